@@ -0,0 +1,182 @@
+"""Read-through cache for LDAP search results.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import collections
+import copy
+import logging
+import threading
+import time
+
+import six
+
+_LOGGER = logging.getLogger(__name__)
+
+_DEFAULT_MAX_SIZE = 4096
+
+_DEFAULT_POLL_INTERVAL = 5
+
+
+def _norm_dn(dn):
+    """Normalize dn for comparison."""
+    return ','.join(
+        part.strip() for part in dn.lower().split(',')
+    )
+
+
+def _is_related(dn, search_base):
+    """Check if a change of dn can affect a search rooted at search_base.
+
+    A change affects searches rooted at the dn itself, at any of its
+    ancestors (subtree searches) and at any of its descendants (the entry
+    may have been deleted together with its subtree).
+    """
+    return (
+        dn == search_base or
+        dn.endswith(',' + search_base) or
+        search_base.endswith(',' + dn)
+    )
+
+
+def csn_time(csn):
+    """Convert CSN (e.g. 20180101120000.123456Z#000000#000#000000) to LDAP
+    generalized time (20180101120000Z).
+    """
+    return csn.split('.', 1)[0].split('#', 1)[0].rstrip('Z') + 'Z'
+
+
+class SearchCache:
+    """TTL and size bounded LRU cache of LDAP search results.
+
+    Cache entries are keyed by search base, filter, scope and attributes.
+    """
+
+    __slots__ = (
+        'ttl',
+        'max_size',
+        'poll_interval',
+        'context_csn',
+        'hits',
+        'misses',
+        '_clock',
+        '_entries',
+        '_lock',
+        '_next_poll',
+    )
+
+    def __init__(self, ttl, max_size=_DEFAULT_MAX_SIZE,
+                 poll_interval=_DEFAULT_POLL_INTERVAL, clock=time.monotonic):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.poll_interval = poll_interval
+        self.context_csn = None
+        self.hits = 0
+        self.misses = 0
+        self._clock = clock
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._next_poll = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def key(search_base, search_filter, search_scope, attributes):
+        """Construct cache key."""
+        if attributes is None:
+            attrs = None
+        elif isinstance(attributes, six.string_types):
+            attrs = (attributes,)
+        else:
+            attrs = tuple(sorted(attributes))
+        return (
+            _norm_dn(search_base),
+            search_filter,
+            str(search_scope),
+            attrs,
+        )
+
+    def get(self, key):
+        """Return copy of cached search response, None if missing/expired.
+        """
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is None:
+                self.misses += 1
+                return None
+
+            expires, response = cached
+            if expires <= self._clock():
+                del self._entries[key]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+
+        # Callers are free to modify returned entries.
+        return copy.deepcopy(response)
+
+    def put(self, key, response):
+        """Store (copy of) search response."""
+        response = copy.deepcopy(response)
+        with self._lock:
+            self._entries[key] = (self._clock() + self.ttl, response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, dn):
+        """Invalidate all searches that may include the dn."""
+        dn = _norm_dn(dn)
+        with self._lock:
+            stale = [
+                key for key in self._entries
+                if _is_related(dn, key[0])
+            ]
+            for key in stale:
+                del self._entries[key]
+
+        if stale:
+            _LOGGER.debug('Invalidated %d cached searches for: %s',
+                          len(stale), dn)
+
+    def clear(self):
+        """Invalidate all cached searches."""
+        with self._lock:
+            self._entries.clear()
+
+    def cached_dns(self):
+        """Return the parent dn -> dns of the entries in cached searches."""
+        with self._lock:
+            responses = [response for _expires, response in
+                         self._entries.values()]
+
+        cached = collections.defaultdict(set)
+        for response in responses:
+            for entry in response:
+                if entry.get('type', 'searchResEntry') != 'searchResEntry':
+                    continue
+                dn = _norm_dn(entry['dn'])
+                cached[dn.partition(',')[2]].add(dn)
+        return cached
+
+    def invalidate_deleted(self, parent_dn, cached_dns, dns):
+        """Invalidate searches of the cached dns of parent_dn not in dns."""
+        deleted = cached_dns - set(_norm_dn(dn) for dn in dns)
+        for dn in deleted:
+            _LOGGER.debug('Deleted under %s: %s', parent_dn, dn)
+            self.invalidate(dn)
+
+    def poll_due(self):
+        """Check (and reset) the change detection poll timer."""
+        now = self._clock()
+        with self._lock:
+            if now < self._next_poll:
+                return False
+            self._next_poll = now + self.poll_interval
+            return True
@@ -10,6 +10,7 @@ import sys
 
 import collections
 import copy
+import datetime
 import json
 import itertools
 import logging
@@ -20,6 +21,8 @@ import ldap3.core.exceptions as ldap_exceptions
 import jinja2
 import six
 
+from . import _cache
+
 if sys.platform == 'win32':
     import treadmill.ldap3kerberos
     sys.modules['ldap3.protocol.sasl.kerberos'] = treadmill.ldap3kerberos
@@ -59,6 +62,8 @@ _TYPE_2_SUBSTR = {
 _TREADMILL_ATTR_OID_PREFIX = '1.3.6.1.4.1.360.10.6.1.'
 _TREADMILL_OBJCLS_OID_PREFIX = '1.3.6.1.4.1.360.10.6.2.'
 
+_DEFAULT_PAGED_SIZE = 50
+
 DEFAULT_PARTITION = '_default'
 DEFAULT_TENANT = '_default'
 
@@ -77,6 +82,14 @@ def _to_bool(value):
         return True
 
 
+def _generalized_time(timestamp):
+    """Convert UTC timestamp to LDAP generalized time (20180101120000Z).
+    """
+    return datetime.datetime.fromtimestamp(
+        timestamp, datetime.timezone.utc
+    ).strftime('%Y%m%d%H%M%SZ')
+
+
 def _entry_2_dict(entry, schema):
     """Convert LDAP entry like object to dict.
     """
@@ -467,18 +480,18 @@ class AndQuery:
     """And query helper."""
 
     def __init__(self, key, value):
-        self.clauses = [(key, value)]
+        self.clauses = [(key, '=', value)]
 
-    def __call__(self, key, value):
-        """Add constraint."""
-        self.clauses.append((key, value))
+    def __call__(self, key, value, op='='):
+        """Add constraint, op is one of =, >=, <=, ~=."""
+        self.clauses.append((key, op, value))
 
     def __str__(self):
         return self.to_str()
 
     def to_str(self):
         """Converts to LDAP query string."""
-        paren = ['(%s=%s)' % (k, v) for k, v in self.clauses]
+        paren = ['(%s%s%s)' % (k, op, v) for k, op, v in self.clauses]
         query = ''.join(paren)
         if len(paren) > 1:
             query = '(&%s)' % query
@@ -493,7 +506,9 @@ class Admin:
     # pylint: disable=too-many-statements
 
     def __init__(self, uri, ldap_suffix,
-                 user=None, password=None, connect_timeout=5, write_uri=None):
+                 user=None, password=None, connect_timeout=5, write_uri=None,
+                 paged_size=_DEFAULT_PAGED_SIZE, cache_ttl=None,
+                 cache_size=None):
         self.uri = uri
         self.write_uri = write_uri
 
@@ -502,6 +517,16 @@ class Admin:
         self.user = user
         self.password = password
         self._connect_timeout = connect_timeout
+        self._paged_size = paged_size
+
+        # Non-dirty search results are cached if cache_ttl is set, dirty
+        # searches always go to the write server.
+        self.cache = None
+        if cache_ttl:
+            kwargs = {}
+            if cache_size:
+                kwargs['max_size'] = cache_size
+            self.cache = _cache.SearchCache(cache_ttl, **kwargs)
 
         self.ldap = None
         self.write_ldap = None
@@ -614,6 +639,15 @@ class Admin:
         if attributes is None:
             attributes = ['*', '+']
 
+        cache_key = None
+        if self.cache is not None and not dirty:
+            cache_key = self.cache.key(
+                search_base, search_filter, search_scope, attributes
+            )
+            cached = self._cache_get(cache_key)
+            if cached is not None:
+                return iter(cached)
+
         # If entries in the potential search results were written or modified
         # recently, we use the connection to the write server to avoid problems
         # with replication delays between provider and consumer
@@ -629,6 +663,9 @@ class Admin:
         )
         self._test_raise_exceptions(ldap)
 
+        if cache_key is not None:
+            self.cache.put(cache_key, list(ldap.response))
+
         return iter(ldap.response)
 
     def paged_search(self, search_base=None, search_filter=None,
@@ -645,6 +682,15 @@ class Admin:
         if attributes is None:
             attributes = ['*', '+']
 
+        cache_key = None
+        if self.cache is not None and not dirty:
+            cache_key = self.cache.key(
+                search_base, search_filter, search_scope, attributes
+            )
+            cached = self._cache_get(cache_key)
+            if cached is not None:
+                return iter(cached)
+
         # If entries in the potential search results were written or modified
         # recently, we use the connection to the write server to avoid problems
         # with replication delays between provider and consumer
@@ -657,14 +703,99 @@ class Admin:
             search_scope=search_scope,
             attributes=attributes,
             dereference_aliases=ldap3.DEREF_NEVER,
-            paged_size=50,
+            paged_size=self._paged_size,
             paged_criticality=True,
             generator=True
         )
         self._test_raise_exceptions(ldap)
 
+        if cache_key is not None:
+            # Cached results are materialized, callers (e.g. get) may not
+            # exhaust the generator.
+            response = list(res_gen)
+            self.cache.put(cache_key, response)
+            return iter(response)
+
         return res_gen
 
+    def _cache_get(self, cache_key):
+        """Get cached search response, polling for changes first."""
+        if self.cache.poll_due():
+            self.poll_changes()
+        return self.cache.get(cache_key)
+
+    def poll_changes(self):
+        """Invalidate cached searches of entries changed on the server.
+
+        The contextCSN of the suffix is compared with the one seen last time,
+        if it changed, entries modified since then are found by their
+        modifyTimestamp and their searches are invalidated.
+
+        Deletes leave no trace, the entries of the cached searches are
+        checked by listing the dns (only) of their parent entries, one level
+        search for each parent. Deletes of entries which are not in any cached
+        search do not change the results of the cached searches.
+
+        Servers which do not expose contextCSN rely on cache TTL only.
+        """
+        self.ldap.result = None
+        self.ldap.search(
+            search_base=self.ldap_suffix,
+            search_filter='(objectClass=*)',
+            search_scope=ldap3.BASE,
+            attributes=['contextCSN'],
+            dereference_aliases=ldap3.DEREF_NEVER
+        )
+        self._test_raise_exceptions(self.ldap)
+        suffix_entry = next(iter(self.ldap.response), {})
+        context_csn = sorted(
+            suffix_entry.get('attributes', {}).get('contextCSN') or []
+        )
+
+        last_csn = self.cache.context_csn
+        self.cache.context_csn = context_csn
+        if not context_csn or last_csn is None or context_csn == last_csn:
+            return
+
+        watermark = max(_cache.csn_time(csn) for csn in last_csn)
+        _LOGGER.debug('LDAP changed, looking for changes since: %s',
+                      watermark)
+        for dn in self._poll_dns(self.root_ou, ldap3.SUBTREE,
+                                 '(modifyTimestamp>=%s)' % watermark):
+            self.cache.invalidate(dn)
+
+        for parent_dn, cached_dns in sorted(self.cache.cached_dns().items()):
+            self.cache.invalidate_deleted(
+                parent_dn, cached_dns,
+                self._poll_dns(parent_dn, ldap3.LEVEL, '(objectClass=*)')
+            )
+
+    def _poll_dns(self, search_base, search_scope, search_filter):
+        """Return the dns of the entries matching the filter (uncached).
+
+        No entries are returned if the search base does not exist.
+        """
+        self.ldap.result = None
+        res_gen = self.ldap.extend.standard.paged_search(
+            search_base=search_base,
+            search_filter=search_filter,
+            search_scope=search_scope,
+            attributes=['1.1'],
+            dereference_aliases=ldap3.DEREF_NEVER,
+            paged_size=self._paged_size,
+            paged_criticality=True,
+            generator=True
+        )
+        dns = [
+            entry['dn'] for entry in res_gen
+            if entry.get('type', 'searchResEntry') == 'searchResEntry'
+        ]
+        try:
+            self._test_raise_exceptions(self.ldap)
+        except ldap_exceptions.LDAPNoSuchObjectResult:
+            return []
+        return dns
+
     def _test_raise_exceptions(self, ldap=None):
         """
         Looks for specific error conditions or throws if non-success state.
@@ -694,10 +825,16 @@ class Admin:
                                  message=ldap.result['message'],
                                  response_type=ldap.result['type'])
 
+    def _invalidate(self, dn):
+        """Invalidate cached searches affected by write to dn."""
+        if self.cache is not None:
+            self.cache.invalidate(dn)
+
     def modify(self, dn, changes):
         """Call ldap modify and raise exception on non-success."""
         if changes:
             self.write_ldap.modify(dn, changes)
+            self._invalidate(dn)
             self._test_raise_exceptions(self.write_ldap)
 
     def add(self, dn, object_class=None, attributes=None):
@@ -707,11 +844,13 @@ class Admin:
             for k, v in six.iteritems(attributes)
         )) if attributes else None
         self.write_ldap.add(dn, object_class, sorted_attributes)
+        self._invalidate(dn)
         self._test_raise_exceptions(self.write_ldap)
 
     def delete(self, dn):
         """Call ldap delete and raise exception on non-success."""
         self.write_ldap.delete(dn)
+        self._invalidate(dn)
         self._test_raise_exceptions(self.write_ldap)
 
     def schema(self, abstract=True):
@@ -1154,9 +1293,8 @@ class LdapObject:
 
         self.admin.create(self.dn(ident), entry)
 
-    def list(self, attrs, generator=False, dirty=False,
-             get_operational_attrs=False):
-        """List records, given attribute filter."""
+    def _list_query(self, attrs, modified_since=None):
+        """Build list query, given attribute filter."""
         query = self._query()
         for ldap_field, obj_field, _field_type in self.schema():
             if obj_field not in attrs:
@@ -1171,7 +1309,20 @@ class LdapObject:
                     query(arg, value)
             else:
                 query(arg, attrs[obj_field])
+
+        if modified_since is not None:
+            query('modifyTimestamp', _generalized_time(modified_since), '>=')
         _LOGGER.debug('Query: %s', query.to_str())
+        return query
+
+    def list(self, attrs, generator=False, dirty=False,
+             get_operational_attrs=False, modified_since=None):
+        """List records, given attribute filter.
+
+        If modified_since (UTC timestamp) is set, only list the records
+        modified since then (with a one second resolution).
+        """
+        query = self._list_query(attrs, modified_since=modified_since)
 
         attributes = self.attrs()
         if get_operational_attrs:
@@ -1193,6 +1344,19 @@ class LdapObject:
                 for entry in result
             ]
 
+    def list_ids(self, attrs, dirty=False):
+        """List records identities, given attribute filter."""
+        query = self._list_query(attrs)
+        result = self.admin.paged_search(search_base=self.dn(),
+                                         search_filter=query.to_str(),
+                                         search_scope=ldap3.SUBTREE,
+                                         attributes=[self.entity()],
+                                         dirty=dirty)
+        return [
+            self.from_entry(entry['attributes'], entry['dn'])['_id']
+            for entry in result
+        ]
+
     def update(self, ident, attrs):
         """Updates LDAP record."""
         dn = self.dn(ident)
@@ -23,11 +23,13 @@ class AdminLdapBackend(base.Backend):
     )
 
     def __init__(self, uri, ldap_suffix,
-                 user=None, password=None, connect_timeout=5, write_uri=None):
+                 user=None, password=None, connect_timeout=5, write_uri=None,
+                 cache_ttl=None):
         self._ldap_conn = _ldap.Admin(
             uri, ldap_suffix,
             user=user, password=password,
-            connect_timeout=connect_timeout, write_uri=write_uri
+            connect_timeout=connect_timeout, write_uri=write_uri,
+            cache_ttl=cache_ttl
         )
 
     def init(self):
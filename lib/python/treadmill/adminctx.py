@@ -18,11 +18,12 @@ from treadmill import context
 _LOGGER = logging.getLogger(__name__)
 
 
-def connect(uri, write_uri, ldap_suffix, user, password):
+def connect(uri, write_uri, ldap_suffix, user, password, cache_ttl=None):
     """Connect to from parent context parameters."""
     _LOGGER.debug('Connecting to LDAP %s, %s', uri, ldap_suffix)
     conn = ldapbackend.AdminLdapBackend(uri, ldap_suffix, write_uri=write_uri,
-                                        user=user, password=password)
+                                        user=user, password=password,
+                                        cache_ttl=cache_ttl)
     conn.connect()
     return conn
 
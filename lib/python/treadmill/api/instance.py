@@ -9,11 +9,14 @@ from __future__ import unicode_literals
 import fnmatch
 import logging
 
+import jsonschema
+
 from treadmill import context
 from treadmill import exc
 from treadmill import schema
 from treadmill import utils
 from treadmill import plugin_manager
+from treadmill.admin import exc as admin_exceptions
 from treadmill.scheduler import masterapi
 from treadmill.api import app
 
@@ -50,6 +53,12 @@ def _validate(rsrc):
             'disk size should be larger than or equal to 100M')
 
 
+@schema.schema({'$ref': 'app.json#/resource_id'})
+def _validate_app_id(rsrc_id):
+    """Validate app name."""
+    del rsrc_id
+
+
 def _check_required_attributes(configured):
     """Check that all required attributes are populated."""
     if 'proid' not in configured:
@@ -73,6 +82,31 @@ def _set_defaults(configured, rsrc_id):
         configured['affinity'] = '{0}.{1}'.format(*rsrc_id.split('.'))
 
 
+def _check_quota(scheduled_stats, rsrc_id, count):
+    """Check scheduled apps quotas."""
+    total_apps = sum(scheduled_stats.values())
+    if total_apps + count > _TOTAL_SCHEDULED_QUOTA:
+        raise exc.QuotaExceededError(
+            'Total scheduled apps quota exceeded.')
+
+    proid_apps = scheduled_stats.get(rsrc_id[:rsrc_id.find('.')], 0)
+    if proid_apps + count > _PROID_SCHEDULED_QUOTA:
+        raise exc.QuotaExceededError(
+            'Proid scheduled apps quota exceeded.')
+
+
+def _error_reason(err):
+    """Return the reason of a bulk operation error."""
+    if isinstance(err, (exc.NotFoundError,
+                        admin_exceptions.NoSuchObjectResult)):
+        return 'not_found'
+    if isinstance(err, jsonschema.exceptions.ValidationError):
+        return 'invalid_manifest'
+    if isinstance(err, (exc.InvalidInputError, exc.QuotaExceededError)):
+        return 'invalid'
+    return 'error'
+
+
 def _api_plugins(plugins):
     """Return instance plugins."""
     if not plugins:
@@ -122,42 +156,10 @@ class API:
                 inst = plugin.remove_attributes(inst)
             return inst
 
-        @schema.schema(
-            {'$ref': 'app.json#/resource_id'},
-            {'allOf': [{'$ref': 'instance.json#/resource'},
-                       {'$ref': 'instance.json#/verbs/create'}]},
-            count={'type': 'integer', 'minimum': 1, 'maximum': 1000},
-            created_by={'anyOf': [
-                {'type': 'null'},
-                {'$ref': 'common.json#/user'},
-            ]},
-            debug={'type': 'boolean'},
-            debug_services={'anyOf': [
-                {'type': 'null'},
-                {'type': 'array', 'items': {'type': 'string'}}
-            ]}
-        )
-        def create(rsrc_id, rsrc, count=1, created_by=None,
-                   debug=False, debug_services=None):
-            """Create (configure) instance."""
-            _LOGGER.info('create: count = %s, %s %r, created_by = %s',
-                         count, rsrc_id, rsrc, created_by)
-
-            # Check scheduled quota.
-            zkclient = context.GLOBAL.zk.conn
-            scheduled_stats = masterapi.get_scheduled_stats(zkclient)
-            if not scheduled_stats:
-                scheduled_stats = {}
-
-            total_apps = sum(scheduled_stats.values())
-            if total_apps + count > _TOTAL_SCHEDULED_QUOTA:
-                raise exc.QuotaExceededError(
-                    'Total scheduled apps quota exceeded.')
-
-            proid_apps = scheduled_stats.get(rsrc_id[:rsrc_id.find('.')], 0)
-            if proid_apps + count > _PROID_SCHEDULED_QUOTA:
-                raise exc.QuotaExceededError(
-                    'Proid scheduled apps quota exceeded.')
+        def _create(zkclient, scheduled_stats, rsrc_id, rsrc, count,
+                    created_by, debug, debug_services):
+            """Check quota, configure and schedule instances."""
+            _check_quota(scheduled_stats, rsrc_id, count)
 
             admin_app = context.GLOBAL.admin.application()
             if not rsrc:
@@ -204,6 +206,113 @@ class API:
             )
             return scheduled
 
+        @schema.schema(
+            {'$ref': 'app.json#/resource_id'},
+            {'allOf': [{'$ref': 'instance.json#/resource'},
+                       {'$ref': 'instance.json#/verbs/create'}]},
+            count={'type': 'integer', 'minimum': 1, 'maximum': 1000},
+            created_by={'anyOf': [
+                {'type': 'null'},
+                {'$ref': 'common.json#/user'},
+            ]},
+            debug={'type': 'boolean'},
+            debug_services={'anyOf': [
+                {'type': 'null'},
+                {'type': 'array', 'items': {'type': 'string'}}
+            ]}
+        )
+        def create(rsrc_id, rsrc, count=1, created_by=None,
+                   debug=False, debug_services=None):
+            """Create (configure) instance."""
+            _LOGGER.info('create: count = %s, %s %r, created_by = %s',
+                         count, rsrc_id, rsrc, created_by)
+
+            zkclient = context.GLOBAL.zk.conn
+            scheduled_stats = masterapi.get_scheduled_stats(zkclient)
+            if not scheduled_stats:
+                scheduled_stats = {}
+
+            return _create(
+                zkclient, scheduled_stats, rsrc_id, rsrc, count, created_by,
+                debug, debug_services
+            )
+
+        @schema.schema(
+            {'anyOf': [
+                {'$ref': 'common.json#/proid'},
+                {'$ref': 'common.json#/app_user'},
+            ]},
+            {'type': 'object',
+             'additionalProperties': {'anyOf': [
+                 {'type': 'integer', 'minimum': 1, 'maximum': 1000},
+                 {'$ref': 'instance.json#/resource_ids'},
+             ]}},
+            user={'anyOf': [
+                {'type': 'null'},
+                {'$ref': 'common.json#/user'},
+            ]}
+        )
+        def bulk_scale(proid, plan, user=None):
+            """Scale apps of proid in bulk.
+
+            The plan maps app names to the number of (configured) instances
+            to create, or to the list of app instances to delete. Returns the
+            outcome of each app, the created/deleted instances or the error.
+            """
+            _LOGGER.info('scale: %r, user = %s', plan, user)
+
+            zkclient = context.GLOBAL.zk.conn
+            scheduled_stats = dict(
+                masterapi.get_scheduled_stats(zkclient) or {}
+            )
+
+            def _process(rsrc_id, delta):
+                _validate_app_id(rsrc_id)
+                if proid != rsrc_id.partition('.')[0]:
+                    raise exc.InvalidInputError(
+                        __name__,
+                        'app does not match proid: {} {}'.format(
+                            proid,
+                            rsrc_id
+                        )
+                    )
+
+                if isinstance(delta, list):
+                    for instance_id in delta:
+                        if instance_id.rpartition('#')[0] != rsrc_id:
+                            raise exc.InvalidInputError(
+                                __name__,
+                                'instance id does not match app: {} {}'.format(
+                                    rsrc_id,
+                                    instance_id
+                                )
+                            )
+                    masterapi.delete_apps(zkclient, delta, user)
+                    return {'instances': delta}
+
+                instances = _create(
+                    zkclient, scheduled_stats, rsrc_id, None, delta, user,
+                    False, None
+                )
+                scheduled_stats[proid] = (
+                    scheduled_stats.get(proid, 0) + len(instances)
+                )
+                return {'instances': instances}
+
+            outcomes = {}
+            for rsrc_id, delta in sorted(plan.items()):
+                try:
+                    outcomes[rsrc_id] = _process(rsrc_id, delta)
+                except Exception as err:  # pylint: disable=W0703
+                    _LOGGER.info('Unable to scale %s: %r', rsrc_id, err)
+                    outcomes[rsrc_id] = {
+                        '_error': {'_id': rsrc_id,
+                                   'why': str(err),
+                                   'reason': _error_reason(err)}
+                    }
+
+            return outcomes
+
         @schema.schema(
             {'$ref': 'instance.json#/resource_id'},
             {'allOf': [{'$ref': 'instance.json#/verbs/update'}]}
@@ -311,3 +420,4 @@ class API:
         self.delete = delete
         self.bulk_update = bulk_update
         self.bulk_delete = bulk_delete
+        self.bulk_scale = bulk_scale
@@ -28,6 +28,7 @@ from treadmill import exc
 from treadmill import appenv
 from treadmill import logcontext as lc
 from treadmill import rrdutils
+from treadmill import runtime
 
 _LOGGER = lc.ContainerAdapter(logging.getLogger(__name__))
 
@@ -226,6 +227,59 @@ def _fragment_in_reverse(iterable, start=0, limit=None):
     return fragment
 
 
+def _percentiles(values, percentiles=(50, 90, 99)):
+    """Nearest-rank percentiles (and max) of the values."""
+    values = sorted(values)
+    result = {}
+    for percentile in percentiles:
+        rank = max(int(-(-percentile * len(values) // 100)), 1)
+        result['p%d' % percentile] = values[rank - 1]
+    result['max'] = values[-1]
+    return result
+
+
+def mk_start_timings_api(tm_env):
+    """Factory to create container start timings api.
+    """
+
+    class _StartTimingsAPI:
+        """Access to container start timings."""
+
+        def __init__(self):
+
+            def _get():
+                """Get start timings percentiles of the node containers.
+                """
+                durations = []
+                phases = collections.defaultdict(list)
+
+                data_glob = os.path.join(tm_env().apps_dir, '*', 'data')
+                for data_dir in glob.glob(data_glob):
+                    timings = runtime.load_start_timings(data_dir)
+                    if timings is None:
+                        continue
+
+                    durations.append(timings['duration'])
+                    for phase, phase_timings in timings['phases'].items():
+                        phases[phase].append(phase_timings['duration'])
+
+                result = {
+                    'count': len(durations),
+                    'phases': {
+                        phase: _percentiles(values)
+                        for phase, values in phases.items()
+                    },
+                }
+                if durations:
+                    result['duration'] = _percentiles(durations)
+
+                return result
+
+            self.get = _get
+
+    return _StartTimingsAPI
+
+
 def mk_metrics_api(tm_env):
     """Factory to create metrics api.
     """
@@ -672,3 +726,4 @@ class API:
         self.log = mk_logapi(tm_env)()
         self.archive = _ArchiveAPI()
         self.metrics = mk_metrics_api(tm_env)()
+        self.start_timings = mk_start_timings_api(tm_env)()
@@ -12,8 +12,6 @@ import json
 import os
 import re
 import zlib
-import sqlite3
-import tempfile
 import fnmatch
 import collections
 import time
@@ -24,6 +22,7 @@ from treadmill import utils
 from treadmill import yamlwrapper as yaml
 from treadmill import zknamespace as z
 from treadmill import zkutils
+from treadmill.trace import history
 
 
 _LOGGER = logging.getLogger(__name__)
@@ -130,21 +129,14 @@ def watch_finished_history(zkclient, cell_state):
 
             data, _stat = zkclient.get(z.path.finished_history(db_node))
 
-            with tempfile.NamedTemporaryFile(delete=False, mode='wb') as f:
-                f.write(zlib.decompress(data))
-            try:
-                conn = sqlite3.connect(f.name)
-                cur = conn.cursor()
-                sql = 'SELECT name, data FROM finished ORDER BY timestamp'
-                for row in cur.execute(sql):
-                    instance, data = row
-                    if data:
-                        data = yaml.load(data)
-                    updated_finished_history[instance] = data
-                    loaded_snapshots[db_node].append(instance)
-                conn.close()
-            finally:
-                os.unlink(f.name)
+            with history.Snapshot(data, 'finished') as snapshot:
+                rows = sorted(snapshot.rows(), key=lambda row: row.timestamp)
+            for row in rows:
+                data = row.data
+                if data:
+                    data = yaml.load(data)
+                updated_finished_history[row.name] = data
+                loaded_snapshots[db_node].append(row.name)
 
             _LOGGER.debug('Loading time: %s', time.time() - loading_start_time)
 
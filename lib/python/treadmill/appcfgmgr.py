@@ -93,10 +93,12 @@ class AppCfgMgr:
             content='Service %r failed' % self.name
         )
 
-        watch = dirwatch.DirWatcher(self.tm_env.cache_dir)
-        watch.on_created = self._on_created
-        watch.on_modified = self._on_modified
-        watch.on_deleted = self._on_deleted
+        # Cached manifests are only processed once completely written, and
+        # bursts of events are handled as a batch.
+        watch = dirwatch.DirWatcher(
+            self.tm_env.cache_dir, coalesce=True, close_write=True
+        )
+        watch.on_events = self._on_events
 
         # Start the timer
         watchdog_lease.heartbeat()
@@ -138,6 +140,26 @@ class AppCfgMgr:
         _LOGGER.info('service shutdown.')
         watchdog_lease.remove()
 
+    def _on_events(self, events):
+        """Handle a batch of cache events, refreshing the supervisor once.
+
+        :param events:
+            List of ``(DirWatcherEvent, <event_file>)``
+        :type events:
+            ``list``
+        """
+        refresh = False
+        for event, event_file in events:
+            if event == dirwatch.DirWatcherEvent.CREATED:
+                refresh |= self._on_created(event_file, refresh=False)
+            elif event == dirwatch.DirWatcherEvent.MODIFIED:
+                self._on_modified(event_file)
+            elif event == dirwatch.DirWatcherEvent.DELETED:
+                refresh |= self._on_deleted(event_file, refresh=False)
+
+        if refresh:
+            self._refresh_supervisor()
+
     def _on_modified(self, event_file):
         """Handle a modified cached manifest event.
 
@@ -158,65 +180,83 @@ class AppCfgMgr:
 
         # NOTE(boysson): We ignore anything else for now.
 
-    def _on_created(self, event_file):
+    def _on_created(self, event_file, refresh=True):
         """Handle a new cached manifest event: configure an instance.
 
         :param event_file:
             Full path to an event file
         :type event_file:
             ``str``
+        :param refresh:
+            Refresh the supervisor if the instance was configured.
+        :type refresh:
+            ``bool``
+        :returns ``bool``:
+            ``True`` if the instance was configured.
         """
         instance_name = os.path.basename(event_file)
 
         if instance_name == eventmgr.READY_FILE:
             self._first_sync()
-            return
+            return False
 
         elif instance_name[0] == '.':
             # Ignore all dot files
-            return
+            return False
 
         elif self._is_active is False:
             # Ignore all created events while we are not running
             _LOGGER.debug('Inactive in created event handler.')
-            return
+            return False
 
         elif os.path.islink(os.path.join(self.tm_env.running_dir,
                                          instance_name)):
             _LOGGER.warning('Event on already configured %r',
                             instance_name)
-            return
+            return False
 
         elif self._configure(instance_name):
-            self._refresh_supervisor()
+            if refresh:
+                self._refresh_supervisor()
+            return True
 
-    def _on_deleted(self, event_file):
+        return False
+
+    def _on_deleted(self, event_file, refresh=True):
         """Handle removal event of a cached manifest: terminate an instance.
 
         :param event_file:
             Full path to an event file
         :type event_file:
             ``str``
+        :param refresh:
+            Refresh the supervisor if the instance was terminated.
+        :type refresh:
+            ``bool``
+        :returns ``bool``:
+            ``True`` if the instance was terminated.
         """
         instance_name = os.path.basename(event_file)
         if instance_name == eventmgr.READY_FILE:
             _LOGGER.info('Cache folder not ready.'
                          ' Stopping processing of events.')
             self._is_active = False
-            return
+            return False
 
         elif instance_name[0] == '.':
             # Ignore all dot files
-            return
+            return False
 
         elif self._is_active is False:
             # Ignore all deleted events while we are not running
             _LOGGER.debug('Inactive in deleted event handler.')
-            return
+            return False
 
         else:
             self._terminate(instance_name)
-            self._refresh_supervisor()
+            if refresh:
+                self._refresh_supervisor()
+            return True
 
     def _first_sync(self):
         """Bring the appcfgmgr into active mode and do a first sync.
@@ -0,0 +1,216 @@
+"""App group lookup databases.
+
+The app groups of a proid are published in Zookeeper as a sqlite DB
+snapshot, followed by ordered deltas of the rows deleted and inserted since
+the snapshot::
+
+    /appgroup-lookups/<proid>/<digest>                  - snapshot (sqlite)
+    /appgroup-lookups/<proid>/<digest>/delta-<seq>      - delta (json)
+
+Consumers download the snapshot once, then only apply the new deltas to
+their local copy. The publisher compacts the deltas into a new snapshot
+when they pile up.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import collections
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+
+import kazoo.client
+
+from treadmill import fs
+from treadmill import zknamespace as z
+
+_LOGGER = logging.getLogger(__name__)
+
+DELTA_PREFIX = 'delta-'
+
+#: Max number of deltas of a snapshot, a new snapshot is published past it.
+MAX_DELTAS = 100
+
+Published = collections.namedtuple(
+    'Published',
+    ['snapshot', 'deltas', 'digest']
+)
+
+
+def make_delta(digest, delete, insert):
+    """Serialize delta of the rows deleted and inserted, resulting in the
+    rows with the given digest.
+    """
+    return json.dumps(
+        {'digest': digest, 'delete': delete, 'insert': insert}
+    ).encode()
+
+
+def apply_delta(conn, data):
+    """Apply serialized delta to the lookup DB."""
+    delta = json.loads(data.decode())
+    conn.executemany(
+        """
+        DELETE FROM appgroups WHERE
+            pattern IS ? AND group_type IS ? AND endpoints IS ? AND data IS ?
+        """,
+        delta['delete']
+    )
+    conn.executemany(
+        """
+        INSERT INTO appgroups (
+            pattern, group_type, endpoints, data
+        ) VALUES(?, ?, ?, ?)
+        """,
+        delta['insert']
+    )
+    return delta['digest']
+
+
+def latest_snapshot(zkclient, proid):
+    """Return the latest snapshot of the proid lookup (or None)."""
+    try:
+        snapshots = zkclient.get_children(z.path.appgroup_lookup(proid))
+    except kazoo.client.NoNodeError:
+        return None
+
+    if len(snapshots) > 1:
+        # Old snapshots are removed after a new one is published.
+        snapshots.sort(
+            key=lambda node: zkclient.exists(
+                z.path.appgroup_lookup(proid, node)
+            ).czxid
+        )
+    return snapshots[-1] if snapshots else None
+
+
+def _deltas(zkclient, proid, snapshot):
+    """Return the ordered deltas of the snapshot."""
+    return sorted(
+        node for node in zkclient.get_children(
+            z.path.appgroup_lookup(proid, snapshot)
+        )
+        if node.startswith(DELTA_PREFIX)
+    )
+
+
+def get_published(zkclient, proid):
+    """Get the published version of the proid lookup (or None)."""
+    snapshot = latest_snapshot(zkclient, proid)
+    if snapshot is None:
+        return None
+
+    deltas = _deltas(zkclient, proid, snapshot)
+    digest = snapshot
+    if deltas:
+        data, _metadata = zkclient.get(
+            z.path.appgroup_lookup(proid, snapshot, deltas[-1])
+        )
+        digest = json.loads(data.decode())['digest']
+
+    return Published(snapshot, len(deltas), digest)
+
+
+def _local_version(db_path):
+    """Return (snapshot, last applied delta) of the local lookup DB."""
+    if not os.path.exists(db_path):
+        return (None, None)
+
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute(
+            'SELECT snapshot, delta FROM lookup_version'
+        ).fetchone()
+    except sqlite3.OperationalError:
+        return (None, None)
+    finally:
+        conn.close()
+
+
+def _save_snapshot(db_path, snapshot, data):
+    """Save snapshot as the local lookup DB."""
+    with tempfile.NamedTemporaryFile(dir=os.path.dirname(db_path),
+                                     prefix='.tmp', delete=False) as f:
+        f.write(data)
+
+    try:
+        conn = sqlite3.connect(f.name)
+        with conn:
+            conn.execute(
+                'CREATE TABLE lookup_version (snapshot text, delta text)'
+            )
+            conn.execute(
+                'INSERT INTO lookup_version VALUES(?, ?)', (snapshot, '')
+            )
+        conn.close()
+        fs.replace(f.name, db_path)
+    finally:
+        fs.rm_safe(f.name)
+
+
+def sync_db(zkclient, proid, db_path):
+    """Sync the local lookup DB of a proid with Zookeeper.
+
+    :returns:
+        ``bool`` - True if the local lookup DB was updated.
+    """
+    snapshot = latest_snapshot(zkclient, proid)
+    if snapshot is None:
+        if os.path.exists(db_path):
+            fs.rm_safe(db_path)
+            return True
+        return False
+
+    updated = False
+    local_snapshot, applied = _local_version(db_path)
+    if local_snapshot != snapshot:
+        _LOGGER.info('Download appgroup lookup snapshot: %s/%s',
+                     proid, snapshot)
+        data, _metadata = zkclient.get(
+            z.path.appgroup_lookup(proid, snapshot)
+        )
+        _save_snapshot(db_path, snapshot, data)
+        applied = ''
+        updated = True
+
+    deltas = [
+        delta for delta in _deltas(zkclient, proid, snapshot)
+        if delta > applied
+    ]
+    if not deltas:
+        return updated
+
+    conn = sqlite3.connect(db_path)
+    try:
+        for delta in deltas:
+            _LOGGER.debug('Apply appgroup lookup delta: %s/%s/%s',
+                          proid, snapshot, delta)
+            data, _metadata = zkclient.get(
+                z.path.appgroup_lookup(proid, snapshot, delta)
+            )
+            with conn:
+                apply_delta(conn, data)
+                conn.execute(
+                    'UPDATE lookup_version SET delta = ?', (delta,)
+                )
+    finally:
+        conn.close()
+
+    return True
+
+
+__all__ = [
+    'DELTA_PREFIX',
+    'MAX_DELTAS',
+    'Published',
+    'apply_delta',
+    'get_published',
+    'latest_snapshot',
+    'make_delta',
+    'sync_db',
+]
@@ -11,9 +11,14 @@ import hashlib
 import json
 import io
 import logging
+import os
 import sqlite3
 import tempfile
+import time
 
+import kazoo.client
+
+from treadmill import appgrouplookup
 from treadmill import context
 from treadmill import fs
 from treadmill import utils
@@ -24,39 +29,181 @@ from treadmill.scheduler import masterapi
 _LOGGER = logging.getLogger(__name__)
 
 
+#: Sync state is dropped (and collections synced in full) after (seconds).
+_FULL_SYNC_INTERVAL = 3600
+
+# Zookeeper path -> _SyncState (or _LookupState).
+_SYNC_STATE = {}
+
+
+class _SyncState:
+    """State of the last sync of a Zookeeper path.
+    """
+
+    __slots__ = (
+        'digests',
+        'entities',
+        'digest',
+        'since',
+        'watermark',
+    )
+
+    def __init__(self):
+        # Children digests (None until compared with Zookeeper) and entities.
+        self.digests = None
+        self.entities = {}
+        # Digest of the node data.
+        self.digest = None
+        self.since = time.time()
+        # Latest LDAP modify timestamp of the synced entities.
+        self.watermark = None
+
+
+class _LookupState:
+    """State of the last sync of the app group lookups.
+    """
+
+    __slots__ = (
+        'loaded',
+        'published',
+        'since',
+    )
+
+    def __init__(self):
+        # True once the published proids are read from Zookeeper.
+        self.loaded = False
+        # Proid -> (published lookup, rows), None until read from Zookeeper.
+        self.published = {}
+        self.since = time.time()
+
+
+def _sync_state(zkpath, state_cls=_SyncState):
+    """Get sync state of Zookeeper path."""
+    state = _SYNC_STATE.get(zkpath)
+    if state is None or time.time() - state.since > _FULL_SYNC_INTERVAL:
+        state = _SYNC_STATE[zkpath] = state_cls()
+    return state
+
+
+def _payload(data):
+    """Serialize data (as in zkutils.put)."""
+    return json.dumps(data, sort_keys=True).encode()
+
+
+def _digest(data):
+    """Return digest of serialized data."""
+    return hashlib.sha1(data).hexdigest()
+
+
 def _match_appgroup(group):
     """Match if appgroup belongs to the cell.
     """
     return context.GLOBAL.cell in group.get('cells', [])
 
 
-def _sync_collection(zkclient, entities, zkpath, match=None):
+def _sync_nodes(zkclient, zkpath, nodes, state, changed=None):
+    """Sync nodes (name -> data) to Zookeeper children of zkpath.
+
+    Nodes are compared with the digests of the last sync, if changed names
+    are given, the other nodes are known to be in sync.
+
+    :returns:
+        ``bool`` - True if Zookeeper was updated.
+    """
+    if state.digests is None:
+        zkclient.ensure_path(zkpath)
+        state.digests = dict.fromkeys(zkclient.get_children(zkpath))
+
+    ops = []
+    digests = {}
+    deleted = set(state.digests) - set(nodes)
+    for name in deleted:
+        _LOGGER.info('Delete: %s', name)
+        ops.append(('delete', z.join_zookeeper_path(zkpath, name), None))
+
+    if changed is None:
+        changed = nodes
+    for name in changed:
+        if name not in nodes:
+            continue
+
+        path = z.join_zookeeper_path(zkpath, name)
+        payload = _payload(nodes[name])
+        digest = _digest(payload)
+        if name not in state.digests:
+            op = 'create'
+        else:
+            synced = state.digests[name]
+            if synced is None:
+                # Not synced yet, compare with the data in Zookeeper.
+                try:
+                    data, _metadata = zkclient.get(path)
+                    synced = _digest(data)
+                except kazoo.client.NoNodeError:
+                    pass
+            if synced == digest:
+                _LOGGER.debug('Up to date: %s', name)
+                digests[name] = digest
+                continue
+            op = 'set'
+
+        _LOGGER.info('Update: %s', name)
+        ops.append((op, path, payload))
+        digests[name] = digest
+
+    # Nodes created since the children were listed are updated.
+    for path, payload in zkutils.apply_batch(zkclient, ops):
+        zkutils.put(zkclient, path, payload)
+
+    for name in deleted:
+        del state.digests[name]
+    state.digests.update(digests)
+    state.entities = nodes
+    return bool(ops)
+
+
+def _sync_collection(zkclient, entities, zkpath, match=None, state=None,
+                     ids=None):
     """Sync ldap collection to Zookeeper.
+
+    If ids (of all the LDAP entities) are given, entities are the entities
+    modified since the state watermark, the others are left as last synced.
+
+    :returns:
+        ``bool`` - True if Zookeeper was updated.
     """
     _LOGGER.info('Sync: %s', zkpath)
-    zkclient.ensure_path(zkpath)
-
-    in_zk = zkclient.get_children(zkpath)
+    if state is None:
+        state = _SyncState()
 
+    watermark = state.watermark
+    modified = set()
     to_sync = {}
     for entity in entities:
         name = entity.pop('_id')
+        # Operational attrs are only used to find the modified entities.
+        entity.pop('_create_timestamp', None)
+        timestamp = entity.pop('_modify_timestamp', None)
+        if timestamp is not None and (watermark is None or
+                                      timestamp > watermark):
+            watermark = timestamp
+        modified.add(name)
+
         if match and not match(entity):
             _LOGGER.debug('Skip: %s', name)
             continue
         to_sync[name] = entity
 
-    for to_del in set(in_zk) - set(to_sync):
-        _LOGGER.info('Delete: %s', to_del)
-        zkutils.ensure_deleted(zkclient, z.join_zookeeper_path(zkpath, to_del))
+    changed = None
+    if ids is not None:
+        for name in set(ids) - modified:
+            if name in state.entities:
+                to_sync[name] = state.entities[name]
+        changed = modified
 
-    # Add or update current app-groups
-    for name, entity in to_sync.items():
-        if zkutils.put(zkclient, z.join_zookeeper_path(zkpath, name),
-                       entity, check_content=True):
-            _LOGGER.info('Update: %s', name)
-        else:
-            _LOGGER.info('Up to date: %s', name)
+    updated = _sync_nodes(zkclient, zkpath, to_sync, state, changed=changed)
+    state.watermark = watermark
+    return updated
 
 
 def _appgroup_group_by_proid(cell_app_groups):
@@ -120,32 +267,94 @@ def _create_lookup_db(rows):
     return f.name
 
 
+def _published_rows(zkclient, proid):
+    """Get the rows of the published lookup DB of proid."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db_path = os.path.join(tmpdir, 'lookup.db')
+        appgrouplookup.sync_db(zkclient, proid, db_path)
+        conn = sqlite3.connect(db_path)
+        try:
+            return set(conn.execute(
+                'SELECT pattern, group_type, endpoints, data FROM appgroups'
+            ))
+        finally:
+            conn.close()
+
+
 def _sync_appgroup_lookups(zkclient, cell_app_groups):
-    """Sync app group lookup databases."""
+    """Sync app group lookup databases.
+
+    Changes of the app groups of a proid are published as deltas of the
+    lookup DB snapshot, a new snapshot is published once deltas pile up or
+    for large changes.
+    """
     groups_by_proid, checksum_by_proid = _appgroup_group_by_proid(
         cell_app_groups
     )
 
-    for proid in groups_by_proid:
+    state = _sync_state(z.APPGROUP_LOOKUP, _LookupState)
+    published = state.published
+    if not state.loaded:
+        state.loaded = True
+        try:
+            for proid in zkclient.get_children(z.APPGROUP_LOOKUP):
+                published[proid] = None
+        except kazoo.client.NoNodeError:
+            pass
 
-        if not groups_by_proid[proid]:
-            _LOGGER.debug('Appgroups not defined for proid: %s', proid)
-            zkutils.ensure_deleted(z.path.appgroup_lookup, proid)
-            continue
+    for proid in set(published) - set(groups_by_proid):
+        _LOGGER.info('Delete appgroup lookup: %s', proid)
+        zkutils.ensure_deleted(zkclient, z.path.appgroup_lookup(proid))
+        del published[proid]
 
-        # If node already exists with the proper checksum, ensure that others
-        # are removed, but not recreate.
+    for proid, proid_rows in groups_by_proid.items():
         digest = checksum_by_proid[proid].hexdigest()
-        if zkclient.exists(z.path.appgroup_lookup(proid, digest)):
+        rows = set(proid_rows)
+
+        lookup, synced_rows = published.get(proid) or (None, None)
+        if lookup is None:
+            lookup = appgrouplookup.get_published(zkclient, proid)
+
+        if lookup is not None and lookup.digest == digest:
             _LOGGER.debug('Appgroup lookup for proid %s is up to date: %s',
                           proid, digest)
+            published[proid] = (lookup, rows)
             continue
 
-        db_file = _create_lookup_db(groups_by_proid[proid])
-        try:
-            _save_appgroup_lookup(zkclient, db_file, proid, digest)
-        finally:
-            fs.rm_safe(db_file)
+        snapshot = lookup is None
+        if not snapshot:
+            if synced_rows is None:
+                synced_rows = _published_rows(zkclient, proid)
+            delete = list(synced_rows - rows)
+            insert = list(rows - synced_rows)
+            # Compact deltas into a new snapshot, unless it would have the
+            # name (digest) of the current one.
+            snapshot = (
+                (lookup.deltas >= appgrouplookup.MAX_DELTAS or
+                 len(delete) + len(insert) > len(rows) // 2) and
+                digest != lookup.snapshot
+            )
+
+        if snapshot:
+            db_file = _create_lookup_db(proid_rows)
+            try:
+                _save_appgroup_lookup(zkclient, db_file, proid, digest)
+            finally:
+                fs.rm_safe(db_file)
+            lookup = appgrouplookup.Published(digest, 0, digest)
+        else:
+            _LOGGER.info('Appgroup lookup delta for proid %s: %s',
+                         proid, digest)
+            zkutils.put(
+                zkclient,
+                z.path.appgroup_lookup(proid, lookup.snapshot,
+                                       appgrouplookup.DELTA_PREFIX),
+                appgrouplookup.make_delta(digest, delete, insert),
+                sequence=True
+            )
+            lookup = lookup._replace(deltas=lookup.deltas + 1, digest=digest)
+
+        published[proid] = (lookup, rows)
 
 
 def _save_appgroup_lookup(zkclient, db_file, proid, digest):
@@ -168,14 +377,28 @@ def _remove_extra_appgroup_lookup(zkclient, proid, digest):
 
 
 def sync_appgroups():
-    """Sync app-groups from LDAP to Zookeeper."""
+    """Sync app-groups from LDAP to Zookeeper.
+
+    Once synced in full, only the app-groups modified since the last sync
+    are read from LDAP.
+    """
     _LOGGER.info('Sync appgroups.')
+    zkclient = context.GLOBAL.zk.conn
     admin_app_group = context.GLOBAL.admin.app_group()
-    app_groups = admin_app_group.list({})
-    cell_app_groups = [group for group in app_groups if _match_appgroup(group)]
-    _sync_collection(context.GLOBAL.zk.conn,
-                     cell_app_groups, z.path.appgroup())
-    _sync_appgroup_lookups(context.GLOBAL.zk.conn, cell_app_groups)
+
+    state = _sync_state(z.path.appgroup())
+    ids = None
+    if state.watermark is None:
+        app_groups = admin_app_group.list({}, get_operational_attrs=True)
+    else:
+        ids = admin_app_group.list_ids({})
+        app_groups = admin_app_group.list({}, get_operational_attrs=True,
+                                          modified_since=state.watermark)
+
+    updated = _sync_collection(zkclient, app_groups, z.path.appgroup(),
+                               match=_match_appgroup, state=state, ids=ids)
+    if updated or ids is None:
+        _sync_appgroup_lookups(zkclient, list(state.entities.values()))
 
 
 def sync_partitions():
@@ -187,19 +410,8 @@ def sync_partitions():
     admin_cell = context.GLOBAL.admin.cell()
     partitions = admin_cell.partitions(context.GLOBAL.cell)
 
-    zkclient.ensure_path(z.path.partition())
-
-    in_zk = zkclient.get_children(z.path.partition())
-    names = [partition['_id'] for partition in partitions]
-
-    for extra in set(in_zk) - set(names):
-        _LOGGER.debug('Delete: %s', extra)
-        zkutils.ensure_deleted(zkclient, z.path.partition(extra))
-
-    # Add or update current partitions
+    nodes = {}
     for partition in partitions:
-        zkname = partition['_id']
-
         if 'reboot-schedule' in partition:
             try:
                 partition['reboot-schedule'] = utils.reboot_schedule(
@@ -209,11 +421,10 @@ def sync_partitions():
                 _LOGGER.info('Invalid reboot schedule, ignoring.')
                 del partition['reboot-schedule']
 
-        if zkutils.put(zkclient, z.path.partition(zkname),
-                       partition, check_content=True):
-            _LOGGER.info('Update: %s', zkname)
-        else:
-            _LOGGER.info('Up to date: %s', zkname)
+        nodes[partition['_id']] = partition
+
+    _sync_nodes(zkclient, z.path.partition(), nodes,
+                _sync_state(z.path.partition()))
 
 
 def _check_assignments(assignments):
@@ -245,19 +456,34 @@ def sync_allocations():
             alloc['assignments'] = _check_assignments(assignments)
         filtered.append(alloc)
 
+    state = _sync_state(z.path.allocation())
+    digest = _digest(_payload(filtered))
+    if digest == state.digest:
+        _LOGGER.info('Up to date: allocations.')
+        return
+
     masterapi.update_allocations(zkclient, filtered)
+    state.digest = digest
 
 
 def sync_servers():
     """Sync global servers list."""
     _LOGGER.info('Sync servers.')
     admin_srv = context.GLOBAL.admin.server()
-    global_servers = admin_srv.list({})
+    servers = admin_srv.list_ids({})
+
+    state = _sync_state(z.path.globals('servers'))
+    digest = _digest(_payload(servers))
+    if digest == state.digest:
+        _LOGGER.info('Up to date: servers.')
+        return
+
     zkutils.ensure_exists(
         context.GLOBAL.zk.conn,
         z.path.globals('servers'),
-        data=[server['_id'] for server in global_servers]
+        data=servers
     )
+    state.digest = digest
 
 
 def sync_traits():
@@ -50,6 +50,10 @@ class _AppTraceEventsOnly(events.AppTraceEventHandler):
         """Invoked when task is configured.
         """
 
+    def on_started(self, when, instanceid, server, uniqueid, duration):
+        """Invoked when task container is started.
+        """
+
     def on_deleted(self, when, instanceid):
         """Invoked when task is deleted.
         """
@@ -234,6 +234,19 @@ class AdminContext:
         self._context.set('ldap_write_url', value)
         self._conn = None
 
+    @property
+    def cache_ttl(self):
+        """Get the TTL of cached LDAP search results (disabled if not set).
+        """
+        return self._context.get('ldap_cache_ttl', resolve=False)
+
+    @cache_ttl.setter
+    def cache_ttl(self, value):
+        """Set the TTL of cached LDAP search results.
+        """
+        self._context.set('ldap_cache_ttl', value)
+        self._conn = None
+
     @property
     def conn(self):
         """Lazily establishes connection to admin LDAP.
@@ -243,7 +256,8 @@ class AdminContext:
 
         plugin = plugin_manager.load('treadmill.context', 'admin')
         self._conn = plugin.connect(self.url, self.write_url, self.ldap_suffix,
-                                    self.user, self.password)
+                                    self.user, self.password,
+                                    cache_ttl=self.cache_ttl)
         return self._conn
 
     def partition(self):
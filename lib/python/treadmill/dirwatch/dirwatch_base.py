@@ -46,18 +46,24 @@ class DirWatcher:
     """Directory watcher base, invoking callbacks on file create/delete events.
     """
     __slots__ = (
+        'coalesce',
         'event_list',
         'on_created',
         'on_deleted',
+        'on_events',
         'on_modified',
         '_watches'
     )
 
-    def __init__(self, watch_dir=None):
+    def __init__(self, watch_dir=None, coalesce=False):
+        self.coalesce = coalesce
         self.event_list = collections.deque()
         self.on_created = self._noop
         self.on_deleted = self._noop
         self.on_modified = self._noop
+        #: Batch callback, if set it is invoked with the list of
+        #: ``(DirWatcherEvent, <path>)`` instead of the per event callbacks.
+        self.on_events = None
         self._watches = {}
 
         if watch_dir is not None:
@@ -150,7 +156,9 @@ class DirWatcher:
         """Process events received.
 
         This function will parse all received events and invoke the registered
-        callbacks accordingly.
+        callbacks accordingly. If ``on_events`` is set, it is invoked once with
+        the (up to ``max_events``) events instead, and the callback return
+        values are ``None``.
 
         :param ``int`` max_events:
             Maximum number of events to process
@@ -165,7 +173,13 @@ class DirWatcher:
 
         # If we are out of cached events, get more from inotify
         if not self.event_list and not resume:
-            self.event_list.extend(self._read_events())
+            events = self._read_events()
+            if self.coalesce:
+                events = coalesce_events(events)
+            self.event_list.extend(events)
+
+        if self.on_events is not None:
+            return self._process_batch(max_events)
 
         results = []
         step = 0
@@ -207,3 +221,65 @@ class DirWatcher:
             )
 
         return results
+
+    def _process_batch(self, max_events):
+        """Invoke the batch callback with up to max_events queued events.
+        """
+        batch = []
+        while self.event_list and len(batch) < max_events:
+            batch.append(self.event_list.popleft())
+
+        if batch:
+            self.on_events(batch)  # pylint: disable=E1102
+
+        results = [(event, src_path, None) for event, src_path in batch]
+        if self.event_list:
+            results.append((DirWatcherEvent.MORE_PENDING, None, None))
+
+        return results
+
+
+def coalesce_events(events):
+    """Coalesce redundant events of the same path.
+
+        - MODIFIED after CREATED or MODIFIED is dropped (consumers read the
+          latest content anyway);
+        - CREATED after MODIFIED (e.g. file moved over) replaces it;
+        - DELETED replaces the MODIFIED events before it.
+
+    Creation and deletion are never dropped, paths are reported in the order
+    of their first event.
+
+    :param events:
+        List of ``(DirWatcherEvent, <path>)``.
+    :returns:
+        List of ``(DirWatcherEvent, <path>)``.
+    """
+    by_path = collections.OrderedDict()
+    for event, src_path in events:
+        path_events = by_path.setdefault(src_path, [])
+        last = path_events[-1] if path_events else None
+
+        if event == DirWatcherEvent.MODIFIED:
+            if last in (DirWatcherEvent.CREATED, DirWatcherEvent.MODIFIED):
+                continue
+
+        elif event == DirWatcherEvent.CREATED:
+            if last == DirWatcherEvent.CREATED:
+                continue
+            if last == DirWatcherEvent.MODIFIED:
+                path_events.pop()
+
+        elif event == DirWatcherEvent.DELETED:
+            if last == DirWatcherEvent.MODIFIED:
+                path_events.pop()
+            if path_events and path_events[-1] == DirWatcherEvent.DELETED:
+                continue
+
+        path_events.append(event)
+
+    return [
+        (event, src_path)
+        for src_path, path_events in six.iteritems(by_path)
+        for event in path_events
+    ]
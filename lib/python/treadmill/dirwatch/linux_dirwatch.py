@@ -8,7 +8,9 @@ from __future__ import unicode_literals
 
 import errno
 import logging
+import os
 import select
+import stat
 
 import six
 
@@ -20,18 +22,28 @@ _LOGGER = logging.getLogger(__name__)
 
 
 class LinuxDirWatcher(dirwatch_base.DirWatcher):
-    """Linux directory watcher implementation."""
+    """Linux directory watcher implementation.
+
+    In close write mode, files are only reported once they are complete:
+    a new regular file is CREATED when closed after writing (or when moved
+    in), and subsequent writes are reported as MODIFIED on close.
+    """
 
     __slots__ = (
+        'close_write',
         'inotify',
-        'poll'
+        'poll',
+        '_pending',
     )
 
-    def __init__(self, watch_dir=None):
+    def __init__(self, watch_dir=None, coalesce=False, close_write=False):
+        self.close_write = close_write
         self.inotify = inotify.Inotify(inotify.IN_CLOEXEC)
         self.poll = select.poll()
         self.poll.register(self.inotify, select.POLLIN)
-        super(LinuxDirWatcher, self).__init__(watch_dir)
+        # New regular files not yet closed (close write mode).
+        self._pending = set()
+        super(LinuxDirWatcher, self).__init__(watch_dir, coalesce=coalesce)
 
     def _add_dir(self, watch_dir):
         """Add `directory` to the list of watched directories.
@@ -39,9 +51,16 @@ class LinuxDirWatcher(dirwatch_base.DirWatcher):
         :param watch_dir: watch directory real path
         :returns: watch id
         """
-        return self.inotify.add_watch(
-            watch_dir,
-            event_mask=(
+        if self.close_write:
+            event_mask = (
+                inotify.IN_CLOSE_WRITE |
+                inotify.IN_CREATE |
+                inotify.IN_DELETE |
+                inotify.IN_DELETE_SELF |
+                inotify.IN_MOVE
+            )
+        else:
+            event_mask = (
                 inotify.IN_ATTRIB |
                 inotify.IN_CREATE |
                 inotify.IN_DELETE |
@@ -49,7 +68,8 @@ class LinuxDirWatcher(dirwatch_base.DirWatcher):
                 inotify.IN_MODIFY |
                 inotify.IN_MOVE
             )
-        )
+
+        return self.inotify.add_watch(watch_dir, event_mask=event_mask)
 
     def _remove_dir(self, watch_id):
         """Remove `directory` from the list of watched directories.
@@ -84,9 +104,11 @@ class LinuxDirWatcher(dirwatch_base.DirWatcher):
 
         :returns: List of ``(DirWatcherEvent, <path>)``
         """
-        results = []
         events = self.inotify.read_events()
+        if self.close_write:
+            return self._close_write_events(events)
 
+        results = []
         for event in events:
             if (event.is_modify or
                     event.is_attrib):
@@ -121,3 +143,72 @@ class LinuxDirWatcher(dirwatch_base.DirWatcher):
                     _LOGGER.info('Watch on %r auto-removed', event.src_path)
 
         return results
+
+    def _close_write_events(self, events):
+        """Format close write mode inotify events as ``DirWatcherEvent``.
+        """
+        results = []
+        # Files deleted (and not re-created) in this batch, still open ones
+        # report close after the delete.
+        deleted = set()
+        for event in events:
+            src_path = event.src_path
+
+            if event.is_create:
+                deleted.discard(src_path)
+                if not event.is_directory and self._is_regular(src_path):
+                    # Wait for the file to be written.
+                    self._pending.add(src_path)
+                else:
+                    results.append(
+                        (dirwatch_base.DirWatcherEvent.CREATED, src_path)
+                    )
+
+            elif event.is_close_write:
+                if src_path in deleted:
+                    continue
+                if src_path in self._pending:
+                    self._pending.discard(src_path)
+                    results.append(
+                        (dirwatch_base.DirWatcherEvent.CREATED, src_path)
+                    )
+                else:
+                    results.append(
+                        (dirwatch_base.DirWatcherEvent.MODIFIED, src_path)
+                    )
+
+            elif event.is_moved_to:
+                deleted.discard(src_path)
+                self._pending.discard(src_path)
+                results.append(
+                    (dirwatch_base.DirWatcherEvent.CREATED, src_path)
+                )
+
+            elif (event.is_delete or
+                  event.is_moved_from or
+                  event.is_delete_self):
+                deleted.add(src_path)
+                if src_path in self._pending:
+                    # Never reported as created.
+                    self._pending.discard(src_path)
+                    continue
+                results.append(
+                    (dirwatch_base.DirWatcherEvent.DELETED, src_path)
+                )
+
+            elif event.mask == inotify.IN_IGNORED:
+                if self._watches.pop(event.wd, None):
+                    _LOGGER.info('Watch on %r auto-removed', event.src_path)
+
+        return results
+
+    @staticmethod
+    def _is_regular(path):
+        """Check if path is a regular file (not a symlink, fifo, etc.)."""
+        try:
+            return stat.S_ISREG(os.lstat(path).st_mode)
+        except OSError as err:
+            if err.errno != errno.ENOENT:
+                raise
+            # Already removed, the delete event follows.
+            return True
@@ -86,10 +86,12 @@ class WindowsDirWatcher(dirwatch_base.DirWatcher):
         '_changed'
     )
 
-    def __init__(self, watch_dir=None):
+    def __init__(self, watch_dir=None, coalesce=False, close_write=False):
+        # close_write mode is Linux only, changes are always reported.
+        del close_write
         self._dir_infos = {}
         self._changed = collections.deque()
-        super(WindowsDirWatcher, self).__init__(watch_dir)
+        super(WindowsDirWatcher, self).__init__(watch_dir, coalesce=coalesce)
 
     @staticmethod
     def _read_dir(info):
@@ -227,6 +227,29 @@ class PortScanner:
         self.node_acl = self.zkclient.make_host_acl(self.hostname, 'rwcd')
         self.instance = instance
 
+        # Endpoints dir entries, kept up to date by the dir watcher.
+        self._entries = None
+        self._watcher = None
+        # Container name -> (pid, netutils.SockDiag or None).
+        self._sock_diags = {}
+
+    def _on_created(self, path):
+        """Add endpoints dir entry."""
+        entry = os.path.basename(path)
+        if not entry.startswith('.'):
+            self._entries.add(entry)
+
+    def _on_deleted(self, path):
+        """Remove endpoints dir entry."""
+        self._entries.discard(os.path.basename(path))
+
+    def _list_entries(self):
+        """List endpoints dir entries."""
+        self._entries = set(
+            entry for entry in os.listdir(self.endpoints_dir)
+            if not entry.startswith('.')
+        )
+
     def _publish(self, result):
         """Publish network info to Zookeeper."""
         if self.instance:
@@ -244,11 +267,19 @@ class PortScanner:
     def run(self, watchdog_lease=None):
         """Scan running directory in a watchdir loop."""
 
+        self._watcher = dirwatch.DirWatcher(self.endpoints_dir)
+        self._watcher.on_created = self._on_created
+        self._watcher.on_deleted = self._on_deleted
+
         garbage_collect(self.endpoints_dir)
+        self._list_entries()
         last_gc = time.time()
         prev_result = None
 
         while True:
+            if self._watcher.wait_for_events(timeout=0):
+                self._watcher.process_events()
+
             result = self._scan()
             if result != prev_result:
                 self._publish(result)
@@ -259,6 +290,7 @@ class PortScanner:
 
             if time.time() - last_gc > _GC_INTERVAL:
                 garbage_collect(self.endpoints_dir)
+                self._list_entries()
                 last_gc = time.time()
 
             time.sleep(self.scan_interval)
@@ -267,14 +299,44 @@ class PortScanner:
         if watchdog_lease:
             watchdog_lease.remove()
 
+    def _listening(self, appname, pid, ports):
+        """Return the ports the container listens on, out of ports.
+
+        Ports are checked with a sock_diag socket in the container network
+        namespace, kept open while the container runs. If it cannot be
+        created (e.g. not permitted), /proc/<pid>/net/tcp is parsed instead.
+        """
+        cached = self._sock_diags.get(appname)
+        if cached is None or cached[0] != pid:
+            if cached is not None and cached[1] is not None:
+                cached[1].close()
+            try:
+                sock_diag = netutils.SockDiag(pid)
+            except OSError as err:
+                _LOGGER.warning('Unable to use sock_diag for %s: %s',
+                                appname, err)
+                sock_diag = None
+            cached = self._sock_diags[appname] = (pid, sock_diag)
+
+        sock_diag = cached[1]
+        if sock_diag is not None:
+            try:
+                return sock_diag.listening(ports)
+            except OSError as err:
+                _LOGGER.warning('sock_diag failed for %s: %s', appname, err)
+                sock_diag.close()
+                self._sock_diags[appname] = (pid, None)
+
+        return netutils.netstat(pid)
+
     def _scan(self):
         """Scan all container ports."""
+        if self._entries is None:
+            self._list_entries()
+
         container_ports = collections.defaultdict(dict)
         container_pids = dict()
-        for entry in os.listdir(self.endpoints_dir):
-            if entry.startswith('.'):
-                continue
-
+        for entry in self._entries:
             _LOGGER.debug('Entry: %s', entry)
             appname, endpoint, proto, real_port, pid, port = entry.split(_SEP)
 
@@ -284,9 +346,17 @@ class PortScanner:
             real_port = int(real_port)
             container_ports[appname][port] = real_port
 
+        # Release the sockets (and network namespaces) of gone containers.
+        for appname in set(self._sock_diags) - set(container_pids):
+            _pid, sock_diag = self._sock_diags.pop(appname)
+            if sock_diag is not None:
+                sock_diag.close()
+
         real_port_status = dict()
         for appname, pid in container_pids.items():
-            open_ports = netutils.netstat(pid)
+            open_ports = self._listening(
+                appname, pid, set(container_ports[appname])
+            )
             _LOGGER.debug(
                 'Container %s listens on %r',
                 appname, list(open_ports)
@@ -49,6 +49,7 @@ class EventMgr:
     __slots__ = (
         'tm_env',
         '_hostname',
+        '_cache_index',
     )
 
     def __init__(self, root):
@@ -56,6 +57,8 @@ class EventMgr:
         self.tm_env = appenv.AppEnvironment(root=root)
 
         self._hostname = sysinfo.hostname()
+        # Index of cached manifests, app -> ctime (None if not known yet).
+        self._cache_index = None
 
     @property
     def name(self):
@@ -150,11 +153,19 @@ class EventMgr:
         :param ``bool`` check_existing:
             Whether to check if the already existing entries are up to date.
         """
+        # The cache dir is only modified by the event manager, it is scanned
+        # once (or when existing entries are to be checked) and then tracked
+        # in memory.
+        if self._cache_index is None or check_existing:
+            self._cache_index = {
+                os.path.basename(manifest): None
+                for manifest in glob.glob(
+                    os.path.join(self.tm_env.cache_dir, '*')
+                )
+            }
+
         expected_set = set(expected)
-        current_set = {
-            os.path.basename(manifest)
-            for manifest in glob.glob(os.path.join(self.tm_env.cache_dir, '*'))
-        }
+        current_set = set(self._cache_index)
         extra = current_set - expected_set
         missing = expected_set - current_set
         existing = current_set & expected_set
@@ -168,15 +179,96 @@ class EventMgr:
         for app in extra:
             manifest = os.path.join(self.tm_env.cache_dir, app)
             os.unlink(manifest)
-
-        # If app is missing, fetch its manifest in the cache
-        for app in missing:
-            self._cache(zkclient, app)
+            del self._cache_index[app]
 
         if check_existing:
             _LOGGER.info('existing : %s', ','.join(existing))
-            for app in existing:
-                self._cache(zkclient, app, check_existing=True)
+            self._cache_many(
+                zkclient, list(missing) + list(existing), check_existing=True
+            )
+        elif len(missing) > 1:
+            self._cache_many(zkclient, list(missing))
+        else:
+            # If app is missing, fetch its manifest in the cache
+            for app in missing:
+                self._cache(zkclient, app)
+
+    def _cache_many(self, zkclient, apps, check_existing=False):
+        """Read the manifest and placement data of multiple apps from Zk and
+        store the changed ones as YAML in <cache>/<app>.
+
+        Placement and manifest reads are pipelined.
+
+        :param ``list`` apps:
+            Instance names.
+        :param ``bool`` check_existing:
+            Whether to check if the files already exist and are up to date.
+        """
+        placements = {}
+        for path, placement_data, placement_metadata in (
+                zkutils.get_many_with_metadata(
+                    zkclient,
+                    [z.path.placement(self._hostname, app) for app in apps]
+                )
+        ):
+            app = os.path.basename(path)
+            if placement_metadata is None:
+                _LOGGER.info('Placement %s/%s not found', self._hostname, app)
+                continue
+
+            if check_existing:
+                placement_time = placement_metadata.ctime / 1000.0
+                manifest_time = self._manifest_time(app)
+                if manifest_time and manifest_time >= placement_time:
+                    _LOGGER.info('%s is up to date', app)
+                    continue
+
+            placements[app] = placement_data
+
+        for path, manifest, metadata in zkutils.get_many_with_metadata(
+                zkclient, [z.path.scheduled(app) for app in placements]
+        ):
+            app = os.path.basename(path)
+            if metadata is None:
+                _LOGGER.info('App %s not found', app)
+                continue
+
+            self._write_manifest(app, manifest, placements[app])
+
+    def _manifest_time(self, app):
+        """Get the cached manifest ctime, None if it does not exist."""
+        manifest_time = self._cache_index.get(app)
+        if manifest_time is None:
+            try:
+                manifest_time = os.stat(
+                    os.path.join(self.tm_env.cache_dir, app)
+                ).st_ctime
+            except FileNotFoundError:
+                return None
+            self._cache_index[app] = manifest_time
+
+        return manifest_time
+
+    def _write_manifest(self, app, manifest, placement_data):
+        """Write the cached app manifest."""
+        manifest_file = os.path.join(self.tm_env.cache_dir, app)
+        # TODO: need a function to parse instance id from name.
+        manifest['task'] = app[app.index('#') + 1:]
+
+        if placement_data is not None:
+            manifest.update(placement_data)
+
+        fs.write_safe(
+            manifest_file,
+            lambda f: yaml.dump(manifest, stream=f),
+            prefix='.%s-' % app,
+            mode='w',
+            permission=0o644
+        )
+        if self._cache_index is not None:
+            # ctime is looked up lazily when needed.
+            self._cache_index[app] = None
+        _LOGGER.info('Created cache manifest: %s', manifest_file)
 
     def _cache(self, zkclient, app, check_existing=False):
         """Read the manifest and placement data from Zk and store it as YAML in
@@ -211,20 +303,7 @@ class EventMgr:
         app_node = z.path.scheduled(app)
         try:
             manifest = zkutils.get(zkclient, app_node)
-            # TODO: need a function to parse instance id from name.
-            manifest['task'] = app[app.index('#') + 1:]
-
-            if placement_data is not None:
-                manifest.update(placement_data)
-
-            fs.write_safe(
-                manifest_file,
-                lambda f: yaml.dump(manifest, stream=f),
-                prefix='.%s-' % app,
-                mode='w',
-                permission=0o644
-            )
-            _LOGGER.info('Created cache manifest: %s', manifest_file)
+            self._write_manifest(app, manifest, placement_data)
 
         except kazoo.exceptions.NoNodeError:
             _LOGGER.info('App %s not found', app)
@@ -39,10 +39,10 @@ TREADMILL_MIN_RESERVE_SIZE = utils.size_to_bytes('100M')
 TREADMILL_LOOPDEV_NB = 8
 
 
-def refresh_vg_status(group):
+def refresh_vg_status(group, lvm_impl=lvm):
     """Query LVM for the current volume group status.
     """
-    vg_info = lvm.vgdisplay(group=group)
+    vg_info = lvm_impl.vgdisplay(group=group)
     status = {
         'name': vg_info['name'],
         'extent_size': utils.size_to_bytes(
@@ -273,6 +273,22 @@ def lvremove(volume, group):
     )
 
 
+###############################################################################
+def lvrename(volume, new_name, group):
+    """Rename a LVM logical volume.
+    """
+    return subproc.check_call(
+        [
+            'lvm',
+            'lvrename',
+            '--autobackup', 'n',
+            group,
+            volume,
+            new_name,
+        ]
+    )
+
+
 ###############################################################################
 def _parse_lv_data(lv_data):
     """Parse LVM logical volume data.
@@ -366,6 +382,7 @@ __all__ = [
     'lvcreate',
     'lvdisplay',
     'lvremove',
+    'lvrename',
     'lvsdisplay',
     'pvcreate',
     'vgactivate',
@@ -9,17 +9,25 @@ from __future__ import unicode_literals
 # XXX: importlib not regarded as standard lib on windows
 import collections
 import fnmatch
+import hashlib
 import importlib  # pylint: disable=wrong-import-order
 import io
 import json
 import logging
 import os
+import sys
+import tempfile
 
 
 _LOGGER = logging.getLogger(__name__)
 
 _FILTER = None
 
+# Entry point index of the installed distributions, see _load_index.
+_INDEX = None
+
+_METADATA_SUFFIXES = ('.dist-info', '.egg-info')
+
 
 def _load_plugins():
     """Load plugins."""
@@ -42,6 +50,159 @@ def _load_plugins():
 _PLUGINS = _load_plugins()
 
 
+def _index_file():
+    """Return the entry point index file of the current sys.path."""
+    if 'TREADMILL_PLUGIN_INDEX' in os.environ:
+        return os.environ['TREADMILL_PLUGIN_INDEX']
+
+    # Virtualenvs (sys.path) sharing the cache dir have their own index.
+    path_digest = hashlib.sha1(
+        json.dumps(sys.path).encode()
+    ).hexdigest()[:12]
+    cache_dir = os.environ.get(
+        'XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache')
+    )
+    return os.path.join(
+        cache_dir, 'treadmill', 'plugins-{}.json'.format(path_digest)
+    )
+
+
+def _entry_points_files(path):
+    """Return entry points metadata files of the distributions in path."""
+    if path.endswith('.egg'):
+        return [os.path.join(path, 'EGG-INFO', 'entry_points.txt')]
+
+    try:
+        entries = os.listdir(path or '.')
+    except OSError:
+        return []
+
+    return [
+        os.path.join(path, entry, 'entry_points.txt')
+        for entry in sorted(entries)
+        if entry.endswith(_METADATA_SUFFIXES)
+    ]
+
+
+def _index_key():
+    """Return the key of the installed distributions entry points.
+
+    The key is the digest of the entry points metadata files (and their
+    mtimes) on sys.path, it changes when a distribution is installed,
+    removed or upgraded.
+    """
+    digest = hashlib.sha1()
+    for path in sys.path:
+        for entry_points in _entry_points_files(path):
+            try:
+                mtime = os.stat(entry_points).st_mtime
+            except OSError:
+                continue
+            digest.update(
+                '{}:{}\n'.format(entry_points, mtime).encode()
+            )
+    return digest.hexdigest()
+
+
+def _parse_entry(value):
+    """Parse entry point value, module[:attrs] [extras]."""
+    module, _sep, attrs = value.split('[')[0].strip().partition(':')
+    return {
+        'module': module.strip(),
+        'attrs': [attr for attr in attrs.strip().split('.') if attr],
+    }
+
+
+def _build_index():
+    """Build index of the entry points of the installed distributions."""
+    index = collections.defaultdict(dict)
+    try:
+        from importlib import metadata
+    except ImportError:
+        import pkg_resources
+        for dist in pkg_resources.working_set:
+            for section, entries in dist.get_entry_map().items():
+                for name, entry in entries.items():
+                    index[section].setdefault(name, {
+                        'module': entry.module_name,
+                        'attrs': list(entry.attrs),
+                    })
+        return index
+
+    # Distributions are in sys.path order, the first one of the duplicate
+    # entry points wins, as with pkg_resources.
+    for dist in metadata.distributions():
+        for entry in dist.entry_points:
+            index[entry.group].setdefault(
+                entry.name, _parse_entry(entry.value)
+            )
+    return index
+
+
+def _write_index(index_file, key, index):
+    """Write entry point index, ignoring errors (e.g. read-only home)."""
+    try:
+        index_dir = os.path.dirname(index_file)
+        if not os.path.isdir(index_dir):
+            os.makedirs(index_dir)
+        with tempfile.NamedTemporaryFile(mode='w', dir=index_dir,
+                                         prefix='.tmp', delete=False) as f:
+            f.write(json.dumps({'key': key, 'plugins': index}))
+        os.rename(f.name, index_file)
+    except (IOError, OSError) as err:
+        _LOGGER.debug('Unable to write plugin index %s: %s', index_file, err)
+
+
+def _load_index():
+    """Load entry point index, rebuild it if stale."""
+    global _INDEX  # pylint: disable=global-statement
+    if _INDEX is not None:
+        return _INDEX
+
+    index_file = _index_file()
+    key = _index_key()
+    try:
+        with io.open(index_file) as f:
+            cached = json.loads(f.read())
+        if cached['key'] == key:
+            _INDEX = cached['plugins']
+            return _INDEX
+    except (IOError, OSError, ValueError, KeyError):
+        pass
+
+    _LOGGER.debug('Building plugin index: %s', index_file)
+    _INDEX = _build_index()
+    _write_index(index_file, key, _INDEX)
+    return _INDEX
+
+
+def _index_names(namespace):
+    """Return extension names from the index."""
+    return [
+        name for name in _load_index().get(namespace, {})
+        if _match(namespace, name)
+    ]
+
+
+def _index_load(namespace, name):
+    """Return loaded module from the index."""
+    entry = _load_index().get(namespace, {}).get(name)
+    if entry is None or not _match(namespace, name):
+        # FIXME: Do not overload KeyError
+        raise KeyError('Entry point not found: %r:%r' % (namespace, name))
+
+    return _load_entry(entry)
+
+
+def _index_load_all(namespace):
+    """Load all plugins in the namespace from the index."""
+    return [
+        _load_entry(entry)
+        for name, entry in _load_index().get(namespace, {}).items()
+        if _match(namespace, name)
+    ]
+
+
 def _load_entry(entry):
     """Load plugin entry."""
     plugin = importlib.import_module(entry['module'])
@@ -87,49 +248,12 @@ def _match(namespace, name):
     return False
 
 
-def _pkg_resources_names(namespace):
-    """Return extension names without loading the extensions."""
-    import pkg_resources
-
-    return [
-        entry.name for entry in pkg_resources.iter_entry_points(namespace)
-        if _match(namespace, entry.name)
-    ]
-
-
-def _pkg_resources_load(namespace, name):
-    """Return loaded module."""
-    import pkg_resources
-
-    if not _match(namespace, name):
-        # FIXME: Do not overload KeyError
-        raise KeyError('Entry point not found: %r:%r' % (namespace, name))
-
-    plugin = next(pkg_resources.iter_entry_points(namespace, name), None)
-    if plugin is None:
-        # FIXME: Do not overload KeyError
-        raise KeyError('Entry point not found: %r:%r' % (namespace, name))
-
-    instance = plugin.load()
-    return instance
-
-
-def _pkg_resources_load_all(namespace):
-    """Load all plugins in the namespace."""
-    import pkg_resources
-
-    return [
-        entry.load() for entry in pkg_resources.iter_entry_points(namespace)
-        if _match(namespace, entry.name)
-    ]
-
-
 def names(namespace):
     """Return extension names without loading the extensions."""
     if _PLUGINS:
         return _PLUGINS[namespace].keys()
     else:
-        return _pkg_resources_names(namespace)
+        return _index_names(namespace)
 
 
 def load(namespace, name):
@@ -137,7 +261,7 @@ def load(namespace, name):
     if _PLUGINS:
         return _load_entry(_PLUGINS[namespace][name])
     else:
-        return _pkg_resources_load(namespace, name)
+        return _index_load(namespace, name)
 
 
 def load_all(namespace):
@@ -148,7 +272,7 @@ def load_all(namespace):
             plugins.append(_load_entry(spec))
         return plugins
     else:
-        return _pkg_resources_load_all(namespace)
+        return _index_load_all(namespace)
 
 
 def dump_cache(cache_file, distributions):
@@ -51,6 +51,21 @@ def _create_ephemeral_with_retry(zkclient, path, data):
                                   app_abort.AbortedReason.PRESENCE)
 
 
+def _create_ephemerals(zkclient, nodes):
+    """Create ephemeral nodes, (path, data) tuples, in a single transaction.
+
+    Nodes which already exist (e.g. not yet expired nodes of a previous
+    instance) are created one by one, with retry.
+    """
+    acl = zkclient.make_servers_acl()
+    conflicts = zkutils.apply_batch(
+        zkclient, [('create', path, data) for path, data in nodes],
+        acl=[acl], ephemeral=True
+    )
+    for path, data in conflicts:
+        _create_ephemeral_with_retry(zkclient, path, data)
+
+
 class EndpointPresence:
     """Manages application endpoint registration in Zookeeper."""
 
@@ -64,17 +79,24 @@ class EndpointPresence:
             self.appname = self.manifest.get('name')
 
     def register(self):
-        """Register container in Zookeeper."""
-        self.register_identity()
-        self.register_running()
-        self.register_endpoints()
+        """Register container in Zookeeper.
+
+        The identity, running and endpoint nodes are created in a single
+        transaction.
+        """
+        nodes = self._identity_nodes()
+        nodes.extend(self._running_nodes())
+        nodes.extend(self._endpoint_nodes())
+        _create_ephemerals(self.zkclient, nodes)
+
+    def _running_nodes(self):
+        """Return the running node, as (path, data) list."""
+        _LOGGER.info('registering container as running: %s', self.appname)
+        return [(z.path.running(self.appname), self.hostname)]
 
     def register_running(self):
         """Register container as running."""
-        _LOGGER.info('registering container as running: %s', self.appname)
-        _create_ephemeral_with_retry(self.zkclient,
-                                     z.path.running(self.appname),
-                                     self.hostname)
+        _create_ephemerals(self.zkclient, self._running_nodes())
 
     def unregister_running(self):
         """Safely deletes the "running" node for the container."""
@@ -87,10 +109,11 @@ class EndpointPresence:
         except kazoo.client.NoNodeError:
             _LOGGER.info('running node does not exist.')
 
-    def register_endpoints(self):
-        """Registers service endpoint."""
+    def _endpoint_nodes(self):
+        """Return the endpoint nodes, as (path, data) list."""
         _LOGGER.info('registering endpoints: %s', self.appname)
 
+        nodes = []
         endpoints = self.manifest.get('endpoints', [])
         for endpoint in endpoints:
             internal_port = endpoint['port']
@@ -101,10 +124,15 @@ class EndpointPresence:
             hostport = self.hostname + ':' + str(ep_port)
             path = z.path.endpoint(self.appname, ep_proto, ep_name)
             _LOGGER.info('register endpoint: %s %s', path, hostport)
+            nodes.append((path, hostport))
 
-            # Endpoint node is created with default acl. It is ephemeral
-            # and not supposed to be modified by anyone.
-            _create_ephemeral_with_retry(self.zkclient, path, hostport)
+        return nodes
+
+    def register_endpoints(self):
+        """Registers service endpoint."""
+        # Endpoint node is created with default acl. It is ephemeral
+        # and not supposed to be modified by anyone.
+        _create_ephemerals(self.zkclient, self._endpoint_nodes())
 
     def unregister_endpoints(self):
         """Unregisters service endpoint."""
@@ -130,22 +158,25 @@ class EndpointPresence:
             except kazoo.client.NoNodeError:
                 _LOGGER.info('endpoint node does not exist.')
 
-    def register_identity(self):
-        """Register app identity."""
+    def _identity_nodes(self):
+        """Return the identity node (if any), as (path, data) list."""
         identity_group = self.manifest.get('identity_group')
 
         # If identity_group is not set or set to None, nothing to register.
         if not identity_group:
-            return
+            return []
 
         identity = self.manifest.get('identity', _INVALID_IDENTITY)
 
         _LOGGER.info('Register identity: %s, %s', identity_group, identity)
-        _create_ephemeral_with_retry(
-            self.zkclient,
+        return [(
             z.path.identity_group(identity_group, str(identity)),
             {'host': self.hostname, 'app': self.appname},
-        )
+        )]
+
+    def register_identity(self):
+        """Register app identity."""
+        _create_ephemerals(self.zkclient, self._identity_nodes())
 
     def unregister_identity(self):
         """Register app identity."""
@@ -26,6 +26,9 @@ _PAGESIZE = mmap.PAGESIZE // 1024
 
 _KERNEL_VER = sysinfo.kernel_ver()
 
+# /proc/<pid>/smaps_rollup (Linux 4.14+) sums the smaps of all mappings.
+_HAVE_SMAPS_ROLLUP = os.path.exists('/proc/self/smaps_rollup')
+
 
 def proc_path(*args):
     """Helper function to construct /proc path.
@@ -67,16 +70,54 @@ def proc_read(*args):
         return f.read()
 
 
+def _proc_status(pid):
+    """Read /proc/<pid>/status as dict.
+    """
+    status = {}
+    for line in proc_readlines(pid, 'status'):
+        key, _sep, value = line.partition(':')
+        status[key] = value.strip()
+    return status
+
+
 def get_thread_id(pid):
     """Read thread group id designated in /proc/<pid>/status.
     """
-    return proc_readlines(pid, 'status')[2][6:-1]
+    return _proc_status(pid)['Tgid']
 
 
 def get_threads(pid):
     """Read number of threads designated in /proc/<pid>/status.
     """
-    return int(proc_readlines(pid, 'status')[26][8:-1].strip())
+    return int(_proc_status(pid)['Threads'])
+
+
+def _read_smaps(pid, name):
+    """Sum Private*, Shared* and Pss fields of /proc/<pid>/smaps[_rollup].
+
+    The file is parsed in a single pass, one line at a time.
+
+    :returns:
+        ``tuple`` - private, shared, pss (in K) and the number of Pss lines.
+    """
+    private = shared = pss = 0
+    pss_lines = 0
+    with proc_open(pid, name) as f:
+        for line in f:
+            # Skip mapping lines (hex address ranges) and other fields.
+            if line[0] not in 'PS':
+                continue
+
+            key, _sep, value = line.partition(':')
+            if key == 'Pss':
+                pss += int(value.split()[0])
+                pss_lines += 1
+            elif key.startswith('Shared'):
+                shared += int(value.split()[0])
+            elif key.startswith('Private'):
+                private += int(value.split()[0])
+
+    return private, shared, pss, pss_lines
 
 
 def get_mem_stats(pid, use_pss=True):
@@ -87,31 +128,30 @@ def get_mem_stats(pid, use_pss=True):
     statm = proc_readline(pid, 'statm').split()
     rss = int(statm[1]) * _PAGESIZE
 
-    private_lines = []
-    shared_lines = []
-    pss_lines = []
-    have_pss = False
-
-    if use_pss and os.path.exists(proc_path(pid, 'smaps')):
-        for line in proc_readlines(pid, 'smaps'):
-            if line.startswith('Shared'):
-                shared_lines.append(line)
-            elif line.startswith('Private'):
-                private_lines.append(line)
-            elif line.startswith('Pss'):
-                have_pss = True
-                pss_lines.append(line)
+    smaps = None
+    if use_pss:
+        names = ['smaps']
+        if _HAVE_SMAPS_ROLLUP:
+            names.insert(0, 'smaps_rollup')
+        for name in names:
+            try:
+                smaps = (name,) + _read_smaps(pid, name)
+                break
+            except LookupError:
+                continue
 
-        shared = sum([int(line.split()[1]) for line in shared_lines])
-        private = sum([int(line.split()[1]) for line in private_lines])
+    have_pss = False
+    if smaps is not None:
+        name, private, shared, pss, pss_lines = smaps
 
         # shared + private = rss above
         # the Rss in smaps includes video card mem etc.
-        if have_pss:
-            # add 0.5KiB as this avg error due to trunctation
-            pss_adjust = 0.5
-            pss = sum([float(line.split()[1]) + pss_adjust
-                       for line in pss_lines])
+        if pss_lines:
+            have_pss = True
+            # add 0.5KiB per mapping as this avg error due to trunctation
+            # (smaps_rollup is summed before truncation).
+            if name == 'smaps':
+                pss += 0.5 * pss_lines
             shared = pss - private
     else:
         shared = int(statm[2]) * _PAGESIZE
@@ -121,7 +161,7 @@ def get_mem_stats(pid, use_pss=True):
     return (int(private * 1024), int(shared * 1024), have_pss)
 
 
-def get_cmd_name(pid, verbose):
+def get_cmd_name(pid, verbose, name=None):
     """Returns truncated command line name given pid."""
     cmdline = proc_read(pid, 'cmdline').split(r'\0')
     if cmdline[-1] == '' and len(cmdline) > 1:
@@ -158,7 +198,9 @@ def get_cmd_name(pid, verbose):
                 path += ' [deleted]'
 
     exe = os.path.basename(path)
-    cmd = proc_readline(pid, 'status')[6:-1]
+    if name is None:
+        name = _proc_status(pid)['Name']
+    cmd = name
     if exe.startswith(cmd):
         cmd = exe
 
@@ -172,12 +214,18 @@ def get_memory_usage(pids, verbose=False, exclude=None, use_pss=True):
     meminfos = []
 
     for pid in pids:
-        thread_id = int(get_thread_id(pid))
+        try:
+            status = _proc_status(pid)
+        except LookupError:
+            # process gone
+            continue
+
+        thread_id = int(status['Tgid'])
         if not pid or thread_id != pid:
             continue
 
         try:
-            cmd = get_cmd_name(pid, verbose)
+            cmd = get_cmd_name(pid, verbose, name=status['Name'])
         except LookupError:
             # kernel threads don't have exe links or
             # process gone
@@ -200,7 +248,7 @@ def get_memory_usage(pids, verbose=False, exclude=None, use_pss=True):
         meminfo['tgid'] = thread_id
         try:
             private, shared, have_pss = get_mem_stats(pid, use_pss=use_pss)
-        except RuntimeError:
+        except (LookupError, RuntimeError):
             continue  # process gone
 
         if 'shared' in meminfo:
@@ -212,7 +260,7 @@ def get_memory_usage(pids, verbose=False, exclude=None, use_pss=True):
             meminfo['shared'] = shared
 
         meminfo['private'] = meminfo.setdefault('private', 0) + private
-        meminfo['threads'] = get_threads(pid)
+        meminfo['threads'] = int(status['Threads'])
         meminfo['total'] = meminfo['private'] + meminfo['shared']
         meminfos.append(meminfo)
 
@@ -49,6 +49,12 @@ def init(api, cors, impl):
         'instances': fields.List(fields.String(description='Application ID')),
     })
 
+    bulk_scale_inst_req = api.model('ReqBulkScaleInstance', {
+        'plan': fields.Raw(
+            description='App name to count to create or instances to delete'
+        ),
+    })
+
     # Responses
     app_request_model, app_response_model = app_model.models(api)
     _erorr_id_why, error_model_resp = error_model.models(api)
@@ -148,6 +154,30 @@ def init(api, cors, impl):
             result = impl.bulk_update(proid, deltas)
             return {'instances': result}
 
+    @namespace.route(
+        '/_bulk/scale',
+    )
+    class _InstanceBulkScale(restplus.Resource):
+        """Treadmill Instance resource"""
+
+        @webutils.post_api(api, cors,
+                           req_model=bulk_scale_inst_req,)
+        def post(self):
+            """Bulk scales apps, returns the outcome of each app."""
+            user = flask.g.get('user')
+            plan = flask.request.json['plan']
+            if not plan:
+                return {}
+            # Bulk operations are allowed on same proid.
+            proids = {rsrc_id.partition('.')[0] for rsrc_id in plan}
+            if len(proids) > 1:
+                raise exc.InvalidInputError(
+                    __name__,
+                    'Mulitple proids in bulk scale request.'
+                )
+
+            return impl.bulk_scale(proids.pop(), plan, user)
+
     @namespace.route('/<instance_id>')
     @api.doc(params={'instance_id': 'Instance ID/name'})
     class _InstanceResource(restplus.Resource):
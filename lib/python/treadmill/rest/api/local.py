@@ -218,3 +218,16 @@ def init(api, cors, impl):
                     impl.metrics.file_path(rsrc_id)
                 )
             )
+
+    start_timings_ns = api.namespace(
+        'start-timings', description='Container start timings REST operations'
+    )
+
+    @start_timings_ns.route('/')
+    class _StartTimings(restplus.Resource):
+        """Container start timings resource."""
+
+        @webutils.get_api(api, cors)
+        def get(self):
+            """Returns container start timings percentiles of the node."""
+            return impl.start_timings.get()
@@ -7,14 +7,19 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 
+import collections
+import contextlib
 import errno
 import glob
+import io
 import itertools
+import json
 import logging
 import os
 import random
 import socket
 import tarfile
+import time
 
 import six
 
@@ -31,6 +36,7 @@ from treadmill.appcfg import abort as app_abort
 from treadmill.appcfg import manifest as app_manifest
 
 STATE_JSON = 'state.json'
+START_TIMINGS_JSON = 'start_timings.json'
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -125,6 +131,77 @@ def save_app(manifest, container_dir, app_json=STATE_JSON):
     return utils.to_obj(manifest)
 
 
+class StartTimings:
+    """Per phase timings of the container start.
+
+    Phase start/end are monotonic times, relative to the start of the
+    container start.
+    """
+
+    __slots__ = (
+        'phases',
+        '_started',
+    )
+
+    def __init__(self):
+        self.phases = collections.OrderedDict()
+        self._started = time.monotonic()
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """Time the execution of the with block as phase name."""
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            end = time.monotonic()
+            self.phases[name] = {
+                'start': round(start - self._started, 6),
+                'end': round(end - self._started, 6),
+                'duration': round(end - start, 6),
+            }
+            _LOGGER.debug('Start phase %s: %.3fs', name, end - start)
+
+    @property
+    def duration(self):
+        """Total duration of the container start so far."""
+        return round(time.monotonic() - self._started, 6)
+
+    def to_dict(self):
+        """Return the timings as dict."""
+        return {
+            'duration': self.duration,
+            'phases': self.phases,
+        }
+
+    def save(self, container_dir):
+        """Save the timings in the container directory."""
+        timings = self.to_dict()
+        fs.write_safe(
+            os.path.join(container_dir, START_TIMINGS_JSON),
+            lambda f: f.writelines(
+                utils.json_genencode(timings)
+            ),
+            mode='w',
+            permission=0o644
+        )
+        return timings
+
+
+def load_start_timings(container_dir):
+    """Load container start timings, None if not available."""
+    try:
+        with io.open(os.path.join(container_dir, START_TIMINGS_JSON)) as f:
+            return json.load(f)
+    except (IOError, OSError) as err:
+        if err.errno != errno.ENOENT:
+            raise
+    except ValueError:
+        _LOGGER.warning('Invalid start timings: %s', container_dir)
+
+    return None
+
+
 def _allocate_sockets(environment, host_ip, sock_type, count):
     """Return a list of `count` socket bound to an ephemeral port.
     """
@@ -20,9 +20,11 @@ from treadmill import newnet
 from treadmill import plugin_manager
 from treadmill import runtime
 from treadmill import subproc
+from treadmill import trace
 
 from treadmill.fs import linux as fs_linux
 from treadmill.syscall import unshare
+from treadmill.trace.app import events
 
 from . import image
 
@@ -33,7 +35,9 @@ _LOGGER = logging.getLogger(__name__)
 def run(tm_env, runtime_config, container_dir, manifest):
     """Creates container environment and prepares to exec root supervisor.
     """
+    # pylint: disable=too-many-statements
     _LOGGER.info('Running %r', container_dir)
+    timings = runtime.StartTimings()
 
     unique_name = appcfg.manifest_unique_name(manifest)
 
@@ -67,18 +71,22 @@ def run(tm_env, runtime_config, container_dir, manifest):
         'environment': manifest['environment'],
     }
 
-    cgroup_client.put(unique_name, cgroup_req)
-    localdisk_client.put(unique_name, localdisk_req)
-    if not manifest['shared_network']:
-        network_client.put(unique_name, network_req)
+    with timings.phase('resource_requests'):
+        cgroup_client.put(unique_name, cgroup_req)
+        localdisk_client.put(unique_name, localdisk_req)
+        if not manifest['shared_network']:
+            network_client.put(unique_name, network_req)
 
     # Apply memory limits first thing, so that app_run does not consume memory
     # from cgroups of <treadmill_root_cgroup>/core.
-    app_cgroups = cgroup_client.wait(unique_name)
+    with timings.phase('cgroups_wait'):
+        app_cgroups = cgroup_client.wait(unique_name)
     _apply_cgroup_limits(app_cgroups)
-    localdisk = localdisk_client.wait(unique_name)
+    with timings.phase('localdisk_wait'):
+        localdisk = localdisk_client.wait(unique_name)
     # TODO: should it wait for network client reply if shared_network is true?
-    app_network = network_client.wait(unique_name)
+    with timings.phase('network_wait'):
+        app_network = network_client.wait(unique_name)
 
     img_impl = image.get_image(tm_env, manifest)
 
@@ -99,26 +107,33 @@ def run(tm_env, runtime_config, container_dir, manifest):
     # Sockets are then put into global list, so that they are not closed
     # at gc time, and address remains in use for the lifetime of the
     # supervisor.
-    sockets = runtime.allocate_network_ports(
-        app_network['external_ip'], manifest
-    )
+    with timings.phase('port_allocation'):
+        sockets = runtime.allocate_network_ports(
+            app_network['external_ip'], manifest
+        )
 
     app = runtime.save_app(manifest, container_dir)
 
     if not app.shared_network:
-        _unshare_network(tm_env, container_dir, app)
+        with timings.phase('unshare_network'):
+            _unshare_network(tm_env, container_dir, app)
 
     # Create and format the container root volume.
-    root_dir = _create_root_dir(container_dir, localdisk)
+    with timings.phase('create_root_dir'):
+        root_dir = _create_root_dir(container_dir, localdisk)
 
     # NOTE: below here, MOUNT namespace is private
 
     # Unpack the image to the root directory.
-    img_impl.unpack(container_dir, root_dir, app, app_cgroups, tm_env.data)
+    with timings.phase('image_unpack'):
+        img_impl.unpack(
+            container_dir, root_dir, app, app_cgroups, tm_env.data
+        )
 
     # clean mounts.
-    wanted_mounts = runtime_config.host_mount_whitelist
-    fs_linux.cleanup_mounts(wanted_mounts + [root_dir + '*'])
+    with timings.phase('cleanup_mounts'):
+        wanted_mounts = runtime_config.host_mount_whitelist
+        fs_linux.cleanup_mounts(wanted_mounts + [root_dir + '*'])
 
     # If network is shared, close sockets before starting the
     # supervisor, as these ports will be use be container apps.
@@ -127,7 +142,8 @@ def run(tm_env, runtime_config, container_dir, manifest):
             socket_.close()
 
     # hook container
-    apphook.configure(tm_env, app, container_dir)
+    with timings.phase('apphook_configure'):
+        apphook.configure(tm_env, app, container_dir)
 
     # Register presence last, once everything succeeds.
     presence_req = {
@@ -140,8 +156,12 @@ def run(tm_env, runtime_config, container_dir, manifest):
     if manifest.get('identity') is not None:
         presence_req['identity'] = manifest['identity']
 
-    presence_client.put(unique_name, presence_req)
-    presence_client.wait(unique_name)
+    with timings.phase('presence_request'):
+        presence_client.put(unique_name, presence_req)
+    with timings.phase('presence_wait'):
+        presence_client.wait(unique_name)
+
+    _report_start_timings(tm_env, container_dir, app, timings)
 
     subproc.exec_pid1(
         [
@@ -156,6 +176,21 @@ def run(tm_env, runtime_config, container_dir, manifest):
     )
 
 
+def _report_start_timings(tm_env, container_dir, app, timings):
+    """Persist the container start timings and post the started event."""
+    start_timings = timings.save(container_dir)
+    _LOGGER.info('Container start timings: %r', start_timings)
+
+    trace.post(
+        tm_env.app_events_dir,
+        events.StartedTraceEvent(
+            instanceid=app.name,
+            uniqueid=app.uniqueid,
+            duration=start_timings['duration']
+        )
+    )
+
+
 def _apply_cgroup_limits(app_cgroups):
     """Join cgroups."""
     _LOGGER.info('Joining cgroups: %r', app_cgroups)
@@ -321,7 +356,11 @@ def _create_root_dir(container_dir, localdisk):
     # container_dir/<subdir>
     root_dir = os.path.join(container_dir, 'root')
 
-    already_initialized = fs_linux.blk_fs_test(localdisk['block_dev'])
+    # Volumes from the localdisk warm pool come pre-formatted.
+    already_initialized = (
+        localdisk.get('formatted') or
+        fs_linux.blk_fs_test(localdisk['block_dev'])
+    )
     if not already_initialized:
         # Format the block device
         fs_linux.blk_fs_create(localdisk['block_dev'])
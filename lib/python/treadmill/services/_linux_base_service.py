@@ -111,7 +111,9 @@ class LinuxResourceService(_base_service.ResourceService):
         # Create the status socket
         ss = self._create_status_socket()
 
-        watcher = dirwatch.DirWatcher(self._rsrc_dir)
+        # Redundant events of a request (e.g. created and modified) within a
+        # read are only handled once.
+        watcher = dirwatch.DirWatcher(self._rsrc_dir, coalesce=True)
         # Call all the callbacks with the implementation instance
         watcher.on_created = functools.partial(self._on_created, impl)
         watcher.on_deleted = functools.partial(self._on_deleted, impl)
@@ -6,11 +6,17 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import collections
 import logging
 import math
 import os
+import select
+import struct
+import threading
 import time
 
+from six.moves import queue
+
 from treadmill import cgroups
 from treadmill import cgutils
 from treadmill import localdiskutils
@@ -19,12 +25,21 @@ from treadmill import lvm
 from treadmill import subproc
 from treadmill import utils
 
+from treadmill.fs import linux as fs_linux
+from treadmill.syscall import eventfd
+
 from . import BaseResourceServiceImpl
 
 _LOGGER = logging.getLogger(__name__)
 
 TREADMILL_LV_PREFIX = 'tm-'
 
+#: Prefix of the pre-provisioned volumes. As they start with
+#: TREADMILL_LV_PREFIX, leftovers of a previous run are cleaned up as stale.
+TREADMILL_POOL_LV_PREFIX = TREADMILL_LV_PREFIX + 'pool-'
+
+_POOL_EVENT = struct.pack('@Q', 1)
+
 
 def _uniqueid(app_unique_name):
     """Create unique volume name based on unique app name.
@@ -52,6 +67,14 @@ class LocalDiskResourceService(BaseResourceServiceImpl):
         '_vg_status',
         '_volumes',
         '_extent_reserved',
+        '_lvm',
+        '_pool_sizes',
+        '_pool',
+        '_pool_filling',
+        '_pool_seq',
+        '_pool_jobs',
+        '_pool_done',
+        '_pool_eventfd',
     )
 
     WATCHDOG_HEARTBEAT_SEC = 60 * 5
@@ -63,7 +86,8 @@ class LocalDiskResourceService(BaseResourceServiceImpl):
     def __init__(self, block_dev, vg_name,
                  read_bps, write_bps, read_iops, write_iops,
                  default_read_bps='20M', default_write_bps='20M',
-                 default_read_iops=100, default_write_iops=100):
+                 default_read_iops=100, default_write_iops=100,
+                 pool_sizes=None, lvm_impl=lvm):
         super(LocalDiskResourceService, self).__init__()
 
         self._block_dev = block_dev
@@ -85,6 +109,21 @@ class LocalDiskResourceService(BaseResourceServiceImpl):
         self._default_write_bps = default_write_bps
         self._default_read_iops = default_read_iops
         self._default_write_iops = default_write_iops
+        # LVM command layer (anything implementing the treadmill.lvm API).
+        self._lvm = lvm_impl
+        # Warm pool of pre-created, pre-formatted volumes: size -> count.
+        self._pool_sizes = {
+            utils.size_to_bytes(size): int(count)
+            for size, count in (pool_sizes or {}).items()
+        }
+        # Ready volumes, keyed by size in extents.
+        self._pool = collections.defaultdict(collections.deque)
+        # Number of volumes being provisioned, keyed by size in extents.
+        self._pool_filling = collections.Counter()
+        self._pool_seq = 0
+        self._pool_jobs = None
+        self._pool_done = collections.deque()
+        self._pool_eventfd = None
 
     def initialize(self, service_dir):
         super(LocalDiskResourceService, self).initialize(service_dir)
@@ -93,7 +132,7 @@ class LocalDiskResourceService(BaseResourceServiceImpl):
         localdiskutils.setup_device_lvm(self._block_dev, self._vg_name)
 
         # Finally retrieve the LV info
-        lvs_info = lvm.lvsdisplay(group=self._vg_name)
+        lvs_info = self._lvm.lvsdisplay(group=self._vg_name)
 
         # Mark all retrived volumes that were created by treadmill as 'stale'
         for lv in lvs_info:
@@ -119,7 +158,18 @@ class LocalDiskResourceService(BaseResourceServiceImpl):
             for lv in lvs_info
         }
         self._volumes = volumes
-        self._vg_status = localdiskutils.refresh_vg_status(self._vg_name)
+        self._vg_status = localdiskutils.refresh_vg_status(
+            self._vg_name, lvm_impl=self._lvm
+        )
+
+        if self._pool_sizes:
+            self._pool_eventfd = eventfd.eventfd(0, eventfd.EFD_CLOEXEC)
+            self._pool_jobs = queue.Queue()
+            worker = threading.Thread(
+                name='localdisk-pool', target=self._pool_worker
+            )
+            worker.daemon = True
+            worker.start()
 
     def synchronize(self):
         """Make sure that all stale volumes are removed.
@@ -132,6 +182,7 @@ class LocalDiskResourceService(BaseResourceServiceImpl):
                 self._destroy_volume(uniqueid)
 
         if not modified:
+            self._fill_pool()
             return
 
         # Now that we successfully removed a volume, retry all the pending
@@ -140,9 +191,20 @@ class LocalDiskResourceService(BaseResourceServiceImpl):
             self.retry_request(pending_id)
         self._pending = []
 
-        # We just destroyed a volume, refresh cached status from LVM and notify
-        # the service of the availability of the new status.
-        self._vg_status = localdiskutils.refresh_vg_status(self._vg_name)
+        # We just destroyed volumes, resynchronize the extent ledger with LVM
+        # and notify the service of the availability of the new status.
+        self._vg_status = localdiskutils.refresh_vg_status(
+            self._vg_name, lvm_impl=self._lvm
+        )
+        self._fill_pool()
+
+    def event_handlers(self):
+        if self._pool_eventfd is None:
+            return []
+
+        return [
+            (self._pool_eventfd, select.POLLIN, self._on_pool_event),
+        ]
 
     def report_status(self):
         status = self._vg_status.copy()
@@ -173,10 +235,21 @@ class LocalDiskResourceService(BaseResourceServiceImpl):
 
             # Create the logical volume
             existing_volume = uniqueid in self._volumes
-            if not existing_volume:
-                needed = math.ceil(
-                    size_in_bytes / self._vg_status['extent_size']
+            if existing_volume:
+                lv_info = self._lvm.lvdisplay(
+                    volume=uniqueid,
+                    group=self._vg_name
                 )
+
+            else:
+                needed = self._extents(size_in_bytes)
+                lv_info = self._take_pool_volume(uniqueid, needed)
+
+            if lv_info is None:
+                if needed > self._vg_status['extent_free']:
+                    # Give back the extents held by the warm pool first.
+                    self._drain_pool(needed)
+
                 if needed > self._vg_status['extent_free']:
                     # If we do not have enough space, delay the creation until
                     # another volume is deleted.
@@ -187,20 +260,18 @@ class LocalDiskResourceService(BaseResourceServiceImpl):
                     self._pending.append(rsrc_id)
                     return None
 
-                lvm.lvcreate(
+                self._lvm.lvcreate(
                     volume=uniqueid,
                     group=self._vg_name,
                     size_in_bytes=size_in_bytes,
                 )
-                # We just created a volume, refresh cached status from LVM
-                self._vg_status = localdiskutils.refresh_vg_status(
-                    self._vg_name
-                )
+                # We just created a volume, update the extent ledger
+                self._vg_status['extent_free'] -= needed
 
-            lv_info = lvm.lvdisplay(
-                volume=uniqueid,
-                group=self._vg_name
-            )
+                lv_info = self._lvm.lvdisplay(
+                    volume=uniqueid,
+                    group=self._vg_name
+                )
 
             # Configure block device using cgroups (this is idempotent)
             # FIXME(boysson): The unique id <-> cgroup relation should be
@@ -254,6 +325,11 @@ class LocalDiskResourceService(BaseResourceServiceImpl):
             # Record existence of the volume.
             self._volumes[lv_info['name']] = volume_data
 
+            if lv_info.get('formatted'):
+                # Let the runtime skip the filesystem check.
+                volume_data = dict(volume_data, formatted=True)
+                self._fill_pool()
+
         return volume_data
 
     def on_delete_request(self, rsrc_id):
@@ -272,9 +348,7 @@ class LocalDiskResourceService(BaseResourceServiceImpl):
                 self.retry_request(pending_id)
             self._pending = []
 
-            # We just destroyed a volume, refresh cached status from LVM and
-            # notify the service of the availability of the new status.
-            self._vg_status = localdiskutils.refresh_vg_status(self._vg_name)
+            self._fill_pool()
 
         return True
 
@@ -284,16 +358,26 @@ class LocalDiskResourceService(BaseResourceServiceImpl):
         # Remove it from state (if present)
         self._volumes.pop(uniqueid, None)
         try:
-            lvm.lvdisplay(uniqueid, group=self._vg_name)
+            lv_info = self._lvm.lvdisplay(uniqueid, group=self._vg_name)
         except subproc.CalledProcessError:
             _LOGGER.warning('Ignoring unknown volume %r', uniqueid)
             return False
 
+        self._remove_volume(uniqueid)
+        # We just destroyed a volume, update the extent ledger.
+        if self._vg_status:
+            self._vg_status['extent_free'] += lv_info['extent_size']
+
+        return True
+
+    def _remove_volume(self, uniqueid):
+        """Remove a volume from LVM.
+        """
         # This should not fail.
         while True:
             # XXX: Workaround AFSClient delayed cleanup.
             try:
-                lvm.lvremove(uniqueid, group=self._vg_name)
+                self._lvm.lvremove(uniqueid, group=self._vg_name)
                 break
             except subproc.CalledProcessError:
                 _LOGGER.critical('Ignoring volume %r deletion error', uniqueid)
@@ -301,4 +385,142 @@ class LocalDiskResourceService(BaseResourceServiceImpl):
 
         _LOGGER.info('Destroyed volume %r', uniqueid)
 
+    def _extents(self, size_in_bytes):
+        """Number of extents needed by a volume of size_in_bytes.
+        """
+        return int(math.ceil(size_in_bytes / self._vg_status['extent_size']))
+
+    def _take_pool_volume(self, uniqueid, needed):
+        """Hand out a ready pool volume of needed extents as uniqueid.
+
+        :returns ``dict``:
+            Logical volume info or ``None`` if the pool has no such volume.
+        """
+        ready = self._pool.get(needed)
+        if not ready:
+            return None
+
+        pool_info = ready.popleft()
+        self._lvm.lvrename(
+            pool_info['name'], uniqueid, group=self._vg_name
+        )
+        _LOGGER.info('Using pool volume %r as %r',
+                     pool_info['name'], uniqueid)
+
+        # Renaming a volume does not change its device numbers.
+        return dict(
+            pool_info,
+            name=uniqueid,
+            block_dev=os.path.join(
+                os.path.dirname(pool_info['block_dev']), uniqueid
+            )
+        )
+
+    def _drain_pool(self, needed):
+        """Destroy ready pool volumes until needed extents are free.
+        """
+        for ready in self._pool.values():
+            while ready and needed > self._vg_status['extent_free']:
+                pool_info = ready.popleft()
+                self._remove_volume(pool_info['name'])
+                self._vg_status['extent_free'] += pool_info['extent_size']
+
+    def _fill_pool(self):
+        """Schedule provisioning of the missing pool volumes.
+
+        Extents are reserved in the ledger when the volume is scheduled.
+        """
+        if self._pool_jobs is None or self._pending:
+            # Never hold on to extents while requests are waiting for space.
+            return
+
+        for size_in_bytes, count in sorted(self._pool_sizes.items()):
+            extents = self._extents(size_in_bytes)
+            missing = (
+                count -
+                len(self._pool[extents]) -
+                self._pool_filling[extents]
+            )
+            while missing > 0 and extents <= self._vg_status['extent_free']:
+                self._pool_seq += 1
+                name = '{prefix}{pid}-{seq}'.format(
+                    prefix=TREADMILL_POOL_LV_PREFIX,
+                    pid=os.getpid(),
+                    seq=self._pool_seq,
+                )
+                self._vg_status['extent_free'] -= extents
+                self._pool_filling[extents] += 1
+                self._pool_jobs.put((name, size_in_bytes, extents))
+                missing -= 1
+
+    def _pool_worker(self):
+        """Provision pool volumes (runs in the pool thread).
+        """
+        while True:
+            name, size_in_bytes, extents = self._pool_jobs.get()
+            try:
+                lv_info = self._provision_volume(name, size_in_bytes)
+            except Exception:  # pylint: disable=broad-except
+                _LOGGER.exception('Unable to provision pool volume %r', name)
+                lv_info = None
+
+            self._pool_done.append((name, extents, lv_info))
+            os.write(self._pool_eventfd, _POOL_EVENT)
+            self._pool_jobs.task_done()
+
+    def _provision_volume(self, name, size_in_bytes):
+        """Create and format a volume.
+        """
+        self._lvm.lvcreate(
+            volume=name,
+            group=self._vg_name,
+            size_in_bytes=size_in_bytes,
+        )
+        lv_info = self._lvm.lvdisplay(volume=name, group=self._vg_name)
+        fs_linux.blk_fs_create(lv_info['block_dev'])
+        lv_info['formatted'] = True
+
+        return lv_info
+
+    def _on_pool_event(self):
+        """Collect the volumes provisioned by the pool thread.
+        """
+        os.read(self._pool_eventfd, 8)
+
+        while self._pool_done:
+            name, extents, lv_info = self._pool_done.popleft()
+            self._pool_filling[extents] -= 1
+            if lv_info is None:
+                # Provisioning failed, cleanup and resynchronize the ledger
+                # with LVM, keeping the extents reserved by the pool volumes
+                # still being provisioned.
+                try:
+                    self._lvm.lvremove(name, group=self._vg_name)
+                except subproc.CalledProcessError:
+                    pass
+                self._vg_status = localdiskutils.refresh_vg_status(
+                    self._vg_name, lvm_impl=self._lvm
+                )
+                self._vg_status['extent_free'] -= sum(
+                    k * v for k, v in self._pool_filling.items()
+                )
+                continue
+
+            pool_info = {
+                k: lv_info[k]
+                for k in ['name', 'block_dev',
+                          'dev_major', 'dev_minor', 'extent_size',
+                          'formatted']
+            }
+            if self._pending:
+                # Space is needed by waiting requests, give it back.
+                self._remove_volume(name)
+                self._vg_status['extent_free'] += pool_info['extent_size']
+                for pending_id in self._pending:
+                    self.retry_request(pending_id)
+                self._pending = []
+            else:
+                self._pool[extents].append(pool_info)
+
+        # Report the new status.
         return True
@@ -76,11 +76,7 @@ class PresenceResourceService(BaseResourceServiceImpl):
             # Register running.
             path = z.path.running(app_name)
             _LOGGER.info('Register running: %s, %s', path, self.hostname)
-            if not self._safe_create(rsrc_id, path, self.hostname):
-                _LOGGER.info('Waiting to expire: %s', path)
-                return None
-
-            self.presence[app_name][path] = rsrc_id
+            nodes = [(path, self.hostname)]
 
             # Register endpoints.
             for endpoint in rsrc_data.get('endpoints', []):
@@ -93,11 +89,7 @@ class PresenceResourceService(BaseResourceServiceImpl):
 
                 path = z.path.endpoint(app_name, ep_proto, ep_name)
                 _LOGGER.info('Register endpoint: %s, %s', path, hostport)
-                if not self._safe_create(rsrc_id, path, hostport):
-                    _LOGGER.info('Waiting to expire: %s', path)
-                    return None
-
-                self.presence[app_name][path] = rsrc_id
+                nodes.append((path, hostport))
 
             # Register identity.
             identity_group = rsrc_data.get('identity_group')
@@ -107,7 +99,25 @@ class PresenceResourceService(BaseResourceServiceImpl):
 
                 path = z.path.identity_group(identity_group, str(identity))
                 _LOGGER.info('Register identity: %s, %s', path, identity_data)
-                if not self._safe_create(rsrc_id, path, identity_data):
+                nodes.append((path, identity_data))
+
+            # All nodes are created in a single transaction, the ones which
+            # already exist are then checked one by one.
+            acl = self.zkclient.make_servers_acl()
+            conflicts = dict(zkutils.apply_batch(
+                self.zkclient,
+                [('create', path, data) for path, data in nodes],
+                acl=[acl], ephemeral=True
+            ))
+            for path, _data in nodes:
+                if path not in conflicts:
+                    self.presence[app_name][path] = rsrc_id
+
+            for path, data in nodes:
+                if path not in conflicts:
+                    continue
+
+                if not self._safe_create(rsrc_id, path, data):
                     _LOGGER.info('Waiting to expire: %s', path)
                     return None
 
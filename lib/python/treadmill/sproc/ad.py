@@ -5,6 +5,7 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 import logging
+import os
 
 import click
 
@@ -12,6 +13,7 @@ from treadmill import context
 from treadmill import zknamespace as z
 from treadmill import zkutils
 from treadmill.ad import gmsa
+from treadmill.zksync import mirrordb
 from treadmill.zksync import utils as zksync_utils
 
 _LOGGER = logging.getLogger(__name__)
@@ -38,6 +40,14 @@ def init():
     def gmsa_sync(fs_root, partition, group_ou, group_pattern, no_lock):
         """Sync placements GMSA groups."""
 
+        # The placement and server watches read the node files, a zk2fs
+        # --mirror-db root only has them in the mirror DB.
+        if os.path.exists(mirrordb.db_path(fs_root)):
+            raise click.UsageError(
+                'Unsupported mirror DB root: %s, use a zk2fs root without '
+                '--mirror-db' % fs_root
+            )
+
         # keep sleeping until zksync ready
         zksync_utils.wait_for_ready(fs_root)
 
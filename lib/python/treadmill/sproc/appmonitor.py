@@ -6,10 +6,10 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
-import collections
-import itertools
+import bisect
 import logging
 import math
+import threading
 import time
 
 import click
@@ -35,6 +35,13 @@ _INTERVAL = float(60 * 60)
 # Delay monitoring for non-existent apps.
 _DELAY_INTERVAL = float(5 * 60)
 
+# Bulk scale error reasons which suspend the monitor.
+_SUSPEND_REASONS = {
+    'not_found': 'Monitor suspended: App not configured',
+    'invalid': 'Monitor suspended: Unable to start',
+    'invalid_manifest': 'Monitor suspended: Invalid manifest',
+}
+
 
 def make_alerter(alerts_dir, cell):
     """Create alert function."""
@@ -52,14 +59,73 @@ def make_alerter(alerts_dir, cell):
     return send_alert
 
 
+def update_scheduled(state, children):
+    """Update the scheduled instances index from the new children list.
+
+    Instances of each app are kept sorted (i.e. in creation order), apps with
+    added or removed instances are marked dirty. The index is updated under
+    the state lock, as it is read by ``reevaluate`` in another thread.
+    """
+    children = set(children)
+    with state['lock']:
+        grouped = state['scheduled']
+        instances = state['instances']
+        dirty = state['dirty']
+
+        added = children - instances
+        removed = instances - children
+
+        for instance in removed:
+            name = instance.rpartition('#')[0]
+            app_instances = grouped[name]
+            del app_instances[bisect.bisect_left(app_instances, instance)]
+            if not app_instances:
+                del grouped[name]
+            dirty.add(name)
+
+        for instance in added:
+            name = instance.rpartition('#')[0]
+            bisect.insort(grouped.setdefault(name, []), instance)
+            dirty.add(name)
+
+        state['instances'] = children
+
+
+def _scale(api_url, plan):
+    """Submit scale plan in bulk requests (one per proid), return outcomes."""
+    by_proid = {}
+    for name, delta in six.iteritems(plan):
+        by_proid.setdefault(name.partition('.')[0], {})[name] = delta
+
+    outcomes = {}
+    for proid, proid_plan in sorted(six.iteritems(by_proid)):
+        _LOGGER.info('Scaling %d apps of %s', len(proid_plan), proid)
+        try:
+            response = restclient.post(
+                [api_url], '/instance/_bulk/scale',
+                payload={'plan': proid_plan},
+                headers={'X-Treadmill-Trusted-Agent': 'monitor'}
+            )
+            outcomes.update(response.json())
+        except Exception:  # pylint: disable=W0703
+            _LOGGER.exception('Unable to scale apps: %r', proid_plan)
+
+    return outcomes
+
+
 def reevaluate(api_url, alert_f, state, zkclient, last_waited):
-    """Evaluate state and adjust app count based on monitor"""
+    """Evaluate state and adjust app count based on monitor.
+
+    Only the apps in ``state['dirty']`` are evaluated, apps are removed from
+    it once their scheduled count matches the monitor count.
+    """
     # Disable too many branches/statements warning.
     #
     # pylint: disable=R0912
     # pylint: disable=R0915
-    grouped = dict(state['scheduled'])
-    monitors = dict(state['monitors'])
+    grouped = state['scheduled']
+    monitors = state['monitors']
+    dirty = state['dirty']
 
     # Do not create a copy, suspended is accessed by ref.
     suspended = state['suspended']
@@ -68,126 +134,125 @@ def reevaluate(api_url, alert_f, state, zkclient, last_waited):
 
     now = time.time()
 
-    # remove outdated information in suspended dict
-    extra = six.viewkeys(suspended) - six.viewkeys(monitors)
-    for name in extra:
-        suspended.pop(name, None)
-        modified = True
-
-    # Increase available tokens.
-    for name, conf in six.iteritems(monitors):
-
-        if suspended.get(name, 0) > now:
-            _LOGGER.debug('Ignoring app %s - suspended.', name)
-            continue
-
-        # Either app is not suspended or it is past-due - remove it from
-        # suspended dict.
-        if suspended.pop(name, None) is not None:
-            alert_f(name, 'Monitor active again', status='clear')
+    # The plan is computed under the state lock, so that apps marked dirty
+    # by the watches meanwhile are not lost.
+    with state['lock']:
+        # remove outdated information in suspended dict
+        extra = six.viewkeys(suspended) - six.viewkeys(monitors)
+        for name in extra:
+            suspended.pop(name, None)
             modified = True
 
-        # Max value reached, nothing to do.
-        max_value = conf['count'] * 2
-        available = conf['available']
-        if available < max_value:
-            delta = conf['rate'] * (now - conf['last_update'])
-            conf['available'] = min(available + delta, max_value)
+        # Compute the whole scale plan: number of instances to create or list
+        # of instances to delete for each app.
+        plan = {}
+        for name in sorted(dirty):
+            conf = monitors.get(name)
+            if conf is None:
+                dirty.discard(name)
+                continue
 
-        conf['last_update'] = now
+            if suspended.get(name, 0) > now:
+                _LOGGER.debug('Monitor is suspended for: %s.', name)
+                continue
 
-    for name, conf in six.iteritems(monitors):
+            # Either app is not suspended or it is past-due - remove it from
+            # suspended dict.
+            if suspended.pop(name, None) is not None:
+                alert_f(name, 'Monitor active again', status='clear')
+                modified = True
 
-        if suspended.get(name, 0) > now:
-            _LOGGER.debug('Monitor is suspended for: %s.', name)
-            continue
+            # Increase available tokens, since the last evaluation.
+            max_value = conf['count'] * 2
+            available = conf['available']
+            if available < max_value:
+                delta = conf['rate'] * (now - conf['last_update'])
+                conf['available'] = min(available + delta, max_value)
 
-        count = conf['count']
-        available = conf['available']
+            conf['last_update'] = now
 
-        current_count = len(grouped.get(name, []))
-        _LOGGER.debug('App: %r current: %d, target %d',
-                      name, current_count, count)
+            count = conf['count']
+            available = conf['available']
 
-        if count == current_count:
-            continue
-
-        elif count > current_count:
-            needed = count - current_count
-            allowed = int(min(needed, math.floor(available)))
-            _LOGGER.debug('%s => need %d, allow %d', name, needed, allowed)
-            if allowed <= 0:
-                # in this case available <= 0 as needed >= 1
-                # we got estimated wait time, now + wait seconds
-                waited[name] = now + int((1 - available) / conf['rate'])
-                # new wait item, need modify
-                if name not in last_waited:
-                    alert_f(name, 'Monitor suspended: Rate limited')
-                    modified = True
+            current_count = len(grouped.get(name, []))
+            _LOGGER.debug('App: %r current: %d, target %d',
+                          name, current_count, count)
 
+            if count == current_count:
+                dirty.discard(name)
                 continue
 
-            try:
-                # scheduled, remove app from waited list
-                _scheduled = restclient.post(
-                    [api_url],
-                    '/instance/{}?count={}'.format(name, allowed),
-                    payload={},
-                    headers={'X-Treadmill-Trusted-Agent': 'monitor'}
-                )
-
-                if name in last_waited:
-                    # this means app jump out of wait, need to clear it from zk
-                    alert_f(name, 'Monitor active again', status='clear')
-                    modified = True
-
-                conf['available'] -= allowed
-            except restclient.NotFoundError:
-                _LOGGER.info('App not configured: %s', name)
-                suspended[name] = now + _DELAY_INTERVAL
-                alert_f(name, 'Monitor suspended: App not configured')
-                modified = True
-            except restclient.BadRequestError:
-                _LOGGER.exception('Unable to start: %s', name)
-                suspended[name] = now + _DELAY_INTERVAL
-                alert_f(name, 'Monitor suspended: Unable to start')
-                modified = True
-            except restclient.ValidationError:
-                _LOGGER.exception('Invalid manifest: %s', name)
-                suspended[name] = now + _DELAY_INTERVAL
-                alert_f(name, 'Monitor suspended: Invalid manifest')
+            elif count > current_count:
+                needed = count - current_count
+                allowed = int(min(needed, math.floor(available)))
+                _LOGGER.debug('%s => need %d, allow %d', name, needed, allowed)
+                if allowed <= 0:
+                    # in this case available <= 0 as needed >= 1
+                    # we got estimated wait time, now + wait seconds
+                    waited[name] = now + int((1 - available) / conf['rate'])
+                    # new wait item, need modify
+                    if name not in last_waited:
+                        alert_f(name, 'Monitor suspended: Rate limited')
+                        modified = True
+
+                    continue
+
+                plan[name] = allowed
+
+            elif count < current_count:
+                extra = []
+                policy = conf.get('policy')
+                if policy is None:
+                    policy = 'fifo'
+
+                if policy == 'fifo':
+                    extra = grouped[name][:current_count - count]
+                elif policy == 'lifo':
+                    extra = grouped[name][count - current_count:]
+                else:
+                    _LOGGER.warning('Invalid scale policy: %s', policy)
+                    continue
+
+                plan[name] = list(extra)
+
+    outcomes = _scale(api_url, plan)
+
+    for name, delta in sorted(six.iteritems(plan)):
+        outcome = outcomes.get(name)
+        if outcome is None:
+            continue
+
+        if '_error' not in outcome:
+            if isinstance(delta, list):
+                _LOGGER.info('deleted: %r', delta)
+                # this means we reduce the count number, no need to wait
                 modified = True
-            except Exception:  # pylint: disable=W0703
-                _LOGGER.exception('Unable to create instances: %s: %s',
-                                  name, needed)
-
-        elif count < current_count:
-            extra = []
-            policy = conf.get('policy')
-            if policy is None:
-                policy = 'fifo'
-
-            if policy == 'fifo':
-                extra = grouped[name][:current_count - count]
-            elif policy == 'lifo':
-                extra = grouped[name][count - current_count:]
-            else:
-                _LOGGER.warning('Invalid scale policy: %s', policy)
                 continue
 
-            try:
-                response = restclient.post(
-                    [api_url], '/instance/_bulk/delete',
-                    payload=dict(instances=list(extra)),
-                    headers={'X-Treadmill-Trusted-Agent': 'monitor'}
-                )
-                _LOGGER.info('deleted: %r - %s', extra, response)
-
-                # this means we reduce the count number, no need to wait
+            # scheduled, remove app from waited list
+            if name in last_waited:
+                # this means app jump out of wait, need to clear it from zk
+                alert_f(name, 'Monitor active again', status='clear')
                 modified = True
 
-            except Exception:  # pylint: disable=W0703
-                _LOGGER.exception('Unable to delete instances: %r', extra)
+            with state['lock']:
+                if name in monitors:
+                    monitors[name]['available'] -= delta
+            continue
+
+        error = outcome['_error']
+        reason = error.get('reason')
+        if isinstance(delta, list):
+            _LOGGER.error('Unable to delete instances: %r - %s',
+                          delta, error.get('why'))
+        elif reason in _SUSPEND_REASONS:
+            _LOGGER.error('Unable to start: %s - %s', name, error.get('why'))
+            suspended[name] = now + _DELAY_INTERVAL
+            alert_f(name, _SUSPEND_REASONS[reason])
+            modified = True
+        else:
+            _LOGGER.error('Unable to create instances: %s: %s - %s',
+                          name, delta, error.get('why'))
 
     # total inactive means
     waited.update(suspended)
@@ -207,27 +272,20 @@ def _run_sync(api_url, alerts_dir, once):
 
     state = {
         'scheduled': {},
+        'instances': set(),
         'monitors': {},
         'suspended': {},
+        'dirty': set(),
+        # Guards scheduled, instances, monitors and dirty, updated by the
+        # watches.
+        'lock': threading.Lock(),
     }
 
     @zkclient.ChildrenWatch(z.path.scheduled())
     @utils.exit_on_unhandled
     def _scheduled_watch(children):
         """Watch scheduled instances."""
-        scheduled = sorted(children)
-
-        def _appname_fn(instancename):
-            return instancename.rpartition('#')[0]
-
-        grouped = collections.defaultdict(
-            list,
-            {
-                k: list(v)
-                for k, v in itertools.groupby(scheduled, _appname_fn)
-            }
-        )
-        state['scheduled'] = grouped
+        update_scheduled(state, children)
         return True
 
     def _watch_monitor(name):
@@ -251,13 +309,15 @@ def _run_sync(api_url, alerts_dir, once):
                 return
 
             _LOGGER.info('Reconfigure monitor: %s, count: %s', name, count)
-            state['monitors'][name] = {
-                'count': count,
-                'available': 2.0 * count,
-                'last_update': time.time(),
-                'policy': policy,
-                'rate': (2.0 * count / _INTERVAL)
-            }
+            with state['lock']:
+                state['monitors'][name] = {
+                    'count': count,
+                    'available': 2.0 * count,
+                    'last_update': time.time(),
+                    'policy': policy,
+                    'rate': (2.0 * count / _INTERVAL)
+                }
+                state['dirty'].add(name)
 
     @zkclient.ChildrenWatch(z.path.appmonitor())
     @utils.exit_on_unhandled
@@ -265,15 +325,16 @@ def _run_sync(api_url, alerts_dir, once):
         """Watch app monitors."""
 
         monitors = set(children)
-        extra = six.viewkeys(state['monitors']) - monitors
-        for name in extra:
-            _LOGGER.info('Removing extra monitor: %r', name)
-            if state['monitors'].pop(name, None) is None:
-                _LOGGER.warning(
-                    'Failed to remove non-existent monitor: %r', name
-                )
-
-        missing = monitors - six.viewkeys(state['monitors'])
+        with state['lock']:
+            extra = six.viewkeys(state['monitors']) - monitors
+            for name in extra:
+                _LOGGER.info('Removing extra monitor: %r', name)
+                if state['monitors'].pop(name, None) is None:
+                    _LOGGER.warning(
+                        'Failed to remove non-existent monitor: %r', name
+                    )
+
+            missing = monitors - six.viewkeys(state['monitors'])
 
         for name in missing:
             _LOGGER.info('Adding missing monitor: %s', name)
@@ -13,6 +13,7 @@ import signal
 import click
 
 from treadmill import appenv
+from treadmill import cli
 from treadmill import context
 from treadmill import fs
 from treadmill import services
@@ -87,12 +88,17 @@ def init():
         @click.option('--default-write-iops', required=True, type=int,
                       help='Default write IO per second value.',
                       envvar='TREADMILL_LOCALDISK_DEFAULT_WRITE_IOPS')
+        @click.option('--pool', type=cli.DICT,
+                      help='Pre-formatted volumes to keep ready, per size '
+                      '(e.g. 1G=4,10G=2).',
+                      envvar='TREADMILL_LOCALDISK_POOL')
         def localdisk(img_location, img_size, block_dev, vg_name,
                       block_dev_configuration,
                       block_dev_read_bps, block_dev_write_bps,
                       block_dev_read_iops, block_dev_write_iops,
                       default_read_bps, default_write_bps,
-                      default_read_iops, default_write_iops):
+                      default_read_iops, default_write_iops,
+                      pool):
             """Runs localdisk service."""
 
             root_dir = local_ctx['root-dir']
@@ -186,6 +192,7 @@ def init():
                 default_write_bps=default_write_bps,
                 default_read_iops=default_read_iops,
                 default_write_iops=default_write_iops,
+                pool_sizes=pool,
             )
 
         @service.command()
@@ -49,6 +49,18 @@ FINISHED_HISTORY_MAX_COUNT = 100
 TRACE_HISTORY_MAX_COUNT = 100
 
 
+def _timed(phase, func, *args, **kwargs):
+    """Run cleanup phase, log its duration and number of processed nodes."""
+    started = time.monotonic()
+    result = func(*args, **kwargs)
+    duration = time.monotonic() - started
+    if isinstance(result, int):
+        _LOGGER.info('Cleanup %s: %d nodes in %.3fs', phase, result, duration)
+    else:
+        _LOGGER.info('Cleanup %s: %.3fs', phase, duration)
+    return result
+
+
 def init():
     """Top level command handler."""
 
@@ -96,41 +108,45 @@ def init():
 
         def _cleanup():
             """Do cleanup."""
+            zkclient = context.GLOBAL.zk.conn
             while True:
-                app_zk.prune_trace_evictions(
-                    context.GLOBAL.zk.conn,
-                    trace_evictions_max_count
+                stats = _timed(
+                    'trace', app_zk.maintain_trace,
+                    zkclient,
+                    batch_size=trace_batch_size,
+                    expires_after=trace_expire_after,
+                    evictions_max_count=trace_evictions_max_count,
+                    service_events_max_count=trace_service_events_max_count
                 )
-                app_zk.prune_trace_service_events(
-                    context.GLOBAL.zk.conn,
-                    trace_service_events_max_count
+                _LOGGER.info(
+                    'Trace: %(events)d events, '
+                    'scan: %(scan_time).3fs, '
+                    'pruned: %(pruned_evictions)d evictions, '
+                    '%(pruned_service_events)d service events '
+                    'in %(prune_time).3fs, '
+                    'uploaded: %(uploaded)d in %(upload_time).3fs',
+                    stats
                 )
-                app_zk.cleanup_trace(
-                    context.GLOBAL.zk.conn,
-                    trace_batch_size,
-                    trace_expire_after
+                _timed(
+                    'finished', app_zk.cleanup_finished,
+                    zkclient, finished_batch_size, finished_expire_after
                 )
-                app_zk.cleanup_finished(
-                    context.GLOBAL.zk.conn,
-                    finished_batch_size,
-                    finished_expire_after
+                _timed(
+                    'trace history', app_zk.cleanup_trace_history,
+                    zkclient, trace_history_max_count
                 )
-                app_zk.cleanup_trace_history(
-                    context.GLOBAL.zk.conn,
-                    trace_history_max_count
+                _timed(
+                    'finished history', app_zk.cleanup_finished_history,
+                    zkclient, finished_history_max_count
                 )
-                app_zk.cleanup_finished_history(
-                    context.GLOBAL.zk.conn,
-                    finished_history_max_count
-                )
-
-                server_zk.cleanup_server_trace(
-                    context.GLOBAL.zk.conn,
-                    trace_batch_size
+                _timed(
+                    'server trace', server_zk.cleanup_server_trace,
+                    zkclient, trace_batch_size
                 )
-                server_zk.cleanup_server_trace_history(
-                    context.GLOBAL.zk.conn,
-                    trace_history_max_count
+                _timed(
+                    'server trace history',
+                    server_zk.cleanup_server_trace_history,
+                    zkclient, trace_history_max_count
                 )
 
                 _LOGGER.info('Finished cleanup, sleep %s sec', interval)
@@ -47,9 +47,12 @@ def init():
             watches.extend(topic_watches)
 
         pubsub = ws.DirWatchPubSub(fs_root, impl, watches)
-        pubsub.run_detached()
+        pubsub.run_on_ioloop()
 
-        application = tornado.web.Application([(r'/', pubsub.ws)])
+        application = tornado.web.Application([
+            (r'/', pubsub.ws),
+            (r'/stats', ws.make_stats_handler(pubsub)),
+        ])
         http_server = tornado.httpserver.HTTPServer(application)
         http_server.listen(port)
         tornado.ioloop.IOLoop.instance().start()
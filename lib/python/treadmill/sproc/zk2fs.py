@@ -8,9 +8,7 @@ from __future__ import unicode_literals
 
 import logging
 import os
-import shutil
 import time
-import zlib
 import tempfile
 
 import click
@@ -20,8 +18,11 @@ from treadmill import fs
 from treadmill import context
 from treadmill import zknamespace as z
 from treadmill import utils
+from treadmill.trace import history
 from treadmill.trace.app import zk as app_zk
 from treadmill.trace.server import zk as server_zk
+from treadmill.zksync import mirrordb
+from treadmill.zksync import sowdb
 from treadmill.zksync import zk2fs
 from treadmill.zksync import utils as zksync_utils
 
@@ -51,7 +52,7 @@ def _on_del_identity(zk2fs_sync, zkpath):
     """Invoked when identity group is removed."""
     fpath = zk2fs_sync.fpath(zkpath)
     _LOGGER.info('Removed identity-group: %s', os.path.basename(fpath))
-    shutil.rmtree(fpath)
+    zk2fs_sync.remove_tree(zkpath)
 
 
 def _on_add_endpoint_proid(zk2fs_sync, zkpath):
@@ -64,7 +65,7 @@ def _on_del_endpoint_proid(zk2fs_sync, zkpath):
     """Invoked when proid is removed from endpoints (never)."""
     fpath = zk2fs_sync.fpath(zkpath)
     _LOGGER.info('Removed proid: %s', os.path.basename(fpath))
-    shutil.rmtree(fpath)
+    zk2fs_sync.remove_tree(zkpath)
 
 
 def _on_add_placement_server(zk2fs_sync, zkpath):
@@ -77,7 +78,7 @@ def _on_del_placement_server(zk2fs_sync, zkpath):
     """Invoked when server is removed from placement."""
     fpath = zk2fs_sync.fpath(zkpath)
     _LOGGER.info('Removed server: %s', os.path.basename(fpath))
-    shutil.rmtree(fpath)
+    zk2fs_sync.remove_tree(zkpath)
 
 
 def _on_add_trace_shard(zk2fs_sync, zkpath):
@@ -121,11 +122,20 @@ def _on_add_trace_db(zk2fs_sync, zkpath, sow_dir):
     _LOGGER.info('Added trace db snapshot: %s', zkpath)
     data, _metadata = zk2fs_sync.zkclient.get(zkpath)
     with tempfile.NamedTemporaryFile(delete=False,
-                                     mode='wb',
                                      dir=zk2fs_sync.tmp_dir) as trace_db:
-        trace_db.write(zlib.decompress(data))
-    db_name = os.path.basename(zkpath)
-    os.rename(trace_db.name, os.path.join(sow_dir, db_name))
+        pass
+    # Snapshots are queried with SQL, history snapshots are converted.
+    history.write_sqlite(data, trace_db.name)
+    db_path = os.path.join(sow_dir, os.path.basename(zkpath))
+
+    # Index is written first, so readers never see a DB without it.
+    conn = sowdb.connect(trace_db.name)
+    try:
+        index = sowdb.build_index(conn)
+    finally:
+        conn.close()
+    sowdb.write_index(db_path, index, tmp_dir=zk2fs_sync.tmp_dir)
+    os.rename(trace_db.name, db_path)
 
     utils.touch(zk2fs_sync.fpath(zkpath))
 
@@ -134,6 +144,7 @@ def _on_del_trace_db(zk2fs_sync, zkpath, sow_dir):
     """Called when trace DB snapshot is deleted."""
     db_path = os.path.join(sow_dir, os.path.basename(zkpath))
     fs.rm_safe(db_path)
+    sowdb.remove_index(db_path)
 
     fpath = zk2fs_sync.fpath(zkpath)
     fs.rm_safe(fpath)
@@ -195,9 +206,17 @@ def init():
                   is_flag=True, default=False)
     @click.option('--once', help='Sync once and exit.',
                   is_flag=True, default=False)
+    @click.option('--concurrency', type=int, default=0,
+                  help='Pipeline node reads, with at most concurrency '
+                  'outstanding requests (0 - read serially).')
+    @click.option('--mirror-db', help='Store node data in a single mirror '
+                  'DB instead of a file per node (only read by the websocket '
+                  'API, file readers e.g. gmsa need a root without it).',
+                  is_flag=True, default=False)
     def zk2fs_cmd(root, endpoints, identity_groups, identity_groups_meta,
                   appgroups, running, scheduled, servers, servers_data,
-                  placement, trace, server_trace, app_monitors, once):
+                  placement, trace, server_trace, app_monitors, once,
+                  concurrency, mirror_db):
         """Starts appcfgmgr process."""
 
         fs.mkdir_safe(root)
@@ -205,7 +224,14 @@ def init():
         tmp_dir = os.path.join(root, '.tmp')
         fs.mkdir_safe(tmp_dir)
 
-        zk2fs_sync = zk2fs.Zk2Fs(context.GLOBAL.zk.conn, root, tmp_dir)
+        store = None
+        if mirror_db:
+            store = mirrordb.MirrorDB(mirrordb.db_path(root))
+
+        zk2fs_sync = zk2fs.Zk2Fs(
+            context.GLOBAL.zk.conn, root, tmp_dir, concurrency=concurrency,
+            store=store
+        )
 
         if servers or servers_data:
             zk2fs_sync.sync_children(z.path.server(), watch_data=servers_data)
@@ -68,6 +68,7 @@ if os.name == 'nt':
     _PREFIX = 'winss'
 else:
     from . import s6 as sup_impl
+    from .s6 import control as s6_control
     _PREFIX = 's6'
 
 
@@ -500,8 +501,64 @@ def _get_wait_action(action):
     return action
 
 
+def _native_error(err, cmd):
+    """Translate a native s6 control error into the matching s6 tool error.
+
+    :returns:
+        ``None`` if the s6 tool should be used instead (no supervise
+        directory, unknown status format).
+    """
+    if isinstance(err, ValueError):
+        _LOGGER.debug('Native s6 control not supported: %s', err)
+        return None
+
+    if err.errno == errno.ENOENT:
+        return None
+    elif err.errno == errno.ENXIO:
+        return subproc.CalledProcessError(ERR_NO_SUP, cmd)
+    else:
+        _LOGGER.warning('Native s6 control failed: %r: %s', cmd, err)
+        return subproc.CalledProcessError(ERR_COMMAND, cmd)
+
+
+def _control_service_native(service_dir, action_str, wait, timeout):
+    """Control a service through its s6-supervise control fifo.
+
+    :returns:
+        ``None`` if the s6 tool should be used instead.
+    """
+    cmd = [_get_cmd('svc'), '-' + action_str, service_dir]
+    try:
+        if wait is None:
+            s6_control.svc(service_dir, action_str)
+            return True
+
+        # Check the status is readable before sending anything, so that the
+        # fallback never sends the actions twice.
+        s6_control.read_status(service_dir)
+        with s6_control.EventListener([service_dir]) as listener:
+            s6_control.svc(service_dir, action_str)
+            return s6_control.wait(
+                [service_dir], _get_wait_action(wait).value,
+                timeout=timeout, listener=listener
+            )
+
+    except (IOError, OSError, ValueError) as err:
+        error = _native_error(err, cmd)
+        if error is None:
+            return None
+        raise error
+
+
 def is_supervised(service_dir):
     """Checks if the supervisor is running."""
+    if _PREFIX == 's6':
+        try:
+            return s6_control.svok(service_dir)
+        except (IOError, OSError) as err:
+            if err.errno != errno.ENOENT:
+                raise
+
     try:
         subproc.check_call([_get_cmd('svok'), service_dir])
         return True
@@ -524,6 +581,15 @@ def control_service(service_dir, actions, wait=None, timeout=0):
         With `returncode` set to `ERR_COMMAND` if there is a problem
         communicating with the supervisor.
     """
+    actions = list(utils.get_iterable(actions))
+    if _PREFIX == 's6':
+        res = _control_service_native(
+            service_dir, ''.join(action.value for action in actions),
+            wait, timeout
+        )
+        if res is not None:
+            return res
+
     cmd = [_get_cmd('svc')]
 
     if wait:
@@ -556,12 +622,36 @@ def control_svscan(scan_dir, actions):
     for action in utils.get_iterable(actions):
         action_str += action.value
 
-    subproc.check_call([_get_cmd('svscanctl'), action_str, scan_dir])
+    cmd = [_get_cmd('svscanctl'), action_str, scan_dir]
+    if _PREFIX == 's6':
+        try:
+            s6_control.svscanctl(scan_dir, action_str[1:])
+            return
+        except (IOError, OSError) as err:
+            error = _native_error(err, cmd)
+            if error is not None:
+                raise error
+
+    subproc.check_call(cmd)
 
 
 def wait_service(service_dirs, action, all_services=True, timeout=0):
     """Performs a wait task on the given list of service directories.
     """
+    if _PREFIX == 's6':
+        service_dirs = list(utils.get_iterable(service_dirs))
+        try:
+            if s6_control.wait(service_dirs, _get_wait_action(action).value,
+                               all_services=all_services, timeout=timeout):
+                return
+            raise subproc.CalledProcessError(
+                ERR_TIMEOUT, [_get_cmd('svwait')] + service_dirs
+            )
+        except (IOError, OSError, ValueError) as err:
+            error = _native_error(err, [_get_cmd('svwait')] + service_dirs)
+            if error is not None:
+                raise error
+
     cmd = [_get_cmd('svwait')]
 
     if timeout > 0:
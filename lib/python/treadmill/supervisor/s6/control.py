@@ -0,0 +1,282 @@
+"""Native s6 supervision control.
+
+Talks to s6-supervise and s6-svscan through their control FIFOs, and reads
+the binary supervise status file directly, instead of forking the s6 command
+line tools for every action.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import collections
+import errno
+import io
+import itertools
+import logging
+import os
+import select
+import struct
+import time
+
+_LOGGER = logging.getLogger(__name__)
+
+SUPERVISE_DIR = 'supervise'
+SVSCAN_DIR = '.s6-svscan'
+EVENT_DIR = 'event'
+
+_CONTROL = 'control'
+_STATUS = 'status'
+
+#: Prefix of the fifos s6-supervise notifies in the event fifodir.
+_FTRIG_PREFIX = 'ftrig1'
+
+#: Interval at which the status is re-read when no event is received.
+_POLL_INTERVAL = 1.0
+
+# Status file layout: stamp (tain), ready stamp (tain), pid (uint64),
+# [pgid (uint64), s6 >= 2.9], wait status (uint16), flags.
+_STATUS_FORMATS = {
+    35: struct.Struct('>QI QI Q H B'),
+    43: struct.Struct('>QI QI Q Q H B'),
+}
+
+_FLAG_PAUSED = 0x01
+_FLAG_FINISHING = 0x02
+_FLAG_WANT_UP = 0x04
+_FLAG_READY = 0x08
+
+#: TAI64 label of the epoch.
+_TAI64_EPOCH = 2 ** 62 + 10
+
+_SEQ = itertools.count()
+
+ServiceStatus = collections.namedtuple(
+    'ServiceStatus',
+    [
+        'stamp',
+        'ready_stamp',
+        'pid',
+        'wstat',
+        'paused',
+        'finishing',
+        'want_up',
+        'ready',
+    ]
+)
+
+
+def _tain(secs, nano):
+    """Convert a packed tain into a (approximate) unix timestamp."""
+    return secs - _TAI64_EPOCH + nano / 1e9
+
+
+def read_status(service_dir):
+    """Read the supervise status of a service.
+
+    :raises ``ValueError``:
+        If the status format is not understood.
+    """
+    with io.open(os.path.join(service_dir, SUPERVISE_DIR, _STATUS), 'rb') as f:
+        data = f.read()
+
+    fmt = _STATUS_FORMATS.get(len(data))
+    if fmt is None:
+        raise ValueError('Unknown supervise status format (%d bytes): %s' %
+                         (len(data), service_dir))
+
+    fields = fmt.unpack(data)
+    flags = fields[-1]
+    return ServiceStatus(
+        stamp=_tain(fields[0], fields[1]),
+        ready_stamp=_tain(fields[2], fields[3]),
+        pid=fields[4],
+        wstat=fields[-2],
+        paused=bool(flags & _FLAG_PAUSED),
+        finishing=bool(flags & _FLAG_FINISHING),
+        want_up=bool(flags & _FLAG_WANT_UP),
+        ready=bool(flags & _FLAG_READY),
+    )
+
+
+def _is_up(status):
+    return status.pid != 0 and not status.finishing
+
+
+_WAIT_STATES = {
+    'u': _is_up,
+    'd': lambda status: not _is_up(status),
+    'U': lambda status: _is_up(status) and status.ready,
+    'D': lambda status: status.pid == 0 and not status.finishing,
+}
+
+
+def _write_control(control, actions):
+    """Write actions to a control fifo.
+
+    :raises ``OSError``:
+        With `ENXIO` if nobody is listening on the fifo, `ENOENT` if the fifo
+        does not exist.
+    """
+    fd = os.open(control, os.O_WRONLY | os.O_NONBLOCK | os.O_CLOEXEC)
+    try:
+        os.write(fd, actions.encode())
+    finally:
+        os.close(fd)
+
+
+def svok(service_dir):
+    """Check if the service directory is supervised.
+
+    :raises ``OSError``:
+        With `ENOENT` if the service was never supervised.
+    """
+    control = os.path.join(service_dir, SUPERVISE_DIR, _CONTROL)
+    try:
+        fd = os.open(control, os.O_WRONLY | os.O_NONBLOCK | os.O_CLOEXEC)
+    except OSError as err:
+        if err.errno == errno.ENXIO:
+            return False
+        raise
+
+    os.close(fd)
+    return True
+
+
+def svc(service_dir, actions):
+    """Send actions (e.g. 'uO') to the service's s6-supervise.
+    """
+    _write_control(os.path.join(service_dir, SUPERVISE_DIR, _CONTROL),
+                   actions)
+
+
+def svscanctl(scan_dir, actions):
+    """Send actions (e.g. 'an') to the scan directory's s6-svscan.
+    """
+    _write_control(os.path.join(scan_dir, SVSCAN_DIR, _CONTROL), actions)
+
+
+class EventListener:
+    """Subscription to the s6-supervise events of services.
+
+    Subscribing before sending a command guarantees no state change is
+    missed.
+    """
+
+    __slots__ = (
+        '_fifos',
+        '_poll',
+    )
+
+    def __init__(self, service_dirs):
+        self._fifos = []
+        self._poll = select.poll()
+
+        try:
+            for service_dir in service_dirs:
+                self._subscribe(service_dir)
+        except Exception:
+            self.close()
+            raise
+
+    def _subscribe(self, service_dir):
+        """Create and open a notification fifo in the service fifodir."""
+        fifo = os.path.join(
+            service_dir, EVENT_DIR,
+            '{prefix}@{pid}.{seq}'.format(
+                prefix=_FTRIG_PREFIX, pid=os.getpid(), seq=next(_SEQ)
+            )
+        )
+        os.mkfifo(fifo, 0o622)
+        fds = []
+        self._fifos.append((fifo, fds))
+        fds.append(os.open(fifo, os.O_RDONLY | os.O_NONBLOCK | os.O_CLOEXEC))
+        # Keep a writer open so that the fifo never reports EOF.
+        fds.append(os.open(fifo, os.O_WRONLY | os.O_NONBLOCK | os.O_CLOEXEC))
+        self._poll.register(fds[0], select.POLLIN)
+
+    def wait(self, timeout):
+        """Wait up to timeout seconds for events.
+
+        :returns ``str``:
+            Events received (e.g. 'ud').
+        """
+        events = []
+        for fd, _event in self._poll.poll(timeout * 1000):
+            try:
+                events.append(os.read(fd, 4096).decode())
+            except OSError as err:
+                if err.errno != errno.EAGAIN:
+                    raise
+
+        return ''.join(events)
+
+    def close(self):
+        """Unsubscribe from the services events."""
+        for fifo, fds in self._fifos:
+            for fd in fds:
+                os.close(fd)
+            try:
+                os.unlink(fifo)
+            except OSError as err:
+                if err.errno != errno.ENOENT:
+                    raise
+        self._fifos = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_args):
+        self.close()
+
+
+def wait(service_dirs, state, all_services=True, timeout=0, listener=None):
+    """Wait for services to reach state ('u', 'd', 'U' or 'D').
+
+    :param ``int`` timeout:
+        Timeout in milliseconds, 0 to wait forever.
+    :param ``EventListener`` listener:
+        Existing subscription to the services events.
+    :returns ``bool``:
+        ``False`` if the timeout expired.
+    """
+    reached = _WAIT_STATES[state]
+    check = all if all_services else any
+    deadline = None
+    if timeout > 0:
+        deadline = time.monotonic() + timeout / 1000
+
+    own_listener = listener is None
+    if own_listener:
+        listener = EventListener(service_dirs)
+
+    try:
+        while True:
+            if check(reached(read_status(service_dir))
+                     for service_dir in service_dirs):
+                return True
+
+            wait_time = _POLL_INTERVAL
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait_time = min(remaining, wait_time)
+
+            listener.wait(wait_time)
+
+    finally:
+        if own_listener:
+            listener.close()
+
+
+__all__ = [
+    'EventListener',
+    'ServiceStatus',
+    'read_status',
+    'svc',
+    'svok',
+    'svscanctl',
+    'wait',
+]
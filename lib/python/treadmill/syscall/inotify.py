@@ -169,7 +169,8 @@ def inotify_rm_watch(fileno, watch_id):
                       'inotify_rm_watch(%r, %r)' % (fileno, watch_id))
 
 
-INOTIFY_EVENT_HDRSIZE = struct.calcsize('iIII')
+_INOTIFY_EVENT_HDR = struct.Struct('iIII')
+INOTIFY_EVENT_HDRSIZE = _INOTIFY_EVENT_HDR.size
 
 
 ###############################################################################
@@ -190,18 +191,22 @@ def _parse_buffer(event_buffer):
     The ``cookie`` member of this struct is used to pair two related
     events, for example, it pairs an IN_MOVED_FROM event with an
     IN_MOVED_TO event.
+
+    The buffer is walked by offset (not re-sliced), so parsing is linear in
+    the buffer size.
     """
-    while len(event_buffer) >= INOTIFY_EVENT_HDRSIZE:
-        wd, mask, cookie, length = struct.unpack_from('iIII', event_buffer, 0)
-        name = event_buffer[
-            INOTIFY_EVENT_HDRSIZE:
-            INOTIFY_EVENT_HDRSIZE + length
-        ]
-        name = name.rstrip(b'\x00')
-        event_buffer = event_buffer[INOTIFY_EVENT_HDRSIZE + length:]
+    unpack_from = _INOTIFY_EVENT_HDR.unpack_from
+    buffer_len = len(event_buffer)
+    offset = 0
+    while buffer_len - offset >= INOTIFY_EVENT_HDRSIZE:
+        wd, mask, cookie, length = unpack_from(event_buffer, offset)
+        offset += INOTIFY_EVENT_HDRSIZE
+        name = event_buffer[offset:offset + length].rstrip(b'\x00')
+        offset += length
         yield wd, mask, cookie, name
 
-    assert not event_buffer, 'Unparsed bytes left in buffer: %r' % event_buffer
+    assert offset >= buffer_len, \
+        'Unparsed bytes left in buffer: %r' % event_buffer[offset:]
 
 
 ###############################################################################
@@ -0,0 +1,47 @@
+"""Wrapper for setns(2) system call.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import logging
+import os
+
+import ctypes
+from ctypes import (
+    c_int,
+)
+from ctypes.util import find_library
+
+_LOGGER = logging.getLogger(__name__)
+
+
+###############################################################################
+# Map the C interface
+
+_LIBC_PATH = find_library('c')
+_LIBC = ctypes.CDLL(_LIBC_PATH, use_errno=True)
+
+if getattr(_LIBC, 'setns', None) is None:
+    raise ImportError('Unsupported libc version found: %s' % _LIBC_PATH)
+
+# int setns(int fd, int nstype);
+_SETNS_DECL = ctypes.CFUNCTYPE(c_int, c_int, c_int, use_errno=True)
+_SETNS = _SETNS_DECL(('setns', _LIBC))
+
+
+def setns(fd, nstype=0):
+    """reassociate (the calling thread) with a namespace.
+    """
+    retcode = _SETNS(fd, nstype)
+    if retcode != 0:
+        errno = ctypes.get_errno()
+        raise OSError(errno, os.strerror(errno), fd)
+
+
+###############################################################################
+__all__ = [
+    'setns',
+]
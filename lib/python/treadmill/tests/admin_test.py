@@ -34,6 +34,9 @@ class AdminTest(unittest.TestCase):
         query('b', '*')
         self.assertEqual('(&(a=1)(b=*))', str(query))
 
+        query('c', 2, '>=')
+        self.assertEqual('(&(a=1)(b=*)(c>=2))', str(query))
+
     def test_entry_to_dict(self):
         """Test entry to dict conversion."""
         # Disable W0212: Test access protected members of admin module.
@@ -1228,6 +1231,265 @@ class ServerTest(unittest.TestCase):
             dirty=False
         )
 
+    @mock.patch('treadmill.admin._ldap.Admin.paged_search')
+    def test_list_modified_since(self, paged_search_mock):
+        """Test getting a list of servers modified since a given time."""
+        paged_search_mock.return_value = iter([])
+
+        self.server.list({'cell': 'yyy'}, modified_since=1542835343.5)
+
+        paged_search_mock.assert_called_once_with(
+            search_base='ou=servers,ou=treadmill,dc=xx,dc=com',
+            search_filter=(
+                '(&(objectClass=tmServer)(cell=yyy)'
+                '(modifyTimestamp>=20181121212223Z))'
+            ),
+            search_scope='SUBTREE',
+            attributes=['server', 'cell', 'trait', 'partition', 'data'],
+            dirty=False
+        )
+
+    @mock.patch('treadmill.admin._ldap.Admin.paged_search')
+    def test_list_ids(self, paged_search_mock):
+        """Test getting a list of servers identities from LDAP."""
+        paged_search_mock.return_value = iter([
+            {
+                'dn': 'server=xxx,ou=servers,ou=treadmill,dc=xx,dc=com',
+                'attributes': {'server': ['xxx']},
+            },
+            {
+                'dn': 'server=zzz,ou=servers,ou=treadmill,dc=xx,dc=com',
+                'attributes': {'server': ['zzz']},
+            }
+        ])
+
+        self.assertEqual(self.server.list_ids({}), ['xxx', 'zzz'])
+        paged_search_mock.assert_called_once_with(
+            search_base='ou=servers,ou=treadmill,dc=xx,dc=com',
+            search_filter='(objectClass=tmServer)',
+            search_scope='SUBTREE',
+            attributes=['server'],
+            dirty=False
+        )
+
+
+class AdminCacheTest(unittest.TestCase):
+    """Tests Admin search cache."""
+
+    def setUp(self):
+        self.admin = admin.Admin(None, 'dc=test,dc=com', cache_ttl=60)
+        self.conn = ldap3.Connection(
+            ldap3.Server('fake'),
+            client_strategy=ldap3.MOCK_SYNC,
+            return_empty_attributes=False
+        )
+        self.conn.strategy.add_entry(
+            'dc=test,dc=com',
+            {
+                'objectClass': ['domain'],
+                'contextCSN': ['20180101000000.000000Z#000000#000#000000'],
+            }
+        )
+        self.conn.strategy.add_entry(
+            'ou=treadmill,dc=test,dc=com',
+            {'objectClass': ['organizationalUnit']}
+        )
+        self.conn.strategy.add_entry(
+            'ou=cells,ou=treadmill,dc=test,dc=com',
+            {'objectClass': ['organizationalUnit']}
+        )
+        self.conn.strategy.add_entry(
+            'cell=foo,ou=cells,ou=treadmill,dc=test,dc=com',
+            {
+                'objectClass': ['tmCell'],
+                'cell': ['foo'],
+                'location': ['x'],
+                'modifyTimestamp': ['20180101000000Z'],
+            }
+        )
+        self.conn.bind()
+        self.admin.ldap = self.conn
+        self.admin.write_ldap = self.conn
+        self.cell = admin.Cell(self.admin)
+
+    def _external_update(self, location, timestamp):
+        """Update cell location bypassing the admin object."""
+        self.conn.modify(
+            'cell=foo,ou=cells,ou=treadmill,dc=test,dc=com',
+            {
+                'location': [(ldap3.MODIFY_REPLACE, [location])],
+                'modifyTimestamp': [(ldap3.MODIFY_REPLACE, [timestamp])],
+            }
+        )
+        self.conn.modify(
+            'dc=test,dc=com',
+            {
+                'contextCSN': [(
+                    ldap3.MODIFY_REPLACE,
+                    ['%s.000000Z#000000#000#000000' % timestamp[:-1]]
+                )],
+            }
+        )
+
+    def test_read_through(self):
+        """Test repeated reads are served from cache."""
+        self.assertEqual(self.cell.get('foo')['location'], 'x')
+        self.assertEqual(self.admin.cache.hits, 0)
+
+        with mock.patch.object(
+            self.conn, 'search', wraps=self.conn.search
+        ) as search_mock:
+            self.assertEqual(self.cell.get('foo')['location'], 'x')
+            self.assertEqual(
+                [cell['_id'] for cell in self.cell.list({})],
+                ['foo']
+            )
+            self.assertEqual(
+                [cell['_id'] for cell in self.cell.list({})],
+                ['foo']
+            )
+            # Only the list query (first time) hits the server.
+            self.assertEqual(self.admin.cache.hits, 3)
+            search_mock.assert_called_once()
+
+    def test_read_your_writes(self):
+        """Test writes invalidate cached searches, dirty reads bypass cache.
+        """
+        self.cell.get('foo')
+        self.cell.update('foo', {'location': 'y'})
+
+        self.assertEqual(self.cell.get('foo')['location'], 'y')
+        self.assertEqual(
+            self.cell.get('foo', dirty=True)['location'], 'y'
+        )
+
+        self.cell.delete('foo')
+        self.assertIsNone(self.admin.get(
+            'cell=foo,ou=cells,ou=treadmill,dc=test,dc=com',
+            '(objectClass=tmCell)', ['cell']
+        ))
+
+    def test_change_detection(self):
+        """Test external changes are detected by contextCSN/modifyTimestamp.
+        """
+        self.cell.get('foo')
+        self._external_update('y', '20180102000000Z')
+
+        # Poll interval has not expired, cached result is returned.
+        self.assertEqual(self.cell.get('foo')['location'], 'x')
+
+        self.admin.poll_changes()
+        self.assertEqual(self.cell.get('foo')['location'], 'y')
+
+    def test_change_detection_delete(self):
+        """Test deletes and modifies in the same poll window are detected.
+        """
+        for ou_name in ['servers', 'app-groups']:
+            self.conn.strategy.add_entry(
+                'ou=%s,ou=treadmill,dc=test,dc=com' % ou_name,
+                {'objectClass': ['organizationalUnit']}
+            )
+        self.conn.strategy.add_entry(
+            'server=xxx,ou=servers,ou=treadmill,dc=test,dc=com',
+            {
+                'objectClass': ['tmServer'],
+                'server': ['xxx'],
+                'modifyTimestamp': ['20180101000000Z'],
+            }
+        )
+        server = admin.Server(self.admin)
+        app_group = admin.AppGroup(self.admin)
+
+        def _read():
+            """Read (and cache) cell, servers and app groups."""
+            return (
+                self.cell.get('foo')['location'],
+                server.get('xxx') is not None,
+                [item['_id'] for item in server.list({})],
+                app_group.list({}),
+            )
+
+        self.admin.poll_changes()
+        self._external_update('y', '20180102000000Z')
+        self.admin.poll_changes()
+        self.assertEqual(_read(), ('y', True, ['xxx'], []))
+
+        # Server deleted and cell modified in the same poll window.
+        self.conn.delete('server=xxx,ou=servers,ou=treadmill,dc=test,dc=com')
+        self._external_update('z', '20180103000000Z')
+        cached = len(self.admin.cache)
+        paged_search = mock.Mock(wraps=self.conn.extend.standard.paged_search)
+        with mock.patch.object(self.conn.extend.standard, 'paged_search',
+                               paged_search):
+            self.admin.poll_changes()
+
+        # Deletes are found by listing the parents of the (still) cached
+        # entries, not the whole tree.
+        self.assertEqual(
+            [(call[1]['search_base'], call[1]['search_scope'])
+             for call in paged_search.call_args_list],
+            [('ou=treadmill,dc=test,dc=com', ldap3.SUBTREE),
+             ('ou=servers,ou=treadmill,dc=test,dc=com', ldap3.LEVEL)]
+        )
+
+        # Only the app groups search is left in cache.
+        self.assertEqual(len(self.admin.cache), 1)
+        self.assertLess(len(self.admin.cache), cached)
+        self.assertEqual(self.cell.get('foo')['location'], 'z')
+        self.assertEqual(server.list({}), [])
+        self.assertIsNone(server.get('xxx'))
+
+    def test_change_detection_unknown(self):
+        """Test cache is cleared if changed entries cannot be found."""
+        self.cell.list({})
+        self.admin.poll_changes()
+        self.conn.modify(
+            'dc=test,dc=com',
+            {
+                'contextCSN': [(
+                    ldap3.MODIFY_REPLACE,
+                    ['20180103000000.000000Z#000000#000#000000']
+                )],
+            }
+        )
+
+        self.assertEqual(len(self.admin.cache), 1)
+        self.admin.poll_changes()
+        self.assertEqual(len(self.admin.cache), 0)
+
+    def test_bounds(self):
+        """Test cache TTL and size bounds."""
+        # pylint: disable=protected-access
+        now = [100]
+        search_cache = admin._cache.SearchCache(
+            10, max_size=2, clock=lambda: now[0]
+        )
+        for idx in range(3):
+            search_cache.put(
+                search_cache.key('cn=%d,dc=x' % idx, '(a=*)', 'BASE', ['a']),
+                [{'dn': 'cn=%d,dc=x' % idx}]
+            )
+
+        self.assertEqual(len(search_cache), 2)
+        self.assertIsNone(
+            search_cache.get(
+                search_cache.key('cn=0,dc=x', '(a=*)', 'BASE', ['a'])
+            )
+        )
+        self.assertEqual(
+            search_cache.get(
+                search_cache.key('CN=1,dc=x', '(a=*)', 'BASE', ['a'])
+            ),
+            [{'dn': 'cn=1,dc=x'}]
+        )
+
+        now[0] = 110
+        self.assertIsNone(
+            search_cache.get(
+                search_cache.key('cn=1,dc=x', '(a=*)', 'BASE', ['a'])
+            )
+        )
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -16,6 +16,7 @@ from treadmill import exc
 from treadmill import yamlwrapper as yaml
 from treadmill.api import instance
 from treadmill.scheduler import masterapi
+from treadmill.admin import exc as admin_exceptions
 from treadmill.admin import ldapbackend
 
 
@@ -344,6 +345,83 @@ class ApiInstanceTest(unittest.TestCase):
             mock.ANY, {'proid.app#0000000001': 1}
         )
 
+    @mock.patch('treadmill.context.ZkContext.conn', mock.Mock())
+    @mock.patch('treadmill.context.AdminContext.application')
+    @mock.patch('treadmill.scheduler.masterapi.create_apps')
+    @mock.patch('treadmill.scheduler.masterapi.delete_apps')
+    @mock.patch('treadmill.scheduler.masterapi.get_scheduled_stats',
+                mock.Mock(return_value={'proid': 9998}))
+    @mock.patch('treadmill.api.instance._check_required_attributes',
+                mock.Mock())
+    @mock.patch('treadmill.api.instance._set_defaults', mock.Mock())
+    def test_instance_bulk_scale(self, delete_apps_mock, create_apps_mock,
+                                 application_mock):
+        """Test bulk scaling apps."""
+        app = {
+            'cpu': '10%',
+            'memory': '100M',
+            'disk': '100M',
+            'services': [{
+                'command': '/bin/sleep 10',
+                'name': 'sleep',
+                'restart': {'interval': 60, 'limit': 3}
+            }],
+        }
+
+        def _get(rsrc_id):
+            if rsrc_id == 'proid.missing':
+                raise admin_exceptions.NoSuchObjectResult(rsrc_id)
+            return dict(app)
+
+        admin_app = application_mock.return_value
+        admin_app.get.side_effect = _get
+        admin_app.from_entry.side_effect = lambda entry: entry
+        create_apps_mock.side_effect = (
+            lambda _zkclient, app_id, _app, count, _created_by: [
+                '{}#{:010d}'.format(app_id, idx) for idx in range(count)
+            ]
+        )
+
+        outcomes = self.instance.bulk_scale(
+            'proid',
+            {
+                'proid.app': 1,
+                'proid.big': 2,
+                'proid.missing': 1,
+                'proid.old': ['proid.old#0000000001'],
+                'proid.bad': ['proid.app#0000000001'],
+                'other.app': 1,
+            },
+            user='monitor'
+        )
+
+        self.assertEqual(
+            outcomes['proid.app'], {'instances': ['proid.app#0000000000']}
+        )
+        self.assertEqual(
+            outcomes['proid.old'], {'instances': ['proid.old#0000000001']}
+        )
+        # Quota accounts for the instances created by the plan.
+        self.assertEqual(outcomes['proid.big']['_error']['reason'], 'invalid')
+        self.assertEqual(outcomes['proid.bad']['_error']['reason'], 'invalid')
+        # Apps of other proids are not scaled.
+        self.assertEqual(
+            outcomes['other.app']['_error']['reason'], 'invalid'
+        )
+        self.assertEqual(
+            outcomes['proid.missing']['_error']['reason'], 'not_found'
+        )
+
+        create_apps_mock.assert_called_once_with(
+            mock.ANY, 'proid.app', mock.ANY, 1, 'monitor'
+        )
+        delete_apps_mock.assert_called_once_with(
+            mock.ANY, ['proid.old#0000000001'], 'monitor'
+        )
+
+        with self.assertRaises(jsonschema.exceptions.ValidationError):
+            self.instance.bulk_scale('proid', {'proid.app': 0})
+
     @mock.patch('treadmill.context.ZkContext.conn', mock.Mock())
     @mock.patch('treadmill.scheduler.masterapi.create_apps', mock.Mock())
     @mock.patch('treadmill.scheduler.masterapi.get_scheduled_stats')
@@ -81,6 +81,68 @@ class MetricsAPITest(unittest.TestCase):
         mock_.assert_called_with('rrd.file', 'foo')
 
 
+class StartTimingsAPITest(unittest.TestCase):
+    """treadmill.api.local._StartTimingsAPI tests."""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        tm_env = mock.Mock()
+        tm_env.apps_dir = os.path.join(self.root, 'apps')
+
+        tm_env_func = mock.Mock()
+        tm_env_func.return_value = tm_env
+
+        self.apps_dir = tm_env.apps_dir
+        self.start_timings = local.mk_start_timings_api(tm_env_func)()
+
+    def tearDown(self):
+        if self.root and os.path.isdir(self.root):
+            shutil.rmtree(self.root)
+
+    def _start_timings(self, app, duration, unpack):
+        """Write start timings of app."""
+        data_dir = os.path.join(self.apps_dir, app, 'data')
+        os.makedirs(data_dir)
+        with io.open(os.path.join(data_dir, 'start_timings.json'), 'w') as f:
+            f.write(six.text_type(json.dumps({
+                'duration': duration,
+                'phases': {
+                    'image_unpack': {
+                        'start': 0, 'end': unpack, 'duration': unpack
+                    },
+                },
+            })))
+
+    def test_get(self):
+        """Test the _StartTimingsAPI.get() method."""
+        self.assertEqual(
+            self.start_timings.get(),
+            {'count': 0, 'phases': {}}
+        )
+
+        for idx in range(10):
+            self._start_timings(
+                'proid.app-%d-uniq' % idx, idx + 1.0, (idx + 1) / 10
+            )
+        # Apps without start timings are ignored.
+        os.makedirs(os.path.join(self.apps_dir, 'proid.app-10-uniq', 'data'))
+
+        self.assertEqual(
+            self.start_timings.get(),
+            {
+                'count': 10,
+                'duration': {
+                    'p50': 5.0, 'p90': 9.0, 'p99': 10.0, 'max': 10.0
+                },
+                'phases': {
+                    'image_unpack': {
+                        'p50': 0.5, 'p90': 0.9, 'p99': 1.0, 'max': 1.0
+                    },
+                },
+            }
+        )
+
+
 class LogAPITest(unittest.TestCase):
     """treadmill.api.local._LogAPI tests."""
 
@@ -17,6 +17,7 @@ import mock
 
 import treadmill
 from treadmill import appcfgmgr
+from treadmill import dirwatch
 from treadmill import fs
 
 
@@ -466,6 +467,46 @@ class AppCfgMgrTest(unittest.TestCase):
         treadmill.appcfgmgr.AppCfgMgr._configure.assert_not_called()
         treadmill.appcfgmgr.AppCfgMgr._refresh_supervisor.assert_called()
 
+    @mock.patch('treadmill.appcfgmgr.AppCfgMgr._configure',
+                mock.Mock(return_value=True))
+    @mock.patch('treadmill.appcfgmgr.AppCfgMgr._refresh_supervisor',
+                mock.Mock())
+    @mock.patch('treadmill.appcfgmgr.AppCfgMgr._terminate', mock.Mock())
+    def test__on_events(self):
+        """Tests a batch of events refreshes the supervisor once.
+        """
+        # Access to a protected member _on_events of a client class
+        # pylint: disable=W0212
+        self.appcfgmgr._is_active = True
+
+        self.appcfgmgr._on_events([
+            (dirwatch.DirWatcherEvent.CREATED,
+             os.path.join(self.cache, 'proid.foo#1')),
+            (dirwatch.DirWatcherEvent.CREATED,
+             os.path.join(self.cache, '.tmp')),
+            (dirwatch.DirWatcherEvent.CREATED,
+             os.path.join(self.cache, 'proid.foo#2')),
+            (dirwatch.DirWatcherEvent.DELETED,
+             os.path.join(self.cache, 'proid.bar#3')),
+        ])
+
+        treadmill.appcfgmgr.AppCfgMgr._configure.assert_has_calls([
+            mock.call('proid.foo#1'),
+            mock.call('proid.foo#2'),
+        ])
+        treadmill.appcfgmgr.AppCfgMgr._terminate.assert_called_once_with(
+            'proid.bar#3'
+        )
+        treadmill.appcfgmgr.AppCfgMgr._refresh_supervisor.assert_called_once()
+
+        # Nothing configured, no refresh.
+        treadmill.appcfgmgr.AppCfgMgr._refresh_supervisor.reset_mock()
+        self.appcfgmgr._on_events([
+            (dirwatch.DirWatcherEvent.MODIFIED,
+             os.path.join(self.cache, 'proid.foo#1')),
+        ])
+        treadmill.appcfgmgr.AppCfgMgr._refresh_supervisor.assert_not_called()
+
     @mock.patch('treadmill.supervisor.control_svscan', mock.Mock())
     def test__refresh_supervisor(self):
         """Check how the supervisor is being refreshed.
@@ -0,0 +1,148 @@
+"""Unit test for app group lookup databases.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+import mock
+
+# Disable W0611: Unused import
+import treadmill.tests.treadmill_test_skip_windows  # pylint: disable=W0611
+
+from treadmill import appgrouplookup
+from treadmill import cellsync
+
+from treadmill.tests.testutils import mockzk
+
+
+def _appgroup(pattern, endpoint):
+    return {
+        'pattern': pattern, 'group-type': 'dns',
+        'endpoints': [endpoint], 'data': [],
+    }
+
+
+def _rows(db_path):
+    conn = sqlite3.connect(db_path)
+    rows = sorted(conn.execute('SELECT pattern, endpoints FROM appgroups'))
+    conn.close()
+    return rows
+
+
+class AppGroupLookupTest(unittest.TestCase):
+    """Test treadmill.appgrouplookup"""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.root, 'foo.db')
+        cellsync._SYNC_STATE.clear()  # pylint: disable=protected-access
+
+    def tearDown(self):
+        if self.root and os.path.isdir(self.root):
+            shutil.rmtree(self.root)
+
+    def test_sync_db(self):
+        """Test publishing and syncing lookup DB snapshots and deltas."""
+        # pylint: disable=protected-access
+
+        zkclient = mockzk.make_mock_zkclient()
+        appgroups = [
+            _appgroup('foo.%s.*' % idx, 'http') for idx in range(10)
+        ]
+
+        cellsync._sync_appgroup_lookups(zkclient, appgroups)
+        published = appgrouplookup.get_published(zkclient, 'foo')
+        self.assertEqual(published.deltas, 0)
+        self.assertEqual(published.digest, published.snapshot)
+        state = cellsync._SYNC_STATE['/appgroup-lookups']
+        self.assertTrue(state.loaded)
+        self.assertEqual(
+            state.published['foo'],
+            (published, {('foo.%s.*' % idx, 'dns', 'http', '{}')
+                         for idx in range(10)})
+        )
+
+        self.assertTrue(
+            appgrouplookup.sync_db(zkclient, 'foo', self.db_path)
+        )
+        self.assertEqual(
+            _rows(self.db_path),
+            [('foo.%s.*' % idx, 'http') for idx in range(10)]
+        )
+        self.assertFalse(
+            appgrouplookup.sync_db(zkclient, 'foo', self.db_path)
+        )
+
+        # A change is published as a delta of the snapshot.
+        appgroups[0] = _appgroup('foo.0.*', 'tcp')
+        cellsync._sync_appgroup_lookups(zkclient, appgroups)
+        self.assertEqual(
+            appgrouplookup.get_published(zkclient, 'foo'),
+            (published.snapshot, 1, mock.ANY)
+        )
+
+        zkclient.get.reset_mock()
+        self.assertTrue(
+            appgrouplookup.sync_db(zkclient, 'foo', self.db_path)
+        )
+        self.assertEqual(
+            zkclient.get.call_args_list,
+            [mock.call('/appgroup-lookups/foo/%s/delta-0000000000' %
+                       published.snapshot)]
+        )
+        self.assertEqual(
+            _rows(self.db_path),
+            [('foo.0.*', 'tcp')] +
+            [('foo.%s.*' % idx, 'http') for idx in range(1, 10)]
+        )
+
+        # Deltas are published from the rows in Zookeeper after a restart.
+        cellsync._SYNC_STATE.clear()
+        del appgroups[1]
+        cellsync._sync_appgroup_lookups(zkclient, appgroups)
+        self.assertEqual(
+            appgrouplookup.get_published(zkclient, 'foo'),
+            (published.snapshot, 2, mock.ANY)
+        )
+        appgrouplookup.sync_db(zkclient, 'foo', self.db_path)
+        self.assertEqual(
+            _rows(self.db_path),
+            [('foo.0.*', 'tcp')] +
+            [('foo.%s.*' % idx, 'http') for idx in range(2, 10)]
+        )
+
+        # Large changes are published as a new snapshot.
+        appgroups = appgroups[:2]
+        cellsync._sync_appgroup_lookups(zkclient, appgroups)
+        snapshot = appgrouplookup.get_published(zkclient, 'foo')
+        self.assertEqual(snapshot.deltas, 0)
+        self.assertNotEqual(snapshot.snapshot, published.snapshot)
+        self.assertEqual(
+            zkclient.get_children('/appgroup-lookups/foo'),
+            [snapshot.snapshot]
+        )
+        appgrouplookup.sync_db(zkclient, 'foo', self.db_path)
+        self.assertEqual(
+            _rows(self.db_path),
+            [('foo.0.*', 'tcp'), ('foo.2.*', 'http')]
+        )
+
+        # Lookups of proids without app groups are removed.
+        cellsync._sync_appgroup_lookups(zkclient, [])
+        self.assertEqual(zkclient.nodes, {})
+        self.assertTrue(
+            appgrouplookup.sync_db(zkclient, 'foo', self.db_path)
+        )
+        self.assertFalse(os.path.exists(self.db_path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -6,6 +6,7 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import datetime
 import unittest
 
 import os
@@ -13,6 +14,7 @@ import sqlite3
 import tempfile
 
 import kazoo
+import kazoo.exceptions
 import mock
 
 # Disable W0611: Unused import
@@ -21,11 +23,20 @@ import treadmill.tests.treadmill_test_skip_windows  # pylint: disable=W0611
 import treadmill
 from treadmill import cellsync
 from treadmill import zkutils
+from treadmill.admin import _ldap as admin_ldap
+
+
+def _utc(timestamp):
+    """Return LDAP (UTC aware datetime) timestamp."""
+    return datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc)
 
 
 class CellsyncTest(unittest.TestCase):
     """Test treadmill.cellsync"""
 
+    def setUp(self):
+        cellsync._SYNC_STATE.clear()
+
     @mock.patch('treadmill.context.GLOBAL', mock.Mock(cell='test'))
     def test_sync_collection(self):
         """"Test syncing ldap collection to Zookeeper."""
@@ -35,25 +46,160 @@ class CellsyncTest(unittest.TestCase):
         zkclient.get_children.side_effect = lambda path: {
             '/app-groups': ['test.foo', 'test.bar', 'test.baz']
         }.get(path, [])
+        zkclient.get.return_value = (b'{"cells": []}', None)
+        transaction = zkclient.transaction.return_value
+        transaction.commit.return_value = [True, True, '/app-groups/test.foo']
 
         entities = [
             {'_id': 'test.foo', 'cells': ['test']},
             {'_id': 'test.bar', 'cells': []},
         ]
 
-        cellsync._sync_collection(zkclient, entities, '/app-groups',
-                                  match=cellsync._match_appgroup)
+        self.assertTrue(
+            cellsync._sync_collection(zkclient, entities, '/app-groups',
+                                      match=cellsync._match_appgroup)
+        )
 
-        zkclient.delete.assert_has_calls([
+        transaction.delete.assert_has_calls([
             mock.call('/app-groups/test.bar'),
             mock.call('/app-groups/test.baz')
         ], any_order=True)
+        transaction.set_data.assert_called_once_with(
+            '/app-groups/test.foo',
+            b'{"cells": ["test"]}'
+        )
+        transaction.commit.assert_called_once_with()
+        zkclient.delete.assert_not_called()
+
+    @mock.patch('treadmill.context.GLOBAL', mock.Mock(cell='test'))
+    @mock.patch('treadmill.zkutils.put', mock.Mock())
+    @mock.patch('treadmill.zkutils.ensure_deleted', mock.Mock())
+    def test_sync_collection_changed(self):
+        """"Test syncing ldap entities changed since the last sync."""
+        # pylint: disable=protected-access
+
+        zkclient = mock.Mock()
+        zkclient.get_children.return_value = []
+        transaction = zkclient.transaction.return_value
+        transaction.commit.return_value = [True, True, True]
+
+        state = cellsync._SyncState()
+        cellsync._sync_collection(
+            zkclient,
+            [
+                {'_id': 'test.foo', 'cells': ['test'],
+                 '_create_timestamp': 900.0, '_modify_timestamp': 1000.0},
+                {'_id': 'test.bar', 'cells': ['test'],
+                 '_create_timestamp': 900.0, '_modify_timestamp': 1002.0},
+                {'_id': 'test.baz', 'cells': ['test'],
+                 '_create_timestamp': 900.0, '_modify_timestamp': 1001.0},
+            ],
+            '/app-groups',
+            state=state
+        )
+        self.assertEqual(transaction.create.call_count, 3)
+        self.assertEqual(state.watermark, 1002.0)
+        self.assertEqual(
+            state.entities['test.foo'], {'cells': ['test']}
+        )
+
+        # Nothing changed, Zookeeper is not read nor written.
+        zkclient.reset_mock()
+        self.assertFalse(
+            cellsync._sync_collection(
+                zkclient,
+                [{'_id': 'test.bar', 'cells': ['test'],
+                  '_create_timestamp': 900.0, '_modify_timestamp': 1002.0}],
+                '/app-groups',
+                state=state,
+                ids=['test.foo', 'test.bar', 'test.baz']
+            )
+        )
+        zkclient.get_children.assert_not_called()
+        zkclient.get.assert_not_called()
+        zkclient.transaction.assert_not_called()
+
+        # Changed entities are updated, missing entities are deleted, the ops
+        # are applied one by one if the transaction fails.
+        transaction.commit.return_value = [
+            kazoo.exceptions.RolledBackError(),
+            kazoo.exceptions.NoNodeError(),
+        ]
+        self.assertTrue(
+            cellsync._sync_collection(
+                zkclient,
+                [{'_id': 'test.bar', 'cells': ['test', 'other'],
+                  '_create_timestamp': 900.0, '_modify_timestamp': 1003.0}],
+                '/app-groups',
+                state=state,
+                ids=['test.foo', 'test.bar']
+            )
+        )
+        transaction.delete.assert_called_once_with('/app-groups/test.baz')
+        transaction.set_data.assert_called_once_with(
+            '/app-groups/test.bar',
+            b'{"cells": ["test", "other"]}'
+        )
+        zkutils.ensure_deleted.assert_called_once_with(
+            zkclient, '/app-groups/test.baz', recursive=False
+        )
+        zkutils.put.assert_called_once_with(
+            zkclient, '/app-groups/test.bar', b'{"cells": ["test", "other"]}',
+            acl=mock.ANY, default_acl=False, ephemeral=False
+        )
+        self.assertEqual(state.watermark, 1003.0)
+        self.assertEqual(sorted(state.digests), ['test.bar', 'test.foo'])
+        self.assertEqual(sorted(state.entities), ['test.bar', 'test.foo'])
+
+    @mock.patch('treadmill.context.AdminContext.app_group')
+    @mock.patch('treadmill.context.GLOBAL.zk', mock.Mock())
+    @mock.patch('treadmill.cellsync._sync_appgroup_lookups', mock.Mock())
+    def test_sync_appgroups(self, app_group_factory):
+        """"Test syncing app-groups modified since the last sync."""
+        treadmill.context.GLOBAL.cell = 'test'
+        zkclient = treadmill.context.GLOBAL.zk.conn
+        zkclient.get_children.return_value = []
+        mock_admappgroup = app_group_factory.return_value
+
+        # App groups as read from LDAP, with the operational attrs.
+        mock_admappgroup.list.return_value = [
+            admin_ldap.AppGroup(None).from_entry({
+                'app-group': ['test.foo'],
+                'cell': ['test'],
+                'pattern': ['test.foo.*'],
+                'createTimestamp': _utc(900),
+                'modifyTimestamp': _utc(1000),
+            }),
+        ]
+        cellsync.sync_appgroups()
+
+        mock_admappgroup.list.assert_called_once_with(
+            {}, get_operational_attrs=True
+        )
+        mock_admappgroup.list_ids.assert_not_called()
+        cellsync._sync_appgroup_lookups.assert_called_once_with(
+            zkclient,
+            [{'cells': ['test'], 'pattern': 'test.foo.*',
+              'endpoints': [], 'data': []}]
+        )
         zkclient.create.assert_called_once_with(
             '/app-groups/test.foo',
-            b'{"cells": ["test"]}',
-            makepath=True, ephemeral=False, acl=mock.ANY, sequence=False
+            b'{"cells": ["test"], "data": [], "endpoints": [], '
+            b'"pattern": "test.foo.*"}',
+            acl=mock.ANY, makepath=True, sequence=False, ephemeral=False
         )
 
+        mock_admappgroup.reset_mock()
+        cellsync._sync_appgroup_lookups.reset_mock()
+        mock_admappgroup.list.return_value = []
+        mock_admappgroup.list_ids.return_value = ['test.foo']
+        cellsync.sync_appgroups()
+
+        mock_admappgroup.list.assert_called_once_with(
+            {}, get_operational_attrs=True, modified_since=1000.0
+        )
+        cellsync._sync_appgroup_lookups.assert_not_called()
+
     @mock.patch('treadmill.context.AdminContext.cell_allocation')
     @mock.patch('treadmill.context.GLOBAL.zk', mock.Mock())
     @mock.patch('treadmill.scheduler.masterapi.update_allocations',
@@ -106,9 +252,11 @@ class CellsyncTest(unittest.TestCase):
             },
         ]
 
+        cellsync.sync_allocations()
         cellsync.sync_allocations()
 
-        treadmill.scheduler.masterapi.update_allocations.assert_called_with(
+        masterapi = treadmill.scheduler.masterapi
+        masterapi.update_allocations.assert_called_once_with(
             mock.ANY,
             [
                 {
@@ -20,6 +20,7 @@ if os.name != 'nt':
 import mock
 
 from treadmill import dirwatch
+from treadmill.dirwatch import dirwatch_base
 
 
 class DirWatcherTest(unittest.TestCase):
@@ -87,6 +88,96 @@ class DirWatcherTest(unittest.TestCase):
                 res,
             )
 
+    @unittest.skipUnless(sys.platform.startswith('linux'), 'Requires Linux')
+    def test_close_write(self):
+        """Tests close write mode with coalesced events."""
+        test_file = os.path.join(self.root, 'a')
+        test_link = os.path.join(self.root, 'b')
+        test_tmp = os.path.join(self.root, 'c')
+
+        watcher = dirwatch.DirWatcher(
+            self.root, coalesce=True, close_write=True
+        )
+        events = []
+        watcher.on_events = events.extend
+
+        with io.open(test_file, 'w') as f:
+            f.write('hello')
+            f.flush()
+            f.write(' world!')
+        os.symlink(test_file, test_link)
+        # Never closed before deleted, not reported.
+        f = io.open(test_tmp, 'w')
+        os.unlink(test_tmp)
+        f.close()
+
+        self.assertTrue(watcher.wait_for_events(0))
+        res = watcher.process_events()
+        self.assertEqual(
+            [
+                (dirwatch.DirWatcherEvent.CREATED, test_file),
+                (dirwatch.DirWatcherEvent.CREATED, test_link),
+            ],
+            events,
+        )
+        self.assertEqual(
+            [
+                (dirwatch.DirWatcherEvent.CREATED, test_file, None),
+                (dirwatch.DirWatcherEvent.CREATED, test_link, None),
+            ],
+            res,
+        )
+
+        del events[:]
+        with io.open(test_file, 'a') as f:
+            f.write(' again')
+        with io.open(test_file, 'a') as f:
+            f.write(' and again')
+        os.unlink(test_link)
+
+        watcher.process_events(max_events=1)
+        self.assertEqual(
+            [(dirwatch.DirWatcherEvent.MODIFIED, test_file)],
+            events,
+        )
+        res = watcher.process_events(resume=True)
+        self.assertEqual(
+            [(dirwatch.DirWatcherEvent.DELETED, test_link, None)],
+            res,
+        )
+
+    def test_coalesce_events(self):
+        """Tests coalescing events of the same path."""
+        created = dirwatch.DirWatcherEvent.CREATED
+        modified = dirwatch.DirWatcherEvent.MODIFIED
+        deleted = dirwatch.DirWatcherEvent.DELETED
+
+        self.assertEqual(
+            dirwatch_base.coalesce_events([
+                (created, 'a'),
+                (modified, 'b'),
+                (modified, 'a'),
+                (modified, 'b'),
+                (created, 'b'),
+                (created, 'c'),
+                (deleted, 'c'),
+                (modified, 'd'),
+                (deleted, 'd'),
+                (deleted, 'e'),
+                (created, 'e'),
+                (modified, 'e'),
+            ]),
+            [
+                (created, 'a'),
+                (created, 'b'),
+                (created, 'c'),
+                (deleted, 'c'),
+                (deleted, 'd'),
+                (deleted, 'e'),
+                (created, 'e'),
+            ]
+        )
+
     @unittest.skipUnless(sys.platform.startswith('linux'), 'Requires Linux')
     @mock.patch('select.poll', mock.Mock())
     def test_signal(self):
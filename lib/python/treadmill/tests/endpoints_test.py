@@ -48,6 +48,8 @@ class PortScannerTest(unittest.TestCase):
     @mock.patch('treadmill.zkutils.put', mock.Mock())
     @mock.patch('treadmill.netutils.netstat',
                 mock.Mock(return_value=set([8000])))
+    @mock.patch('treadmill.netutils.SockDiag',
+                mock.Mock(side_effect=OSError(1, 'Operation not permitted')))
     def test_scan(self):
         """Test publishing endpoints status info."""
         endp_files = ['x.y#001~http~tcp~45000~12345~8000']
@@ -59,6 +61,37 @@ class PortScannerTest(unittest.TestCase):
         )
         treadmill.netutils.netstat.assert_called_with('12345')
 
+    @mock.patch('treadmill.netutils.netstat', mock.Mock())
+    @mock.patch('treadmill.netutils.SockDiag', mock.Mock())
+    def test_scan_sock_diag(self):
+        """Test scanning container ports with sock_diag."""
+        sock_diag = treadmill.netutils.SockDiag.return_value
+        sock_diag.listening.return_value = set([8000])
+        io.open(
+            os.path.join(self.root, 'x.y#001~http~tcp~45000~12345~8000'), 'w'
+        ).close()
+        io.open(
+            os.path.join(self.root, 'x.y#001~ssh~tcp~45001~12345~22'), 'w'
+        ).close()
+
+        self.assertEqual({45000: 1, 45001: 0}, self.scanner._scan())
+        self.assertEqual({45000: 1, 45001: 0}, self.scanner._scan())
+
+        # The sock_diag socket is created once per container.
+        treadmill.netutils.SockDiag.assert_called_once_with('12345')
+        sock_diag.listening.assert_called_with(set([8000, 22]))
+        treadmill.netutils.netstat.assert_not_called()
+
+        # And closed once the container is gone.
+        self.scanner._on_deleted(
+            os.path.join(self.root, 'x.y#001~http~tcp~45000~12345~8000')
+        )
+        self.scanner._on_deleted(
+            os.path.join(self.root, 'x.y#001~ssh~tcp~45001~12345~22')
+        )
+        self.assertEqual({}, self.scanner._scan())
+        sock_diag.close.assert_called_once_with()
+
 
 class EndpointPublisherTest(unittest.TestCase):
     """Mock test for endpoint publisher."""
@@ -82,6 +82,9 @@ class EventMgrTest(mockzk.MockZookeeperTestCase):
         )
 
         mock_zkclient.get.return_value = (b'{}', mock.Mock(ctime=1000))
+        mock_zkclient.get_async.return_value.get.return_value = (
+            b'{}', mock.Mock(ctime=1000)
+        )
         mock_zkclient.exits.return_value = mock.Mock()
         # Decorator style watch
         mock_zkclient.DataWatch.return_value = mock_data_watch
@@ -121,6 +124,9 @@ class EventMgrTest(mockzk.MockZookeeperTestCase):
         )
 
         mock_zkclient.get.return_value = (b'{}', mock.Mock(ctime=1000))
+        mock_zkclient.get_async.return_value.get.return_value = (
+            b'{}', mock.Mock(ctime=1000)
+        )
         mock_zkclient.exits.return_value = mock.Mock()
         # Decorator style watch
         mock_zkclient.DataWatch.return_value = mock_data_watch
@@ -291,6 +297,113 @@ class EventMgrTest(mockzk.MockZookeeperTestCase):
         )
         self.assertFalse(treadmill.eventmgr.EventMgr._cache.called)
 
+    @mock.patch('glob.glob', mock.Mock())
+    @mock.patch('treadmill.eventmgr.EventMgr._cache', mock.Mock())
+    @mock.patch('treadmill.eventmgr.EventMgr._cache_many', mock.Mock())
+    def test__synchronize_many(self):
+        """Check that multiple apps are fetched in bulk, cache dir is scanned
+        only once.
+        """
+        # Access to a protected member _synchronize of a client class
+        # pylint: disable=W0212
+        glob.glob.return_value = [os.path.join(self.cache, 'foo#001')]
+
+        zkclient = kazoo.client.KazooClient()
+        self.evmgr._synchronize(
+            zkclient, ['foo#001', 'foo#002', 'foo#003'], check_existing=True
+        )
+        treadmill.eventmgr.EventMgr._cache_many.assert_called_with(
+            zkclient, mock.ANY, check_existing=True
+        )
+        self.assertEqual(
+            sorted(treadmill.eventmgr.EventMgr._cache_many.call_args[0][1]),
+            ['foo#001', 'foo#002', 'foo#003']
+        )
+
+        # Simulate the cache being written.
+        self.evmgr._cache_index.update({'foo#002': 1, 'foo#003': 1})
+        treadmill.eventmgr.EventMgr._cache_many.reset_mock()
+        glob.glob.reset_mock()
+
+        self.evmgr._synchronize(
+            zkclient, ['foo#001', 'foo#002', 'foo#003', 'foo#004', 'foo#005']
+        )
+        glob.glob.assert_not_called()
+        self.assertEqual(
+            sorted(treadmill.eventmgr.EventMgr._cache_many.call_args[0][1]),
+            ['foo#004', 'foo#005']
+        )
+        treadmill.eventmgr.EventMgr._cache.assert_not_called()
+
+    @mock.patch('kazoo.client.KazooClient.get', mock.Mock())
+    @mock.patch('kazoo.client.KazooClient.get_async', mock.Mock())
+    @mock.patch('kazoo.client.KazooClient.exists', mock.Mock())
+    @mock.patch('kazoo.client.KazooClient.get_children', mock.Mock())
+    def test__cache_many(self):
+        """Test bulk cache of placement and manifest data.
+        """
+        # Access to a protected member _cache_many of a client class
+        # pylint: disable=W0212
+        zk_content = {
+            'placement': {
+                'test.xx.com': {
+                    'xxx.app1#1234': {
+                        '.data': '{identity: 1}\n',
+                        '.metadata': {'ctime': 1000},
+                    },
+                    'xxx.app1#1235': {
+                        '.data': '{identity: 2}\n',
+                        '.metadata': {'ctime': 1000},
+                    },
+                    'xxx.app1#1236': {
+                        '.data': '{identity: 3}\n',
+                        '.metadata': {'ctime': 1000},
+                    },
+                }
+            },
+            'scheduled': {
+                'xxx.app1#1234': {
+                    'affinity': 'app1',
+                    'memory': '1G',
+                },
+                'xxx.app1#1236': {
+                    'affinity': 'app1',
+                    'memory': '2G',
+                },
+            }
+        }
+        self.make_mock_zk(zk_content)
+        zkclient = kazoo.client.KazooClient()
+        self.evmgr._hostname = 'test.xx.com'
+        self.evmgr._cache_index = {'xxx.app1#1236': 2.0}
+
+        self.evmgr._cache_many(
+            zkclient,
+            ['xxx.app1#1234', 'xxx.app1#1235', 'xxx.app1#1236',
+             'xxx.app1#1237'],
+            check_existing=True
+        )
+
+        with io.open(os.path.join(self.cache, 'xxx.app1#1234')) as f:
+            data = yaml.load(stream=f)
+            self.assertEqual(data['identity'], 1)
+            self.assertEqual(data['task'], '1234')
+            self.assertEqual(data['memory'], '1G')
+
+        # No manifest, no placement or up to date.
+        self.assertFalse(
+            os.path.exists(os.path.join(self.cache, 'xxx.app1#1235'))
+        )
+        self.assertFalse(
+            os.path.exists(os.path.join(self.cache, 'xxx.app1#1236'))
+        )
+        self.assertFalse(
+            os.path.exists(os.path.join(self.cache, 'xxx.app1#1237'))
+        )
+        self.assertEqual(
+            kazoo.client.KazooClient.get_async.call_count, 6
+        )
+
     @mock.patch('kazoo.client.KazooClient.get', mock.Mock())
     @mock.patch('kazoo.client.KazooClient.exists', mock.Mock())
     @mock.patch('kazoo.client.KazooClient.get_children', mock.Mock())
@@ -235,6 +235,22 @@ class LVMTest(unittest.TestCase):
             ]
         )
 
+    @mock.patch('treadmill.subproc.check_call', mock.Mock())
+    def test_lvrename(self):
+        """Test LVM Logical Volume rename.
+        """
+        lvm.lvrename('some_volume', 'new_volume', 'some_group')
+
+        treadmill.subproc.check_call.assert_called_with(
+            [
+                'lvm', 'lvrename',
+                '--autobackup', 'n',
+                'some_group',
+                'some_volume',
+                'new_volume',
+            ]
+        )
+
     @mock.patch('treadmill.subproc.check_output', mock.Mock())
     def test_lvdisplay(self):
         """Test display of LVM volume information.
@@ -8,6 +8,7 @@ from __future__ import unicode_literals
 
 import io
 import os
+import socket
 import sys
 import unittest
 
@@ -58,6 +59,39 @@ class NetutilsTest(unittest.TestCase):
         self.assertIn(3, netutils.netstat(os.getpid()))
         self.assertNotIn(4, netutils.netstat(os.getpid()))
 
+    def test_sock_diag(self):
+        """Tests netutils.SockDiag against listening sockets."""
+        try:
+            sock_diag = netutils.SockDiag()
+        except OSError as err:
+            self.skipTest('sock_diag not available: %s' % err)
+
+        listening = socket.socket()
+        listening.bind(('0.0.0.0', 0))
+        listening.listen(1)
+        loopback = socket.socket()
+        loopback.bind(('127.0.0.1', 0))
+        loopback.listen(1)
+        bound = socket.socket()
+        bound.bind(('0.0.0.0', 0))
+        try:
+            port = listening.getsockname()[1]
+            lo_port = loopback.getsockname()[1]
+            bound_port = bound.getsockname()[1]
+
+            self.assertIn(port, sock_diag.listening())
+            self.assertEqual(
+                sock_diag.listening(set([port, lo_port, bound_port])),
+                set([port])
+            )
+            self.assertEqual(sock_diag.listening(set([bound_port])), set())
+            self.assertEqual(sock_diag.listening(set()), set())
+        finally:
+            listening.close()
+            loopback.close()
+            bound.close()
+            sock_diag.close()
+
 
 if __name__ == '__main__':
     unittest.main()
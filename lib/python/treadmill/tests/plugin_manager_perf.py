@@ -0,0 +1,93 @@
+"""Performance test for treadmill.plugin_manager.
+
+Measures the treadmill CLI startup time, when the entry point index is
+built (cold) and when it is loaded (warm), compared to the entry points
+scan of pkg_resources::
+
+    python -m treadmill.tests.plugin_manager_perf
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import timeit
+
+# Disable W0611: Unused import
+import treadmill.tests.treadmill_test_skip_windows  # pylint: disable=W0611
+
+
+def _python(env, *args):
+    """Run python, discarding the output."""
+    subprocess.call(
+        [sys.executable] + list(args),
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+
+def scan(env):
+    """Compare the index with the pkg_resources entry points scan."""
+    pkg_resources_code = (
+        'import pkg_resources; '
+        'list(pkg_resources.iter_entry_points("treadmill.cli"))'
+    )
+    index_code = (
+        'from treadmill import plugin_manager; '
+        'list(plugin_manager.names("treadmill.cli"))'
+    )
+
+    interval = timeit.timeit(
+        stmt=lambda: _python(env, '-c', pkg_resources_code), number=5
+    )
+    print('pkg_resources scan time  :', interval / 5)
+    _python(env, '-c', index_code)
+    interval = timeit.timeit(
+        stmt=lambda: _python(env, '-c', index_code), number=5
+    )
+    print('index load time  :', interval / 5)
+
+
+def startup(env, *args):
+    """Measure startup time of the treadmill CLI command."""
+    print('command: treadmill %s' % ' '.join(args))
+    index_file = env['TREADMILL_PLUGIN_INDEX']
+
+    def _cold():
+        """Run command, rebuilding the index."""
+        if os.path.exists(index_file):
+            os.unlink(index_file)
+        _python(env, '-m', 'treadmill', *args)
+
+    interval = timeit.timeit(stmt=_cold, number=5)
+    print('cold index startup time  :', interval / 5)
+    interval = timeit.timeit(
+        stmt=lambda: _python(env, '-m', 'treadmill', *args), number=5
+    )
+    print('warm index startup time  :', interval / 5)
+
+
+def main():
+    """Run the startup benchmarks with a scratch index file."""
+    cachedir = tempfile.mkdtemp()
+    try:
+        env = dict(
+            os.environ,
+            TREADMILL_PLUGIN_INDEX=os.path.join(cachedir, 'plugins.json')
+        )
+        env.pop('TREADMILL_APPROOT', None)
+
+        scan(env)
+        startup(env, '--help')
+        startup(env, 'sproc', '--help')
+    finally:
+        shutil.rmtree(cachedir)
+
+
+if __name__ == '__main__':
+    main()
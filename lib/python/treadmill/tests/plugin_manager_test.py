@@ -6,18 +6,22 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
-import collections
+import io
+import os
+import shutil
+import tempfile
 import unittest
 
 import mock
-import pkg_resources
 
 from treadmill import plugin_manager
 
 # pylint: disable=protected-access
 
 
-_EntryPoint = collections.namedtuple('EntryPoint', ['name'])
+def _write(path, content):
+    with io.open(path, 'w') as f:
+        f.write(content)
 
 
 class PluginManagerTest(unittest.TestCase):
@@ -25,20 +29,24 @@ class PluginManagerTest(unittest.TestCase):
 
     def setUp(self):
         self.saved = plugin_manager._FILTER
+        self.root = tempfile.mkdtemp()
+        plugin_manager._INDEX = None
 
     def tearDown(self):
         plugin_manager._FILTER = self.saved
+        plugin_manager._INDEX = None
+        if self.root and os.path.isdir(self.root):
+            shutil.rmtree(self.root)
 
-    @mock.patch('pkg_resources.iter_entry_points', mock.Mock())
     def test_whitelist(self):
         """Tests plugin manager whitelist."""
-        pkg_resources.iter_entry_points.return_value = [
-            _EntryPoint(x) for x in [
-                'aaa',
-                'bbb',
-                'aaa.foo'
-            ]
-        ]
+        plugin_manager._INDEX = {
+            section: {
+                name: {'module': 'treadmill', 'attrs': []}
+                for name in ['aaa', 'bbb', 'aaa.foo']
+            }
+            for section in ['foo.bar', 'x', 'y']
+        }
 
         # No whitelist - load all.
         plugin_manager._FILTER = {}
@@ -55,12 +63,64 @@ class PluginManagerTest(unittest.TestCase):
             set(['aaa', 'aaa.foo']),
             set(plugin_manager.names('x'))
         )
+        with self.assertRaises(KeyError):
+            plugin_manager.load('x', 'bbb')
         # Section not in the whitelist, will load all.
         self.assertEqual(
             set(['aaa', 'bbb', 'aaa.foo']),
             set(plugin_manager.names('y'))
         )
 
+    def test_index(self):
+        """Test entry point index is rebuilt when distributions change."""
+        index_file = os.path.join(self.root, 'cache', 'plugins.json')
+        dist_info = os.path.join(self.root, 'foo-1.0.dist-info')
+        os.mkdir(dist_info)
+        _write(
+            os.path.join(dist_info, 'METADATA'),
+            'Metadata-Version: 2.1\nName: foo\nVersion: 1.0\n'
+        )
+        entry_points = os.path.join(dist_info, 'entry_points.txt')
+        _write(
+            entry_points,
+            '[foo.bar]\n'
+            'aaa = treadmill.plugin_manager:load\n'
+            'bbb = treadmill.plugin_manager [extra]\n'
+        )
+
+        with mock.patch.dict(os.environ,
+                             {'TREADMILL_PLUGIN_INDEX': index_file}), \
+                mock.patch('sys.path', [self.root]):
+            self.assertEqual(
+                set(plugin_manager.names('foo.bar')), set(['aaa', 'bbb'])
+            )
+            self.assertIs(
+                plugin_manager.load('foo.bar', 'aaa'), plugin_manager.load
+            )
+            self.assertIs(
+                plugin_manager.load('foo.bar', 'bbb'), plugin_manager
+            )
+
+            # The index is loaded from the file if up to date.
+            plugin_manager._INDEX = None
+            with mock.patch('treadmill.plugin_manager._build_index',
+                            mock.Mock()):
+                self.assertEqual(
+                    set(plugin_manager.names('foo.bar')),
+                    set(['aaa', 'bbb'])
+                )
+                plugin_manager._build_index.assert_not_called()
+
+            # And rebuilt when the distribution entry points change.
+            plugin_manager._INDEX = None
+            _write(
+                entry_points,
+                '[foo.bar]\n'
+                'ccc = treadmill.plugin_manager:load_all\n'
+            )
+            os.utime(entry_points, (0, 0))
+            self.assertEqual(list(plugin_manager.names('foo.bar')), ['ccc'])
+
     def test_load(self):
         """Test parsing filter string."""
         self.assertEqual(
@@ -102,16 +102,20 @@ class PresenceTest(mockzk.MockZookeeperTestCase):
             shutil.rmtree(self.root)
 
     @mock.patch('kazoo.client.KazooClient.create', mock.Mock())
+    @mock.patch('kazoo.client.KazooClient.exists', mock.Mock())
     @mock.patch('kazoo.client.KazooClient.get', mock.Mock())
+    @mock.patch('kazoo.client.KazooClient.transaction', mock.Mock())
     @mock.patch('treadmill.sysinfo.hostname', mock.Mock())
     @mock.patch('treadmill.subproc.check_call', mock.Mock())
-    @mock.patch('time.sleep', mock.Mock)
+    @mock.patch('time.sleep', mock.Mock())
     def test_registration(self):
         """Verifies presence registration."""
         treadmill.sysinfo.hostname.return_value = 'myhostname'
         manifest = {
             'task': 't-0001',
             'name': 'foo.test1',
+            'identity_group': 'foo.grp',
+            'identity': 0,
             'uniqueid': 'AAAAAA',
             'proid': 'andreik',
             'services': [
@@ -146,64 +150,88 @@ class PresenceTest(mockzk.MockZookeeperTestCase):
                 }
             ]
         }
+        zk_content = {
+            'running': {},
+            'endpoints': {},
+            'identity-groups': {
+                'foo.grp': {},
+            },
+        }
+        self.make_mock_zk(zk_content)
+
         app_presence = presence.EndpointPresence(self.zkclient, manifest)
-        app_presence.register_endpoints()
+        app_presence.register()
+
+        # All nodes are created in a single transaction, which fails as the
+        # parent node of the proid endpoints is missing, the nodes are then
+        # created one by one.
+        self.assertEqual(kazoo.client.KazooClient.transaction.call_count, 1)
+        self.assertEqual(zk_content['running'], {'foo.test1': b'myhostname'})
+        self.assertEqual(
+            zk_content['endpoints']['foo'],
+            {
+                'test1:tcp:ssh': b'myhostname:5001',
+                'test1:tcp:http': b'myhostname:5000',
+            }
+        )
+        self.assertEqual(
+            zk_content['identity-groups']['foo.grp'],
+            {'0': b'{"app": "foo.test1", "host": "myhostname"}'}
+        )
         kazoo.client.KazooClient.create.assert_has_calls(
             [
                 mock.call(
                     '/endpoints/foo/test1:tcp:ssh',
                     value=b'myhostname:5001',
                     acl=mock.ANY,
-                    ephemeral=True, makepath=True, sequence=False
+                    ephemeral=True,
+                    sequence=False,
+                    makepath=True
                 ),
                 mock.call(
                     '/endpoints/foo/test1:tcp:http',
                     value=b'myhostname:5000',
                     acl=mock.ANY,
-                    ephemeral=True, makepath=True, sequence=False
+                    ephemeral=True,
+                    sequence=False,
+                    makepath=True
                 ),
             ]
         )
+        self.assertFalse(time.sleep.called)
 
-        retry_happened = []
+        # Nodes which exist (not expired yet) are retried until they expire.
+        zk_content['endpoints']['foo'] = {'test1:tcp:ssh': b'otherhost:5001'}
+        kazoo.client.KazooClient.transaction.reset_mock()
 
-        def node_exists(*_args, **_kwargs):
-            """Simulate existence of ephemeral node."""
-            if retry_happened:
-                return
-            else:
-                retry_happened.append(1)
-                raise kazoo.client.NodeExistsError()
+        def _expire(_interval):
+            """Simulate expiration of ephemeral node."""
+            zk_content['endpoints']['foo'].pop('test1:tcp:ssh', None)
 
-        kazoo.client.KazooClient.create.reset()
-        kazoo.client.KazooClient.create.side_effect = node_exists
-        kazoo.client.KazooClient.get.return_value = (b'{}', {})
+        time.sleep.side_effect = _expire
         app_presence.register_endpoints()
-        self.assertTrue(retry_happened)
-        self.assertTrue(time.sleep.called)
-        kazoo.client.KazooClient.create.assert_has_calls(
-            [
-                mock.call(
-                    '/endpoints/foo/test1:tcp:ssh',
-                    value=b'myhostname:5001',
-                    acl=mock.ANY,
-                    ephemeral=True, makepath=True, sequence=False
-                ),
-                mock.call(
-                    '/endpoints/foo/test1:tcp:http',
-                    value=b'myhostname:5000',
-                    acl=mock.ANY,
-                    ephemeral=True, makepath=True, sequence=False
-                ),
-            ]
+        self.assertEqual(time.sleep.call_count, 1)
+        self.assertEqual(kazoo.client.KazooClient.transaction.call_count, 1)
+        self.assertEqual(
+            zk_content['endpoints']['foo'],
+            {
+                'test1:tcp:ssh': b'myhostname:5001',
+                'test1:tcp:http': b'myhostname:5000',
+            }
         )
 
-        kazoo.client.KazooClient.create.reset()
-        kazoo.client.KazooClient.create.side_effect = (
-            kazoo.client.NodeExistsError
-        )
+        # Nodes which never expire abort the registration.
+        zk_content['endpoints']['foo'] = {'test1:tcp:ssh': b'otherhost:5001'}
+        time.sleep.side_effect = None
         self.assertRaises(exc.ContainerSetupError,
                           app_presence.register_endpoints)
+        self.assertEqual(
+            zk_content['endpoints']['foo'],
+            {
+                'test1:tcp:ssh': b'otherhost:5001',
+                'test1:tcp:http': b'myhostname:5000',
+            }
+        )
 
     @mock.patch('kazoo.client.KazooClient.get', mock.Mock())
     @mock.patch('kazoo.client.KazooClient.delete', mock.Mock())
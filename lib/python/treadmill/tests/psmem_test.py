@@ -0,0 +1,103 @@
+"""Unit test for psmem.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import io
+import os
+import unittest
+
+import mock
+
+# Disable W0611: Unused import
+import treadmill.tests.treadmill_test_skip_windows  # pylint: disable=W0611
+
+from treadmill import psmem
+
+_SMAPS = """\
+00400000-0040b000 r-xp 00000000 fd:00 123     /usr/bin/foo
+Size:                 44 kB
+Rss:                  40 kB
+Pss:                  20 kB
+Pss_Dirty:             4 kB
+Shared_Clean:         32 kB
+Shared_Dirty:          0 kB
+Private_Clean:         4 kB
+Private_Dirty:         4 kB
+Swap:                  0 kB
+SwapPss:               0 kB
+VmFlags: rd ex mr mw me dw
+7ffd559ad000-7ffd559af000 rw-p 00000000 00:00 0     [stack]
+Size:                  8 kB
+Rss:                   8 kB
+Pss:                   8 kB
+Shared_Clean:          0 kB
+Shared_Dirty:          0 kB
+Private_Clean:         0 kB
+Private_Dirty:         8 kB
+Shared_Hugetlb:        0 kB
+Private_Hugetlb:       0 kB
+"""
+
+
+# Disable warning about accessing protected members.
+#
+# pylint: disable=W0212
+class PsmemTest(unittest.TestCase):
+    """Tests for teadmill.psmem."""
+
+    def test_proc_status(self):
+        """Test parsing of /proc/<pid>/status."""
+        pid = os.getpid()
+        self.assertEqual(psmem.get_thread_id(pid), str(pid))
+        self.assertGreaterEqual(psmem.get_threads(pid), 1)
+
+    @mock.patch('io.open', mock.mock_open(read_data=_SMAPS))
+    def test_read_smaps(self):
+        """Test single pass parsing of smaps."""
+        self.assertEqual(
+            psmem._read_smaps(123, 'smaps'),
+            (16, 32, 28, 2)
+        )
+        io.open.assert_called_with('/proc/123/smaps')
+
+    def test_get_mem_stats(self):
+        """Test smaps_rollup and smaps give the same memory stats."""
+        pid = os.getpid()
+        private, shared, have_pss = psmem.get_mem_stats(pid)
+        self.assertTrue(have_pss)
+
+        with mock.patch('treadmill.psmem._HAVE_SMAPS_ROLLUP', False):
+            smaps_private, smaps_shared, have_pss = psmem.get_mem_stats(pid)
+        self.assertTrue(have_pss)
+
+        # Allow for memory allocated between the calls, and truncation.
+        self.assertAlmostEqual(private, smaps_private, delta=1 << 20)
+        self.assertAlmostEqual(shared, smaps_shared, delta=1 << 20)
+
+    @mock.patch('treadmill.psmem.get_mem_stats',
+                mock.Mock(return_value=(1024, 2048, True)))
+    def test_get_memory_usage(self):
+        """Test memory usage of processes, gone processes are skipped."""
+        pid = os.getpid()
+
+        meminfo = psmem.get_memory_usage([pid, 2 ** 22 + 1])
+        self.assertEqual(
+            meminfo,
+            [{
+                'name': mock.ANY,
+                'tgid': pid,
+                'private': 1024,
+                'shared': 2048,
+                'total': 3072,
+                'threads': mock.ANY,
+            }]
+        )
+        psmem.get_mem_stats.assert_called_once_with(pid, use_pss=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -169,6 +169,47 @@ class InstanceTest(unittest.TestCase):
                 ),
             ])
 
+    def test_bulk_scale_instance(self):
+        """Test bulk scaling apps."""
+        outcomes = {
+            'proid.app': {'instances': ['proid.app#0000000001']},
+            'proid.foo': {'_error': {'_id': 'proid.foo',
+                                     'why': 'Not found',
+                                     'reason': 'not_found'}},
+        }
+        self.impl.bulk_scale.return_value = outcomes
+
+        plan = {
+            'proid.app': 1,
+            'proid.foo': 2,
+            'proid.bar': ['proid.bar#0000000002'],
+        }
+        with user_set(self.app, 'foo@BAR.BAZ'):
+            resp = self.client.post(
+                '/instance/_bulk/scale',
+                data=json.dumps({'plan': plan}),
+                content_type='application/json'
+            )
+        self.assertEqual(resp.status_code, http_client.OK)
+        self.assertEqual(
+            json.loads(b''.join(resp.response).decode()), outcomes
+        )
+        self.impl.bulk_scale.assert_called_once_with(
+            'proid', plan, 'foo@BAR.BAZ'
+        )
+
+        # Bulk operations are allowed on same proid.
+        self.impl.reset_mock()
+        plan['proid2.app'] = ['proid2.app#0000000003']
+        with user_set(self.app, 'foo@BAR.BAZ'):
+            resp = self.client.post(
+                '/instance/_bulk/scale',
+                data=json.dumps({'plan': plan}),
+                content_type='application/json'
+            )
+        self.assertEqual(resp.status_code, http_client.BAD_REQUEST)
+        self.impl.bulk_scale.assert_not_called()
+
     def test_bulk_update_instance(self):
         """Test bulk updateing list of instances."""
         self.impl.bulk_update.return_value = None
@@ -46,6 +46,7 @@ class LinuxRuntimeRunTest(unittest.TestCase):
         self.tm_env = mock.Mock(
             root=self.root,
             apps_dir=os.path.join(self.root, 'apps'),
+            app_events_dir=os.path.join(self.root, 'appevents'),
             endpoints_dir=os.path.join(self.root, 'endpoints'),
             rules_dir=os.path.join(self.root, 'rules'),
             svc_cgroup=mock.Mock(
@@ -459,6 +460,7 @@ class LinuxRuntimeRunTest(unittest.TestCase):
         app_unique_name = 'proid.myapp-0-0000000ID1234'
         app_dir = os.path.join(self.root, 'apps', app_unique_name)
         os.makedirs(app_dir)
+        os.makedirs(self.tm_env.app_events_dir)
         mock_cgroup_client = self.tm_env.svc_cgroup.make_client.return_value
         mock_ld_client = self.tm_env.svc_localdisk.make_client.return_value
         mock_nwrk_client = self.tm_env.svc_network.make_client.return_value
@@ -544,6 +546,29 @@ class LinuxRuntimeRunTest(unittest.TestCase):
             app_dir,
             mock_ld_client.wait.return_value
         )
+        # Start timings are recorded and the started event is posted.
+        timings = treadmill.runtime.load_start_timings(app_dir)
+        self.assertEqual(
+            list(timings['phases']),
+            [
+                'resource_requests',
+                'cgroups_wait',
+                'localdisk_wait',
+                'network_wait',
+                'port_allocation',
+                'unshare_network',
+                'create_root_dir',
+                'image_unpack',
+                'cleanup_mounts',
+                'apphook_configure',
+                'presence_request',
+                'presence_wait',
+            ]
+        )
+        self.assertIn(
+            ',proid.myapp#0,started,ID1234.',
+            os.listdir(self.tm_env.app_events_dir)[0]
+        )
 
     @mock.patch('pwd.getpwnam', mock.Mock())
     @mock.patch('shutil.copy', mock.Mock())
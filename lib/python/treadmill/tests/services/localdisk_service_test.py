@@ -25,6 +25,187 @@ from treadmill import services
 from treadmill.services import localdisk_service
 
 
+class _FakeLVM:
+    """In-memory LVM command layer."""
+
+    def __init__(self, extent_nb):
+        self.extent_nb = extent_nb
+        self.volumes = {}
+        self.calls = []
+        self._minor = 0
+
+    def _extent_free(self):
+        return self.extent_nb - sum(self.volumes.values())
+
+    def vgdisplay(self, group):
+        """Fake vgdisplay, 4M extents."""
+        return {
+            'name': group,
+            'extent_size': 4096,
+            'extent_free': self._extent_free(),
+            'extent_nb': self.extent_nb,
+        }
+
+    def lvsdisplay(self, group=None):
+        """Fake lvsdisplay."""
+        return [self.lvdisplay(name, group) for name in self.volumes]
+
+    def lvdisplay(self, volume, group):
+        """Fake lvdisplay."""
+        if volume not in self.volumes:
+            raise subproc.CalledProcessError(returncode=5, cmd='lvm')
+        return {
+            'block_dev': os.path.join('/dev', group, volume),
+            'name': volume,
+            'group': group,
+            'open_count': 0,
+            'extent_size': self.volumes[volume],
+            'extent_alloc': self.volumes[volume],
+            'dev_major': 253,
+            'dev_minor': self._minor,
+        }
+
+    def lvcreate(self, volume, size_in_bytes, group):
+        """Fake lvcreate."""
+        self.calls.append(('lvcreate', volume))
+        extents = -(-size_in_bytes // (4 * 1024**2))
+        assert extents <= self._extent_free()
+        self.volumes[volume] = extents
+
+    def lvrename(self, volume, new_name, group):
+        """Fake lvrename."""
+        self.calls.append(('lvrename', volume, new_name))
+        self.volumes[new_name] = self.volumes.pop(volume)
+
+    def lvremove(self, volume, group):
+        """Fake lvremove."""
+        self.calls.append(('lvremove', volume))
+        if volume not in self.volumes:
+            raise subproc.CalledProcessError(returncode=5, cmd='lvm')
+        del self.volumes[volume]
+
+
+@unittest.skipUnless(sys.platform.startswith('linux'), 'Requires Linux')
+class LocalDiskPoolTest(unittest.TestCase):
+    """Unit tests for the local disk service volume pool.
+    """
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.lvm = _FakeLVM(extent_nb=100)
+
+    def tearDown(self):
+        if self.root and os.path.isdir(self.root):
+            shutil.rmtree(self.root)
+
+    def _svc(self):
+        """Create and initialize the service with the fake LVM."""
+        svc = localdisk_service.LocalDiskResourceService(
+            block_dev='/dev/block',
+            vg_name='treadmill',
+            read_bps='100M',
+            write_bps='100M',
+            read_iops=1000,
+            write_iops=1000,
+            pool_sizes={'100M': 2},
+            lvm_impl=self.lvm,
+        )
+        svc.initialize(self.root)
+        svc.synchronize()
+        self._wait_pool(svc)
+        return svc
+
+    @staticmethod
+    def _wait_pool(svc):
+        """Wait for the pool thread and process its completions."""
+        # pylint: disable=W0212
+        svc._pool_jobs.join()
+        svc._on_pool_event()
+
+    @mock.patch('treadmill.cgroups.set_value', mock.Mock())
+    @mock.patch('treadmill.cgutils.create', mock.Mock())
+    @mock.patch('treadmill.fs.linux.blk_fs_create', mock.Mock())
+    @mock.patch('treadmill.localdiskutils.setup_device_lvm', mock.Mock())
+    def test_pool(self):
+        """Test handing out and refilling of pool volumes.
+        """
+        # pylint: disable=W0212
+        svc = self._svc()
+
+        self.assertEqual(len(svc.event_handlers()), 1)
+        self.assertEqual(len(svc._pool[25]), 2)
+        self.assertEqual(svc._vg_status['extent_free'], 50)
+        self.assertEqual(treadmill.fs.linux.blk_fs_create.call_count, 2)
+
+        del self.lvm.calls[:]
+        localdisk = svc.on_create_request(
+            'myproid.test-0-ID1234', {'size': '100M'}
+        )
+
+        self.assertTrue(localdisk['formatted'])
+        self.assertEqual(localdisk['name'], 'tm-ID1234')
+        self.assertEqual(localdisk['block_dev'], '/dev/treadmill/tm-ID1234')
+        self.assertEqual(self.lvm.calls[0][0], 'lvrename')
+        self.assertEqual(self.lvm.calls[0][2], 'tm-ID1234')
+
+        # Refilled in the background.
+        self._wait_pool(svc)
+        self.assertEqual(len(svc._pool[25]), 2)
+        self.assertEqual(svc._vg_status['extent_free'], 25)
+
+        # Ledger matches LVM.
+        svc.on_delete_request('myproid.test-0-ID1234')
+        self.assertEqual(
+            svc._vg_status['extent_free'], self.lvm._extent_free()
+        )
+
+    @mock.patch('treadmill.cgroups.set_value', mock.Mock())
+    @mock.patch('treadmill.cgutils.create', mock.Mock())
+    @mock.patch('treadmill.fs.linux.blk_fs_create', mock.Mock())
+    @mock.patch('treadmill.localdiskutils.setup_device_lvm', mock.Mock())
+    def test_pool_drain(self):
+        """Test pool volumes are given back to requests of other sizes.
+        """
+        # pylint: disable=W0212
+        svc = self._svc()
+
+        localdisk = svc.on_create_request(
+            'myproid.test-0-ID1234', {'size': '300M'}
+        )
+
+        self.assertNotIn('formatted', localdisk)
+        self.assertIn(('lvcreate', 'tm-ID1234'), self.lvm.calls)
+        # Only one pool volume was given back.
+        self.assertEqual(len(svc._pool[25]), 1)
+        self.assertEqual(svc._vg_status['extent_free'], 0)
+        self.assertEqual(
+            svc._vg_status['extent_free'], self.lvm._extent_free()
+        )
+
+    @mock.patch('treadmill.cgroups.set_value', mock.Mock())
+    @mock.patch('treadmill.cgutils.create', mock.Mock())
+    @mock.patch('treadmill.fs.linux.blk_fs_create', mock.Mock())
+    @mock.patch('treadmill.localdiskutils.setup_device_lvm', mock.Mock())
+    def test_pool_failure(self):
+        """Test ledger resync on failure keeps the reserved extents.
+        """
+        # pylint: disable=W0212
+        svc = self._svc()
+
+        # Two pool volumes are scheduled, the first one fails while the
+        # second one is still being provisioned.
+        svc._vg_status['extent_free'] -= 50
+        svc._pool_filling[25] += 2
+        svc._pool_done.append(('tm-pool-failed', 25, None))
+        os.write(svc._pool_eventfd, localdisk_service._POOL_EVENT)
+        svc._on_pool_event()
+
+        self.assertIn(('lvremove', 'tm-pool-failed'), self.lvm.calls)
+        self.assertEqual(svc._pool_filling[25], 1)
+        self.assertEqual(
+            svc._vg_status['extent_free'], self.lvm._extent_free() - 25
+        )
+
+
 @unittest.skipUnless(sys.platform.startswith('linux'), 'Requires Linux')
 class LocalDiskServiceTest(unittest.TestCase):
     """Unit tests for the local disk service implementation.
@@ -132,9 +313,11 @@ class LocalDiskServiceTest(unittest.TestCase):
             group='treadmill',
             size_in_bytes=100 * 1024**2,
         )
-        self.assertTrue(
+        # The extent ledger is updated without querying LVM.
+        self.assertFalse(
             treadmill.localdiskutils.refresh_vg_status.called
         )
+        self.assertEqual(svc._vg_status['extent_free'], 511)
         cgrp = os.path.join('treadmill/apps', request_id)
         treadmill.cgroups.create.assert_called_with(
             'blkio', cgrp
@@ -277,7 +460,18 @@ class LocalDiskServiceTest(unittest.TestCase):
             read_iops=1000,
             write_iops=1000
         )
+        svc._vg_status = {
+            'extent_size': 4 * 1024**3,
+            'extent_free': 500,
+        }
         request_id = 'myproid.test-0-ID1234'
+        treadmill.lvm.lvdisplay.return_value = {
+            'block_dev': '/dev/test',
+            'dev_major': 42,
+            'dev_minor': 43,
+            'extent_size': 10,
+            'name': 'tm-ID1234',
+        }
 
         svc.on_delete_request(request_id)
 
@@ -289,7 +483,9 @@ class LocalDiskServiceTest(unittest.TestCase):
             'tm-ID1234',
             group='treadmill'
         )
-        treadmill.localdiskutils.refresh_vg_status.assert_called()
+        # The extent ledger is updated without querying LVM.
+        treadmill.localdiskutils.refresh_vg_status.assert_not_called()
+        self.assertEqual(svc._vg_status['extent_free'], 510)
 
     @mock.patch('treadmill.lvm.lvdisplay', mock.Mock())
     @mock.patch('treadmill.lvm.lvremove', mock.Mock())
@@ -90,6 +90,47 @@ class PresenceServiceTest(unittest.TestCase):
             }
         )
 
+    @mock.patch('treadmill.zkutils.apply_batch', mock.Mock())
+    @mock.patch('treadmill.context.ZkContext.conn', mock.MagicMock())
+    @mock.patch('treadmill.services.presence_service.PresenceResourceService.'
+                '_safe_create', mock.Mock(return_value=False))
+    def test_on_create_existing(self):
+        """Test processing of a create request, with existing nodes.
+        """
+        svc = presence_service.PresenceResourceService()
+        treadmill.zkutils.apply_batch.return_value = [
+            ('/running/foo.bar#12345', svc.hostname)
+        ]
+        request = {
+            'endpoints': [{'name': 'xxx',
+                           'port': 8000,
+                           'real_port': 32000}]
+        }
+        request_id = 'foo.bar-12345-Uniq1'
+        self.assertIsNone(svc.on_create_request(request_id, request))
+
+        # All nodes are created at once, the existing ones one by one.
+        treadmill.zkutils.apply_batch.assert_called_once_with(
+            mock.ANY,
+            [
+                ('create', '/running/foo.bar#12345', svc.hostname),
+                ('create', '/endpoints/foo/bar#12345:tcp:xxx',
+                 svc.hostname + ':32000'),
+            ],
+            acl=mock.ANY,
+            ephemeral=True
+        )
+        safe_create = presence_service.PresenceResourceService._safe_create
+        safe_create.assert_called_once_with(
+            request_id, '/running/foo.bar#12345', svc.hostname
+        )
+        self.assertEqual(
+            svc.presence['foo.bar#12345'],
+            {
+                '/endpoints/foo/bar#12345:tcp:xxx': 'foo.bar-12345-Uniq1'
+            }
+        )
+
     @mock.patch('treadmill.zkutils.get', mock.Mock())
     @mock.patch('treadmill.zkutils.create', mock.Mock())
     @mock.patch('treadmill.zkutils.ensure_deleted', mock.Mock())
@@ -0,0 +1,126 @@
+"""Performance test for treadmill.sproc.appmonitor.
+
+Reevaluates synthetic monitors against an in-memory cell, which applies
+the bulk scale plans to the scheduled instances (in place of the cell API
+and Zookeeper), then measures the steady state, when few apps change in a
+large cell::
+
+    python -m treadmill.tests.sproc.appmonitor_perf
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import collections
+import itertools
+import timeit
+
+import mock
+
+# Disable W0611: Unused import
+import treadmill.tests.treadmill_test_skip_windows  # pylint: disable=W0611
+
+from treadmill.sproc import appmonitor
+
+
+class _Cell:
+    """In-memory cell, scheduled instances grouped by app."""
+
+    def __init__(self):
+        self.scheduled = collections.defaultdict(list)
+        self.requests = 0
+        self._seq = itertools.count()
+
+    def post(self, _api, _path, payload, headers):
+        """Apply bulk scale plan."""
+        del headers
+        self.requests += 1
+
+        outcomes = {}
+        for name, delta in payload['plan'].items():
+            if isinstance(delta, list):
+                self.scheduled[name] = [
+                    instance for instance in self.scheduled[name]
+                    if instance not in delta
+                ]
+                instances = delta
+            else:
+                instances = [
+                    '{}#{:010d}'.format(name, next(self._seq))
+                    for _ in range(delta)
+                ]
+                self.scheduled[name].extend(instances)
+            outcomes[name] = {'instances': instances}
+
+        return mock.Mock(**{'json.return_value': outcomes})
+
+    def children(self):
+        """Return scheduled instances (children of /scheduled)."""
+        return list(itertools.chain.from_iterable(self.scheduled.values()))
+
+
+def reevaluate(monitors_count, count):
+    """Scale up, then scale down all monitors, then change a few apps."""
+    print('monitors: %s, count: %s' % (monitors_count, count))
+
+    cell = _Cell()
+    state = {
+        'scheduled': {},
+        'instances': set(),
+        'dirty': set(),
+        'monitors': {
+            'proid.app%s' % idx: {
+                'count': count,
+                'available': 2.0 * count,
+                'last_update': 0,
+                'policy': 'fifo',
+                'rate': 0,
+            }
+            for idx in range(monitors_count)
+        },
+        'suspended': {},
+    }
+    state['dirty'].update(state['monitors'])
+
+    def _reevaluate():
+        """Reevaluate monitors, output some stats."""
+        cell.requests = 0
+        appmonitor.reevaluate(
+            '/cellapi.sock', mock.Mock(), state, mock.Mock(), {}
+        )
+        print('requests: ', cell.requests,
+              ', scheduled: ', sum(len(v) for v in cell.scheduled.values()))
+
+    def _watch():
+        """Update scheduled index, as the /scheduled watch does."""
+        appmonitor.update_scheduled(state, cell.children())
+
+    with mock.patch('treadmill.restclient.post', cell.post), \
+            mock.patch('treadmill.zkutils.update', mock.Mock()):
+        interval = timeit.timeit(stmt=_reevaluate, number=1)
+        print('scale up time  :', interval)
+        interval = timeit.timeit(stmt=_watch, number=1)
+        print('watch time  :', interval)
+
+        for name, monitor in state['monitors'].items():
+            monitor['count'] = count // 2
+            state['dirty'].add(name)
+        interval = timeit.timeit(stmt=_reevaluate, number=1)
+        print('scale down time  :', interval)
+        _watch()
+        _reevaluate()
+
+        # Steady state, an instance of a few apps is deleted.
+        for idx in range(10):
+            cell.scheduled['proid.app%s' % idx].pop()
+        interval = timeit.timeit(stmt=_watch, number=1)
+        print('watch time  :', interval)
+        interval = timeit.timeit(stmt=_reevaluate, number=1)
+        print('steady state time  :', interval)
+
+
+if __name__ == '__main__':
+    reevaluate(10000, 4)
+    reevaluate(50000, 8)
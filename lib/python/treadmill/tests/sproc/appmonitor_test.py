@@ -6,6 +6,7 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import threading
 import time
 import unittest
 
@@ -19,6 +20,34 @@ from treadmill import zkutils
 from treadmill.sproc import appmonitor
 
 
+def _scale_response(reason=None):
+    """Return bulk scale mock, with the same outcome for all the apps."""
+
+    def _post(_api, _path, payload, headers):
+        del headers
+        if reason is None:
+            outcome = {'instances': []}
+        else:
+            outcome = {'_error': {'why': 'xxx', 'reason': reason}}
+
+        response = mock.Mock()
+        response.json.return_value = {
+            name: outcome for name in payload['plan']
+        }
+        return response
+
+    return _post
+
+
+def _scale_call(plan):
+    """Return bulk scale call."""
+    return mock.call(
+        ['/cellapi.sock'],
+        '/instance/_bulk/scale', payload={'plan': plan},
+        headers={'X-Treadmill-Trusted-Agent': 'monitor'}
+    )
+
+
 class AppMonitorTest(unittest.TestCase):
     """Test treadmill.sproc.appmonitor"""
 
@@ -50,20 +79,22 @@ class AppMonitorTest(unittest.TestCase):
                 },
             },
             'suspended': {},
+            'dirty': {'foo.bar', 'foo.baz'},
+            'lock': threading.Lock(),
         }
 
         time.time.return_value = 101
+        restclient.post.side_effect = _scale_response()
 
         appmonitor.reevaluate('/cellapi.sock', alerter, state, zkclient, {})
         self.assertFalse(restclient.post.called)
         self.assertFalse(alerter.called)
 
         state['scheduled']['foo.baz'].append('foo.baz#5')
+        state['dirty'].add('foo.baz')
         appmonitor.reevaluate('/cellapi.sock', alerter, state, zkclient, {})
-        restclient.post.assert_called_with(
-            ['/cellapi.sock'],
-            '/instance/_bulk/delete', payload={'instances': ['foo.baz#3']},
-            headers={'X-Treadmill-Trusted-Agent': 'monitor'}
+        self.assertEqual(
+            restclient.post.call_args, _scale_call({'foo.baz': ['foo.baz#3']})
         )
         self.assertFalse(alerter.called)
 
@@ -80,6 +111,7 @@ class AppMonitorTest(unittest.TestCase):
 
         time.time.return_value = 102
         state['scheduled']['foo.bar'] = []
+        state['dirty'].add('foo.bar')
         appmonitor.reevaluate('/cellapi.sock', alerter, state, zkclient, {})
         self.assertEqual(102, state['monitors']['foo.bar']['last_update'])
         self.assertEqual(2.0, state['monitors']['foo.bar']['available'])
@@ -90,6 +122,7 @@ class AppMonitorTest(unittest.TestCase):
 
         time.time.return_value = 103
         state['scheduled']['foo.bar'] = ['foo.bar#5', 'foo.bar#6']
+        state['dirty'].add('foo.bar')
         appmonitor.reevaluate('/cellapi.sock', alerter, state, zkclient, {})
         self.assertEqual(103, state['monitors']['foo.bar']['last_update'])
         self.assertEqual(3.0, state['monitors']['foo.bar']['available'])
@@ -98,22 +131,19 @@ class AppMonitorTest(unittest.TestCase):
         restclient.post.reset_mock()
 
         state['scheduled']['foo.bar'] = []
+        state['dirty'].add('foo.bar')
 
         appmonitor.reevaluate('/cellapi.sock', alerter, state, zkclient, {})
-        restclient.post.assert_called_with(
-            ['/cellapi.sock'],
-            '/instance/foo.bar?count=2', payload={},
-            headers={'X-Treadmill-Trusted-Agent': 'monitor'}
+        self.assertEqual(
+            restclient.post.call_args, _scale_call({'foo.bar': 2})
         )
         self.assertFalse(alerter.called)
         self.assertEqual(1.0, state['monitors']['foo.bar']['available'])
 
         last_waited = appmonitor.reevaluate(
             '/cellapi.sock', alerter, state, zkclient, {})
-        restclient.post.assert_called_with(
-            ['/cellapi.sock'],
-            '/instance/foo.bar?count=1', payload={},
-            headers={'X-Treadmill-Trusted-Agent': 'monitor'}
+        self.assertEqual(
+            restclient.post.call_args, _scale_call({'foo.bar': 1})
         )
         self.assertFalse(alerter.called)
         self.assertEqual(0.0, state['monitors']['foo.bar']['available'])
@@ -123,6 +153,7 @@ class AppMonitorTest(unittest.TestCase):
         restclient.post.reset_mock()
 
         state['scheduled']['foo.bar'] = []
+        state['dirty'].add('foo.bar')
         last_waited = appmonitor.reevaluate(
             '/cellapi.sock', alerter, state, zkclient, {})
         self.assertFalse(restclient.post.called)
@@ -134,10 +165,8 @@ class AppMonitorTest(unittest.TestCase):
         time.time.return_value = 104
         last_waited = appmonitor.reevaluate(
             '/cellapi.sock', alerter, state, zkclient, last_waited)
-        restclient.post.assert_called_with(
-            ['/cellapi.sock'],
-            '/instance/foo.bar?count=1', payload={},
-            headers={'X-Treadmill-Trusted-Agent': 'monitor'}
+        self.assertEqual(
+            restclient.post.call_args, _scale_call({'foo.bar': 1})
         )
         alerter.assert_called_with(
             'foo.bar', 'Monitor active again', status='clear'
@@ -166,11 +195,13 @@ class AppMonitorTest(unittest.TestCase):
                 },
             },
             'suspended': {},
+            'dirty': {'foo.bar'},
+            'lock': threading.Lock(),
         }
 
         time.time.return_value = 101
 
-        restclient.post.side_effect = restclient.NotFoundError('xxx')
+        restclient.post.side_effect = _scale_response('not_found')
 
         appmonitor.reevaluate('/cellapi.sock', alerter, state, zkclient, {})
         self.assertTrue(restclient.post.called)
@@ -216,8 +247,7 @@ class AppMonitorTest(unittest.TestCase):
         # be removed from delay dict.
         alerter.reset_mock()
         restclient.post.reset_mock()
-        restclient.post.return_value = ()
-        restclient.post.side_effect = None
+        restclient.post.side_effect = _scale_response()
         time.time.return_value = 500 + 300 + 1
         last_waited = appmonitor.reevaluate(
             '/cellapi.sock', alerter, state, zkclient, last_waited)
@@ -231,6 +261,161 @@ class AppMonitorTest(unittest.TestCase):
         )
         self.assertEqual(last_waited, {})
 
+    @mock.patch('time.time', mock.Mock(return_value=101))
+    @mock.patch('treadmill.restclient.post', mock.Mock())
+    @mock.patch('treadmill.zkutils.update', mock.Mock())
+    def test_reevaluate_bulk(self):
+        """Test scaling the apps in a single request per proid."""
+        zkclient = mock.Mock()
+        alerter = mock.Mock()
+
+        state = {
+            'scheduled': {
+                'foo.bar': [],
+                'foo.baz': ['foo.baz#1', 'foo.baz#2'],
+                'bar.qux': [],
+            },
+            'monitors': {
+                name: {
+                    'count': 1,
+                    'available': 2,
+                    'rate': 1.0,
+                    'last_update': 101,
+                }
+                for name in ['foo.bar', 'foo.baz', 'bar.qux']
+            },
+            'suspended': {},
+            'dirty': {'foo.bar', 'foo.baz', 'bar.qux'},
+            'lock': threading.Lock(),
+        }
+
+        def _post(_api, _path, payload, headers):
+            del headers
+            outcomes = {
+                'foo.bar': {'instances': ['foo.bar#3']},
+                'foo.baz': {'instances': ['foo.baz#1']},
+                'bar.qux': {'_error': {'why': 'xxx', 'reason': 'invalid'}},
+            }
+            response = mock.Mock()
+            response.json.return_value = {
+                name: outcomes[name] for name in payload['plan']
+            }
+            return response
+
+        restclient.post.side_effect = _post
+
+        appmonitor.reevaluate('/cellapi.sock', alerter, state, zkclient, {})
+        self.assertEqual(restclient.post.call_args_list, [
+            _scale_call({'bar.qux': 1}),
+            _scale_call({
+                'foo.bar': 1,
+                'foo.baz': ['foo.baz#1'],
+            }),
+        ])
+        self.assertEqual(state['monitors']['foo.bar']['available'], 1)
+        self.assertEqual(state['monitors']['bar.qux']['available'], 2)
+        self.assertEqual(state['suspended'], {'bar.qux': float(101 + 300)})
+        alerter.assert_called_once_with(
+            'bar.qux', 'Monitor suspended: Unable to start'
+        )
+
+        # Failed request, nothing is changed.
+        restclient.post.side_effect = restclient.MaxRequestRetriesError(5)
+        alerter.reset_mock()
+        state['suspended'] = {}
+        appmonitor.reevaluate('/cellapi.sock', alerter, state, zkclient, {})
+        self.assertEqual(state['monitors']['foo.bar']['available'], 1)
+        self.assertEqual(state['suspended'], {})
+        self.assertFalse(alerter.called)
+
+    def test_update_scheduled(self):
+        """Test incremental update of the scheduled instances index."""
+        state = {
+            'scheduled': {},
+            'instances': set(),
+            'dirty': set(),
+            'lock': threading.Lock(),
+        }
+
+        appmonitor.update_scheduled(
+            state, ['foo.bar#2', 'foo.baz#3', 'foo.bar#1']
+        )
+        self.assertEqual(state['scheduled'], {
+            'foo.bar': ['foo.bar#1', 'foo.bar#2'],
+            'foo.baz': ['foo.baz#3'],
+        })
+        self.assertEqual(state['dirty'], {'foo.bar', 'foo.baz'})
+
+        state['dirty'].clear()
+        appmonitor.update_scheduled(
+            state, ['foo.bar#2', 'foo.bar#1', 'foo.qux#4']
+        )
+        self.assertEqual(state['scheduled'], {
+            'foo.bar': ['foo.bar#1', 'foo.bar#2'],
+            'foo.qux': ['foo.qux#4'],
+        })
+        self.assertEqual(state['dirty'], {'foo.baz', 'foo.qux'})
+
+    def test_update_scheduled_locked(self):
+        """Test the index is not updated while reevaluate holds the lock."""
+        state = {
+            'scheduled': {},
+            'instances': set(),
+            'dirty': set(),
+            'lock': threading.Lock(),
+        }
+
+        with state['lock']:
+            watch = threading.Thread(
+                target=appmonitor.update_scheduled,
+                args=(state, ['foo.bar#1'])
+            )
+            watch.start()
+            watch.join(0.1)
+            self.assertTrue(watch.is_alive())
+            self.assertEqual(state['dirty'], set())
+
+        watch.join()
+        self.assertEqual(state['scheduled'], {'foo.bar': ['foo.bar#1']})
+        self.assertEqual(state['dirty'], {'foo.bar'})
+
+    @mock.patch('time.time', mock.Mock(return_value=101))
+    @mock.patch('treadmill.restclient.post', mock.Mock())
+    def test_reevaluate_dirty(self):
+        """Test only dirty apps are reevaluated."""
+        state = {
+            'scheduled': {'foo.bar': [], 'foo.baz': []},
+            'monitors': {
+                name: {
+                    'count': 1,
+                    'available': 2,
+                    'rate': 1.0,
+                    'last_update': 100,
+                }
+                for name in ['foo.bar', 'foo.baz']
+            },
+            'suspended': {},
+            'dirty': {'foo.bar', 'foo.old'},
+            'lock': threading.Lock(),
+        }
+        restclient.post.side_effect = _scale_response()
+
+        appmonitor.reevaluate(
+            '/cellapi.sock', mock.Mock(), state, mock.Mock(), {}
+        )
+        self.assertEqual(
+            restclient.post.call_args, _scale_call({'foo.bar': 1})
+        )
+        # Tokens of clean apps are not refilled until they are reevaluated.
+        self.assertEqual(state['monitors']['foo.baz']['last_update'], 100)
+        self.assertEqual(state['dirty'], {'foo.bar'})
+
+        state['scheduled']['foo.bar'] = ['foo.bar#1']
+        appmonitor.reevaluate(
+            '/cellapi.sock', mock.Mock(), state, mock.Mock(), {}
+        )
+        self.assertEqual(state['dirty'], set())
+
     @mock.patch('time.time', mock.Mock())
     @mock.patch('treadmill.restclient.post', mock.Mock())
     @mock.patch('treadmill.restclient.delete', mock.Mock())
@@ -252,8 +437,11 @@ class AppMonitorTest(unittest.TestCase):
                 },
             },
             'suspended': {},
+            'dirty': {'foo.bar'},
+            'lock': threading.Lock(),
         }
         time.time.return_value = 101
+        restclient.post.side_effect = _scale_response()
         parametrizes = (
             ('fifo', 'foo.bar#3', 'foo.bar#1', True),
             ('lifo', 'foo.bar#4', 'foo.bar#4', True),
@@ -263,15 +451,15 @@ class AppMonitorTest(unittest.TestCase):
         for (policy, created, deleted, api_is_called) in parametrizes:
             state['monitors']['foo.bar']['policy'] = policy
             state['scheduled']['foo.bar'].append(created)
+            state['dirty'].add('foo.bar')
             appmonitor.reevaluate(
                 '/cellapi.sock', alerter, state, zkclient, {}
             )
 
             if api_is_called:
-                restclient.post.assert_called_with(
-                    ['/cellapi.sock'],
-                    '/instance/_bulk/delete', payload={'instances': [deleted]},
-                    headers={'X-Treadmill-Trusted-Agent': 'monitor'}
+                self.assertEqual(
+                    restclient.post.call_args,
+                    _scale_call({'foo.bar': [deleted]})
                 )
                 state['scheduled']['foo.bar'].remove(deleted)
                 restclient.post.reset_mock()
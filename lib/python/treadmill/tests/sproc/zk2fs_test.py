@@ -6,8 +6,14 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import io
 import os
+import shutil
+import sqlite3
+import tempfile
 import unittest
+import zlib
+
 import mock
 
 import kazoo
@@ -16,12 +22,20 @@ import kazoo
 import treadmill.tests.treadmill_test_skip_windows  # pylint: disable=W0611
 
 from treadmill.sproc import zk2fs
+from treadmill.zksync import sowdb
 from treadmill.zksync import utils
 
 
 class Zk2FsTest(unittest.TestCase):
     """Test treadmill.sproc.zk2fs"""
 
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        if self.root and os.path.isdir(self.root):
+            shutil.rmtree(self.root)
+
     @mock.patch('treadmill.sproc.zk2fs.fs', mock.Mock())
     def test_on_add_identity(self):
         """Test _on_add_identity()"""
@@ -46,6 +60,55 @@ class Zk2FsTest(unittest.TestCase):
         # exception should be handled
         zk2fs._on_add_identity(zksync_mock, '/foo/bar', True)
 
+    def test_on_add_del_trace_db(self):
+        """Test _on_add_trace_db() and _on_del_trace_db() with sow index."""
+        # pylint: disable=protected-access
+        db_file = os.path.join(self.root, 'snapshot')
+        conn = sqlite3.connect(db_file)
+        conn.execute(
+            'CREATE TABLE trace (path text, timestamp real, data text, '
+            'directory text, name text)'
+        )
+        conn.execute(
+            'INSERT INTO trace VALUES (?, ?, ?, ?, ?)',
+            ('/trace/0001/a,1', 1.0, None, '/trace/0001', 'a,1')
+        )
+        conn.commit()
+        conn.close()
+        with io.open(db_file, 'rb') as f:
+            data = zlib.compress(f.read())
+
+        sow_dir = os.path.join(self.root, 'sow')
+        os.mkdir(sow_dir)
+        zksync_mock = mock.Mock()
+        zksync_mock.tmp_dir = self.root
+        zksync_mock.zkclient.get.return_value = (data, None)
+        zksync_mock.fpath.return_value = os.path.join(self.root, 'node')
+
+        zk2fs._on_add_trace_db(
+            zksync_mock, '/trace.history/trace.db.gzip-0000000001', sow_dir
+        )
+
+        db_path = os.path.join(sow_dir, 'trace.db.gzip-0000000001')
+        self.assertTrue(os.path.exists(db_path))
+        self.assertEqual(
+            sowdb.read_index(db_path),
+            {
+                'trace': {
+                    'count': 1,
+                    'min_ts': 1.0,
+                    'max_ts': 1.0,
+                    'min_name': 'a,1',
+                    'max_name': 'a,1',
+                }
+            }
+        )
+
+        zk2fs._on_del_trace_db(
+            zksync_mock, '/trace.history/trace.db.gzip-0000000001', sow_dir
+        )
+        self.assertEqual(os.listdir(sow_dir), [])
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,127 @@
+"""Unit test for native s6 control.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import errno
+import io
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+
+# Disable W0611: Unused import
+import treadmill.tests.treadmill_test_skip_windows  # pylint: disable=W0611
+
+from treadmill.supervisor.s6 import control
+
+
+def _status(pid, flags=0, pgid=None):
+    """Pack a supervise status."""
+    stamp = 2 ** 62 + 10 + 1500000000
+    if pgid is None:
+        return struct.pack('>QIQIQHB', stamp, 5, stamp, 0, pid, 0, flags)
+    return struct.pack('>QIQIQQHB', stamp, 5, stamp, 0, pid, pgid, 0, flags)
+
+
+class S6ControlTest(unittest.TestCase):
+    """Tests for treadmill.supervisor.s6.control."""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.svc_dir = os.path.join(self.root, 'svc')
+        os.makedirs(os.path.join(self.svc_dir, 'supervise'))
+        os.makedirs(os.path.join(self.svc_dir, 'event'))
+        self.control = os.path.join(self.svc_dir, 'supervise', 'control')
+        os.mkfifo(self.control)
+        self.reader = None
+
+    def tearDown(self):
+        if self.reader is not None:
+            os.close(self.reader)
+        if self.root and os.path.isdir(self.root):
+            shutil.rmtree(self.root)
+
+    def _supervise(self):
+        """Act as the supervisor, listening on the control fifo."""
+        self.reader = os.open(self.control, os.O_RDONLY | os.O_NONBLOCK)
+
+    def _write_status(self, data):
+        with io.open(os.path.join(self.svc_dir, 'supervise', 'status'),
+                     'wb') as f:
+            f.write(data)
+
+    def test_read_status(self):
+        """Test parsing the supervise status formats."""
+        self._write_status(_status(123, flags=0x04 | 0x08))
+        status = control.read_status(self.svc_dir)
+        self.assertEqual(status.pid, 123)
+        self.assertEqual(status.stamp, 1500000000.000000005)
+        self.assertTrue(status.want_up)
+        self.assertTrue(status.ready)
+        self.assertFalse(status.finishing)
+        self.assertFalse(status.paused)
+
+        self._write_status(_status(0, flags=0x02, pgid=42))
+        status = control.read_status(self.svc_dir)
+        self.assertEqual(status.pid, 0)
+        self.assertTrue(status.finishing)
+
+        self._write_status(b'garbage')
+        with self.assertRaises(ValueError):
+            control.read_status(self.svc_dir)
+
+    def test_svok(self):
+        """Test checking if a service is supervised."""
+        self.assertFalse(control.svok(self.svc_dir))
+
+        self._supervise()
+        self.assertTrue(control.svok(self.svc_dir))
+
+        with self.assertRaises(OSError) as ctx:
+            control.svok(self.root)
+        self.assertEqual(ctx.exception.errno, errno.ENOENT)
+
+    def test_svc(self):
+        """Test sending actions to the supervisor."""
+        with self.assertRaises(OSError) as ctx:
+            control.svc(self.svc_dir, 'd')
+        self.assertEqual(ctx.exception.errno, errno.ENXIO)
+
+        self._supervise()
+        control.svc(self.svc_dir, 'uO')
+        self.assertEqual(os.read(self.reader, 10), b'uO')
+
+    def test_wait(self):
+        """Test waiting on services state."""
+        self._write_status(_status(123))
+        self.assertTrue(control.wait([self.svc_dir], 'u'))
+        self.assertFalse(control.wait([self.svc_dir], 'U', timeout=10))
+        self.assertFalse(control.wait([self.svc_dir], 'd', timeout=10))
+        # The event subscription is cleaned up.
+        self.assertEqual(os.listdir(os.path.join(self.svc_dir, 'event')), [])
+
+    def test_event_listener(self):
+        """Test receiving supervisor events."""
+        with control.EventListener([self.svc_dir]) as listener:
+            fifos = os.listdir(os.path.join(self.svc_dir, 'event'))
+            self.assertEqual(len(fifos), 1)
+            self.assertTrue(fifos[0].startswith('ftrig1'))
+            self.assertEqual(listener.wait(0), '')
+
+            # Notify as s6-supervise does.
+            fd = os.open(os.path.join(self.svc_dir, 'event', fifos[0]),
+                         os.O_WRONLY | os.O_NONBLOCK)
+            os.write(fd, b'd')
+            os.close(fd)
+            self.assertEqual(listener.wait(1), 'd')
+
+        self.assertEqual(os.listdir(os.path.join(self.svc_dir, 'event')), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
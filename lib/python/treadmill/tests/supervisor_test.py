@@ -269,6 +269,38 @@ class SupervisorTest(unittest.TestCase):
                 timeout=100,
             )
 
+    @unittest.skipUnless(sys.platform.startswith('linux'), 'Requires Linux')
+    @mock.patch('treadmill.subproc.check_call', mock.Mock(spec_set=True))
+    def test_control_service_native(self):
+        """Tests controlling a service through the supervise control fifo.
+        """
+        control = os.path.join(self.root, 'supervise', 'control')
+        os.makedirs(os.path.dirname(control))
+        os.mkfifo(control)
+
+        # No supervisor listening.
+        with self.assertRaises(subproc.CalledProcessError) as ctx:
+            supervisor.control_service(
+                self.root, supervisor.ServiceControlAction.down
+            )
+        self.assertEqual(ctx.exception.returncode, supervisor.ERR_NO_SUP)
+        self.assertFalse(supervisor.is_supervised(self.root))
+
+        reader = os.open(control, os.O_RDONLY | os.O_NONBLOCK)
+        try:
+            self.assertTrue(supervisor.is_supervised(self.root))
+            self.assertTrue(supervisor.control_service(
+                self.root, (
+                    supervisor.ServiceControlAction.up,
+                    supervisor.ServiceControlAction.once_at_most,
+                )
+            ))
+            self.assertEqual(os.read(reader, 10), b'uO')
+        finally:
+            os.close(reader)
+
+        treadmill.subproc.check_call.assert_not_called()
+
     @mock.patch('treadmill.subproc.check_call', mock.Mock(spec_set=True))
     def test_control_svscan(self):
         """Tests controlling an svscan instance.
@@ -0,0 +1,55 @@
+"""Unit test for inotify python wrapper.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import struct
+import unittest
+
+# Disable W0611: Unused import
+import treadmill.tests.treadmill_test_skip_windows   # pylint: disable=W0611
+
+from treadmill.syscall import inotify
+
+
+def _event(wd, mask, cookie, name):
+    """Pack an inotify_event with a null padded name."""
+    if name:
+        name += b'\x00' * (16 - len(name) % 16)
+    return struct.pack('iIII', wd, mask, cookie, len(name)) + name
+
+
+class InotifyTest(unittest.TestCase):
+    """Tests inotify module."""
+
+    def test_parse_buffer(self):
+        """Tests parsing an inotify event buffer."""
+        # pylint: disable=protected-access
+        event_buffer = b''.join([
+            _event(1, inotify.IN_CREATE, 0, b'foo'),
+            _event(1, inotify.IN_CLOSE_WRITE, 0, b'a' * 16),
+            _event(2, inotify.IN_DELETE_SELF, 0, b''),
+            _event(1, inotify.IN_MOVED_TO, 42, b'bar'),
+        ])
+
+        self.assertEqual(
+            list(inotify._parse_buffer(event_buffer)),
+            [
+                (1, inotify.IN_CREATE, 0, b'foo'),
+                (1, inotify.IN_CLOSE_WRITE, 0, b'a' * 16),
+                (2, inotify.IN_DELETE_SELF, 0, b''),
+                (1, inotify.IN_MOVED_TO, 42, b'bar'),
+            ]
+        )
+
+        self.assertEqual(list(inotify._parse_buffer(b'')), [])
+
+        with self.assertRaises(AssertionError):
+            list(inotify._parse_buffer(event_buffer + b'\x00'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,31 @@
+"""Unit test for setns python wrapper.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import errno
+import unittest
+
+# Disable W0611: Unused import
+import treadmill.tests.treadmill_test_skip_windows   # pylint: disable=W0611
+
+from treadmill.syscall import setns
+from treadmill.syscall import unshare
+
+
+class SetnsTest(unittest.TestCase):
+    """Tests setns wrapper."""
+
+    def test_setns_error(self):
+        """Verifies errors are raised as OSError."""
+        with self.assertRaises(OSError) as ctx:
+            setns.setns(-1, unshare.CLONE_NEWNET)
+
+        self.assertEqual(ctx.exception.errno, errno.EBADF)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -30,6 +30,7 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 import copy
+import itertools
 import threading
 import time
 import unittest
@@ -37,6 +38,7 @@ import unittest
 from collections import namedtuple
 
 import kazoo
+import mock
 from kazoo.protocol import states
 from six.moves import queue
 
@@ -107,6 +109,132 @@ class MockZookeeperMetadata(namedtuple('MockZookeeperMetadata',
                    children_count=children_count)
 
 
+class MockAsyncResult:
+    """Mock kazoo async result, calls the sync function on get()."""
+
+    def __init__(self, func, *args, **kwargs):
+        self._func = func
+        self._args = args
+        self._kwargs = kwargs
+
+    def get(self, block=True, timeout=None):
+        """Return the result (or raise the exception) of the call."""
+        del block
+        del timeout
+        return self._func(*self._args, **self._kwargs)
+
+
+class MockTransaction:
+    """Mock kazoo transaction, supporting create and delete operations.
+
+    On commit, the operations are applied with the (mocked) client create and
+    delete if all of them are valid, otherwise nothing is applied and the
+    results are errors.
+    """
+
+    def __init__(self, exists):
+        self._exists = exists
+        self._ops = []
+
+    def create(self, path, value=b'', acl=None, ephemeral=False,
+               sequence=False):
+        """Add create operation to the transaction."""
+        del sequence
+        self._ops.append(('create', path, dict(
+            value=value, acl=acl, ephemeral=ephemeral
+        )))
+
+    def delete(self, path, version=-1):
+        """Add delete operation to the transaction."""
+        del version
+        self._ops.append(('delete', path, None))
+
+    def _error(self, op, path):
+        """Return the error of the operation (or None if it is valid)."""
+        if op == 'delete':
+            if not self._exists(path):
+                return kazoo.client.NoNodeError()
+        else:
+            parent = path.rsplit('/', 1)[0]
+            if self._exists(path):
+                return kazoo.client.NodeExistsError()
+            if parent and not self._exists(parent):
+                return kazoo.client.NoNodeError()
+        return None
+
+    def commit(self):
+        """Commit the transaction."""
+        errors = [self._error(op, path) for op, path, _kwargs in self._ops]
+        if any(errors):
+            return [
+                error or kazoo.exceptions.RolledBackError()
+                for error in errors
+            ]
+
+        for op, path, kwargs in self._ops:
+            if op == 'create':
+                kazoo.client.KazooClient.create(path, **kwargs)
+            else:
+                kazoo.client.KazooClient.delete(path)
+        return [True] * len(self._ops)
+
+
+def make_mock_zkclient():
+    """Return Zookeeper client mock, with nodes stored in a flat dict.
+
+    The nodes dict, path to data, is available as ``zkclient.nodes``.
+    """
+    nodes = {}
+    czxids = {}
+    seq = itertools.count()
+    zxid = itertools.count()
+
+    def _create(path, value=b'', acl=None, ephemeral=False, sequence=False,
+                makepath=False):
+        del acl, ephemeral, makepath
+        if sequence:
+            path += '%010d' % next(seq)
+        if path in nodes:
+            raise kazoo.client.NodeExistsError()
+        nodes[path] = value
+        czxids[path] = next(zxid)
+        return path
+
+    def _get(path):
+        if path not in nodes:
+            raise kazoo.client.NoNodeError()
+        return nodes[path], None
+
+    def _exists(path):
+        if path not in nodes:
+            return None
+        return MockZookeeperMetadata.from_dict({'czxid': czxids[path]})
+
+    def _get_children(path):
+        children = [
+            node[len(path) + 1:].split('/')[0]
+            for node in nodes if node.startswith(path + '/')
+        ]
+        if not children and path not in nodes:
+            raise kazoo.client.NoNodeError()
+        return sorted(set(children))
+
+    def _delete(path):
+        if path not in nodes:
+            raise kazoo.client.NoNodeError()
+        del nodes[path]
+        del czxids[path]
+
+    zkclient = mock.Mock()
+    zkclient.nodes = nodes
+    zkclient.create.side_effect = _create
+    zkclient.get.side_effect = _get
+    zkclient.exists.side_effect = _exists
+    zkclient.get_children.side_effect = _get_children
+    zkclient.delete.side_effect = _delete
+    return zkclient
+
+
 class MockZookeeperTestCase(unittest.TestCase):
     """Helper class to mock Zk get[children] events."""
     # Disable too many branches warning.
@@ -167,6 +295,29 @@ class MockZookeeperTestCase(unittest.TestCase):
                 raise kazoo.client.NoNodeError()
             del content[last]
 
+        def mock_create(zkpath, value=b'', acl=None, ephemeral=False,
+                        sequence=False, makepath=False):
+            """Mocks node creation."""
+            del acl, ephemeral, sequence
+
+            path = zkpath.split('/')
+            path.pop(0)
+            last = path.pop(-1)
+            content = zk_content
+            while path:
+                path_component = path.pop(0)
+                if path_component not in content:
+                    if not makepath:
+                        raise kazoo.client.NoNodeError()
+                    content[path_component] = {}
+
+                content = content[path_component]
+
+            if last in content:
+                raise kazoo.client.NodeExistsError()
+            content[last] = value
+            return zkpath
+
         def mock_get(zkpath, watch=None):
             """Traverse data recursively, return the node content."""
             path = zkpath.split('/')
@@ -222,6 +373,28 @@ class MockZookeeperTestCase(unittest.TestCase):
             else:
                 return []
 
+        def mock_get_async(zkpath, watch=None):
+            """Mocks async get, the result is evaluated lazily."""
+            return MockAsyncResult(mock_get, zkpath, watch=watch)
+
+        def mock_exists_async(zkpath, watch=None):
+            """Mocks async exists, returns the node stat or None."""
+            def _exists():
+                try:
+                    return mock_get(zkpath, watch=watch)[1]
+                except kazoo.client.NoNodeError:
+                    return None
+            return MockAsyncResult(_exists)
+
+        def mock_get_children_async(zkpath, watch=None, include_data=False):
+            """Mocks async get_children, the result is evaluated lazily."""
+            del include_data
+            return MockAsyncResult(mock_get_children, zkpath, watch=watch)
+
+        def mock_transaction():
+            """Mocks transaction."""
+            return MockTransaction(mock_exists)
+
         if events:
             self.watch_events = queue.Queue()
 
@@ -249,9 +422,15 @@ class MockZookeeperTestCase(unittest.TestCase):
 
         side_effects = [
             (kazoo.client.KazooClient.exists, mock_exists),
+            (kazoo.client.KazooClient.exists_async, mock_exists_async),
             (kazoo.client.KazooClient.get, mock_get),
+            (kazoo.client.KazooClient.get_async, mock_get_async),
+            (kazoo.client.KazooClient.create, mock_create),
             (kazoo.client.KazooClient.delete, mock_delete),
-            (kazoo.client.KazooClient.get_children, mock_get_children)]
+            (kazoo.client.KazooClient.transaction, mock_transaction),
+            (kazoo.client.KazooClient.get_children, mock_get_children),
+            (kazoo.client.KazooClient.get_children_async,
+             mock_get_children_async)]
 
         for mthd, side_effect in side_effects:
             try:
@@ -453,6 +453,52 @@ class AppTraceEventsTest(unittest.TestCase):
             )
         )
 
+    def test_started(self):
+        """Started event operations.
+        """
+        event = events.StartedTraceEvent(
+            timestamp=1,
+            source='tests',
+            instanceid='proid.foo#123',
+            uniqueid='AAAA',
+            duration=12.3456,
+            payload={'foo': 'bar'}
+        )
+        self.assertEqual(
+            event.to_dict(),
+            {
+                'event_type': 'started',
+                'timestamp': 1,
+                'source': 'tests',
+                'instanceid': 'proid.foo#123',
+                'uniqueid': 'AAAA',
+                'duration': 12.3456,
+                'payload': {'foo': 'bar'},
+            }
+        )
+        self.assertEqual(
+            event.to_data(),
+            (
+                1,
+                'tests',
+                'proid.foo#123',
+                'started',
+                'AAAA.12.346',
+                {'foo': 'bar'},
+            )
+        )
+        self.assertEqual(
+            events.StartedTraceEvent.from_data(
+                timestamp=1,
+                source='tests',
+                instanceid='proid.foo#123',
+                event_type='started',
+                event_data='AAAA.12.346',
+                payload={'foo': 'bar'}
+            ).duration,
+            12.346
+        )
+
     def test_service_running(self):
         """ServiceRunning event operations.
         """
@@ -9,7 +9,6 @@ from __future__ import unicode_literals
 import json
 import unittest
 import time
-import sqlite3
 
 import kazoo
 import kazoo.client
@@ -17,6 +16,8 @@ import mock
 
 import treadmill
 from treadmill import zkutils
+from treadmill.trace import _zk
+from treadmill.trace import history
 from treadmill.trace.app import zk
 
 from treadmill.tests.testutils import mockzk
@@ -139,6 +140,7 @@ class AppTraceZKTest(mockzk.MockZookeeperTestCase):
         self.assertFalse(zkutils.ensure_deleted.called)
 
     @mock.patch('kazoo.client.KazooClient.delete', mock.Mock())
+    @mock.patch('kazoo.client.KazooClient.transaction', mock.Mock())
     @mock.patch('kazoo.client.KazooClient.create', mock.Mock())
     @mock.patch('kazoo.client.KazooClient.exists', mock.Mock())
     @mock.patch('kazoo.client.KazooClient.get', mock.Mock())
@@ -195,6 +197,7 @@ class AppTraceZKTest(mockzk.MockZookeeperTestCase):
         ])
 
     @mock.patch('kazoo.client.KazooClient.delete', mock.Mock())
+    @mock.patch('kazoo.client.KazooClient.transaction', mock.Mock())
     @mock.patch('kazoo.client.KazooClient.create', mock.Mock())
     @mock.patch('kazoo.client.KazooClient.exists', mock.Mock())
     @mock.patch('kazoo.client.KazooClient.get', mock.Mock())
@@ -248,12 +251,12 @@ class AppTraceZKTest(mockzk.MockZookeeperTestCase):
         ])
 
     @mock.patch('kazoo.client.KazooClient.delete', mock.Mock())
+    @mock.patch('kazoo.client.KazooClient.transaction', mock.Mock())
     @mock.patch('kazoo.client.KazooClient.create', mock.Mock())
     @mock.patch('kazoo.client.KazooClient.exists', mock.Mock())
     @mock.patch('kazoo.client.KazooClient.get', mock.Mock())
     @mock.patch('kazoo.client.KazooClient.get_children', mock.Mock())
     @mock.patch('time.time', mock.Mock(return_value=1000))
-    @mock.patch('sqlite3.connect', mock.Mock())
     def test_trace_cleanup(self):
         """Test trace cleanup.
         """
@@ -307,9 +310,6 @@ class AppTraceZKTest(mockzk.MockZookeeperTestCase):
         self.make_mock_zk(zk_content)
         zkclient = treadmill.zkutils.ZkClient()
 
-        conn_mock = mock.MagicMock()
-        sqlite3.connect.return_value = conn_mock
-
         # Current time - 1000, expiration - 3 seconds, there are < 10 events
         # that are expired, nothing is uploaded.
         zk.cleanup_trace(zkclient, 10, 3)
@@ -321,13 +321,14 @@ class AppTraceZKTest(mockzk.MockZookeeperTestCase):
         time.time.return_value = 1100
         zk.cleanup_trace(zkclient, 10, 3)
 
-        conn_mock.executemany.assert_called_once_with(
-            """
-            INSERT INTO trace (
-                path, timestamp, data, directory, name
-            ) VALUES(?, ?, ?, ?, ?)
-            """,
-            [
+        data = kazoo.client.KazooClient.create.call_args[1]['value']
+        with history.Snapshot(data) as snapshot:
+            self.assertEqual(snapshot.table, 'trace')
+            rows = sorted(snapshot.rows())
+
+        self.assertEqual(
+            rows,
+            sorted([
                 ('/trace/0001/app1#0001,1000.00,s1,configured,2DqcoXnaIXEgy',
                  1000.0,
                  None,
@@ -378,7 +379,7 @@ class AppTraceZKTest(mockzk.MockZookeeperTestCase):
                  None,
                  '/trace/0002',
                  'app1#0002,1005.00,configured,2DqcoXnaIXEgy')
-            ]
+            ])
         )
 
         kazoo.client.KazooClient.create.assert_called_with(
@@ -403,12 +404,95 @@ class AppTraceZKTest(mockzk.MockZookeeperTestCase):
         ])
 
     @mock.patch('kazoo.client.KazooClient.delete', mock.Mock())
+    @mock.patch('kazoo.client.KazooClient.transaction', mock.Mock())
+    @mock.patch('kazoo.client.KazooClient.create', mock.Mock())
+    @mock.patch('kazoo.client.KazooClient.exists', mock.Mock())
+    @mock.patch('kazoo.client.KazooClient.get', mock.Mock())
+    @mock.patch('kazoo.client.KazooClient.get_children', mock.Mock())
+    @mock.patch('time.time', mock.Mock(return_value=2000))
+    def test_maintain_trace(self):
+        """Test pruning and cleanup of trace in a single scan.
+        """
+        zk_content = {
+            'scheduled': {
+                'app1#002': {},
+            },
+            'trace': {
+                '0001': {
+                    'app1#001,1000.0,s1,pending,evicted': {},
+                    'app1#001,1001.0,s1,scheduled,host1': {},
+                    'app1#001,1002.0,s1,pending,evicted': {},
+                    'app1#001,1003.0,s1,scheduled,host2': {},
+                },
+                '0002': {
+                    'app1#002,1000.0,s1,service_running,uniq1.service1': {},
+                    'app1#002,1001.0,s1,service_exited,uniq1.service1.0.0': {},
+                    'app1#002,1002.0,s1,service_running,uniq1.service1': {},
+                },
+            },
+            'trace.history': {
+            },
+        }
+
+        self.make_mock_zk(zk_content)
+        zkclient = treadmill.zkutils.ZkClient()
+
+        stats = zk.maintain_trace(zkclient, batch_size=2, expires_after=3,
+                                  evictions_max_count=1,
+                                  service_events_max_count=1)
+
+        # Each shard is listed once.
+        self.assertEqual(
+            kazoo.client.KazooClient.get_children.call_args_list,
+            [mock.call('/scheduled'), mock.call('/trace'),
+             mock.call('/trace/0001'), mock.call('/trace/0002')]
+        )
+        self.assertEqual(stats['events'], 7)
+        self.assertEqual(stats['pruned_evictions'], 2)
+        self.assertEqual(stats['pruned_service_events'], 2)
+        # Remaining events of the unscheduled instance are uploaded.
+        self.assertEqual(stats['uploaded'], 2)
+        self.assertEqual(zk_content['trace']['0001'], {})
+        self.assertEqual(
+            list(zk_content['trace']['0002']),
+            ['app1#002,1002.0,s1,service_running,uniq1.service1']
+        )
+
+    @mock.patch('kazoo.client.KazooClient.delete', mock.Mock())
+    @mock.patch('kazoo.client.KazooClient.transaction', mock.Mock())
+    @mock.patch('kazoo.client.KazooClient.get_children', mock.Mock())
+    def test_delete_batch(self):
+        """Test batched delete, falling back to deleting one by one.
+        """
+        zk_content = {
+            'trace': {
+                '0001': {
+                    'a': {},
+                    'b': {},
+                    'c': {},
+                },
+            },
+        }
+
+        self.make_mock_zk(zk_content)
+        zkclient = treadmill.zkutils.ZkClient()
+
+        _zk.delete_batch(zkclient, ['/trace/0001/a', '/trace/0001/b'])
+        self.assertEqual(kazoo.client.KazooClient.transaction.call_count, 1)
+        self.assertEqual(list(zk_content['trace']['0001']), ['c'])
+
+        # Node already deleted, the batch is rolled back.
+        _zk.delete_batch(zkclient, ['/trace/0001/a', '/trace/0001/c'])
+        self.assertEqual(kazoo.client.KazooClient.transaction.call_count, 2)
+        self.assertEqual(zk_content['trace']['0001'], {})
+
+    @mock.patch('kazoo.client.KazooClient.delete', mock.Mock())
+    @mock.patch('kazoo.client.KazooClient.transaction', mock.Mock())
     @mock.patch('kazoo.client.KazooClient.create', mock.Mock())
     @mock.patch('kazoo.client.KazooClient.exists', mock.Mock())
     @mock.patch('kazoo.client.KazooClient.get', mock.Mock())
     @mock.patch('kazoo.client.KazooClient.get_children', mock.Mock())
     @mock.patch('time.time', mock.Mock(return_value=1000))
-    @mock.patch('sqlite3.connect', mock.Mock())
     def test_finished_cleanup(self):
         """Test finished cleanup.
         """
@@ -445,9 +529,6 @@ class AppTraceZKTest(mockzk.MockZookeeperTestCase):
         self.make_mock_zk(zk_content)
         zkclient = treadmill.zkutils.ZkClient()
 
-        conn_mock = mock.MagicMock()
-        sqlite3.connect.return_value = conn_mock
-
         zk.cleanup_finished(zkclient, 10, 3)
         self.assertFalse(kazoo.client.KazooClient.create.called)
 
@@ -460,13 +541,14 @@ class AppTraceZKTest(mockzk.MockZookeeperTestCase):
         # There are twelve expired events, expect batch to be uploaded
         zk.cleanup_finished(zkclient, 5, 3)
 
-        conn_mock.executemany.assert_called_once_with(
-            """
-            INSERT INTO finished (
-                path, timestamp, data, directory, name
-            ) VALUES(?, ?, ?, ?, ?)
-            """,
-            [
+        data = kazoo.client.KazooClient.create.call_args[1]['value']
+        with history.Snapshot(data) as snapshot:
+            self.assertEqual(snapshot.table, 'finished')
+            rows = sorted(snapshot.rows())
+
+        self.assertEqual(
+            rows,
+            sorted([
                 ('/finished/app1#0001', 1000.0,
                  "{data: '1.0', host: foo, state: finished, when: '123.45'}\n",
                  '/finished', 'app1#0001'),
@@ -482,7 +564,7 @@ class AppTraceZKTest(mockzk.MockZookeeperTestCase):
                 ('/finished/app1#0005', 1000.0,
                  "{data: '1.0', host: foo, state: finished, when: '123.45'}\n",
                  '/finished', 'app1#0005')
-            ]
+            ])
         )
 
         kazoo.client.KazooClient.create.assert_called_with(
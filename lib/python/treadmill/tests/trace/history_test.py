@@ -0,0 +1,121 @@
+"""Unit test for trace history snapshots.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import io
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+import zlib
+
+import mock
+
+from treadmill.trace import history
+
+
+def _row(name, timestamp, data=None):
+    return ('/trace/0001/' + name, timestamp, data, '/trace/0001', name)
+
+
+_ROWS = [
+    _row('app1#003,1002.0,s1,scheduled,host1', 1002.0),
+    _row('app1#001,1000.0,s1,pending,created', 1000.0),
+    _row('app2#001,1003.0,s1,pending,created', 1003.0, 'x'),
+    _row('app1#002,1001.0,s1,pending,created', 1001.0),
+    _row('app1#001,1004.0,s1,scheduled,host2', 1004.0),
+]
+
+
+def _legacy_snapshot(table, rows):
+    """Create compressed sqlite snapshot."""
+    conn = sqlite3.connect(':memory:')
+    history.create_table(conn, table, rows)
+    data = zlib.compress(conn.serialize())
+    conn.close()
+    return data
+
+
+class HistoryTest(unittest.TestCase):
+    """Tests for treadmill.trace.history."""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        if self.root and os.path.isdir(self.root):
+            shutil.rmtree(self.root)
+
+    def test_snapshot(self):
+        """Test reading snapshot rows by name prefix."""
+        data = history.dumps('trace', _ROWS, block_size=2)
+        self.assertTrue(data.startswith(history.MAGIC))
+
+        with history.Snapshot(data) as snapshot:
+            self.assertFalse(snapshot.legacy)
+            self.assertEqual(snapshot.table, 'trace')
+            self.assertEqual(len(snapshot), 5)
+            self.assertEqual(len(snapshot.blocks), 3)
+
+            self.assertEqual(list(snapshot.rows()), sorted(_ROWS, key=str))
+            self.assertEqual(
+                [row.name for row in snapshot.rows(prefix='app1#001,')],
+                ['app1#001,1000.0,s1,pending,created',
+                 'app1#001,1004.0,s1,scheduled,host2']
+            )
+            self.assertEqual(
+                list(snapshot.rows(prefix='app2#')),
+                [_row('app2#001,1003.0,s1,pending,created', 1003.0, 'x')]
+            )
+            self.assertEqual(list(snapshot.rows(prefix='app3')), [])
+
+            # Only the matching blocks are decompressed.
+            with mock.patch('zlib.decompress',
+                            mock.Mock(wraps=zlib.decompress)):
+                list(snapshot.rows(prefix='app1#001,'))
+                self.assertEqual(zlib.decompress.call_count, 1)
+
+        with history.Snapshot(history.dumps('trace', [])) as snapshot:
+            self.assertEqual(list(snapshot.rows()), [])
+
+    def test_legacy_snapshot(self):
+        """Test reading legacy sqlite snapshots."""
+        data = _legacy_snapshot('trace', _ROWS)
+
+        with history.Snapshot(data, 'trace') as snapshot:
+            self.assertTrue(snapshot.legacy)
+            self.assertEqual(len(snapshot), 5)
+            self.assertEqual(list(snapshot.rows()), sorted(_ROWS, key=str))
+            self.assertEqual(
+                [row.name for row in snapshot.rows(prefix='app1#001,')],
+                ['app1#001,1000.0,s1,pending,created',
+                 'app1#001,1004.0,s1,scheduled,host2']
+            )
+
+    def test_write_sqlite(self):
+        """Test converting snapshots to sqlite DBs."""
+        for data in (history.dumps('trace', _ROWS),
+                     _legacy_snapshot('trace', _ROWS)):
+            db_path = os.path.join(self.root, 'trace.db')
+            io.open(db_path, 'wb').close()
+            history.write_sqlite(data, db_path)
+
+            conn = sqlite3.connect(db_path)
+            self.assertEqual(
+                conn.execute(
+                    'SELECT path, timestamp, data, directory, name '
+                    'FROM trace ORDER BY name'
+                ).fetchall(),
+                sorted(_ROWS, key=str)
+            )
+            conn.close()
+            os.unlink(db_path)
+
+
+if __name__ == '__main__':
+    unittest.main()
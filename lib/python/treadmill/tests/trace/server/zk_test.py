@@ -7,13 +7,13 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 import unittest
-import sqlite3
 
 import kazoo
 import kazoo.client
 import mock
 
 import treadmill
+from treadmill.trace import history
 from treadmill.trace.server import zk
 
 from treadmill.tests.testutils import mockzk
@@ -50,11 +50,11 @@ class ServerTraceZKTest(mockzk.MockZookeeperTestCase):
         )
 
     @mock.patch('kazoo.client.KazooClient.delete', mock.Mock())
+    @mock.patch('kazoo.client.KazooClient.transaction', mock.Mock())
     @mock.patch('kazoo.client.KazooClient.create', mock.Mock())
     @mock.patch('kazoo.client.KazooClient.exists', mock.Mock())
     @mock.patch('kazoo.client.KazooClient.get', mock.Mock())
     @mock.patch('kazoo.client.KazooClient.get_children', mock.Mock())
-    @mock.patch('sqlite3.connect', mock.Mock())
     def test_server_trace_cleanup(self):
         """Test server trace cleanup.
         """
@@ -77,9 +77,6 @@ class ServerTraceZKTest(mockzk.MockZookeeperTestCase):
         self.make_mock_zk(zk_content)
         zkclient = treadmill.zkutils.ZkClient()
 
-        conn_mock = mock.MagicMock()
-        sqlite3.connect.return_value = conn_mock
-
         # There are < 10 events, nothing is uploaded.
         zk.cleanup_server_trace(zkclient, 10)
         self.assertEqual(0, len(zk_content['server-trace.history']))
@@ -88,13 +85,14 @@ class ServerTraceZKTest(mockzk.MockZookeeperTestCase):
         # Expect batch to be uploaded.
         zk.cleanup_server_trace(zkclient, 3)
 
-        conn_mock.executemany.assert_called_once_with(
-            """
-            INSERT INTO server_trace (
-                path, timestamp, data, directory, name
-            ) VALUES(?, ?, ?, ?, ?)
-            """,
-            [
+        data = kazoo.client.KazooClient.create.call_args[1]['value']
+        with history.Snapshot(data) as snapshot:
+            self.assertEqual(snapshot.table, 'server_trace')
+            rows = sorted(snapshot.rows())
+
+        self.assertEqual(
+            rows,
+            sorted([
                 ('/server-trace/0001/'
                  'test1.xx.com,1000.00,tests,server_state,up',
                  1000.0,
@@ -113,7 +111,7 @@ class ServerTraceZKTest(mockzk.MockZookeeperTestCase):
                  None,
                  '/server-trace/0001',
                  'test1.xx.com,1001.00,tests,server_state,down'),
-            ]
+            ])
         )
 
         kazoo.client.KazooClient.create.assert_called_with(
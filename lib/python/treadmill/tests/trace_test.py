@@ -6,12 +6,14 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import io
 import json
 import os
 import shutil
 import tempfile
 import unittest
 
+import kazoo
 import mock
 
 from treadmill import trace
@@ -64,7 +66,8 @@ class TraceTest(mockzk.MockZookeeperTestCase):
             self.app_events_dir, '100,foo.bar#123,pending,created'
         )
         self.assertTrue(os.path.exists(path))
-        publisher._on_created(path, app_zk.publish)
+        publisher._on_created(path, app_zk.publish_batch)
+        publisher._publish_pending()
         zkclient_mock.create.assert_called_once_with(
             '/trace/007B/foo.bar#123,100,baz,pending,created',
             b'',
@@ -84,7 +87,8 @@ class TraceTest(mockzk.MockZookeeperTestCase):
             self.app_events_dir, '100,foo.bar#123,pending_delete,deleted'
         )
         self.assertTrue(os.path.exists(path))
-        publisher._on_created(path, app_zk.publish)
+        publisher._on_created(path, app_zk.publish_batch)
+        publisher._publish_pending()
         zkclient_mock.create.assert_called_once_with(
             '/trace/007B/foo.bar#123,100,baz,pending_delete,deleted',
             b'',
@@ -104,7 +108,8 @@ class TraceTest(mockzk.MockZookeeperTestCase):
             self.app_events_dir, '100,foo.bar#123,aborted,test'
         )
         self.assertTrue(os.path.exists(path))
-        publisher._on_created(path, app_zk.publish)
+        publisher._on_created(path, app_zk.publish_batch)
+        publisher._publish_pending()
         self.assertEqual(zkclient_mock.create.call_args_list, [
             mock.call(
                 '/trace/007B/foo.bar#123,100,baz,aborted,test',
@@ -139,7 +144,8 @@ class TraceTest(mockzk.MockZookeeperTestCase):
             self.server_events_dir, '100,test.xx.com,server_state,up'
         )
         self.assertTrue(os.path.exists(path))
-        publisher._on_created(path, server_zk.publish)
+        publisher._on_created(path, server_zk.publish_batch)
+        publisher._publish_pending()
         zkclient_mock.create.assert_called_once_with(
             '/server-trace/005D/test.xx.com,100,baz,server_state,up',
             b'',
@@ -158,7 +164,8 @@ class TraceTest(mockzk.MockZookeeperTestCase):
             self.server_events_dir, '100,test.xx.com,server_blackout,'
         )
         self.assertTrue(os.path.exists(path))
-        publisher._on_created(path, server_zk.publish)
+        publisher._on_created(path, server_zk.publish_batch)
+        publisher._publish_pending()
         zkclient_mock.create.assert_called_once_with(
             '/server-trace/005D/test.xx.com,100,baz,server_blackout,',
             b'',
@@ -166,6 +173,104 @@ class TraceTest(mockzk.MockZookeeperTestCase):
             acl=mock.ANY
         )
 
+    @mock.patch('time.time', mock.Mock(return_value=100))
+    @mock.patch('treadmill.trace.app.zk._HOSTNAME', 'baz')
+    def test_publish_batch(self):
+        """Test publishing event files in windows of batched creates."""
+        # Disable W0212(protected-access)
+        # pylint: disable=W0212
+        zkclient_mock = mock.Mock()
+        zkclient_mock.exists.return_value = False
+        transaction = zkclient_mock.transaction.return_value
+        transaction.commit.return_value = [True, True]
+        publisher = events_publisher.EventsPublisher(
+            zkclient_mock,
+            app_events_dir=self.app_events_dir,
+            window=2
+        )
+
+        for event in [
+                app_events.PendingTraceEvent(
+                    instanceid='foo.bar#123', why='created'
+                ),
+                app_events.PendingTraceEvent(
+                    instanceid='foo.bar#124', why='created'
+                ),
+                app_events.AbortedTraceEvent(
+                    instanceid='foo.bar#123', why='test'
+                ),
+        ]:
+            trace.post(self.app_events_dir, event)
+        with io.open(os.path.join(self.app_events_dir, '.tmp'), 'w'):
+            pass
+
+        with mock.patch('time.time', mock.Mock(return_value=190)):
+            publisher._configure(self.app_events_dir, app_zk.publish_batch)
+            publisher._update_stats()
+        self.assertEqual(publisher.stats['pending'], 3)
+        self.assertEqual(publisher.stats['oldest_age'], 90)
+
+        publisher._publish_pending()
+
+        # First window is one transaction, the second window has a single
+        # event and is created directly.
+        self.assertEqual(transaction.create.call_args_list, [
+            mock.call('/trace/007B/foo.bar#123,100,baz,aborted,test', b'',
+                      acl=mock.ANY, ephemeral=False),
+            mock.call('/trace/007B/foo.bar#123,100,baz,pending,created', b'',
+                      acl=mock.ANY, ephemeral=False),
+        ])
+        self.assertEqual(zkclient_mock.create.call_args_list, [
+            mock.call(
+                '/finished/foo.bar#123',
+                json.dumps({
+                    'data': 'test',
+                    'host': 'baz',
+                    'state': 'aborted',
+                    'when': '100'
+                }, sort_keys=True).encode(),
+                makepath=True, ephemeral=False, acl=mock.ANY, sequence=False
+            ),
+            mock.call(
+                '/trace/007C/foo.bar#124,100,baz,pending,created', b'',
+                makepath=True, ephemeral=False, acl=mock.ANY, sequence=False
+            ),
+        ])
+        self.assertEqual(os.listdir(self.app_events_dir), ['.tmp'])
+        self.assertEqual(
+            publisher.stats,
+            {'pending': 0, 'oldest_age': 0, 'published': 3, 'windows': 2}
+        )
+
+    @mock.patch('treadmill.trace.app.zk._HOSTNAME', 'baz')
+    def test_publish_batch_fallback(self):
+        """Test creating nodes one by one when the transaction fails."""
+        zkclient_mock = mock.Mock()
+        zkclient_mock.exists.return_value = False
+        zkclient_mock.transaction.return_value.commit.return_value = [
+            kazoo.client.NodeExistsError(),
+            kazoo.exceptions.RolledBackError(),
+        ]
+        zkclient_mock.create.side_effect = [
+            kazoo.client.NodeExistsError(), None
+        ]
+
+        app_zk.publish_batch(zkclient_mock, [
+            ('100', 'foo.bar#123', 'pending', 'created', ''),
+            ('101', 'foo.bar#123', 'scheduled', 'host1', ''),
+        ])
+
+        self.assertEqual(zkclient_mock.create.call_args_list, [
+            mock.call(
+                '/trace/007B/foo.bar#123,100,baz,pending,created', b'',
+                makepath=True, ephemeral=False, acl=mock.ANY, sequence=False
+            ),
+            mock.call(
+                '/trace/007B/foo.bar#123,101,baz,scheduled,host1', b'',
+                makepath=True, ephemeral=False, acl=mock.ANY, sequence=False
+            ),
+        ])
+
     @mock.patch('time.time', mock.Mock(return_value=100))
     @mock.patch('treadmill.trace.app.zk._HOSTNAME', 'baz')
     @mock.patch('treadmill.trace.server.zk._HOSTNAME', 'baz')
@@ -28,6 +28,8 @@ import treadmill.tests.treadmill_test_skip_windows  # pylint: disable=W0611
 
 from treadmill import websocket
 from treadmill import fs
+from treadmill.zksync import mirrordb
+from treadmill.zksync import sowdb
 
 
 class DummyHandler:
@@ -93,10 +95,11 @@ class PubSubTest(unittest.TestCase):
 
         pubsub.run(once=True)
 
+        # Writing a new file is published once, when complete.
         self.assertIn(('/abc', 'c', 'x'), handler1.events)
-        self.assertIn(('/abc', 'm', 'x'), handler1.events)
+        self.assertNotIn(('/abc', 'm', 'x'), handler1.events)
         self.assertIn(('/abc', 'c', 'x'), handler2.events)
-        self.assertIn(('/abc', 'm', 'x'), handler2.events)
+        self.assertNotIn(('/abc', 'm', 'x'), handler2.events)
         self.assertNotIn(('/.abc', 'c', 'x'), handler1.events)
         self.assertNotIn(('/.abc', 'c', 'x'), handler2.events)
 
@@ -106,6 +109,139 @@ class PubSubTest(unittest.TestCase):
         pubsub.run(once=True)
         self.assertEqual(1, len(pubsub.handlers[self.root]))
 
+    @mock.patch('treadmill.utils.sys_exit', mock.Mock())
+    def test_pubsub_fanout(self):
+        """Tests event payload is computed and encoded once per topic."""
+        pubsub = websocket.DirWatchPubSub(self.root)
+        impl = mock.Mock()
+        impl.sow = None
+        impl.on_event.return_value = {'echo': 1}
+
+        ws1 = mock.Mock()
+        ws2 = mock.Mock()
+        ws3 = mock.Mock()
+        ws1.active.return_value = True
+        ws2.active.return_value = True
+        ws3.active.return_value = True
+
+        pubsub.register('/', 'a*', ws1, impl, None, sub_id='sub1')
+        pubsub.register('/', '*', ws2, impl, None)
+        pubsub.register('/', 'b*', ws3, impl, None, sub_id='sub3')
+
+        with io.open(os.path.join(self.root, 'abc'), 'w') as f:
+            f.write('x')
+        impl.on_event.reset_mock()
+        ws1.send_msg.reset_mock()
+        ws2.send_msg.reset_mock()
+
+        # Access to protected member: _handle
+        #
+        # pylint: disable=W0212
+        pubsub._handle('d', os.path.join(self.root, 'abc'))
+
+        impl.on_event.assert_called_once_with('/abc', 'd', None)
+        msg1 = json.loads(ws1.send_msg.call_args[0][0])
+        self.assertEqual(msg1['echo'], 1)
+        self.assertEqual(msg1['sub-id'], 'sub1')
+        msg2 = json.loads(ws2.send_msg.call_args[0][0])
+        self.assertEqual(msg2['when'], msg1['when'])
+        self.assertNotIn('sub-id', msg2)
+        self.assertFalse(ws3.send_msg.called)
+
+    @mock.patch('treadmill.utils.sys_exit', mock.Mock())
+    def test_mirror(self):
+        """Tests sow and events from the zk2fs mirror DB."""
+        # Access to protected member: _poll_mirror
+        #
+        # pylint: disable=W0212
+        fs.mkdir_safe(os.path.join(self.root, 'a'))
+        with io.open(os.path.join(self.root, 'a', 'f'), 'w') as f:
+            f.write('file')
+        os.utime(os.path.join(self.root, 'a', 'f'), (150, 150))
+
+        store = mirrordb.MirrorDB(mirrordb.db_path(self.root))
+        store.put('/a/x', b'1', 100)
+        store.put('/a/y', None, 200)
+
+        pubsub = websocket.DirWatchPubSub(self.root)
+        handler = DummyHandler()
+        ws = mock.Mock()
+        ws.active.return_value = True
+
+        pubsub.register('/a', '*', ws, handler, 0)
+        self.assertEqual(
+            handler.events,
+            [('/a/x', None, '1'), ('/a/f', None, 'file'), ('/a/y', None, '')]
+        )
+
+        del handler.events[:]
+        store.put('/a/x', b'2', 300)
+        store.delete('/a/y')
+        store.put('/b/x', b'3', 300)
+        pubsub._poll_mirror()
+        self.assertEqual(
+            handler.events,
+            [('/a/x', 'm', '2'), ('/a/y', 'd', None)]
+        )
+
+        del handler.events[:]
+        pubsub._poll_mirror()
+        self.assertEqual(handler.events, [])
+
+    @mock.patch('treadmill.utils.sys_exit', mock.Mock())
+    def test_mirror_late(self):
+        """Tests opening a mirror DB created after startup."""
+        # Access to protected member: _poll_mirror, _gc
+        #
+        # pylint: disable=W0212
+        fs.mkdir_safe(os.path.join(self.root, 'a'))
+        pubsub = websocket.DirWatchPubSub(self.root)
+        self.assertIsNone(pubsub.mirror)
+        handler = DummyHandler()
+        ws = mock.Mock()
+        ws.active.return_value = True
+        pubsub.register('/a', '*', ws, handler, 0)
+
+        store = mirrordb.MirrorDB(mirrordb.db_path(self.root))
+        store.put('/a/x', b'1', 100)
+        pubsub._poll_mirror()
+        self.assertEqual(handler.events, [])
+
+        pubsub._gc()
+        self.assertIsNotNone(pubsub.mirror)
+        pubsub._poll_mirror()
+        self.assertEqual(handler.events, [('/a/x', 'c', '1')])
+
+    @mock.patch('treadmill.utils.sys_exit', mock.Mock())
+    @mock.patch('treadmill.zksync.mirrordb.MAX_CHANGES', 1)
+    @mock.patch('treadmill.zksync.mirrordb._TRIM_INTERVAL', 1)
+    def test_mirror_trimmed(self):
+        """Tests reconnecting subscribers when mirror changes are lost."""
+        # Access to protected member: _poll_mirror
+        #
+        # pylint: disable=W0212
+        fs.mkdir_safe(os.path.join(self.root, 'a'))
+        store = mirrordb.MirrorDB(mirrordb.db_path(self.root))
+        store.put('/a/x', b'1', 100)
+
+        pubsub = websocket.DirWatchPubSub(self.root)
+        handler = DummyHandler()
+        ws = mock.Mock()
+        ws.active.return_value = True
+        pubsub.register('/a', '*', ws, handler, 0)
+        conn = mock.Mock()
+        pubsub.connections.add(conn)
+        del handler.events[:]
+
+        store.put('/a/x', b'2', 200)
+        store.put('/a/x', b'3', 300)
+        store.put('/a/x', b'4', 400)
+        pubsub._poll_mirror()
+
+        conn.close_with_log.assert_called_once_with()
+        self.assertEqual(handler.events, [])
+        self.assertEqual(pubsub._mirror_seq, store.seq())
+
     def test_sow_since(self):
         """Tests sow since handling."""
         # Access to protected member: _sow
@@ -242,6 +378,70 @@ class PubSubTest(unittest.TestCase):
             ]
         )
 
+    def test_sow_index(self):
+        """Tests sow skips snapshot DBs using the index."""
+        # Access to protected member: _sow
+        #
+        # pylint: disable=W0212
+        pubsub = websocket.DirWatchPubSub(self.root)
+
+        handler = mock.Mock()
+        impl = mock.Mock()
+        impl.sow = os.path.join('.sow', 'trace')
+        impl.sow_table = 'trace'
+        impl.on_event.side_effect = lambda path, _op, _data: {'path': path}
+        sow_dir = os.path.join(self.root, impl.sow)
+        fs.mkdir_safe(sow_dir)
+
+        for db_name, rows in [('trace.db-1', [('/aaa', 1, '/', 'aaa')]),
+                              ('trace.db-2', [('/bbb', 5, '/', 'bbb')]),
+                              ('trace.db-3', [('/ccc', 6, '/', 'ccc')])]:
+            db_path = os.path.join(sow_dir, db_name)
+            conn = sqlite3.connect(db_path)
+            conn.execute(
+                """
+                CREATE TABLE trace (
+                    path text, timestamp integer, data text,
+                    directory text, name text
+                )
+                """
+            )
+            conn.executemany(
+                """
+                INSERT INTO trace (
+                    path, timestamp, directory, name
+                ) VALUES(?, ?, ?, ?)
+                """,
+                rows
+            )
+            conn.commit()
+            # Index of trace.db-3 is built on first use.
+            if db_name != 'trace.db-3':
+                sowdb.write_index(db_path, sowdb.build_index(conn))
+            conn.close()
+
+        with mock.patch('treadmill.zksync.sowdb.connect',
+                        side_effect=sowdb.connect) as connect_mock:
+            pubsub._sow('/', '*', 2, handler, impl)
+            self.assertEqual(
+                handler.send_msg.call_args_list,
+                [mock.call({'path': '/bbb', 'when': 5}),
+                 mock.call({'path': '/ccc', 'when': 6})]
+            )
+            connect_mock.assert_has_calls([
+                mock.call(os.path.join(sow_dir, 'trace.db-2')),
+                mock.call(os.path.join(sow_dir, 'trace.db-3')),
+            ], any_order=True)
+            self.assertEqual(connect_mock.call_count, 2)
+
+            # Connections are reused, name range excludes trace.db-2.
+            handler.reset_mock()
+            pubsub._sow('/', 'c*', 0, handler, impl)
+            handler.send_msg.assert_called_once_with(
+                {'path': '/ccc', 'when': 6}
+            )
+            self.assertEqual(connect_mock.call_count, 2)
+
     @mock.patch('glob.glob')
     @mock.patch('os.path.isdir')
     @mock.patch('treadmill.dirwatch.DirWatcher')
@@ -362,6 +562,62 @@ class WebSocketTest(AsyncHTTPTestCase):
         response = yield ws.read_message()
         self.assertIsNone(response)
 
+    @gen_test
+    def test_ioloop(self):
+        """Test directory events processed on the IOLoop."""
+        echo_impl = mock.Mock()
+        echo_impl.sow = None
+        echo_impl.subscribe.return_value = [('/', '*')]
+        echo_impl.on_event.side_effect = lambda filename, operation, _: {
+            'filename': filename,
+            'operation': operation
+        }
+        self.pubsub.impl['echo'] = echo_impl
+        self.pubsub.run_on_ioloop(self.io_loop)
+
+        ws = yield self.ws_connect('/')
+        ws.write_message('{"topic": "echo"}')
+        # Wait for the subscription to be registered.
+        while not self.pubsub.handlers:
+            yield gen.sleep(0.01)
+
+        io.open(os.path.join(self.root, 'xxx'), 'w').close()
+
+        response = json.loads((yield ws.read_message()))
+        self.assertEqual(response['filename'], '/xxx')
+        self.assertEqual(response['operation'], 'c')
+
+        stats = self.pubsub.stats()
+        self.assertEqual(len(stats), 1)
+        self.assertEqual(stats[0]['subscriptions'], 0)
+        self.assertEqual(stats[0]['dropped'], 0)
+
+    @gen_test
+    def test_slow_consumer(self):
+        """Test live events are dropped for connections over max queue."""
+        io.open(os.path.join(self.root, 'xxx'), 'w').close()
+
+        echo_impl = mock.Mock()
+        echo_impl.sow = None
+        echo_impl.subscribe.return_value = [('/', '*')]
+        echo_impl.on_event.return_value = {'echo': 1}
+        self.pubsub.impl['echo'] = echo_impl
+        self.pubsub.ws.max_queue = 0
+
+        ws = yield self.ws_connect('/')
+        ws.write_message('{"topic": "echo"}')
+
+        # State of the world is never dropped.
+        response = json.loads((yield ws.read_message()))
+        self.assertEqual(response['echo'], 1)
+
+        io.open(os.path.join(self.root, 'yyy'), 'w').close()
+        self.pubsub.run(once=True)
+
+        stats = self.pubsub.stats()
+        self.assertEqual(stats[0]['dropped'], 1)
+        self.assertEqual(stats[0]['sent'], 1)
+
     @gen_test
     def test_sub_id(self):
         """Test subscribing/unsubscribing with sub-id."""
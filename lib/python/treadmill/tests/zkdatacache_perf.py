@@ -0,0 +1,73 @@
+"""Performance test for treadmill.zkdatacache.
+
+Refreshes a cache directory holding many entries, with and without the
+cache index, then refreshes Zookeeper nodes::
+
+    python -m treadmill.tests.zkdatacache_perf
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+import timeit
+
+# Disable W0611: Unused import
+import treadmill.tests.treadmill_test_skip_windows  # pylint: disable=W0611
+
+from treadmill import zkdatacache
+
+
+def refresh(count):
+    """Refresh cache and Zookeeper data of count entries."""
+    print('entries: %s' % count)
+
+    cachedir = tempfile.mkdtemp()
+    try:
+        zknodes = []
+        for idx in range(count):
+            chksum = hashlib.sha1(str(idx).encode()).hexdigest()
+            name = 'name%s' % (idx // 10)
+            io.open(os.path.join(cachedir, '%s#%s' % (name, chksum)),
+                    'wb').close()
+            zknodes.append('%s#%s#%010d' % (name, chksum, idx))
+
+        zdc = None
+
+        def _create():
+            """Create cache, loading the index if any."""
+            nonlocal zdc
+            zdc = zkdatacache.ZkDataCache(None, '/zk/path', cachedir)
+
+        interval = timeit.timeit(stmt=_create, number=1)
+        print('scan time  :', interval)
+        interval = timeit.timeit(stmt=_create, number=1)
+        print('index load time  :', interval)
+        interval = timeit.timeit(stmt=zdc.refresh_cache, number=10)
+        print('noop refresh time  :', interval / 10)
+
+        zdc.add_data('name0', b'new data')
+        interval = timeit.timeit(stmt=_create, number=1)
+        print('index load time (after update)  :', interval)
+
+        interval = timeit.timeit(stmt=lambda: zdc.refresh_zk(zknodes),
+                                 number=1)
+        print('refresh_zk time  :', interval)
+        zknodes.append('name0#%s#%010d' % ('0' * 40, count))
+        interval = timeit.timeit(stmt=lambda: zdc.refresh_zk(zknodes),
+                                 number=1)
+        print('refresh_zk time (one new node)  :', interval)
+
+    finally:
+        shutil.rmtree(cachedir)
+
+
+if __name__ == '__main__':
+    refresh(5000)
+    refresh(50000)
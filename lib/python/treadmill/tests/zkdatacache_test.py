@@ -9,6 +9,7 @@ from __future__ import unicode_literals
 import errno
 import hashlib
 import io
+import itertools
 import os
 import shutil
 import tempfile
@@ -206,6 +207,10 @@ class ZkDataCacheTest(mockzk.MockZookeeperTestCase):
     @mock.patch('io.open', mock.mock_open(), create=True)
     @mock.patch('os.listdir', mock.Mock(set_spec=True))
     @mock.patch('os.stat', mock.Mock(set_spec=True))
+    @mock.patch('treadmill.zkdatacache._dir_mtime',
+                mock.Mock(side_effect=itertools.count()))
+    @mock.patch('treadmill.zkdatacache._index_size',
+                mock.Mock(return_value=None))
     def test_refresh_cache(self):
         """Test refresh of local cache data.
         """
@@ -372,6 +377,39 @@ class ZkDataCacheTest(mockzk.MockZookeeperTestCase):
             )
         )
 
+    def test_index(self):
+        """Test refreshing the cache from the cache index.
+        """
+        zdc = zkdatacache.ZkDataCache(None, '/zk/path', self.cachedir)
+        zdc.add_data('FOO', b'foo')
+        zdc.add_data('FOO', b'bar')
+        zdc.add_data('BAR', b'bar')
+
+        # Entries are loaded from the index, without scanning the directory.
+        with mock.patch('os.listdir', mock.Mock(set_spec=True)):
+            other = zkdatacache.ZkDataCache(None, '/zk/path', self.cachedir)
+            self.assertEqual(other.cached, zdc.cached)
+            self.assertEqual(len(other.cached['FOO']), 1)
+
+            with mock.patch('io.open', mock.Mock(set_spec=True)):
+                other.refresh_cache()
+                io.open.assert_not_called()
+
+            zdc.rm_data('BAR')
+            other.refresh_cache()
+            self.assertEqual(other.cached, zdc.cached)
+
+            os.listdir.assert_not_called()
+
+        # Files added outside of the cache make the index outdated.
+        io.open(os.path.join(self.cachedir, 'BAZ#chk'), 'wb').close()
+        os.utime(self.cachedir, ns=(0, 0))
+        other.refresh_cache()
+        self.assertEqual(
+            sorted(other.cached),
+            ['BAZ', 'FOO']
+        )
+
     @mock.patch('os.link', mock.Mock(set_spec=True))
     def test__add_data_stream_exists(self):
         """Check adding the same data stream twice returns None.
@@ -387,6 +425,8 @@ class ZkDataCacheTest(mockzk.MockZookeeperTestCase):
         self.assertIsNone(res)
 
     @mock.patch('os.stat', mock.Mock(set_spec=True))
+    @mock.patch('treadmill.zkdatacache._dir_mtime',
+                mock.Mock(return_value=0))
     def test__add_data_bytes(self):
         """Test adding bytes data to the cache.
         """
@@ -640,6 +680,8 @@ class ZkDataCacheTest(mockzk.MockZookeeperTestCase):
     @mock.patch('kazoo.client.KazooClient.get_children',
                 mock.Mock(set_spec=True))
     @mock.patch('treadmill.zkutils.ensure_deleted', mock.Mock(set_spec=True))
+    @mock.patch('treadmill.zkdatacache.ZkDataCache._load_index',
+                mock.Mock(return_value=None))
     def test_push(self):
         """Test pushing data from the cache to Zookeeper.
         """
@@ -758,6 +800,67 @@ class ZkDataCacheTest(mockzk.MockZookeeperTestCase):
         treadmill.zkutils.ensure_deleted.reset_mock()
         zkclient.create.reset_mock()
 
+    def test_push_pull_chunks(self):
+        """Test pushing and pulling chunked data.
+        """
+        zkclient = mockzk.make_mock_zkclient()
+        pulldir = os.path.join(self.root, 'pull')
+        os.mkdir(pulldir)
+
+        pusher = zkdatacache.ZkDataCache(
+            zkclient, '/zk/path', self.cachedir, chunk_size=4
+        )
+        puller = zkdatacache.ZkDataCache(zkclient, '/zk/path', pulldir)
+
+        chksum = pusher.add_data('FOO', b'aaaabbbbcc')
+        self.assertTrue(pusher.push())
+        self.assertEqual(
+            sorted(zkclient.nodes),
+            sorted(
+                ['/zk/path/.chunks/' + hashlib.sha1(chunk).hexdigest()
+                 for chunk in [b'aaaa', b'bbbb', b'cc']] +
+                ['/zk/path/FOO#{}#0000000000'.format(chksum)]
+            )
+        )
+
+        self.assertTrue(puller.pull(refresh=True))
+        with puller.get_data('FOO') as data:
+            self.assertEqual(data.read(), b'aaaabbbbcc')
+            self.assertEqual(data.checksum, chksum)
+
+        # Only the new chunk is pushed and pulled, unused chunks are removed.
+        zkclient.create.reset_mock()
+        chksum = pusher.add_data('FOO', b'aaaaXXXXcc')
+        self.assertTrue(pusher.push())
+        self.assertEqual(
+            [call[0][0] for call in zkclient.create.call_args_list],
+            ['/zk/path/.chunks/' + hashlib.sha1(b'XXXX').hexdigest(),
+             '/zk/path/FOO#{}#'.format(chksum)]
+        )
+        self.assertEqual(
+            sorted(zkclient.nodes),
+            sorted(
+                ['/zk/path/.chunks/' + hashlib.sha1(chunk).hexdigest()
+                 for chunk in [b'aaaa', b'XXXX', b'cc']] +
+                ['/zk/path/FOO#{}#0000000001'.format(chksum)]
+            )
+        )
+
+        zkclient.get.reset_mock()
+        self.assertTrue(puller.pull(refresh=True))
+        self.assertEqual(
+            [call[0][0] for call in zkclient.get.call_args_list],
+            ['/zk/path/FOO#{}#0000000001'.format(chksum),
+             '/zk/path/.chunks/' + hashlib.sha1(b'XXXX').hexdigest()]
+        )
+        with puller.get_data('FOO') as data:
+            self.assertEqual(data.read(), b'aaaaXXXXcc')
+            self.assertEqual(data.checksum, chksum)
+        self.assertEqual(
+            sorted(os.listdir(pulldir)), ['.index', 'FOO#{}'.format(chksum)]
+        )
+        self.assertFalse(puller.pull(refresh=True))
+
 
 if __name__ == '__main__':
     unittest.main()
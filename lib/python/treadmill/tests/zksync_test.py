@@ -11,6 +11,7 @@ import glob
 import io
 import os
 import shutil
+import sqlite3
 import tempfile
 import unittest
 
@@ -19,6 +20,8 @@ import mock
 
 from treadmill import fs
 from treadmill import utils
+from treadmill.zksync import mirrordb
+from treadmill.zksync import sowdb
 from treadmill.zksync import zk2fs
 from treadmill.zksync import utils as zksync_utils
 
@@ -96,6 +99,111 @@ class ZkSyncTest(mockzk.MockZookeeperTestCase):
                                    zk2fs_sync._default_on_del)
         self.assertFalse(os.path.exists(os.path.join(self.root, 'a/x')))
 
+    @mock.patch('kazoo.client.KazooClient.get', mock.Mock())
+    @mock.patch('kazoo.client.KazooClient.get_async', mock.Mock())
+    @mock.patch('kazoo.client.KazooClient.exists_async', mock.Mock())
+    @mock.patch('kazoo.client.KazooClient.get_children', mock.Mock())
+    def test_sync_children_pipelined(self):
+        """Test pipelined zk2fs sync, resumed from the manifest."""
+        # Disable W0212: accessing protected members.
+        # pylint: disable=W0212
+        zk_content = {
+            'a': {
+                'x': {'.data': b'1', '.metadata': {'mzxid': 1}},
+                'y': {'.data': b'2', '.metadata': {'mzxid': 2}},
+                'z': {'.data': b'3', '.metadata': {'mzxid': 3}},
+            },
+        }
+        self.make_mock_zk(zk_content)
+
+        zk2fs_sync = zk2fs.Zk2Fs(kazoo.client.KazooClient(), self.root,
+                                 concurrency=2)
+        fs.mkdir_safe(os.path.join(self.root, 'a'))
+        zk2fs_sync._children_watch('/a', ['x', 'y', 'z'],
+                                   False,
+                                   zk2fs_sync._default_on_add,
+                                   zk2fs_sync._default_on_del)
+        self._check_file('a/x', '1')
+        self._check_file('a/y', '2')
+        self._check_file('a/z', '3')
+        self._check_file(
+            os.path.join('a', zk2fs.MANIFEST_FILE),
+            '{"x": 1, "y": 2, "z": 3}'
+        )
+        self.assertEqual(kazoo.client.KazooClient.get_async.call_count, 3)
+        self.assertFalse(kazoo.client.KazooClient.get.called)
+        self.assertEqual(zk2fs_sync.sync_stats['/a']['synced'], 3)
+
+        # Restart, only changed and new nodes are read.
+        kazoo.client.KazooClient.get_async.reset_mock()
+        zk_content['a']['x'] = {'.data': b'11', '.metadata': {'mzxid': 4}}
+        zk_content['a']['q'] = {'.data': b'q', '.metadata': {'mzxid': 5}}
+        del zk_content['a']['z']
+
+        zk2fs_sync = zk2fs.Zk2Fs(kazoo.client.KazooClient(), self.root,
+                                 concurrency=2)
+        zk2fs_sync._children_watch('/a', ['q', 'x', 'y', 'z'],
+                                   False,
+                                   zk2fs_sync._default_on_add,
+                                   zk2fs_sync._default_on_del)
+        self._check_file('a/x', '11')
+        self._check_file('a/y', '2')
+        self._check_file('a/q', 'q')
+        self.assertFalse(os.path.exists(os.path.join(self.root, 'a/z')))
+        kazoo.client.KazooClient.get_async.assert_has_calls(
+            [mock.call('/a/x', watch=None), mock.call('/a/q', watch=None)],
+            any_order=True
+        )
+        self.assertEqual(kazoo.client.KazooClient.get_async.call_count, 2)
+        self._check_file(
+            os.path.join('a', zk2fs.MANIFEST_FILE),
+            '{"q": 5, "x": 4, "y": 2}'
+        )
+
+    @mock.patch('kazoo.client.KazooClient.get', mock.Mock())
+    @mock.patch('kazoo.client.KazooClient.get_async', mock.Mock())
+    @mock.patch('kazoo.client.KazooClient.exists_async', mock.Mock())
+    @mock.patch('kazoo.client.KazooClient.get_children', mock.Mock())
+    def test_sync_children_pipelined_watch(self):
+        """Test pipelined zk2fs sync with data watches."""
+        # Disable W0212: accessing protected members.
+        # pylint: disable=W0212
+        zk_content = {
+            'a': {
+                'x': {'.data': b'1', '.metadata': {'mzxid': 1}},
+                'y': {'.data': b'2', '.metadata': {'mzxid': 2}},
+            },
+        }
+        self.make_mock_zk(zk_content)
+        fs.mkdir_safe(os.path.join(self.root, 'a'))
+        with io.open(os.path.join(self.root, 'a', 'x'), 'w') as f:
+            f.write('1')
+        with io.open(os.path.join(self.root, 'a', 'y'), 'w') as f:
+            f.write('old')
+        with io.open(os.path.join(self.root, 'a', zk2fs.MANIFEST_FILE),
+                     'w') as f:
+            f.write('{"x": 1, "y": 1}')
+
+        zk2fs_sync = zk2fs.Zk2Fs(kazoo.client.KazooClient(), self.root,
+                                 concurrency=10)
+        zk2fs_sync._children_watch('/a', ['x', 'y'],
+                                   True,
+                                   zk2fs_sync._default_on_add,
+                                   zk2fs_sync._default_on_del)
+
+        self._check_file('a/x', '1')
+        self._check_file('a/y', '2')
+        self.assertEqual(zk2fs_sync.watches, {'/a/x', '/a/y'})
+        # Both watched, only y was read.
+        kazoo.client.KazooClient.exists_async.assert_has_calls(
+            [mock.call('/a/x', watch=mock.ANY),
+             mock.call('/a/y', watch=mock.ANY)]
+        )
+        kazoo.client.KazooClient.get_async.assert_called_once_with(
+            '/a/y', watch=mock.ANY
+        )
+        self.assertFalse(kazoo.client.KazooClient.get.called)
+
     @mock.patch('glob.glob', mock.Mock())
     @mock.patch('kazoo.client.KazooClient.get', mock.Mock())
     @mock.patch('kazoo.client.KazooClient.exists', mock.Mock())
@@ -130,6 +238,54 @@ class ZkSyncTest(mockzk.MockZookeeperTestCase):
         self.assertSequenceEqual(['y', 'x', 'z'], add)
         self.assertSequenceEqual(['a', 'b'], rm)
 
+    @mock.patch('kazoo.client.KazooClient.get', mock.Mock())
+    @mock.patch('kazoo.client.KazooClient.exists', mock.Mock())
+    @mock.patch('kazoo.client.KazooClient.get_children', mock.Mock())
+    def test_sync_children_incremental(self):
+        """Test children are diffed against the synced set, not the dir."""
+        # Disable W0212: accessing protected members.
+        # pylint: disable=W0212
+        zk_content = {
+            'a': {
+                'x': b'1',
+                'y': b'2',
+                'z': b'3',
+            },
+        }
+
+        self.make_mock_zk(zk_content)
+
+        zk2fs_sync = zk2fs.Zk2Fs(kazoo.client.KazooClient(), self.root)
+        fs.mkdir_safe(os.path.join(self.root, 'a'))
+        with io.open(os.path.join(self.root, 'a', 'x'), 'w') as f:
+            f.write('1')
+
+        add = []
+        rm = []
+
+        with mock.patch('glob.glob', mock.Mock(wraps=glob.glob)):
+            zk2fs_sync._children_watch(
+                '/a', ['x', 'y'], False,
+                lambda x: add.append(os.path.basename(x)),
+                lambda x: rm.append(os.path.basename(x))
+            )
+            self.assertSequenceEqual(['x', 'y'], add)
+            self.assertSequenceEqual([], rm)
+
+            del add[:]
+            zk2fs_sync._children_watch(
+                '/a', ['y', 'z'], False,
+                lambda x: add.append(os.path.basename(x)),
+                lambda x: rm.append(os.path.basename(x))
+            )
+            self.assertSequenceEqual(['z'], add)
+            self.assertSequenceEqual(['x'], rm)
+
+            # Directory is only listed once.
+            self.assertEqual(glob.glob.call_count, 1)
+
+        self.assertEqual(zk2fs_sync._children['/a'], {'y', 'z'})
+
     @mock.patch('treadmill.utils.sys_exit', mock.Mock())
     @mock.patch('kazoo.client.KazooClient.get', mock.Mock())
     @mock.patch('kazoo.client.KazooClient.exists', mock.Mock())
@@ -163,6 +319,47 @@ class ZkSyncTest(mockzk.MockZookeeperTestCase):
         self.assertIn('/a/y', zk2fs_sync.watches)
         self.assertIn('/a/z', zk2fs_sync.watches)
 
+    @mock.patch('treadmill.utils.sys_exit', mock.Mock())
+    @mock.patch('kazoo.client.KazooClient.get', mock.Mock())
+    @mock.patch('kazoo.client.KazooClient.exists', mock.Mock())
+    @mock.patch('kazoo.client.KazooClient.get_children', mock.Mock())
+    def test_sync_children_recreated(self):
+        """Test node deleted and re-created between children watches."""
+        # accessing protexted members.
+        # pylint: disable=W0212
+        zk_content = {
+            'a': {
+                'x': b'1',
+                'y': b'2',
+            },
+        }
+
+        self.make_mock_zk(zk_content)
+
+        zk2fs_sync = zk2fs.Zk2Fs(kazoo.client.KazooClient(), self.root)
+        fs.mkdir_safe(os.path.join(self.root, 'a'))
+        zk2fs_sync._children_watch('/a', ['x', 'y'],
+                                   True,
+                                   zk2fs_sync._default_on_add,
+                                   zk2fs_sync._default_on_del)
+        self._check_file('a/x', '1')
+
+        # Data watch sees the delete, the node is re-created before the
+        # children watch fires again.
+        event = mock.Mock(type='DELETED')
+        zk2fs_sync._data_watch('/a/x', None, None, event)
+        self.assertFalse(os.path.exists(os.path.join(self.root, 'a/x')))
+        self.assertNotIn('/a/x', zk2fs_sync.watches)
+
+        zk_content['a']['x'] = b'3'
+        zk2fs_sync._children_watch('/a', ['x', 'y'],
+                                   True,
+                                   zk2fs_sync._default_on_add,
+                                   zk2fs_sync._default_on_del)
+        self._check_file('a/x', '3')
+        self.assertIn('/a/x', zk2fs_sync.watches)
+        self.assertEqual(zk2fs_sync._children['/a'], {'x', 'y'})
+
     @mock.patch('kazoo.client.KazooClient.get', mock.Mock())
     @mock.patch('kazoo.client.KazooClient.exists', mock.Mock())
     @mock.patch('kazoo.client.KazooClient.get_children', mock.Mock())
@@ -265,6 +462,46 @@ class ZkSyncTest(mockzk.MockZookeeperTestCase):
                                  cont_watch_predicate=lambda *args: False)
         self.assertFalse(kazoo.client.KazooClient.get_children.called)
 
+    @mock.patch('kazoo.client.KazooClient.get', mock.Mock())
+    @mock.patch('kazoo.client.KazooClient.exists', mock.Mock())
+    @mock.patch('kazoo.client.KazooClient.get_children', mock.Mock())
+    def test_sync_children_store(self):
+        """Test zk2fs sync to the mirror store."""
+        # Disable W0212: accessing protected members.
+        # pylint: disable=W0212
+        zk_content = {
+            'a': {
+                'x': b'1',
+                'y': b'2',
+            },
+        }
+
+        self.make_mock_zk(zk_content)
+
+        store = mirrordb.MirrorDB(mirrordb.db_path(self.root))
+        zk2fs_sync = zk2fs.Zk2Fs(kazoo.client.KazooClient(), self.root,
+                                 store=store)
+        zk2fs_sync.sync_children('/a',
+                                 need_watch_predicate=lambda *args: False,
+                                 cont_watch_predicate=lambda *args: False)
+
+        self.assertEqual(store.get('/a/x')[0], b'1')
+        self.assertEqual(store.get('/a/y')[0], b'2')
+        self.assertFalse(os.path.exists(os.path.join(self.root, 'a', 'x')))
+
+        # Children are seeded from the store.
+        zk2fs_sync = zk2fs.Zk2Fs(kazoo.client.KazooClient(), self.root,
+                                 store=store)
+        zk2fs_sync._children_watch('/a', ['x'], False,
+                                   zk2fs_sync._default_on_add,
+                                   zk2fs_sync._default_on_del)
+        self.assertIsNone(store.get('/a/y'))
+        self.assertEqual(store.names('/a'), ['x'])
+
+        zk2fs_sync.remove_tree('/a')
+        self.assertEqual(store.names('/a'), [])
+        self.assertFalse(os.path.exists(os.path.join(self.root, 'a')))
+
     def test_write_data(self):
         """Tests writing data to filesystem."""
         path_ok = os.path.join(self.root, 'a')
@@ -288,5 +525,206 @@ class ZkSyncTest(mockzk.MockZookeeperTestCase):
         self.assertEqual(zksync_utils.wait_for_ready(self.root), modified)
 
 
+class SowDBTest(unittest.TestCase):
+    """Test treadmill.zksync.sowdb"""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.root, 'trace.db-0000000001')
+        conn = sqlite3.connect(self.db_path)
+        conn.execute(
+            """
+            CREATE TABLE trace (
+                path text, timestamp real, data text,
+                directory text, name text
+            )
+            """
+        )
+        conn.executemany(
+            """
+            INSERT INTO trace (path, timestamp, directory, name)
+            VALUES(?, ?, ?, ?)
+            """,
+            [('/trace/0001/foo.bar#1,10', 10, '/trace/0001', 'foo.bar#1,10'),
+             ('/trace/0002/foo.baz#2,20', 20, '/trace/0002', 'foo.baz#2,20')]
+        )
+        conn.execute('CREATE TABLE other (x text)')
+        conn.commit()
+        conn.close()
+
+    def tearDown(self):
+        if self.root and os.path.isdir(self.root):
+            shutil.rmtree(self.root)
+
+    def test_index(self):
+        """Test building, writing and reading snapshot DB index."""
+        self.assertIsNone(sowdb.read_index(self.db_path))
+
+        conn = sowdb.connect(self.db_path)
+        index = sowdb.build_index(conn)
+        conn.close()
+        self.assertEqual(
+            index,
+            {
+                'trace': {
+                    'count': 2,
+                    'min_ts': 10,
+                    'max_ts': 20,
+                    'min_name': 'foo.bar#1,10',
+                    'max_name': 'foo.baz#2,20',
+                }
+            }
+        )
+
+        sowdb.write_index(self.db_path, index)
+        self.assertEqual(
+            sorted(os.listdir(self.root)),
+            ['.trace.db-0000000001.idx', 'trace.db-0000000001']
+        )
+        self.assertEqual(sowdb.read_index(self.db_path), index)
+
+        sowdb.remove_index(self.db_path)
+        sowdb.remove_index(self.db_path)
+        self.assertIsNone(sowdb.read_index(self.db_path))
+
+    def test_overlaps(self):
+        """Test skipping tables which cannot match."""
+        table_index = {
+            'count': 2,
+            'min_ts': 10,
+            'max_ts': 20,
+            'min_name': 'foo.bar#1,10',
+            'max_name': 'foo.baz#2,20',
+        }
+        self.assertTrue(sowdb.overlaps(table_index, 0, ''))
+        self.assertTrue(sowdb.overlaps(table_index, 20, 'foo.ba'))
+        self.assertTrue(sowdb.overlaps(table_index, 0, 'foo.bar#1,'))
+        self.assertTrue(sowdb.overlaps(table_index, 0, 'foo.bat'))
+        self.assertFalse(sowdb.overlaps(table_index, 21, ''))
+        self.assertFalse(sowdb.overlaps(table_index, 0, 'foo.a'))
+        self.assertFalse(sowdb.overlaps(table_index, 0, 'foo.c'))
+        self.assertFalse(sowdb.overlaps(None, 0, ''))
+        self.assertFalse(sowdb.overlaps(dict(table_index, count=0), 0, ''))
+
+    def test_connection_pool(self):
+        """Test read-only connection pool."""
+        pool = sowdb.ConnectionPool(max_idle=1)
+
+        conn = pool.acquire(self.db_path)
+        with self.assertRaises(sqlite3.OperationalError):
+            conn.execute('DELETE FROM trace')
+        pool.release(self.db_path, conn)
+        self.assertIs(pool.acquire(self.db_path), conn)
+
+        # Missing DBs are not created.
+        missing = os.path.join(self.root, 'missing')
+        with self.assertRaises(sqlite3.OperationalError):
+            pool.acquire(missing)
+        self.assertFalse(os.path.exists(missing))
+
+        # Only max_idle connections are kept.
+        other = sowdb.connect(self.db_path)
+        pool.release(self.db_path, conn)
+        pool.release('other', other)
+        self.assertEqual(len(pool), 1)
+        with self.assertRaises(sqlite3.ProgrammingError):
+            conn.execute('SELECT 1')
+
+        pool.retain([])
+        self.assertEqual(len(pool), 0)
+        with self.assertRaises(sqlite3.ProgrammingError):
+            other.execute('SELECT 1')
+
+
+class MirrorDBTest(unittest.TestCase):
+    """Test treadmill.zksync.mirrordb."""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.db = mirrordb.MirrorDB(mirrordb.db_path(self.root))
+
+    def tearDown(self):
+        self.db.close()
+        if self.root and os.path.isdir(self.root):
+            shutil.rmtree(self.root)
+
+    def test_put_delete(self):
+        """Test storing and deleting nodes."""
+        self.db.put('/a/x', b'1', 100)
+        self.db.put('/a/y', None, 101)
+        self.db.put('/a/x', b'2', 102)
+        self.db.put('/x', b'3', 103)
+
+        self.assertEqual(self.db.get('/a/x'), (b'2', 102))
+        self.assertEqual(self.db.get('/a/y'), (None, 101))
+        self.assertIsNone(self.db.get('/a/z'))
+        self.assertEqual(sorted(self.db.names('/a')), ['x', 'y'])
+        self.assertEqual(self.db.names('/'), ['x'])
+
+        self.db.delete('/a/y')
+        self.db.delete('/a/z')
+        self.assertEqual(self.db.names('/a'), ['x'])
+
+        self.assertEqual(
+            self.db.changes(0),
+            [
+                (1, 'c', '/a/x'),
+                (2, 'c', '/a/y'),
+                (3, 'm', '/a/x'),
+                (4, 'c', '/x'),
+                (5, 'd', '/a/y'),
+            ]
+        )
+        self.assertEqual(self.db.changes(4), [(5, 'd', '/a/y')])
+        self.assertEqual(self.db.seq(), 5)
+
+    def test_records(self):
+        """Test querying nodes by pattern and mtime."""
+        self.db.put('/a/x', b'1', 102)
+        self.db.put('/a/y', b'2', 101)
+        self.db.put('/b/x', b'3', 100)
+        self.db.put('/b/x/z', b'4', 100)
+
+        self.assertEqual(
+            list(self.db.records('/*', 'x')),
+            [(100, '/b/x', b'3'), (102, '/a/x', b'1')]
+        )
+        self.assertEqual(
+            list(self.db.records('/a', '*', since=102)),
+            [(102, '/a/x', b'1')]
+        )
+
+    def test_delete_tree(self):
+        """Test deleting a node and its descendants."""
+        self.db.put('/a', b'', 100)
+        self.db.put('/a/x', b'1', 100)
+        self.db.put('/a/x/y', b'2', 100)
+        self.db.put('/ab/x', b'3', 100)
+
+        self.db.delete_tree('/a')
+        self.assertIsNone(self.db.get('/a'))
+        self.assertEqual(self.db.names('/a'), [])
+        self.assertEqual(self.db.names('/a/x'), [])
+        self.assertEqual(self.db.names('/ab'), ['x'])
+        self.assertEqual(
+            sorted(change[2] for change in self.db.changes(4)),
+            ['/a', '/a/x', '/a/x/y']
+        )
+
+    def test_readonly(self):
+        """Test reading the store from another connection."""
+        self.db.put('/a/x', b'1', 100)
+
+        reader = mirrordb.MirrorDB(self.db.path, readonly=True)
+        try:
+            self.assertEqual(reader.get('/a/x'), (b'1', 100))
+            self.db.put('/a/y', b'2', 100)
+            self.assertEqual(reader.changes(1), [(2, 'c', '/a/y')])
+            with self.assertRaises(sqlite3.OperationalError):
+                reader.put('/a/z', b'3', 100)
+        finally:
+            reader.close()
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -11,6 +11,7 @@ import unittest
 
 import kazoo
 import kazoo.client
+import kazoo.exceptions
 import mock
 
 import treadmill
@@ -84,6 +85,62 @@ class ZkTest(unittest.TestCase):
             makepath=True, sequence=False, ephemeral=False
         )
 
+    @mock.patch('treadmill.zkutils.ZkClient.create', mock.Mock())
+    @mock.patch('treadmill.zkutils.ZkClient.transaction', mock.Mock())
+    @mock.patch('treadmill.zkutils.ensure_deleted', mock.Mock())
+    @mock.patch('treadmill.zkutils.put', mock.Mock())
+    def test_apply_batch(self):
+        """Test applying ops in batched transactions."""
+        client = treadmill.zkutils.ZkClient()
+        transaction = treadmill.zkutils.ZkClient.transaction.return_value
+        transaction.commit.side_effect = [
+            ['/a', True],
+            [kazoo.exceptions.RolledBackError(),
+             kazoo.client.NodeExistsError()],
+        ]
+        treadmill.zkutils.ZkClient.create.side_effect = [
+            '/c', kazoo.client.NodeExistsError()
+        ]
+
+        self.assertEqual(
+            zkutils.apply_batch(
+                client,
+                [('create', '/a', 'x'), ('set', '/b', 'z'),
+                 ('create', '/c', None), ('create', '/d', {'y': 1}),
+                 ('delete', '/e', None)],
+                ephemeral=True, batch_size=2
+            ),
+            [('/d', {'y': 1})]
+        )
+        self.assertEqual(treadmill.zkutils.ZkClient.transaction.call_count, 2)
+        transaction.create.assert_has_calls([
+            mock.call('/a', b'x', acl=mock.ANY, ephemeral=True),
+            mock.call('/c', b'', acl=mock.ANY, ephemeral=True),
+            mock.call('/d', b'{"y": 1}', acl=mock.ANY, ephemeral=True),
+        ])
+        transaction.set_data.assert_called_once_with('/b', b'z')
+
+        # The ops of the failed transaction are applied one by one, as is the
+        # single op of the last batch.
+        treadmill.zkutils.ZkClient.create.assert_has_calls([
+            mock.call('/c', b'', acl=mock.ANY, makepath=True,
+                      sequence=False, ephemeral=True),
+            mock.call('/d', b'{"y": 1}', acl=mock.ANY, makepath=True,
+                      sequence=False, ephemeral=True),
+        ])
+        transaction.delete.assert_not_called()
+        zkutils.ensure_deleted.assert_called_once_with(
+            client, '/e', recursive=False
+        )
+        zkutils.put.assert_not_called()
+
+        # Other errors are raised.
+        treadmill.zkutils.ZkClient.create.side_effect = (
+            kazoo.exceptions.NoAuthError()
+        )
+        with self.assertRaises(kazoo.exceptions.NoAuthError):
+            zkutils.apply_batch(client, [('create', '/a', 'x')])
+
     @mock.patch('treadmill.zkutils.ZkClient.create', mock.Mock())
     @mock.patch('treadmill.zkutils.ZkClient.set', mock.Mock())
     @mock.patch('treadmill.zkutils.ZkClient.set_acls', mock.Mock())
@@ -118,6 +175,41 @@ class ZkTest(unittest.TestCase):
         treadmill.zkutils.ZkClient.get.return_value = (None, None)
         self.assertIsNone(zkutils.get(client, '/foo'))
 
+    @mock.patch('treadmill.zkutils.ZkClient.get_async', mock.Mock())
+    def test_get_many_with_metadata(self):
+        """Test pipelined get of multiple nodes."""
+        client = treadmill.zkutils.ZkClient()
+        outstanding = []
+
+        def _get_async(path):
+            """Check the number of outstanding requests is bounded."""
+            self.assertLessEqual(len(outstanding), 2)
+            result = mock.Mock()
+
+            def _get():
+                outstanding.remove(path)
+                if path == '/b':
+                    raise kazoo.client.NoNodeError()
+                return (b'{"x": 1}', path)
+
+            result.get.side_effect = _get
+            outstanding.append(path)
+            return result
+
+        treadmill.zkutils.ZkClient.get_async.side_effect = _get_async
+
+        self.assertEqual(
+            list(zkutils.get_many_with_metadata(
+                client, ['/a', '/b', '/c', '/d'], concurrency=2
+            )),
+            [
+                ('/a', {'x': 1}, '/a'),
+                ('/b', None, None),
+                ('/c', {'x': 1}, '/c'),
+                ('/d', {'x': 1}, '/d'),
+            ]
+        )
+
     @mock.patch('treadmill.zkutils.ZkClient.create', mock.Mock())
     def test_ensure_exists(self):
         """Tests updating/creating node content."""
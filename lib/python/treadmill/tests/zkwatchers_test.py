@@ -88,6 +88,49 @@ class ZkwatchersTest(mockzk.MockZookeeperTestCase):
             b'baz_data', mock.ANY, ('CHANGED', 'CONNECTED', '/baz')
         )
 
+    @mock.patch('kazoo.client.KazooClient.get', mock.Mock())
+    @mock.patch('kazoo.client.KazooClient.get_async', mock.Mock())
+    @mock.patch('kazoo.client.KazooClient.exists_async', mock.Mock())
+    def test_existing_data_watch_start(self):
+        """Test starting ExistingDataWatch with a pipelined read."""
+        zk_content = {
+            'foo': {
+                '.data': 'foo_data',
+                '.metadata': {'mzxid': 1},
+            },
+        }
+        self.make_mock_zk(zk_content)
+        zkclient = kazoo.client.KazooClient()
+
+        # Unchanged version, no need to read data.
+        foo_func = mock.Mock()
+        watch = zkwatchers.ExistingDataWatch(zkclient, '/foo', version=1)
+        watch.start(foo_func, zkclient.exists_async('/foo', watch.watcher))
+        foo_func.assert_not_called()
+        self.assertFalse(kazoo.client.KazooClient.get.called)
+
+        # Changed version, data is read synchronously.
+        watch = zkwatchers.ExistingDataWatch(zkclient, '/foo', version=0)
+        watch.start(foo_func, zkclient.exists_async('/foo', watch.watcher))
+        foo_func.assert_called_once_with(b'foo_data', mock.ANY, None)
+        kazoo.client.KazooClient.get.assert_called_once_with(
+            '/foo', watch.watcher
+        )
+
+        # Data of the pipelined get is used.
+        foo_func.reset_mock()
+        kazoo.client.KazooClient.get.reset_mock()
+        watch = zkwatchers.ExistingDataWatch(zkclient, '/foo')
+        watch.start(foo_func, zkclient.get_async('/foo', watch.watcher))
+        foo_func.assert_called_once_with(b'foo_data', mock.ANY, None)
+        self.assertFalse(kazoo.client.KazooClient.get.called)
+
+        # Missing node.
+        bar_func = mock.Mock()
+        watch = zkwatchers.ExistingDataWatch(zkclient, '/bar')
+        watch.start(bar_func, zkclient.exists_async('/bar', watch.watcher))
+        bar_func.assert_called_once_with(None, None, None)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -7,18 +7,20 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 import abc
-import io
 import logging
-import os
-import sqlite3
-import tempfile
-import zlib
 
 from treadmill import zknamespace as z
 from treadmill import zkutils
+from treadmill.trace import history
 
 _LOGGER = logging.getLogger(__name__)
 
+#: Max number of nodes deleted in one multi-op transaction.
+DELETE_BATCH_SIZE = 500
+
+#: Max number of nodes created in one multi-op transaction.
+CREATE_BATCH_SIZE = 100
+
 
 class TraceLoop(abc.ABC):
     """Trace loop.
@@ -74,79 +76,60 @@ class TraceLoop(abc.ABC):
 
 
 def upload_batch(zkclient, db_node_path, table, batch):
-    """Generate snapshot DB and upload to zk.
+    """Generate history snapshot and upload to zk.
     """
-    with tempfile.NamedTemporaryFile(delete=False) as f:
-        pass
-
-    conn = sqlite3.connect(f.name)
-    with conn:
-        conn.execute(
-            """
-            CREATE TABLE {table} (
-                path text, timestamp real, data text,
-                directory text, name text
-            )
-            """.format(table=table)
-        )
-        conn.executemany(
-            """
-            INSERT INTO {table} (
-                path, timestamp, data, directory, name
-            ) VALUES(?, ?, ?, ?, ?)
-            """.format(table=table), batch
-        )
-        conn.executescript(
-            """
-            CREATE INDEX name_idx ON {table} (name);
-            CREATE INDEX path_idx ON {table} (path);
-            """.format(table=table)
-        )
-    conn.close()
-
-    with io.open(f.name, 'rb') as f:
-        db_node = zkutils.create(
-            zkclient, db_node_path, zlib.compress(f.read()),
-            sequence=True
-        )
-        _LOGGER.info(
-            'Uploaded compressed snapshot DB: %s to: %s',
-            f.name, db_node
-        )
-
-    os.unlink(f.name)
+    db_node = zkutils.create(
+        zkclient, db_node_path, history.dumps(table, batch),
+        sequence=True
+    )
+    _LOGGER.info('Uploaded history snapshot of %s rows to: %s',
+                 len(batch), db_node)
 
     # Delete uploaded nodes from zk.
-    for path, _timestamp, _data, _directory, _name in batch:
-        zkutils.with_retry(zkutils.ensure_deleted, zkclient, path)
+    delete_batch(
+        zkclient,
+        [path for path, _timestamp, _data, _directory, _name in batch]
+    )
 
 
-def download_batch(zkclient, db_node_path, table, name):
-    """Download snapshot DB and select matching rows.
+def delete_batch(zkclient, paths, batch_size=DELETE_BATCH_SIZE):
+    """Delete (leaf) nodes with batched multi-op transactions.
+
+    Nodes which are already gone are skipped.
     """
-    events = []
-    data, _metadata = zkclient.get(db_node_path)
-    with tempfile.NamedTemporaryFile(delete=False, mode='wb') as f:
-        f.write(zlib.decompress(data))
+    zkutils.apply_batch(
+        zkclient, [('delete', path, None) for path in paths],
+        default_acl=False, batch_size=batch_size
+    )
+
 
-    conn = sqlite3.connect(f.name)
-    # Before Python 3.7 parametrized GLOB pattern won't use index.
-    select_stmt = """
-        SELECT name FROM {table} WHERE name GLOB '{name},*'
-    """.format(table=table, name=name)
-    for row in conn.execute(select_stmt):
-        events.append(row[0])
-    conn.close()
+def create_batch(zkclient, nodes, acl=None, batch_size=CREATE_BATCH_SIZE):
+    """Create (path, bytes data) nodes with batched multi-op transactions.
 
-    os.unlink(f.name)
-    return events
+    Nodes which already exist are skipped.
+    """
+    zkutils.apply_batch(
+        zkclient, [('create', path, data) for path, data in nodes],
+        acl=acl, batch_size=batch_size
+    )
+
+
+def download_batch(zkclient, db_node_path, table, name):
+    """Download history snapshot and select the events of name.
+    """
+    data, _metadata = zkclient.get(db_node_path)
+    with history.Snapshot(data, table) as snapshot:
+        return [row.name for row in snapshot.rows(prefix=name + ',')]
 
 
 def cleanup(zkclient, path, max_count):
-    """Cleanup old nodes given path.
+    """Cleanup old nodes given path, return the number of deleted nodes.
     """
     nodes = sorted(zkclient.get_children(path))
     extra = len(nodes) - max_count
     if extra > 0:
         for node in nodes[0:extra]:
             zkutils.ensure_deleted(zkclient, z.join_zookeeper_path(path, node))
+        return extra
+
+    return 0
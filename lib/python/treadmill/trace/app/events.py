@@ -281,6 +281,50 @@ class ConfiguredTraceEvent(AppTraceEvent):
         return self.uniqueid
 
 
+class StartedTraceEvent(AppTraceEvent):
+    """Event emitted when a container instance environment is set up on a node
+    and the supervisor is about to start.
+    """
+
+    __slots__ = (
+        'uniqueid',
+        'duration',
+    )
+
+    def __init__(self, uniqueid, duration,
+                 timestamp=None, source=None, instanceid=None, payload=None):
+        super(StartedTraceEvent, self).__init__(
+            timestamp=timestamp,
+            source=source,
+            instanceid=instanceid,
+            payload=payload
+        )
+        self.uniqueid = uniqueid
+        self.duration = float(duration)
+
+    @classmethod
+    def from_data(cls, timestamp, source, instanceid, event_type, event_data,
+                  payload=None):
+        assert cls == getattr(AppTraceEventTypes, event_type).value
+
+        uniqueid, duration = event_data.split('.', 1)
+        return cls(
+            timestamp=timestamp,
+            source=source,
+            instanceid=instanceid,
+            payload=payload,
+            uniqueid=uniqueid,
+            duration=duration
+        )
+
+    @property
+    def event_data(self):
+        return '{uniqueid}.{duration:.3f}'.format(
+            uniqueid=self.uniqueid,
+            duration=self.duration
+        )
+
+
 class DeletedTraceEvent(AppTraceEvent):
     """Event emitted when a container instance is deleted from the scheduler.
     """
@@ -531,6 +575,7 @@ class AppTraceEventTypes(enum.Enum):
     scheduled = ScheduledTraceEvent
     service_exited = ServiceExitedTraceEvent
     service_running = ServiceRunningTraceEvent
+    started = StartedTraceEvent
 
 
 class AppTraceEventHandler(_events.TraceEventHandler):
@@ -569,6 +614,14 @@ class AppTraceEventHandler(_events.TraceEventHandler):
                 server=event.source,
                 uniqueid=event.uniqueid
             ),
+        StartedTraceEvent:
+            lambda self, event: self.on_started(
+                when=event.timestamp,
+                instanceid=event.instanceid,
+                server=event.source,
+                uniqueid=event.uniqueid,
+                duration=event.duration
+            ),
         FinishedTraceEvent:
             lambda self, event: self.on_finished(
                 when=event.timestamp,
@@ -636,6 +689,11 @@ class AppTraceEventHandler(_events.TraceEventHandler):
         """Invoked when task is configured.
         """
 
+    @abc.abstractmethod
+    def on_started(self, when, instanceid, server, uniqueid, duration):
+        """Invoked when task container is started.
+        """
+
     @abc.abstractmethod
     def on_deleted(self, when, instanceid):
         """Invoked when task is deleted.
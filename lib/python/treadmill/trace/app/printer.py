@@ -55,6 +55,13 @@ class AppTracePrinter(events.AppTraceEventHandler):
             utils.strftime_utc(when), instanceid, uniqueid, server
         ))
 
+    def on_started(self, when, instanceid, server, uniqueid, duration):
+        """Invoked when task container is started.
+        """
+        print('%s - %s/%s started on %s in %.3fs' % (
+            utils.strftime_utc(when), instanceid, uniqueid, server, duration
+        ))
+
     def on_deleted(self, when, instanceid):
         """Invoked when task is deleted.
         """
@@ -10,10 +10,8 @@ import collections
 import fnmatch
 import logging
 import os
-import sqlite3
-import tempfile
+import re
 import time
-import zlib
 
 import kazoo
 
@@ -24,6 +22,7 @@ from treadmill import zkutils
 
 from . import events as traceevents
 from .. import _zk
+from .. import history
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -67,6 +66,38 @@ def publish(zkclient, when, instanceid, event_type, event_data, payload):
         _unschedule(zkclient, instanceid)
 
 
+def publish_batch(zkclient, events):
+    """Publish application events to ZK.
+
+    Events are (when, instanceid, event_type, event_data, payload) tuples.
+    Trace nodes are created first, then terminal events are handled in the
+    events order.
+    """
+    acl = zkclient.make_servers_acl()
+    nodes = []
+    for when, instanceid, event_type, event_data, payload in events:
+        eventnode = '%s,%s,%s,%s' % (when, _HOSTNAME, event_type, event_data)
+        nodes.append(
+            (z.path.trace(instanceid, eventnode), payload.encode())
+        )
+    _zk.create_batch(zkclient, nodes, acl=[acl])
+
+    for when, instanceid, event_type, event_data, _payload in events:
+        if event_type in ['aborted', 'killed', 'finished']:
+            zkutils.with_retry(
+                zkutils.put,
+                zkclient,
+                z.path.finished(instanceid),
+                {'state': event_type,
+                 'when': when,
+                 'host': _HOSTNAME,
+                 'data': event_data},
+                acl=[acl],
+            )
+
+            _unschedule(zkclient, instanceid)
+
+
 def _unschedule(zkclient, instanceid):
     """Safely delete scheduled node."""
     scheduled_node = z.path.scheduled(instanceid)
@@ -184,117 +215,147 @@ def list_traces(zkclient, app_pattern):
         if fnmatch.fnmatch(app, app_pattern):
             apps.add(app)
 
+    # Only the blocks of the literal prefix of the pattern are read.
+    prefix = re.split(r'[*?\[]', app_pattern, 1)[0]
     for node in zkclient.get_children(z.FINISHED_HISTORY):
         node_path = z.path.finished_history(node)
         _LOGGER.debug('Checking finished db snapshot: %s', node_path)
 
         data, _metadata = zkclient.get(node_path)
-        with tempfile.NamedTemporaryFile(delete=False, mode='wb') as f:
-            f.write(zlib.decompress(data))
+        with history.Snapshot(data, 'finished') as snapshot:
+            for row in snapshot.rows(prefix=prefix):
+                if fnmatch.fnmatchcase(row.name, app_pattern):
+                    apps.add(row.name)
 
-        conn = sqlite3.connect(f.name)
-        # Before Python 3.7 parametrized GLOB pattern won't use index.
-        select_stmt = """
-            SELECT name FROM finished WHERE name GLOB '{app_pattern}'
-        """.format(app_pattern=app_pattern)
-        for row in conn.execute(select_stmt):
-            apps.add(row[0])
-        conn.close()
+    return sorted(apps)
 
-        os.unlink(f.name)
 
-    return sorted(apps)
+def _scan_trace_shard(events, scheduled, expired_before,
+                      evictions_max_count, service_events_max_count):
+    """Scan the trace events of a shard in a single pass.
 
+    Events are processed latest first, excessive evictions and service
+    events are pruned, expired events of unscheduled instances which are not
+    pruned are collected.
 
-def prune_trace_evictions(zkclient, max_count):
-    """Cleanup excessive trace events caused by evictions.
+    :returns:
+        ``tuple`` - (pruned events, number of pruned evictions, expired
+        (timestamp, event)).
     """
-    assert max_count > 0
-    shards = zkclient.get_children(z.TRACE)
-    for shard in shards:
-        evictions = collections.Counter()
-        events = zkclient.get_children(z.path.trace_shard(shard))
-        for event in sorted(events, reverse=True):
-            instanceid, ts, src, event_type, event_data = event.split(',')
+    pruned = []
+    pruned_evictions = 0
+    expired = []
+    evictions = collections.Counter()
+    service_events = collections.Counter()
+
+    for event in sorted(events, reverse=True):
+        parts = event.split(',')
+        instanceid, timestamp = parts[0], float(parts[1])
 
+        event_obj = None
+        if len(parts) == 5 and (evictions_max_count or
+                                service_events_max_count):
+            _instanceid, _ts, src, event_type, event_data = parts
             event_obj = traceevents.AppTraceEvent.from_data(
-                timestamp=ts,
+                timestamp=parts[1],
                 source=src,
                 instanceid=instanceid,
                 event_type=event_type,
                 event_data=event_data,
             )
-            if not event_obj:
-                continue
 
+        if event_obj is not None and evictions_max_count:
             # Leave pending/created events.
             if event_type == 'pending' and 'created' in event_obj.why:
+                pass
+            # Prune when number of evictions for an instance reached
+            # max_count.
+            elif evictions[instanceid] >= evictions_max_count:
+                pruned.append(event)
+                pruned_evictions += 1
+                continue
+            elif ((event_type in ['pending', 'scheduled'] and
+                   event_obj.why == 'evicted')):
+                evictions[instanceid] += 1
+
+        if ((event_obj is not None and service_events_max_count and
+             event_type in ('service_running', 'service_exited'))):
+            key = (instanceid, event_obj.uniqueid, event_obj.service)
+            service_events[key] += 1
+            if service_events[key] > service_events_max_count:
+                pruned.append(event)
                 continue
 
-            # Prune when number of evictions for an instance reached max_count.
-            if evictions.get(instanceid, 0) >= max_count:
-                path = z.join_zookeeper_path(z.TRACE, shard, event)
-                _LOGGER.info('Pruning trace: %s', path)
-                zkutils.with_retry(zkutils.ensure_deleted, zkclient, path)
-            else:
-                if ((event_type in ['pending', 'scheduled'] and
-                     event_obj.why == 'evicted')):
-                    evictions[instanceid] += 1
+        if ((expired_before is not None and
+             instanceid not in scheduled and
+             timestamp < expired_before)):
+            expired.append((timestamp, event))
 
+    return pruned, pruned_evictions, expired
 
-def prune_trace_service_events(zkclient, max_count):
-    """Cleanup excessive trace events caused by services running and exiting.
-    """
-    assert max_count > 0
-    shards = zkclient.get_children(z.TRACE)
-    for shard in shards:
-        service_events = collections.Counter()
-        events = zkclient.get_children(z.path.trace_shard(shard))
-        for event in sorted(events, reverse=True):
-            instanceid, ts, src, event_type, event_data = event.split(',')
-
-            if event_type not in ('service_running', 'service_exited'):
-                continue
 
-            service_event = traceevents.AppTraceEvent.from_data(
-                timestamp=ts,
-                source=src,
-                instanceid=instanceid,
-                event_type=event_type,
-                event_data=event_data,
-            )
-            if not service_event:
-                continue
+def maintain_trace(zkclient, batch_size=None, expires_after=None,
+                   evictions_max_count=None, service_events_max_count=None):
+    """Prune excessive trace events and move expired traces into history.
 
-            uniqueid, service = service_event.uniqueid, service_event.service
-            service_events[(instanceid, uniqueid, service)] += 1
-            if service_events[(instanceid, uniqueid, service)] > max_count:
-                path = z.join_zookeeper_path(z.TRACE, shard, event)
-                _LOGGER.info('Pruning trace: %s', path)
-                zkutils.with_retry(zkutils.ensure_deleted, zkclient, path)
+    Each shard is listed and scanned once for all the passes, pruned events
+    are deleted with batched multi-op transactions. A pass is skipped if its
+    parameters are not set.
 
-
-def cleanup_trace(zkclient, batch_size, expires_after):
-    """Move expired traces into history folder, compressed as sqlite db.
+    :returns ``dict``:
+        Number of events and time (sec) spent in each phase.
     """
-    scheduled = zkclient.get_children(z.SCHEDULED)
-    shards = zkclient.get_children(z.TRACE)
+    stats = {
+        'events': 0,
+        'pruned_evictions': 0,
+        'pruned_service_events': 0,
+        'uploaded': 0,
+        'scan_time': 0.0,
+        'prune_time': 0.0,
+        'upload_time': 0.0,
+    }
+
+    expired_before = None
+    scheduled = frozenset()
+    if batch_size:
+        expired_before = time.time() - expires_after
+        scheduled = frozenset(zkclient.get_children(z.SCHEDULED))
+
     traces = []
-    num_events = 0
-    for shard in shards:
-        events = zkclient.get_children(z.path.trace_shard(shard))
-        num_events += len(events)
-        for event in events:
-            instanceid, timestamp, _ = event.split(',', 2)
-            timestamp = float(timestamp)
-            if ((instanceid not in scheduled and
-                 timestamp < time.time() - expires_after)):
-                traces.append((timestamp, shard, event))
+    for shard in zkclient.get_children(z.TRACE):
+        started = time.monotonic()
+        shard_path = z.path.trace_shard(shard)
+        events = zkclient.get_children(shard_path)
+        pruned, pruned_evictions, expired = _scan_trace_shard(
+            events, scheduled, expired_before,
+            evictions_max_count, service_events_max_count
+        )
+        traces.extend(
+            (timestamp, shard, event) for timestamp, event in expired
+        )
+        stats['events'] += len(events)
+        stats['scan_time'] += time.monotonic() - started
+
+        if pruned:
+            started = time.monotonic()
+            _LOGGER.info('Pruning %s trace events of: %s',
+                         len(pruned), shard_path)
+            _zk.delete_batch(
+                zkclient,
+                [z.join_zookeeper_path(shard_path, event)
+                 for event in pruned]
+            )
+            stats['pruned_evictions'] += pruned_evictions
+            stats['pruned_service_events'] += len(pruned) - pruned_evictions
+            stats['prune_time'] += time.monotonic() - started
 
+    if not batch_size:
+        return stats
+
+    started = time.monotonic()
     # Sort traces from older to latest.
     traces.sort()
 
-    uploaded_events = 0
     for idx in range(0, len(traces), batch_size):
         # Take a slice of batch_size
         batch = traces[idx:idx + batch_size]
@@ -316,16 +377,44 @@ def cleanup_trace(zkclient, batch_size, expires_after):
             db_rows
         )
 
-        uploaded_events += len(db_rows)
+        stats['uploaded'] += len(db_rows)
 
+    stats['upload_time'] = time.monotonic() - started
     _LOGGER.info('Cleaned up %s trace events, live events: %s',
-                 uploaded_events, num_events - uploaded_events)
+                 stats['uploaded'],
+                 stats['events'] - stats['uploaded'] -
+                 stats['pruned_evictions'] - stats['pruned_service_events'])
+    return stats
+
+
+def prune_trace_evictions(zkclient, max_count):
+    """Cleanup excessive trace events caused by evictions.
+    """
+    assert max_count > 0
+    return maintain_trace(zkclient, evictions_max_count=max_count)
+
+
+def prune_trace_service_events(zkclient, max_count):
+    """Cleanup excessive trace events caused by services running and exiting.
+    """
+    assert max_count > 0
+    return maintain_trace(zkclient, service_events_max_count=max_count)
+
+
+def cleanup_trace(zkclient, batch_size, expires_after):
+    """Move expired traces into history folder, compressed as sqlite db.
+    """
+    return maintain_trace(zkclient, batch_size=batch_size,
+                          expires_after=expires_after)
 
 
 def cleanup_finished(zkclient, batch_size, expires_after):
     """Move expired finished events into finished history.
-    """
 
+    :returns ``int``:
+        Number of uploaded finished nodes.
+    """
+    uploaded = 0
     expired = []
     for finished in zkclient.get_children(z.FINISHED):
         node_path = z.path.finished(finished)
@@ -349,15 +438,18 @@ def cleanup_finished(zkclient, batch_size, expires_after):
             'finished',
             batch
         )
+        uploaded += len(batch)
+
+    return uploaded
 
 
 def cleanup_trace_history(zkclient, max_count):
     """Cleanup trace history.
     """
-    _zk.cleanup(zkclient, z.TRACE_HISTORY, max_count)
+    return _zk.cleanup(zkclient, z.TRACE_HISTORY, max_count)
 
 
 def cleanup_finished_history(zkclient, max_count):
     """Cleanup trace history.
     """
-    _zk.cleanup(zkclient, z.FINISHED_HISTORY, max_count)
+    return _zk.cleanup(zkclient, z.FINISHED_HISTORY, max_count)
@@ -1,4 +1,9 @@
 """Publish trace events.
+
+Event files are queued as they are created and published in windows, the
+trace nodes of a window are created with batched ZK transactions. Event
+files are published (and removed) in the order they were created in, which
+preserves the events order of each instance.
 """
 
 from __future__ import absolute_import
@@ -6,9 +11,11 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import collections
 import io
 import logging
 import os
+import time
 
 from treadmill import dirwatch
 from treadmill import utils
@@ -19,14 +26,31 @@ from treadmill.trace.server import zk as server_zk
 
 _LOGGER = logging.getLogger(__name__)
 
+#: Max number of event files published at once.
+PUBLISH_WINDOW = 1000
+
+#: Age (in seconds) of the oldest unpublished event to warn about backlog.
+BACKLOG_WARN_AGE = 60
+
 
 class EventsPublisher:
     """Monitor event directories and publish events."""
 
-    def __init__(self, zkclient, app_events_dir=None, server_events_dir=None):
+    def __init__(self, zkclient, app_events_dir=None, server_events_dir=None,
+                 window=PUBLISH_WINDOW):
         self._zkclient = zkclient
         self._app_events_dir = app_events_dir
         self._server_events_dir = server_events_dir
+        self._window = window
+
+        # Event file path -> batch handler, in creation order.
+        self._pending = collections.OrderedDict()
+        self.stats = {
+            'pending': 0,
+            'oldest_age': 0,
+            'published': 0,
+            'windows': 0,
+        }
 
         self._watcher = dirwatch.DirWatcher()
         self._dispatcher = dirwatch.DirWatcherDispatcher(self._watcher)
@@ -34,11 +58,12 @@ class EventsPublisher:
     def run(self):
         """Run events publisher."""
         if self._app_events_dir:
-            self._configure(self._app_events_dir, app_zk.publish)
+            self._configure(self._app_events_dir, app_zk.publish_batch)
         if self._server_events_dir:
-            self._configure(self._server_events_dir, server_zk.publish)
+            self._configure(self._server_events_dir, server_zk.publish_batch)
 
         while True:
+            self._publish_pending()
             if self._watcher.wait_for_events(60):
                 self._watcher.process_events()
 
@@ -48,25 +73,74 @@ class EventsPublisher:
             dirwatch.DirWatcherEvent.CREATED:
                 lambda p, h=handler: self._on_created(p, h)
         })
-        for event_file in os.listdir(events_dir):
+        for event_file in sorted(os.listdir(events_dir)):
             path = os.path.join(events_dir, event_file)
             self._on_created(path, handler)
 
-    @utils.exit_on_unhandled
     def _on_created(self, path, handler):
-        if not os.path.exists(path):
+        """Queue new event file."""
+        if os.path.basename(path).startswith('.'):
             return
 
-        event_dir, event_file = os.path.split(path)
-        if event_file.startswith('.'):
-            return
-
-        _LOGGER.info('New event file - %s', path)
-
-        when, what, event_type, event_data = event_file.split(',', 4)
-        with io.open(path) as f:
-            payload = f.read()
+        _LOGGER.debug('New event file - %s', path)
+        self._pending[path] = handler
 
-        handler(self._zkclient, when, what, event_type, event_data, payload)
+    @utils.exit_on_unhandled
+    def _publish_pending(self):
+        """Publish queued event files, one window at a time."""
+        while self._pending:
+            self._update_stats()
+            if self.stats['oldest_age'] > BACKLOG_WARN_AGE:
+                _LOGGER.warning('Publishing backlog: %r', self.stats)
+
+            window = collections.defaultdict(list)
+            for _ in range(min(self._window, len(self._pending))):
+                path, handler = self._pending.popitem(last=False)
+                window[handler].append(path)
+
+            for handler, paths in window.items():
+                self._publish(paths, handler)
+            self.stats['windows'] += 1
+
+        self._update_stats()
+
+    def _publish(self, paths, handler):
+        """Publish event files with batch handler."""
+        events = []
+        published = []
+        for path in paths:
+            if not os.path.exists(path):
+                continue
+
+            event_file = os.path.basename(path)
+            when, what, event_type, event_data = event_file.split(',', 4)
+            with io.open(path) as f:
+                payload = f.read()
+
+            events.append((when, what, event_type, event_data, payload))
+            published.append(path)
+
+        if not events:
+            return
 
-        os.unlink(path)
+        _LOGGER.info('Publishing %s events', len(events))
+        handler(self._zkclient, events)
+
+        for path in published:
+            os.unlink(path)
+        self.stats['published'] += len(published)
+
+    def _update_stats(self):
+        """Update backpressure stats of the queued event files."""
+        oldest_age = 0
+        if self._pending:
+            # Files are queued in creation order, the first one is the oldest.
+            path = next(iter(self._pending))
+            try:
+                when = float(os.path.basename(path).split(',', 1)[0])
+                oldest_age = max(0, time.time() - when)
+            except ValueError:
+                pass
+
+        self.stats['pending'] = len(self._pending)
+        self.stats['oldest_age'] = oldest_age
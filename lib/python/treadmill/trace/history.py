@@ -0,0 +1,256 @@
+"""Trace history snapshots.
+
+History snapshots hold rows (path, timestamp, data, directory, name) sorted by
+name, in blocks of columns compressed separately. The header is a sparse
+index of the first and last name of each block, so that a lookup by name
+prefix only decompresses the blocks that may match::
+
+    magic | header size | zlib(json header) | zlib(json block) ...
+
+Older snapshots are zlib compressed sqlite DBs, they are still readable.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import collections
+import io
+import json
+import logging
+import os
+import sqlite3
+import struct
+import tempfile
+import zlib
+
+_LOGGER = logging.getLogger(__name__)
+
+MAGIC = b'TRHIST1\n'
+
+#: Number of rows in a block.
+BLOCK_SIZE = 1000
+
+_HEADER_SIZE = struct.Struct('>I')
+
+HistoryRow = collections.namedtuple(
+    'HistoryRow',
+    ['path', 'timestamp', 'data', 'directory', 'name']
+)
+
+
+def _prefix_upper(prefix):
+    """Return the smallest string greater than all strings with prefix."""
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def dumps(table, rows, block_size=BLOCK_SIZE):
+    """Serialize history rows into a snapshot.
+
+    Row path must be the row directory joined with the row name.
+    """
+    rows = sorted(rows, key=lambda row: row[4])
+    blocks = []
+    body = []
+    offset = 0
+    for idx in range(0, len(rows), block_size):
+        block = rows[idx:idx + block_size]
+        for path, _timestamp, _data, directory, name in block:
+            assert path == directory.rstrip('/') + '/' + name, path
+
+        columns = [
+            [row[4] for row in block],
+            [row[3] for row in block],
+            [row[1] for row in block],
+            [row[2] for row in block],
+        ]
+        compressed = zlib.compress(json.dumps(columns).encode())
+        blocks.append(
+            [block[0][4], block[-1][4], offset, len(compressed), len(block)]
+        )
+        body.append(compressed)
+        offset += len(compressed)
+
+    header = zlib.compress(
+        json.dumps({'table': table, 'blocks': blocks}).encode()
+    )
+    return b''.join(
+        [MAGIC, _HEADER_SIZE.pack(len(header)), header] + body
+    )
+
+
+def _connect_legacy(data):
+    """Open (decompressed) legacy sqlite snapshot.
+
+    :returns:
+        ``tuple`` - (connection, temporary file or None).
+    """
+    db = zlib.decompress(data)
+    conn = sqlite3.connect(':memory:')
+    if hasattr(conn, 'deserialize'):
+        conn.deserialize(db)
+        return conn, None
+
+    # Before Python 3.11, the DB can only be opened from a file.
+    conn.close()
+    with tempfile.NamedTemporaryFile(delete=False, mode='wb') as f:
+        f.write(db)
+    return sqlite3.connect(f.name), f.name
+
+
+class Snapshot:
+    """Trace history snapshot reader."""
+
+    __slots__ = (
+        'table',
+        'blocks',
+        '_data',
+        '_body',
+        '_conn',
+        '_tmp',
+    )
+
+    def __init__(self, data, table=None):
+        self._data = memoryview(data)
+        self._conn = None
+        self._tmp = None
+
+        if not data.startswith(MAGIC):
+            self.table = table
+            self.blocks = None
+            self._body = 0
+            self._conn, self._tmp = _connect_legacy(data)
+            return
+
+        start = len(MAGIC) + _HEADER_SIZE.size
+        (header_size,) = _HEADER_SIZE.unpack_from(data, len(MAGIC))
+        header = json.loads(
+            zlib.decompress(self._data[start:start + header_size]).decode()
+        )
+        self.table = header['table']
+        self.blocks = header['blocks']
+        self._body = start + header_size
+
+    @property
+    def legacy(self):
+        """Check if the snapshot is a legacy sqlite DB."""
+        return self._conn is not None
+
+    def __len__(self):
+        if self.legacy:
+            return self._conn.execute(
+                'SELECT count(*) FROM {table}'.format(table=self.table)
+            ).fetchone()[0]
+        return sum(block[4] for block in self.blocks)
+
+    def _read_block(self, offset, size):
+        """Decompress block, return its rows."""
+        start = self._body + offset
+        names, directories, timestamps, datas = json.loads(
+            zlib.decompress(self._data[start:start + size]).decode()
+        )
+        for name, directory, timestamp, data in zip(names, directories,
+                                                    timestamps, datas):
+            yield HistoryRow(
+                directory.rstrip('/') + '/' + name,
+                timestamp, data, directory, name
+            )
+
+    def rows(self, prefix=''):
+        """Get rows with name prefix, ordered by name."""
+        if self.legacy:
+            return self._legacy_rows(prefix)
+        return self._rows(prefix)
+
+    def _rows(self, prefix):
+        upper = _prefix_upper(prefix) if prefix else None
+        for first, last, offset, size, _count in self.blocks:
+            if last < prefix:
+                continue
+            if upper is not None and first >= upper:
+                break
+            for row in self._read_block(offset, size):
+                if row.name.startswith(prefix):
+                    yield row
+
+    def _legacy_rows(self, prefix):
+        select_stmt = """
+            SELECT path, timestamp, data, directory, name FROM {table}
+        """.format(table=self.table)
+        args = ()
+        if prefix:
+            select_stmt += 'WHERE name >= ? AND name < ? '
+            args = (prefix, _prefix_upper(prefix))
+        select_stmt += 'ORDER BY name'
+
+        for row in self._conn.execute(select_stmt, args):
+            yield HistoryRow(*row)
+
+    def close(self):
+        """Release the legacy DB resources."""
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+        if self._tmp is not None:
+            os.unlink(self._tmp)
+            self._tmp = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_args):
+        self.close()
+
+
+def write_sqlite(data, db_path, table=None):
+    """Write a snapshot as a sqlite DB (e.g. to query it with SQL).
+    """
+    if not data.startswith(MAGIC):
+        with io.open(db_path, 'wb') as f:
+            f.write(zlib.decompress(data))
+        return
+
+    with Snapshot(data, table) as snapshot:
+        conn = sqlite3.connect(db_path)
+        try:
+            with conn:
+                create_table(conn, snapshot.table, snapshot.rows())
+        finally:
+            conn.close()
+
+
+def create_table(conn, table, rows):
+    """Create and index history table with rows."""
+    conn.execute(
+        """
+        CREATE TABLE {table} (
+            path text, timestamp real, data text,
+            directory text, name text
+        )
+        """.format(table=table)
+    )
+    conn.executemany(
+        """
+        INSERT INTO {table} (
+            path, timestamp, data, directory, name
+        ) VALUES(?, ?, ?, ?, ?)
+        """.format(table=table), rows
+    )
+    conn.executescript(
+        """
+        CREATE INDEX name_idx ON {table} (name);
+        CREATE INDEX path_idx ON {table} (path);
+        """.format(table=table)
+    )
+
+
+__all__ = [
+    'BLOCK_SIZE',
+    'HistoryRow',
+    'MAGIC',
+    'Snapshot',
+    'create_table',
+    'dumps',
+    'write_sqlite',
+]
@@ -48,6 +48,21 @@ def publish(zkclient, when, servername, event_type, event_data, payload):
         pass
 
 
+def publish_batch(zkclient, events):
+    """Publish server events to ZK.
+
+    Events are (when, servername, event_type, event_data, payload) tuples.
+    """
+    acl = zkclient.make_servers_acl()
+    nodes = []
+    for when, servername, event_type, event_data, payload in events:
+        eventnode = '%s,%s,%s,%s' % (when, _HOSTNAME, event_type, event_data)
+        nodes.append(
+            (z.path.server_trace(servername, eventnode), payload.encode())
+        )
+    _zk.create_batch(zkclient, nodes, acl=[acl])
+
+
 class ServerTraceLoop(_zk.TraceLoop):
     """Server trace loop.
     """
@@ -152,9 +167,10 @@ def cleanup_server_trace(zkclient, batch_size):
 
     _LOGGER.info('Cleaned up %s server trace events, live events: %s',
                  uploaded_events, num_events)
+    return uploaded_events
 
 
 def cleanup_server_trace_history(zkclient, max_count):
     """Cleanup server trace history.
     """
-    _zk.cleanup(zkclient, z.SERVER_TRACE_HISTORY, max_count)
+    return _zk.cleanup(zkclient, z.SERVER_TRACE_HISTORY, max_count)
@@ -20,7 +20,10 @@ import sqlite3
 import threading
 import time
 import uuid
+import weakref
 
+import tornado.ioloop
+import tornado.web
 import tornado.websocket
 
 import six
@@ -28,10 +31,59 @@ from six.moves import urllib_parse
 
 from treadmill import dirwatch
 from treadmill import utils
+from treadmill.zksync import mirrordb
+from treadmill.zksync import sowdb
 
 
 _LOGGER = logging.getLogger(__name__)
 
+#: Max number of unflushed messages of a connection before live events to it
+#: are dropped.
+MAX_QUEUE = 10000
+
+#: Max age (seconds) of the oldest unflushed message of a connection, before
+#: a connection dropping events is closed.
+MAX_LAG = 60
+
+#: Max number of directory events processed per IOLoop iteration.
+MAX_EVENTS_PER_CYCLE = 100
+
+#: Interval (seconds) at which disconnected handlers are removed.
+GC_INTERVAL = 10
+
+#: Maximum number of idle state of the world DB connections.
+MAX_SOW_CONNECTIONS = 32
+
+#: Interval (seconds) at which the mirror DB change log is polled.
+MIRROR_POLL_INTERVAL = 0.1
+
+# Published operation of the directory events.
+_OPERATIONS = {
+    dirwatch.DirWatcherEvent.CREATED: 'c',
+    dirwatch.DirWatcherEvent.MODIFIED: 'm',
+    dirwatch.DirWatcherEvent.DELETED: 'd',
+}
+
+# Wildcards of the fnmatch patterns.
+_WILDCARD_RE = re.compile(r'[*?\[]')
+
+
+def _literal_prefix(pattern):
+    """Return the literal (wildcard free) prefix of a fnmatch pattern."""
+    match = _WILDCARD_RE.search(pattern)
+    if match is None:
+        return pattern
+    return pattern[:match.start()]
+
+
+def _with_sub_id(msg, sub_id):
+    """Splice the sub-id into an encoded (non-empty) JSON object."""
+    if sub_id is None:
+        return msg
+    return '{msg}, "sub-id": {sub_id}}}'.format(
+        msg=msg[:-1], sub_id=json.dumps(sub_id)
+    )
+
 
 class AggregateFuture(tornado.concurrent.Future):
     """Aggregation future to get done state if all depending future is done
@@ -75,6 +127,9 @@ def make_handler(pubsub):
     class _WS(tornado.websocket.WebSocketHandler):
         """Base class contructor"""
 
+        max_queue = MAX_QUEUE
+        max_lag = MAX_LAG
+
         def __init__(self, application, request, **kwargs):
             """Default constructor for tornado.websocket.WebSocketHandler"""
             tornado.websocket.WebSocketHandler.__init__(
@@ -82,6 +137,10 @@ def make_handler(pubsub):
             )
             self._request_id = str(uuid.uuid4())
             self._subscriptions = set()
+            # Send time of the messages not yet flushed (in order).
+            self._write_times = collections.deque()
+            self._sent = 0
+            self._dropped = 0
 
         def active(self, sub_id=None):
             """Return true if connection (and optional subscription) is active,
@@ -100,16 +159,70 @@ def make_handler(pubsub):
             """
             _LOGGER.info('[%s] Connection opened, remote ip: %s',
                          self._request_id, self.request.remote_ip)
+            if pubsub:
+                pubsub.connections.add(self)
 
-        def send_msg(self, msg):
-            """Send message."""
-            _LOGGER.info('[%s] Sending message: %r', self._request_id, msg)
+        def lag(self):
+            """Age of the oldest message not yet flushed to the client."""
+            try:
+                return max(time.time() - self._write_times[0], 0)
+            except IndexError:
+                return 0
+
+        def stats(self):
+            """Connection queue and lag metrics."""
+            return {
+                'id': self._request_id,
+                'remote_ip': self.request.remote_ip,
+                'subscriptions': len(self._subscriptions),
+                'queued': len(self._write_times),
+                'lag': self.lag(),
+                'sent': self._sent,
+                'dropped': self._dropped,
+            }
+
+        def _is_slow(self):
+            """Check if the client does not keep up with its messages.
+
+            Slow clients are disconnected once they lag more than max_lag,
+            they can resubscribe with "since" to catch up.
+            """
+            if len(self._write_times) < self.max_queue:
+                return False
+
+            if self.lag() > self.max_lag:
+                _LOGGER.warning('[%s] Slow consumer, lag: %.1fs, closing.',
+                                self._request_id, self.lag())
+                self.close_with_log()
+            return True
+
+        def _on_written(self, _future):
+            """Message flushed (or failed)."""
+            try:
+                self._write_times.popleft()
+            except IndexError:
+                pass
+            self._sent += 1
+
+        def send_msg(self, msg, droppable=False):
+            """Send message (dict or already encoded JSON str).
+
+            Droppable messages (live events) are not queued to slow clients.
+            """
+            if droppable and self._is_slow():
+                self._dropped += 1
+                return None
+
+            _LOGGER.debug('[%s] Sending message: %r', self._request_id, msg)
             future = None
             try:
                 future = self.write_message(msg)
             except Exception:  # pylint: disable=W0703
                 _LOGGER.exception('[%s] Error sending message: %r',
                                   self._request_id, msg)
+            if future is not None:
+                self._write_times.append(time.time())
+                future.add_done_callback(self._on_written)
             return future
 
         def close_with_log(self):
@@ -152,7 +265,10 @@ def make_handler(pubsub):
 
             Override if you want to do something else besides log the action.
             """
-            _LOGGER.info('[%s] Connection closed.', self._request_id)
+            _LOGGER.info('[%s] Connection closed, sent: %d, dropped: %d.',
+                         self._request_id, self._sent, self._dropped)
+            if pubsub:
+                pubsub.connections.discard(self)
 
         def check_origin(self, origin):
             """Overriding check_origin method from base class.
@@ -249,18 +365,39 @@ def make_handler(pubsub):
     return _WS
 
 
+def make_stats_handler(pubsub):
+    """Make handler reporting the websocket connections metrics."""
+
+    class _Stats(tornado.web.RequestHandler):
+        """Connections metrics."""
+
+        def get(self):
+            """Return the metrics of all open connections."""
+            self.write({'connections': pubsub.stats()})
+
+    return _Stats
+
+
 class DirWatchPubSub:
     """Pubsub dirwatch events."""
 
-    def __init__(self, root, impl=None, watches=None):
+    def __init__(self, root, impl=None, watches=None,
+                 max_queue=MAX_QUEUE, max_lag=MAX_LAG,
+                 max_sow_connections=MAX_SOW_CONNECTIONS):
         self.root = os.path.realpath(root)
         self.impl = impl or {}
         self.watches = watches or []
+        self.connections = weakref.WeakSet()
+        self._ioloop = None
+        self._processing = False
 
-        self.watcher = dirwatch.DirWatcher()
+        # Files are published once completely written, redundant events of
+        # a read are coalesced.
+        self.watcher = dirwatch.DirWatcher(coalesce=True, close_write=True)
         self.watcher.on_created = self._on_created
         self.watcher.on_deleted = self._on_deleted
         self.watcher.on_modified = self._on_modified
+        self.watcher.on_events = self._on_events
 
         self.watch_dirs = set()
         for watch in self.watches:
@@ -271,7 +408,37 @@ class DirWatchPubSub:
             self.watcher.add_dir(directory)
 
         self.ws = make_handler(self)
+        self.ws.max_queue = max_queue
+        self.ws.max_lag = max_lag
         self.handlers = collections.defaultdict(list)
+        # Handlers of each directory, indexed by pattern literal prefix.
+        self._index = collections.defaultdict(
+            lambda: collections.defaultdict(list)
+        )
+        self._prefix_lens = collections.defaultdict(set)
+        # Snapshot DB indexes, by sow dir and DB path.
+        self._sow_indexes = {}
+        self._sow_conns = sowdb.ConnectionPool(max_sow_connections)
+
+        # Nodes synced to the zk2fs mirror DB instead of files.
+        self.mirror = None
+        self._mirror_seq = 0
+        if self._open_mirror():
+            self._mirror_seq = self.mirror.seq()
+
+    def _open_mirror(self):
+        """Open the zk2fs mirror DB if it exists, return True if opened.
+
+        The DB may be created after startup, all of its changes are then
+        published.
+        """
+        mirror_path = mirrordb.db_path(self.root)
+        if not os.path.exists(mirror_path):
+            return False
+
+        _LOGGER.info('Using mirror DB: %s', mirror_path)
+        self.mirror = mirrordb.MirrorDB(mirror_path, readonly=True)
+        return True
 
     def register(self, watch, pattern, ws_handler, impl, since, sub_id=None):
         """Register handler with pattern.
@@ -289,9 +456,11 @@ class DirWatchPubSub:
             pattern_re = re.compile(
                 fnmatch.translate(pattern)
             )
-            self.handlers[directory].append(
-                (pattern_re, ws_handler, impl, sub_id)
-            )
+            entry = (pattern_re, ws_handler, impl, sub_id)
+            self.handlers[directory].append(entry)
+            prefix = _literal_prefix(pattern)
+            self._index[directory][prefix].append(entry)
+            self._prefix_lens[directory].add(len(prefix))
         return self._sow(
             watch, pattern, since, ws_handler, impl,
             sub_id=sub_id
@@ -301,6 +470,14 @@ class DirWatchPubSub:
         pathname = os.path.realpath(os.path.join(self.root, watch.lstrip('/')))
         return [path for path in glob.glob(pathname) if os.path.isdir(path)]
 
+    @utils.exit_on_unhandled
+    def _on_events(self, events):
+        """On directory events batch callback."""
+        for event, path in events:
+            operation = _OPERATIONS.get(event)
+            if operation is not None:
+                self._handle(operation, path)
+
     @utils.exit_on_unhandled
     def _on_created(self, path):
         """On file created callback."""
@@ -327,13 +504,7 @@ class DirWatchPubSub:
         if filename[0] == '.':
             return
 
-        directory_handlers = self.handlers.get(directory, [])
-        handlers = [
-            (handler, impl, sub_id)
-            for pattern_re, handler, impl, sub_id in directory_handlers
-            if (handler.active(sub_id=sub_id) and
-                pattern_re.match(filename))
-        ]
+        handlers = self._match(directory, filename)
         if not handlers:
             return
 
@@ -360,46 +531,164 @@ class DirWatchPubSub:
 
         self._notify(handlers, path, operation, content, when)
 
+    @utils.exit_on_unhandled
+    def _poll_mirror(self):
+        """Notify interested handlers of the mirror DB changes."""
+        if self.mirror is None:
+            return
+
+        changes = self.mirror.changes(self._mirror_seq)
+        if changes and changes[0][0] > self._mirror_seq + 1:
+            # The change log was trimmed past the last seen change, the
+            # subscribers reconnect and reload the state of the world.
+            _LOGGER.warning('Mirror DB changes lost: %s - %s',
+                            self._mirror_seq + 1, changes[0][0] - 1)
+            self._mirror_seq = self.mirror.seq()
+            for conn in list(self.connections):
+                conn.close_with_log()
+            return
+
+        for seq, operation, zkpath in changes:
+            self._mirror_seq = seq
+
+            path = self.root + zkpath
+            directory, filename = os.path.split(path)
+            if filename[0] == '.':
+                continue
+
+            handlers = self._match(directory, filename)
+            if not handlers:
+                continue
+
+            if operation == 'd':
+                when, content = time.time(), None
+            else:
+                record = self.mirror.get(zkpath)
+                if record is None:
+                    # Already deleted, it will be handled as 'd'.
+                    continue
+                data, when = record
+                content = data.decode() if data else ''
+
+            self._notify(handlers, path, operation, content, when)
+
+    def _match(self, directory, filename):
+        """Get the active handlers with a pattern matching filename."""
+        index = self._index.get(directory)
+        if not index:
+            return []
+
+        handlers = []
+        matched = {}
+        for prefix_len in list(self._prefix_lens[directory]):
+            for pattern_re, handler, impl, sub_id in index.get(
+                    filename[:prefix_len], ()):
+                if pattern_re not in matched:
+                    matched[pattern_re] = bool(pattern_re.match(filename))
+                if matched[pattern_re] and handler.active(sub_id=sub_id):
+                    handlers.append((handler, impl, sub_id))
+
+        return handlers
+
     def _notify(self, handlers, path, operation, content, when):
-        """Notify interested handlers of the change."""
+        """Notify interested handlers of the change.
+
+        The event payload is computed and encoded once per topic, only the
+        sub-id is added for each subscriber.
+        """
         root_len = len(self.root)
 
+        by_impl = collections.OrderedDict()
         for handler, impl, sub_id in handlers:
+            by_impl.setdefault(id(impl), (impl, []))[1].append(
+                (handler, sub_id)
+            )
+
+        for impl, subscribers in by_impl.values():
             try:
                 payload = impl.on_event(path[root_len:],
                                         operation,
                                         content)
-                if payload is not None:
-                    payload['when'] = when
-                    if sub_id is not None:
-                        payload['sub-id'] = sub_id
-                    handler.send_msg(payload)
+                if payload is None:
+                    continue
+                payload['when'] = when
+                msg = json.dumps(payload)
             except Exception as err:  # pylint: disable=broad-except
-                _LOGGER.exception('Error handling event: %s, %s, %s, %s, %s',
-                                  path, operation, content, when, sub_id)
-                handler.send_error_msg(
-                    '{cls}: {err}'.format(
-                        cls=type(err).__name__,
-                        err=str(err)
-                    ),
-                    sub_id=sub_id,
-                    close_conn=sub_id is None
-                )
+                _LOGGER.exception('Error handling event: %s, %s, %s, %s',
+                                  path, operation, content, when)
+                for handler, sub_id in subscribers:
+                    handler.send_error_msg(
+                        '{cls}: {err}'.format(
+                            cls=type(err).__name__,
+                            err=str(err)
+                        ),
+                        sub_id=sub_id,
+                        close_conn=sub_id is None
+                    )
+                continue
+
+            for handler, sub_id in subscribers:
+                handler.send_msg(_with_sub_id(msg, sub_id), droppable=True)
+
+    def _sow_dbs(self, sow_dir, sow_table, since, prefix):
+        """Get the snapshot DBs of sow_dir that may have matching records.
+        """
+        try:
+            names = sorted(os.listdir(sow_dir))
+        except OSError as err:
+            if err.errno != errno.ENOENT:
+                raise
+            names = []
+
+        db_paths = [
+            os.path.join(sow_dir, name) for name in names
+            if not name.startswith('.')
+        ]
+        self._sow_conns.retain(db_paths)
+
+        indexes = self._sow_indexes.setdefault(sow_dir, {})
+        for db_path in set(indexes) - set(db_paths):
+            del indexes[db_path]
+
+        for db_path in db_paths:
+            if db_path not in indexes:
+                indexes[db_path] = self._load_sow_index(db_path)
+            index = indexes[db_path]
+            if index is None:
+                continue
+            if sowdb.overlaps(index.get(sow_table), since, prefix):
+                yield db_path
+
+    def _load_sow_index(self, db_path):
+        """Load the index of a snapshot DB, building it if not synced."""
+        index = sowdb.read_index(db_path)
+        if index is not None:
+            return index
+
+        try:
+            conn = self._sow_conns.acquire(db_path)
+        except sqlite3.OperationalError:
+            _LOGGER.info('Ignore deleted db: %s', db_path)
+            return None
+
+        try:
+            index = sowdb.build_index(conn)
+        except sqlite3.DatabaseError as db_err:
+            _LOGGER.info('Unable to index db: %s, %s', db_path, str(db_err))
+            conn.close()
+            return None
+
+        self._sow_conns.release(db_path, conn)
+        return index
 
     def _db_records(self, db_path, sow_table, watch, pattern, since):
         """Get matching records from db."""
-        # if file does not exist, do not try to open it. Opening connection
-        # will create the file, there is no way to prevent this from
-        # happening until py3.
-        #
-        if not os.path.exists(db_path):
+        try:
+            conn = self._sow_conns.acquire(db_path)
+        except sqlite3.OperationalError:
             _LOGGER.info('Ignore deleted db: %s', db_path)
             return (None, None)
 
-        # There is rare condition that the db file is deleted HERE. In this
-        # case connection will be open, but the tables will not be there.
-        conn = sqlite3.connect(db_path)
-
         # Before Python 3.7 GLOB pattern must not be parametrized to use index.
         select_stmt = """
             SELECT timestamp, path, data FROM %s
@@ -407,11 +696,11 @@ class DirWatchPubSub:
             ORDER BY timestamp
         """ % (sow_table, pattern)
 
-        # Return open connection, as conn.execute is cursor iterator, not
-        # materialized list.
+        # Return checked out connection, as conn.execute is cursor iterator,
+        # not materialized list.
         try:
             return conn, conn.execute(select_stmt, (watch, since,))
-        except sqlite3.OperationalError as db_err:
+        except sqlite3.DatabaseError as db_err:
             # Not sure if the file needs to be deleted at this point. As
             # sow_table is a parameter, passing non-existing table can cause
             # legit file to be deleted.
@@ -446,28 +735,27 @@ class DirWatchPubSub:
         sow_future = AggregateFuture('sow[{}]'.format(pattern))
         db_connections = []
         fs_records = self._get_fs_sow(watch, pattern, since)
+        if self.mirror is not None:
+            fs_records = heapq.merge(
+                fs_records, self._get_mirror_sow(watch, pattern, since)
+            )
 
         sow = getattr(impl, 'sow', None)
         sow_table = getattr(impl, 'sow_table', 'sow')
         try:
             records = []
             if sow:
-                dbs = sorted(glob.glob(os.path.join(self.root, sow, '*')))
+                dbs = self._sow_dbs(
+                    os.path.join(self.root, sow), sow_table, since,
+                    _literal_prefix(pattern)
+                )
                 for db in dbs:
-                    if os.path.basename(db).startswith('.'):
-                        continue
-
                     conn, db_cursor = self._db_records(
                         db, sow_table, watch, pattern, since
                     )
                     if db_cursor:
                         records.append(db_cursor)
-
-                    # FIXME: Figure out pylint use before assign
-                    #
-                    # pylint: disable=E0601
-                    if conn:
-                        db_connections.append(conn)
+                        db_connections.append((db, conn))
 
             records.append(fs_records)
             # Merge db and fs records, removing duplicates.
@@ -485,37 +773,55 @@ class DirWatchPubSub:
             # sow future will be done after all send_msg() are done
             sow_future.ready_for_finish()
         finally:
-            for conn in db_connections:
-                if conn:
-                    conn.close()
+            for db, conn in db_connections:
+                self._sow_conns.release(db, conn)
 
         return sow_future
 
     def _get_fs_sow(self, watch, pattern, since):
-        """Get state of the world from filesystem."""
+        """Get state of the world from filesystem.
+
+        Files are filtered and ordered by mtime first, content is only read
+        when the records are consumed.
+        """
         root_len = len(self.root)
         fs_glob = os.path.join(self.root, watch.lstrip('/'), pattern)
 
-        files = glob.glob(fs_glob)
+        stats = []
+        for filename in glob.glob(fs_glob):
+            try:
+                mtime = os.stat(filename).st_mtime
+            except OSError as err:
+                # Ignore deleted files.
+                if err.errno != errno.ENOENT:
+                    raise
+                continue
+            if mtime >= since:
+                stats.append((mtime, filename[root_len:], filename))
 
-        items = []
-        for filename in files:
+        for when, path, filename in sorted(stats):
             try:
-                stat = os.stat(filename)
                 with io.open(filename) as f:
                     content = f.read()
-                if stat.st_mtime >= since:
-                    path, when = filename[root_len:], stat.st_mtime
-                    items.append((when, path, content))
             except (IOError, OSError) as err:
                 # Ignore deleted files.
                 if err.errno != errno.ENOENT:
                     raise
+                continue
+            yield when, path, content
 
-        return sorted(items)
+    def _get_mirror_sow(self, watch, pattern, since):
+        """Get state of the world from the mirror DB."""
+        dir_pattern = '/' + watch.strip('/')
+        for when, path, data in self.mirror.records(dir_pattern, pattern,
+                                                    since):
+            yield when, path, data.decode() if data else ''
 
     def _gc(self):
         """Remove disconnected websocket handlers."""
+        if self.mirror is None:
+            self._open_mirror()
+
         for directory in list(six.viewkeys(self.handlers)):
             handlers = [
                 (pattern, handler, impl, sub_id)
@@ -529,11 +835,25 @@ class DirWatchPubSub:
             if not handlers:
                 _LOGGER.debug('No active handlers for %s', directory)
                 self.handlers.pop(directory, None)
+                self._index.pop(directory, None)
+                self._prefix_lens.pop(directory, None)
                 if directory not in self.watch_dirs:
                     # Watch is not permanent, remove dir from watcher.
                     self.watcher.remove_dir(directory)
             else:
                 self.handlers[directory] = handlers
+                index = collections.defaultdict(list)
+                for prefix, entries in list(self._index[directory].items()):
+                    active = [
+                        entry for entry in entries
+                        if entry[1].active(sub_id=entry[3])
+                    ]
+                    if active:
+                        index[prefix] = active
+                self._index[directory] = index
+                self._prefix_lens[directory] = {
+                    len(prefix) for prefix in index
+                }
 
     @utils.exit_on_unhandled
     def run(self, once=False):
@@ -544,7 +864,12 @@ class DirWatchPubSub:
             if once:
                 wait_interval = 0
 
-            if self.watcher.wait_for_events(wait_interval):
+            wait_time = wait_interval
+            if self.mirror is not None:
+                wait_time = min(wait_time, MIRROR_POLL_INTERVAL)
+            self._poll_mirror()
+
+            if self.watcher.wait_for_events(wait_time):
                 self.watcher.process_events()
 
             if (time.time() - last_gc) >= wait_interval:
@@ -560,3 +885,49 @@ class DirWatchPubSub:
         event_thread = threading.Thread(target=self.run)
         event_thread.daemon = True
         event_thread.start()
+
+    def run_on_ioloop(self, ioloop=None):
+        """Process directory events on the tornado IOLoop.
+
+        Events are dispatched in batches of MAX_EVENTS_PER_CYCLE, so that
+        websocket writes are interleaved with event processing.
+        """
+        inotify = getattr(self.watcher, 'inotify', None)
+        if inotify is None:
+            _LOGGER.warning('Watcher has no pollable fd, using a thread.')
+            self.run_detached()
+            return
+
+        self._ioloop = ioloop or tornado.ioloop.IOLoop.current()
+        self._ioloop.add_handler(
+            inotify.fileno(),
+            lambda _fd, _events: self._process_events(),
+            tornado.ioloop.IOLoop.READ
+        )
+        tornado.ioloop.PeriodicCallback(
+            self._gc, GC_INTERVAL * 1000
+        ).start()
+        # The mirror DB may be opened later, by _gc.
+        tornado.ioloop.PeriodicCallback(
+            self._poll_mirror, MIRROR_POLL_INTERVAL * 1000
+        ).start()
+
+    @utils.exit_on_unhandled
+    def _process_events(self, scheduled=False):
+        """Process a batch of directory events, reschedule if more are
+        pending.
+        """
+        if scheduled:
+            self._processing = False
+
+        res = self.watcher.process_events(max_events=MAX_EVENTS_PER_CYCLE)
+        more_pending = bool(res) and (
+            res[-1][0] == dirwatch.DirWatcherEvent.MORE_PENDING
+        )
+        if more_pending and not self._processing:
+            self._processing = True
+            self._ioloop.add_callback(self._process_events, scheduled=True)
+
+    def stats(self):
+        """Metrics of the open connections."""
+        return [conn.stats() for conn in list(self.connections)]
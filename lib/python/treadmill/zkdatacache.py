@@ -10,6 +10,7 @@ import collections
 import errno
 import hashlib
 import io
+import json
 import logging
 import os
 import tempfile
@@ -24,6 +25,21 @@ from treadmill import zknamespace as z
 
 _ZK_DATA_SIZE_LIMIT = utils.size_to_bytes('1M')
 
+#: Default size of the chunks of chunked data.
+CHUNK_SIZE = utils.size_to_bytes('512K')
+
+# Chunks are stored under the cache path, keyed by their SHA1.
+_CHUNKS_NODE = '.chunks'
+
+# Data nodes of chunked data hold a manifest of the chunks.
+_MANIFEST_MAGIC = b'#chunks1\n'
+
+# Append-only log of the cache directory entries.
+_INDEX_FILE = '.index'
+
+# Rewrite the index log when it has this many more lines than entries.
+_INDEX_MAX_EXTRA_LINES = 1000
+
 _LOGGER = logging.getLogger(__name__)
 
 
@@ -39,6 +55,50 @@ class ZkDataEntry(collections.namedtuple('_ZkDataEntry',
     """
 
 
+def _make_manifest(chunk_size, size, chunks):
+    """Serialize chunked data manifest."""
+    return _MANIFEST_MAGIC + json.dumps(
+        {'chunk_size': chunk_size, 'size': size, 'chunks': chunks}
+    ).encode()
+
+
+def _parse_manifest(data):
+    """Parse chunked data manifest, return None if data is not chunked."""
+    if not data or not data.startswith(_MANIFEST_MAGIC):
+        return None
+    return json.loads(data[len(_MANIFEST_MAGIC):].decode())
+
+
+def _dir_mtime(path):
+    """Return directory modification time (in ns)."""
+    return os.stat(path).st_mtime_ns
+
+
+def _index_size(path):
+    """Return the size of the cache index (or None)."""
+    try:
+        return os.stat(os.path.join(path, _INDEX_FILE)).st_size
+    except OSError as err:
+        if err.errno == errno.ENOENT:
+            return None
+        raise
+
+
+def _index_line(op, entry):
+    """Format cache index line."""
+    if op == '-':
+        return '-\t{}\n'.format(os.path.basename(entry.fname))
+    return '+\t{}\t{!r}\n'.format(os.path.basename(entry.fname),
+                                  float(entry.ctime))
+
+
+def _file_chunks(fname, chunk_size):
+    """Read file by chunks."""
+    with io.open(fname, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            yield chunk
+
+
 class ZkDataCache:
     """Manage ZK data cached locally.
 
@@ -49,22 +109,44 @@ class ZkDataCache:
 
     Easily integrates with a ChildrenWatch to automatically refresh cache on
     Zookeeper changes.
+
+    Data larger than a Zookeeper node (or all data if ``chunk_size`` is set)
+    is pushed as fixed-size chunks, stored under the cache path keyed by
+    their SHA1, and the data node only holds the chunks manifest. Only new
+    chunks are pushed and only the chunks not in the cached version of the
+    data are pulled.
+
+    The local cache entries are logged in an (append-only) index file, which
+    is valid as long as the cache directory is only modified by caches, i.e.
+    its mtime is the one logged after the last change. Refreshing an
+    unchanged cache is a noop and loading a valid index does not stat the
+    cached files.
     """
     _LCL_FILE_FMT = '{name}#{chksum}'
 
     __slots__ = (
         '_cached',
+        '_chunk_size',
+        '_chunked',
+        '_index_lines',
+        '_index_stamp',
         '_localpath',
         '_zkclient',
         '_zkdata',
+        '_zknodes',
         '_zkpath',
     )
 
-    def __init__(self, zkclient, zkpath, localpath):
+    def __init__(self, zkclient, zkpath, localpath, chunk_size=None):
         self._cached = {}
+        self._chunk_size = chunk_size
+        self._chunked = False
+        self._index_lines = 0
+        self._index_stamp = None
         self._localpath = localpath
         self._zkclient = None
         self._zkdata = {}
+        self._zknodes = {}
         self._zkpath = zkpath
 
         self.refresh_cache()
@@ -102,8 +184,25 @@ class ZkDataCache:
 
         Assume a dirty directory with duplicate files.
         """
+        mtime = _dir_mtime(self._localpath)
+        if (self._index_stamp is not None and
+                self._index_stamp == (mtime, _index_size(self._localpath))):
+            return
+
+        found = self._load_index(mtime)
+        if found is None:
+            found = self._scan_cache()
+            self._write_index(found)
+
+        self._cached = found
+
+    def _scan_cache(self):
+        """Scan files present in localdir."""
         found = {}
         for fname in os.listdir(self._localpath):
+            if fname.startswith('.'):
+                continue
+
             if '#' not in fname:
                 _LOGGER.warning('Bad file in cache dir: %r', fname)
                 continue
@@ -124,7 +223,101 @@ class ZkDataCache:
                 reverse=True
             )
 
-        self._cached = found
+        return found
+
+    def _load_index(self, mtime):
+        """Load cache entries from the index.
+
+        :returns:
+            ``dict`` - Cache entries, or `None` if the index is not valid.
+        """
+        index_mtime = None
+        entries = {}
+        lines = 0
+        try:
+            with io.open(os.path.join(self._localpath, _INDEX_FILE)) as f:
+                for line in f:
+                    lines += 1
+                    (op, _, value) = line.rstrip('\n').partition('\t')
+                    if op == '+':
+                        (fname, ctime) = value.rsplit('\t', 1)
+                        entries[fname] = float(ctime)
+                    elif op == '-':
+                        entries.pop(value, None)
+                    elif op == '@':
+                        index_mtime = int(value)
+                    else:
+                        raise ValueError(line)
+                size = f.tell()
+        except (IOError, OSError, ValueError) as err:
+            _LOGGER.info('Cache index not loaded: %s', err)
+            return None
+
+        if index_mtime != mtime:
+            return None
+
+        found = {}
+        for fname, ctime in six.iteritems(entries):
+            (name, chksum) = fname.split('#', 1)
+            found.setdefault(name, []).append(
+                ZkCachedEntry(
+                    fname=os.path.join(self._localpath, fname),
+                    chksum=chksum,
+                    ctime=ctime
+                )
+            )
+        for name in found:
+            found[name].sort(
+                key=lambda e: e.ctime,  # Sort entries by their creation time
+                reverse=True
+            )
+
+        self._index_lines = lines
+        self._index_stamp = (mtime, size)
+        return found
+
+    def _write_index(self, found):
+        """Rewrite the index with all the cache entries."""
+        lines = [
+            _index_line('+', entry)
+            for entries in six.itervalues(found)
+            for entry in reversed(entries)
+        ]
+        with io.open(os.path.join(self._localpath, _INDEX_FILE), 'w') as f:
+            f.writelines(lines)
+            mtime = _dir_mtime(self._localpath)
+            f.write('@\t{}\n'.format(mtime))
+            size = f.tell()
+
+        self._index_lines = len(lines) + 1
+        self._index_stamp = (mtime, size)
+
+    def _update_index(self, added=(), removed=()):
+        """Log cache entries changes in the index."""
+        if self._index_stamp is None:
+            return
+
+        # Rewrite the index on removals, once removed from the cache.
+        if (not added and self._index_lines >
+                sum(len(v) for v in six.itervalues(self._cached)) +
+                _INDEX_MAX_EXTRA_LINES):
+            self._write_index(self._cached)
+            return
+
+        lines = (
+            [_index_line('+', entry) for entry in added] +
+            [_index_line('-', entry) for entry in removed]
+        )
+        with io.open(os.path.join(self._localpath, _INDEX_FILE), 'a') as f:
+            # Changes logged by others are loaded on the next refresh.
+            outdated = f.tell() != self._index_stamp[1]
+            f.writelines(lines)
+            mtime = _dir_mtime(self._localpath)
+            f.write('@\t{}\n'.format(mtime))
+            size = f.tell()
+
+        self._index_lines += len(lines) + 1
+        self._index_stamp = None if outdated else (mtime, size)
 
     def refresh_zk(self, zknodes=None):
         """Parse data from Zookeeper nodes.
@@ -139,16 +332,27 @@ class ZkDataCache:
             except kazoo.exceptions.NoNodeError:
                 zknodes = []
 
+        # Only parse the nodes not seen on the previous refresh.
+        parsed = {}
         data = {}
         for node in zknodes:
-            (name, chksum, seq) = node.split('#', 2)
-            data.setdefault(name, []).append(
-                ZkDataEntry(
-                    zname=z.join_zookeeper_path(self._zkpath, node),
-                    chksum=chksum,
-                    seq=int(seq)
+            if node == _CHUNKS_NODE:
+                self._chunked = True
+                continue
+
+            entry = self._zknodes.get(node)
+            if entry is None:
+                (name, chksum, seq) = node.split('#', 2)
+                entry = (
+                    name,
+                    ZkDataEntry(
+                        zname=z.join_zookeeper_path(self._zkpath, node),
+                        chksum=chksum,
+                        seq=int(seq)
+                    )
                 )
-            )
+            parsed[node] = entry
+            data.setdefault(entry[0], []).append(entry[1])
         for name in data:
             data[name].sort(
                 key=lambda e: e.seq,  # Sort nodes by their sequence numbers
@@ -156,6 +360,7 @@ class ZkDataCache:
             )
 
         self._zkdata = data
+        self._zknodes = parsed
 
     def add_data(self, name, data):
         """
@@ -191,6 +396,8 @@ class ZkDataCache:
         _LOGGER.info('Removing %r', entries)
         for cache_entry in entries:
             fs.rm_safe(cache_entry.fname)
+        if entries:
+            self._update_index(removed=entries)
 
     def get_data(self, name):
         """Get data from the cache.
@@ -229,31 +436,44 @@ class ZkDataCache:
             # Upload a new version if the chksum is different.
             if zk_entry is None or cache_entry.chksum != zk_entry.chksum:
                 with io.open(cache_entry.fname, 'rb') as data:
-                    self.zkclient.create(
-                        '{path}/{name}#{chksum}#'.format(
-                            path=self._zkpath,
-                            name=name,
-                            chksum=cache_entry.chksum
-                        ),
-                        data.read(),
-                        sequence=True,
-                        makepath=True
-                    )
+                    payload = data.read(_ZK_DATA_SIZE_LIMIT + 1)
+                if (self._chunk_size is not None or
+                        len(payload) > _ZK_DATA_SIZE_LIMIT):
+                    payload = self._push_chunks(cache_entry.fname)
+
+                self.zkclient.create(
+                    '{path}/{name}#{chksum}#'.format(
+                        path=self._zkpath,
+                        name=name,
+                        chksum=cache_entry.chksum
+                    ),
+                    payload,
+                    sequence=True,
+                    makepath=True
+                )
                 new_data = True
 
         if new_data:
             self.refresh_zk()
 
+        deleted = False
         for name, entries in list(six.viewitems(self._zkdata)):
             if name not in self._cached:
                 if expunge:
                     # Clean up all sequence numbers for that name.
                     for zk_entry in entries:
                         zkutils.ensure_deleted(self.zkclient, zk_entry.zname)
+                    del self._zkdata[name]
+                    deleted = True
             else:
                 # Clean up all "older" sequence numbers for that name.
                 for zk_entry in entries[1:]:
                     zkutils.ensure_deleted(self.zkclient, zk_entry.zname)
+                self._zkdata[name] = entries[:1]
+                deleted = deleted or len(entries) > 1
+
+        if deleted and self._chunked:
+            self._cleanup_chunks()
 
         return new_data
 
@@ -289,9 +509,17 @@ class ZkDataCache:
             # Download a new version if the chksum is different.
             if cache_entry is None or zk_entry.chksum != cache_entry.chksum:
                 (data, _metadata) = self.zkclient.get(zk_entry.zname)
+                manifest = _parse_manifest(data)
                 # Store the new cached entry
-                cache_entry = self._add_data_bytes(name, data,
-                                                   chksum=zk_entry.chksum)
+                if manifest is None:
+                    cache_entry = self._add_data_bytes(name, data,
+                                                       chksum=zk_entry.chksum)
+                else:
+                    cache_entry = self._pull_chunks(name, zk_entry.chksum,
+                                                    manifest, cache_entry)
+                    if cache_entry is None:
+                        continue
+
                 self._cached.setdefault(name, []).insert(
                     0,
                     cache_entry
@@ -307,6 +535,121 @@ class ZkDataCache:
 
         return new_data
 
+    def _push_chunks(self, fname):
+        """Push the chunks of a file missing in Zookeeper.
+
+        :returns:
+            ``bytes`` - Manifest of the file chunks.
+        """
+        self._chunked = True
+        chunk_size = self._chunk_size or CHUNK_SIZE
+        chunks_path = z.join_zookeeper_path(self._zkpath, _CHUNKS_NODE)
+        try:
+            existing = set(self.zkclient.get_children(chunks_path))
+        except kazoo.exceptions.NoNodeError:
+            existing = set()
+
+        chunks = []
+        size = 0
+        for chunk in _file_chunks(fname, chunk_size):
+            size += len(chunk)
+            digest = hashlib.sha1(chunk).hexdigest()
+            if digest not in existing:
+                try:
+                    self.zkclient.create(
+                        z.join_zookeeper_path(chunks_path, digest),
+                        chunk,
+                        makepath=True
+                    )
+                except kazoo.exceptions.NodeExistsError:
+                    pass
+                existing.add(digest)
+            chunks.append(digest)
+
+        _LOGGER.info('Pushed %r: %d chunks', fname, len(chunks))
+        return _make_manifest(chunk_size, size, chunks)
+
+    def _pull_chunks(self, name, chksum, manifest, cache_entry):
+        """Pull chunked data, reusing the chunks of the cached version.
+
+        :param ``str`` name:
+            Name for the data.
+        :param ``str`` chksum:
+            Digest of the data.
+        :param ``dict`` manifest:
+            Manifest of the data chunks.
+        :param ``ZkCachedEntry`` cache_entry:
+            Cached version of the data (or `None`).
+        """
+        chunk_size = manifest['chunk_size']
+        chunks_path = z.join_zookeeper_path(self._zkpath, _CHUNKS_NODE)
+
+        # Offsets of the chunks in the cached version of the data.
+        offsets = {}
+        if cache_entry is not None:
+            offset = 0
+            for chunk in _file_chunks(cache_entry.fname, chunk_size):
+                offsets.setdefault(hashlib.sha1(chunk).hexdigest(), offset)
+                offset += len(chunk)
+
+        stats = {'pulled': 0, 'reused': 0}
+
+        def _chunks():
+            """Read chunks locally or from Zookeeper."""
+            cached = None
+            if offsets:
+                cached = io.open(cache_entry.fname, 'rb')
+            try:
+                for digest in manifest['chunks']:
+                    if digest in offsets:
+                        cached.seek(offsets[digest])
+                        stats['reused'] += 1
+                        yield cached.read(chunk_size)
+                    else:
+                        (chunk, _metadata) = self.zkclient.get(
+                            z.join_zookeeper_path(chunks_path, digest)
+                        )
+                        stats['pulled'] += 1
+                        yield chunk
+            finally:
+                if cached is not None:
+                    cached.close()
+
+        new_entry = self._add_data_stream(name, _chunks())
+        _LOGGER.info('Pulled %s#%s: %r', name, chksum, stats)
+        if new_entry is not None and new_entry.chksum != chksum:
+            _LOGGER.error('Invalid chksum for %s#%s: %s',
+                          name, chksum, new_entry.chksum)
+            fs.rm_safe(new_entry.fname)
+            return None
+
+        return new_entry
+
+    def _cleanup_chunks(self):
+        """Remove the chunks which are not referenced by any data node.
+        """
+        chunks_path = z.join_zookeeper_path(self._zkpath, _CHUNKS_NODE)
+        try:
+            chunks = self.zkclient.get_children(chunks_path)
+        except kazoo.exceptions.NoNodeError:
+            return
+
+        referenced = set()
+        for entries in six.itervalues(self._zkdata):
+            for zk_entry in entries:
+                try:
+                    (data, _metadata) = self.zkclient.get(zk_entry.zname)
+                except kazoo.exceptions.NoNodeError:
+                    continue
+                manifest = _parse_manifest(data)
+                if manifest is not None:
+                    referenced.update(manifest['chunks'])
+
+        for digest in set(chunks) - referenced:
+            zkutils.ensure_deleted(
+                self.zkclient, z.join_zookeeper_path(chunks_path, digest)
+            )
+
     def _add_data_stream(self, name, data):
         """Add stream data to the cache.
 
@@ -351,6 +694,8 @@ class ZkDataCache:
         finally:
             os.unlink(tmp.name)
 
+        if res is not None:
+            self._update_index(added=[res])
         return res
 
     def _add_data_bytes(self, name, data, chksum=None):
@@ -395,11 +740,13 @@ class ZkDataCache:
         finally:
             os.unlink(tmp.name)
 
-        return ZkCachedEntry(
+        res = ZkCachedEntry(
             fname=final_filename,
             chksum=chksum,
             ctime=ctime
         )
+        self._update_index(added=[res])
+        return res
 
     def _trim_cache(self, name):
         """Cleanup the cache ensuring only the latest versions are
@@ -416,6 +763,7 @@ class ZkDataCache:
         _LOGGER.debug('Trimming %r', extra)
         for cache_entry in extra:
             fs.rm_safe(cache_entry.fname)
+        self._update_index(removed=extra)
 
 
 __all__ = [
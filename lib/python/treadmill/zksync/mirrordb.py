@@ -0,0 +1,215 @@
+"""Zookeeper mirror store.
+
+Single sqlite DB (in WAL mode) holding the data of the synced nodes, keyed by
+parent path and name, as an alternative to a file per node. Every change is
+recorded in a change log with a monotonic sequence number, readers poll the
+change log instead of watching directories.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import logging
+import os
+import sqlite3
+import threading
+
+from six.moves import urllib_request
+
+_LOGGER = logging.getLogger(__name__)
+
+#: Name of the mirror DB in the zk2fs root.
+DB_FILE = '.mirror.db'
+
+#: Number of changes kept in the change log.
+MAX_CHANGES = 100000
+
+_TRIM_INTERVAL = 1000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS nodes (
+    dir TEXT NOT NULL,
+    name TEXT NOT NULL,
+    data BLOB,
+    mtime REAL NOT NULL,
+    PRIMARY KEY (dir, name)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS nodes_mtime ON nodes (dir, mtime);
+CREATE TABLE IF NOT EXISTS changes (
+    seq INTEGER PRIMARY KEY,
+    op TEXT NOT NULL,
+    dir TEXT NOT NULL,
+    name TEXT NOT NULL
+);
+"""
+
+
+def _split(zkpath):
+    """Split zkpath into (parent, name)."""
+    parent, name = zkpath.rsplit('/', 1)
+    return parent or '/', name
+
+
+def _join(parent, name):
+    """Join parent path and name."""
+    return parent.rstrip('/') + '/' + name
+
+
+def db_path(fsroot):
+    """Return the path of the mirror DB of a zk2fs root."""
+    return os.path.join(fsroot, DB_FILE)
+
+
+class MirrorDB:
+    """Zookeeper mirror store.
+
+    Writes are serialized, the connection is shared by the (kazoo) callback
+    threads of the writer.
+    """
+
+    __slots__ = (
+        'path',
+        '_conn',
+        '_lock',
+        '_writes',
+    )
+
+    def __init__(self, path, readonly=False):
+        self.path = path
+        self._lock = threading.Lock()
+        self._writes = 0
+
+        if readonly:
+            uri = 'file:{}?mode=ro'.format(urllib_request.pathname2url(path))
+            self._conn = sqlite3.connect(
+                uri, uri=True, check_same_thread=False
+            )
+        else:
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.executescript(_SCHEMA)
+
+    def close(self):
+        """Close the DB connection."""
+        self._conn.close()
+
+    def _log(self, op, parent, name):
+        """Record change, periodically trimming the change log."""
+        self._conn.execute(
+            'INSERT INTO changes (op, dir, name) VALUES (?, ?, ?)',
+            (op, parent, name)
+        )
+        self._writes += 1
+        if self._writes % _TRIM_INTERVAL == 0:
+            self._conn.execute(
+                'DELETE FROM changes WHERE seq <= '
+                '(SELECT max(seq) FROM changes) - ?',
+                (MAX_CHANGES,)
+            )
+
+    def put(self, zkpath, data, mtime):
+        """Store node data."""
+        parent, name = _split(zkpath)
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                'UPDATE nodes SET data = ?, mtime = ? '
+                'WHERE dir = ? AND name = ?',
+                (data, mtime, parent, name)
+            )
+            if cursor.rowcount:
+                op = 'm'
+            else:
+                op = 'c'
+                self._conn.execute(
+                    'INSERT INTO nodes (dir, name, data, mtime) '
+                    'VALUES (?, ?, ?, ?)',
+                    (parent, name, data, mtime)
+                )
+            self._log(op, parent, name)
+
+    def delete(self, zkpath):
+        """Delete node."""
+        parent, name = _split(zkpath)
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                'DELETE FROM nodes WHERE dir = ? AND name = ?',
+                (parent, name)
+            )
+            if cursor.rowcount:
+                self._log('d', parent, name)
+
+    def delete_tree(self, zkpath):
+        """Delete node and all its descendants."""
+        prefix = zkpath.rstrip('/') + '/'
+        with self._lock, self._conn:
+            rows = self._conn.execute(
+                'SELECT dir, name FROM nodes '
+                'WHERE dir = ? OR substr(dir, 1, ?) = ?',
+                (zkpath, len(prefix), prefix)
+            ).fetchall()
+            self._conn.execute(
+                'DELETE FROM nodes WHERE dir = ? OR substr(dir, 1, ?) = ?',
+                (zkpath, len(prefix), prefix)
+            )
+            for parent, name in rows:
+                self._log('d', parent, name)
+
+        self.delete(zkpath)
+
+    def get(self, zkpath):
+        """Get node data and mtime, None if node does not exist."""
+        parent, name = _split(zkpath)
+        return self._conn.execute(
+            'SELECT data, mtime FROM nodes WHERE dir = ? AND name = ?',
+            (parent, name)
+        ).fetchone()
+
+    def names(self, zkpath):
+        """Get names of the stored children of zkpath."""
+        return [
+            row[0] for row in self._conn.execute(
+                'SELECT name FROM nodes WHERE dir = ?', (zkpath,)
+            )
+        ]
+
+    def records(self, dir_pattern, pattern='*', since=0):
+        """Get (mtime, zkpath, data) of the nodes matching glob patterns,
+        modified since, ordered by mtime.
+        """
+        cursor = self._conn.execute(
+            'SELECT mtime, dir, name, data FROM nodes '
+            'WHERE dir GLOB ? AND name GLOB ? AND mtime >= ? '
+            'ORDER BY mtime, dir, name',
+            (dir_pattern, pattern, since)
+        )
+        for mtime, parent, name, data in cursor:
+            yield mtime, _join(parent, name), data
+
+    def seq(self):
+        """Get the sequence number of the last change."""
+        return self._conn.execute(
+            'SELECT coalesce(max(seq), 0) FROM changes'
+        ).fetchone()[0]
+
+    def changes(self, since_seq, limit=None):
+        """Get (seq, op, zkpath) of the changes after since_seq."""
+        cursor = self._conn.execute(
+            'SELECT seq, op, dir, name FROM changes WHERE seq > ? '
+            'ORDER BY seq LIMIT ?',
+            (since_seq, -1 if limit is None else limit)
+        )
+        return [
+            (seq, op, _join(parent, name))
+            for seq, op, parent, name in cursor
+        ]
+
+
+__all__ = [
+    'DB_FILE',
+    'MAX_CHANGES',
+    'MirrorDB',
+    'db_path',
+]
@@ -0,0 +1,205 @@
+"""State of the world snapshot DB index and connections.
+
+Every snapshot DB synced to the filesystem gets a (hidden) sidecar index
+recording, per table, the row count and the timestamp and name ranges. Readers
+use the index to skip snapshots that cannot match a query without opening
+them.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import collections
+import errno
+import io
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from six.moves import urllib_request
+
+from treadmill.zksync import utils as zksync_utils
+
+_LOGGER = logging.getLogger(__name__)
+
+INDEX_SUFFIX = '.idx'
+
+_DEFAULT_MAX_IDLE = 32
+
+
+def index_path(db_path):
+    """Return the path of the sidecar index of a snapshot DB."""
+    dirname, basename = os.path.split(db_path)
+    return os.path.join(dirname, '.' + basename + INDEX_SUFFIX)
+
+
+def connect(db_path):
+    """Open read-only connection to an (immutable) snapshot DB.
+
+    Unlike a plain connect, this never creates missing DB files.
+    """
+    uri = 'file:{}?mode=ro&immutable=1'.format(
+        urllib_request.pathname2url(db_path)
+    )
+    return sqlite3.connect(uri, uri=True, check_same_thread=False)
+
+
+def build_index(conn):
+    """Build the index of all tables of a snapshot DB connection."""
+    index = {}
+    tables = [
+        row[0] for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table'"
+        )
+    ]
+    for table in tables:
+        try:
+            count, min_ts, max_ts, min_name, max_name = conn.execute(
+                """
+                SELECT count(*), min(timestamp), max(timestamp),
+                       min(name), max(name)
+                FROM {table}
+                """.format(table=table)
+            ).fetchone()
+        except sqlite3.OperationalError:
+            # Not a state of the world table.
+            continue
+
+        index[table] = {
+            'count': count,
+            'min_ts': min_ts,
+            'max_ts': max_ts,
+            'min_name': min_name,
+            'max_name': max_name,
+        }
+
+    return index
+
+
+def write_index(db_path, index, tmp_dir=None):
+    """Safely write the sidecar index of a snapshot DB."""
+    zksync_utils.write_data(
+        index_path(db_path),
+        json.dumps(index, sort_keys=True).encode(),
+        time.time(),
+        tmp_dir=tmp_dir
+    )
+
+
+def read_index(db_path):
+    """Read the sidecar index of a snapshot DB, None if missing/invalid."""
+    try:
+        with io.open(index_path(db_path)) as f:
+            return json.load(f)
+    except (IOError, OSError) as err:
+        if err.errno != errno.ENOENT:
+            raise
+    except ValueError:
+        _LOGGER.warning('Invalid sow index: %s', index_path(db_path))
+
+    return None
+
+
+def remove_index(db_path):
+    """Remove the sidecar index of a snapshot DB."""
+    try:
+        os.unlink(index_path(db_path))
+    except OSError as err:
+        if err.errno != errno.ENOENT:
+            raise
+
+
+def overlaps(table_index, since, prefix):
+    """Check if a table may have rows newer than since with name prefix."""
+    if table_index is None or not table_index['count']:
+        return False
+
+    if table_index['max_ts'] < since:
+        return False
+
+    if prefix:
+        if table_index['max_name'] < prefix:
+            return False
+        min_name = table_index['min_name']
+        if min_name > prefix and not min_name.startswith(prefix):
+            return False
+
+    return True
+
+
+class ConnectionPool:
+    """Bounded pool of idle read-only snapshot DB connections.
+
+    Connections are checked out for the duration of a query, only idle
+    connections are closed when the pool is over its size.
+    """
+
+    __slots__ = (
+        'max_idle',
+        '_idle',
+        '_lock',
+    )
+
+    def __init__(self, max_idle=_DEFAULT_MAX_IDLE):
+        self.max_idle = max_idle
+        self._idle = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._idle)
+
+    def acquire(self, db_path):
+        """Check out an idle connection to a DB or open a new one.
+
+        :raises ``sqlite3.OperationalError``:
+            If the DB does not exist.
+        """
+        with self._lock:
+            conn = self._idle.pop(db_path, None)
+        if conn is None:
+            conn = connect(db_path)
+        return conn
+
+    def release(self, db_path, conn):
+        """Return a connection to the pool."""
+        with self._lock:
+            stale = self._idle.pop(db_path, None)
+            self._idle[db_path] = conn
+            while len(self._idle) > self.max_idle:
+                _path, oldest = self._idle.popitem(last=False)
+                oldest.close()
+        if stale is not None:
+            stale.close()
+
+    def retain(self, db_paths):
+        """Close idle connections of DBs not in db_paths (e.g. deleted)."""
+        db_paths = set(db_paths)
+        with self._lock:
+            stale = [
+                db_path for db_path in self._idle if db_path not in db_paths
+            ]
+            conns = [self._idle.pop(db_path) for db_path in stale]
+        for conn in conns:
+            conn.close()
+
+    def close(self):
+        """Close all idle connections."""
+        self.retain([])
+
+
+__all__ = [
+    'ConnectionPool',
+    'INDEX_SUFFIX',
+    'build_index',
+    'connect',
+    'index_path',
+    'overlaps',
+    'read_index',
+    'remove_index',
+    'write_index',
+]
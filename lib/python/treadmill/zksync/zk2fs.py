@@ -6,9 +6,16 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import collections
+import errno
+import io
+import json
 import logging
 import glob
 import os
+import shutil
+import time
+
 import kazoo
 
 from treadmill import fs
@@ -21,17 +28,37 @@ from treadmill.zksync import utils as zksync_utils
 
 _LOGGER = logging.getLogger(__name__)
 
+#: Per directory manifest of the synced nodes versions (mzxid).
+MANIFEST_FILE = '.manifest'
+
 
 class Zk2Fs:
-    """Syncronize Zookeeper with file system."""
+    """Syncronize Zookeeper with file system.
+
+    With concurrency, the data of children synced by the default ``on_add``
+    is read with pipelined async requests (at most concurrency outstanding),
+    and a manifest of the synced node versions is kept in each directory, so
+    that after restart only the nodes which changed are read again.
 
-    def __init__(self, zkclient, fsroot, tmp_dir=None):
+    With a mirror store, node data synced to the default location is written
+    to the store instead of a file per node, the directories are still
+    created.
+    """
+
+    def __init__(self, zkclient, fsroot, tmp_dir=None, concurrency=0,
+                 store=None):
         self.watches = set()
         self.processed_once = set()
         self.zkclient = zkclient
         self.fsroot = fsroot
         self.tmp_dir = tmp_dir
         self.ready = False
+        self.concurrency = concurrency
+        self.store = store
+        #: Stats of the last sync of each path.
+        self.sync_stats = {}
+        self._manifests = {}
+        self._children = {}
 
         self.zkclient.add_listener(zkutils.exit_on_lost)
 
@@ -47,7 +74,7 @@ class Zk2Fs:
 
     def _default_on_del(self, zkpath):
         """Default callback invoked on node delete, remove file."""
-        fs.rm_safe(self.fpath(zkpath))
+        self._remove_data(zkpath)
 
     def _default_on_add(self, zkpath):
         """Default callback invoked on node is added, default - sync data.
@@ -61,86 +88,134 @@ class Zk2Fs:
             _LOGGER.warning(
                 'Tried to add node that no longer exists: %s', zkpath
             )
-            fpath = self.fpath(zkpath)
-            fs.rm_safe(fpath)
+            self._remove_data(zkpath)
+            self._forget(zkpath)
 
-    def _write_data(self, fpath, data, stat):
-        """Write Zookeeper data to filesystem.
+    def _write_data(self, zkpath, data, stat, fpath=None):
+        """Write Zookeeper data to filesystem (or the mirror store).
         """
+        if fpath is None and self.store is not None:
+            self.store.put(zkpath, data, stat.last_modified)
+            return
+
         zksync_utils.write_data(
-            fpath, data, stat.last_modified,
+            fpath or self.fpath(zkpath), data, stat.last_modified,
             raise_err=True, tmp_dir=self.tmp_dir
         )
 
+    def _remove_data(self, zkpath, fpath=None):
+        """Remove Zookeeper data from filesystem (or the mirror store).
+        """
+        if fpath is None and self.store is not None:
+            self.store.delete(zkpath)
+        else:
+            fs.rm_safe(fpath or self.fpath(zkpath))
+
     def _data_watch(self, zkpath, data, stat, event, fpath=None):
         """Invoked when data changes.
         """
-        fpath = fpath or self.fpath(zkpath)
         if event is not None and event.type == 'DELETED':
             _LOGGER.info('Node deleted: %s', zkpath)
             self.watches.discard(zkpath)
-            fs.rm_safe(fpath)
+            self._remove_data(zkpath, fpath)
+            self._set_version(zkpath, None)
+            self._forget(zkpath)
         elif stat is None:
             _LOGGER.info('Node does not exist: %s', zkpath)
             self.watches.discard(zkpath)
-            fs.rm_safe(fpath)
+            self._remove_data(zkpath, fpath)
+            self._set_version(zkpath, None)
+            self._forget(zkpath)
         else:
-            self._write_data(fpath, data, stat)
+            self._write_data(zkpath, data, stat, fpath)
+            self._set_version(zkpath, stat)
 
-    def _filter_children_actions(self, sorted_children, sorted_filenames, add,
-                                 remove, common):
-        """sorts the children actions to add, remove and common."""
-        num_children = len(sorted_children)
-        num_filenames = len(sorted_filenames)
+    def _load_manifest(self, zkpath):
+        """Load the manifest of the synced children of zkpath."""
+        manifest = self._manifests.get(zkpath)
+        if manifest is not None:
+            return manifest
 
-        child_idx = 0
-        file_idx = 0
-
-        while child_idx < num_children or file_idx < num_filenames:
-            child_name = None
-            if child_idx < num_children:
-                child_name = sorted_children[child_idx]
-
-            file_name = None
-            if file_idx < num_filenames:
-                file_name = sorted_filenames[file_idx]
+        manifest_file = os.path.join(self.fpath(zkpath), MANIFEST_FILE)
+        try:
+            with io.open(manifest_file) as f:
+                manifest = json.load(f)
+        except (IOError, OSError) as err:
+            if err.errno != errno.ENOENT:
+                raise
+            manifest = {}
+        except ValueError:
+            _LOGGER.warning('Ignoring invalid manifest: %s', manifest_file)
+            manifest = {}
+
+        self._manifests[zkpath] = manifest
+        return manifest
+
+    def _save_manifest(self, zkpath):
+        """Persist the manifest of the synced children of zkpath."""
+        manifest = self._manifests.get(zkpath)
+        if manifest is None:
+            return
 
-            if child_name is None:
-                remove.append(file_name)
-                file_idx += 1
+        zksync_utils.write_data(
+            os.path.join(self.fpath(zkpath), MANIFEST_FILE),
+            json.dumps(manifest, sort_keys=True).encode(),
+            time.time(),
+            raise_err=False, tmp_dir=self.tmp_dir
+        )
 
-            elif file_name is None:
-                add.append(child_name)
-                child_idx += 1
+    def _set_version(self, zknode, stat):
+        """Record the synced version of a node in its parent manifest."""
+        parent, name = zknode.rsplit('/', 1)
+        manifest = self._manifests.get(parent or '/')
+        if manifest is None:
+            return
 
-            elif child_name == file_name:
-                common.append(child_name)
-                child_idx += 1
-                file_idx += 1
+        if stat is None:
+            manifest.pop(name, None)
+        else:
+            manifest[name] = stat.mzxid
 
-            elif child_name < file_name:
-                add.append(child_name)
-                child_idx += 1
+    def _forget(self, zknode):
+        """Remove a node, which data is removed, from its parent synced set.
 
-            else:
-                remove.append(file_name)
-                file_idx += 1
+        The node is then synced again if it is listed (re-created) by the
+        next children watch.
+        """
+        parent, name = zknode.rsplit('/', 1)
+        synced = self._children.get(parent or '/')
+        if synced is not None:
+            synced.discard(name)
 
     def _children_watch(self, zkpath, children, watch_data,
                         on_add, on_del, cont_watch_predicate=None):
         """Callback invoked on children watch."""
+        started = time.monotonic()
         fpath = self.fpath(zkpath)
 
-        sorted_children = sorted(children)
-        sorted_filenames = sorted(map(os.path.basename,
-                                      glob.glob(os.path.join(fpath, '*'))))
+        # Names synced to fpath, seeded from disk once.
+        synced = self._children.get(zkpath)
+        if synced is None:
+            synced = set(
+                os.path.basename(filename)
+                for filename in glob.glob(os.path.join(fpath, '*'))
+            )
+            if self.store is not None:
+                synced.update(self.store.names(zkpath))
+            self._children[zkpath] = synced
+
+        first = zkpath not in self.processed_once
+        self.processed_once.add(zkpath)
 
-        add = []
-        remove = []
-        common = []
+        children = set(children)
+        add = sorted(children - synced)
+        remove = sorted(synced - children)
+        common = sorted(children & synced) if first else []
 
-        self._filter_children_actions(sorted_children, sorted_filenames,
-                                      add, remove, common)
+        # Update the synced set first, nodes gone before they are synced are
+        # removed from it by the callbacks.
+        synced.difference_update(remove)
+        synced.update(add)
 
         for node in remove:
             _LOGGER.info('Delete: %s', node)
@@ -148,8 +223,9 @@ class Zk2Fs:
             self.watches.discard(zknode)
             on_del(zknode)
 
-        if zkpath not in self.processed_once:
-            self.processed_once.add(zkpath)
+        if self.concurrency and on_add == self._default_on_add:
+            self._sync_nodes(zkpath, common, add, remove, watch_data)
+        else:
             for node in common:
                 _LOGGER.info('Common: %s', node)
 
@@ -159,19 +235,144 @@ class Zk2Fs:
 
                 on_add(zknode)
 
+            for node in add:
+                _LOGGER.info('Add: %s', node)
+
+                zknode = z.join_zookeeper_path(zkpath, node)
+                if watch_data:
+                    self.watches.add(zknode)
+
+                on_add(zknode)
+
+        self._report_sync(
+            zkpath, started,
+            synced=len(add) + len(common),
+            removed=len(remove)
+        )
+
+        if cont_watch_predicate:
+            return cont_watch_predicate(zkpath, sorted(children))
+
+        return True
+
+    def _pipeline(self, requests):
+        """Issue async requests, at most concurrency outstanding.
+
+        :param requests:
+            Iterable of (key, callable issuing the async request).
+        :returns:
+            ``generator`` - (key, async result) in the order of requests.
+        """
+        pending = collections.deque()
+        for key, request in requests:
+            pending.append((key, request()))
+            if len(pending) >= self.concurrency:
+                yield pending.popleft()
+
+        while pending:
+            yield pending.popleft()
+
+    def _sync_nodes(self, zkpath, common, add, remove, watch_data):
+        """Pipelined sync of the data of zkpath children.
+
+        Nodes already on disk (common) with the same version in the manifest
+        are only checked with exists, all others are read.
+        """
+        manifest = self._load_manifest(zkpath)
+        for node in remove:
+            manifest.pop(node, None)
+
+        for node in common:
+            _LOGGER.info('Common: %s', node)
         for node in add:
             _LOGGER.info('Add: %s', node)
 
-            zknode = z.join_zookeeper_path(zkpath, node)
-            if watch_data:
+        data_watches = {}
+        if watch_data:
+            for node in common + add:
+                zknode = z.join_zookeeper_path(zkpath, node)
                 self.watches.add(zknode)
+                data_watches[node] = zkwatchers.ExistingDataWatch(
+                    self.zkclient, zknode, version=manifest.get(node)
+                )
 
-            on_add(zknode)
+        def _request(method, node):
+            """Make request of node, setting its data watch."""
+            zknode = z.join_zookeeper_path(zkpath, node)
+            data_watch = data_watches.get(node)
+            watcher = data_watch.watcher if data_watch else None
+            return lambda: method(zknode, watch=watcher)
+
+        # Check if versions of the nodes known from the manifest changed.
+        changed = [node for node in common if node not in manifest]
+        known = [node for node in common if node in manifest]
+        unchanged = 0
+        for node, result in self._pipeline(
+                (node, _request(self.zkclient.exists_async, node))
+                for node in known):
+            try:
+                stat = result.get()
+            except kazoo.exceptions.KazooException:
+                stat = False
+
+            if stat is None or (stat and stat.mzxid == manifest[node]):
+                # Unchanged, or deleted since listed.
+                unchanged += 1
+                if node in data_watches:
+                    self._start_data_watch(zkpath, node,
+                                           data_watches[node], result)
+                elif stat is None:
+                    self._data_watch(
+                        z.join_zookeeper_path(zkpath, node), None, None, None
+                    )
+            else:
+                changed.append(node)
 
-        if cont_watch_predicate:
-            return cont_watch_predicate(zkpath, sorted_children)
+        for node, result in self._pipeline(
+                (node, _request(self.zkclient.get_async, node))
+                for node in changed + add):
+            if node in data_watches:
+                self._start_data_watch(zkpath, node,
+                                       data_watches[node], result)
+                continue
 
-        return True
+            zknode = z.join_zookeeper_path(zkpath, node)
+            try:
+                data, stat = result.get()
+            except kazoo.client.NoNodeError:
+                _LOGGER.warning(
+                    'Tried to add node that no longer exists: %s', zknode
+                )
+                data, stat = None, None
+            self._data_watch(zknode, data, stat, None)
+
+        self._save_manifest(zkpath)
+        _LOGGER.info('Pipelined sync of %s: %d read, %d unchanged',
+                     zkpath, len(changed) + len(add), unchanged)
+
+    def _start_data_watch(self, zkpath, node, data_watch, result):
+        """Start data watch of node with the pipelined read result."""
+        zknode = z.join_zookeeper_path(zkpath, node)
+
+        @utils.exit_on_unhandled
+        def _data_watch(data, stat, event):
+            """Invoked when data changes."""
+            self._data_watch(zknode, data, stat, event)
+            self._update_last()
+
+        data_watch.start(_data_watch, result)
+
+    def _report_sync(self, zkpath, started, synced, removed):
+        """Record and log the children sync latency of zkpath."""
+        duration = time.monotonic() - started
+        self.sync_stats[zkpath] = {
+            'synced': synced,
+            'removed': removed,
+            'duration': duration,
+        }
+        if synced or removed:
+            _LOGGER.info('Synced %s: %d synced, %d removed in %.3fs',
+                         zkpath, synced, removed, duration)
 
     def fpath(self, zkpath):
         """Returns file path to given zk node."""
@@ -179,8 +380,6 @@ class Zk2Fs:
 
     def sync_data(self, zkpath, fpath=None, watch=False):
         """Sync zk node data to file."""
-        fpath = fpath or self.fpath(zkpath)
-
         if watch:
             self.watches.add(zkpath)
 
@@ -193,9 +392,17 @@ class Zk2Fs:
                 self._update_last()
         else:
             data, stat = self.zkclient.get(zkpath)
-            self._write_data(fpath, data, stat)
+            self._write_data(zkpath, data, stat, fpath)
             self._update_last()
 
+    def remove_tree(self, zkpath):
+        """Remove the synced data of zkpath and all its children."""
+        fpath = self.fpath(zkpath)
+        if os.path.isdir(fpath):
+            shutil.rmtree(fpath)
+        if self.store is not None:
+            self.store.delete_tree(zkpath)
+
     def _make_children_watch(self, zkpath, watch_data=False,
                              on_add=None, on_del=None,
                              cont_watch_predicate=None):
@@ -242,6 +449,10 @@ class Zk2Fs:
         fpath = self.fpath(zkpath)
         fs.mkdir_safe(fpath)
 
+        # (Re)synced from scratch, e.g. after the path was removed and added.
+        self._children.pop(zkpath, None)
+        self._manifests.pop(zkpath, None)
+
         done_file = os.path.join(fpath, '.done')
         if os.path.exists(done_file):
             _LOGGER.info('Found done file: %s, nothing to watch.', done_file)
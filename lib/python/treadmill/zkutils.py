@@ -6,6 +6,7 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import collections
 import fnmatch
 import io
 import logging
@@ -37,6 +38,12 @@ ZK_MAX_CONNECTION_START_TIMEOUT = 30
 
 DEFAULT_ACL = True
 
+# Maximum number of outstanding async requests when pipelining reads.
+DEFAULT_CONCURRENCY = 64
+
+# Maximum number of operations in a multi-op transaction.
+TRANSACTION_BATCH_SIZE = 100
+
 
 def _is_valid_perm(perm):
     """Check string to be valid permission spec."""
@@ -399,6 +406,69 @@ def create(zkclient, path, data=None, acl=None, sequence=False,
                            sequence=sequence, ephemeral=ephemeral)
 
 
+def _commit(zkclient, ops, acl, ephemeral):
+    """Apply (op, path, data) ops in a single transaction."""
+    transaction = zkclient.transaction()
+    for op, path, data in ops:
+        if op == 'create':
+            transaction.create(path, _payload(data), acl=acl,
+                               ephemeral=ephemeral)
+        elif op == 'set':
+            transaction.set_data(path, _payload(data))
+        elif op == 'delete':
+            transaction.delete(path)
+        else:
+            raise ValueError('Invalid op: %s' % op)
+    return transaction.commit()
+
+
+def apply_batch(zkclient, ops, acl=None, default_acl=True, ephemeral=False,
+                batch_size=TRANSACTION_BATCH_SIZE):
+    """Apply ops with batched multi-op transactions.
+
+    If a transaction fails (e.g. a node exists, is gone or has no parent),
+    nothing is applied and the ops of the batch are applied one by one:
+    nodes which already exist are not created, set creates missing nodes and
+    delete skips missing nodes. A single op is applied without a transaction.
+
+    :param ops:
+        List of (op, path, data) tuples, op is 'create', 'set' or 'delete',
+        data is serialized as in ``put``.
+    :returns:
+        ``list`` - (path, data) tuples of the nodes which already exist.
+    """
+    if default_acl:
+        realacl = zkclient.make_default_acl(acl)
+    else:
+        realacl = acl
+
+    conflicts = []
+    for idx in range(0, len(ops), batch_size):
+        batch = ops[idx:idx + batch_size]
+        if len(batch) > 1:
+            results = with_retry(_commit, zkclient, batch, realacl,
+                                 ephemeral)
+            if not any(isinstance(result, Exception) for result in results):
+                continue
+            _LOGGER.debug('Transaction failed, applying ops one by one.')
+
+        for op, path, data in batch:
+            if op == 'create':
+                try:
+                    with_retry(create, zkclient, path, data, acl=realacl,
+                               default_acl=False, ephemeral=ephemeral)
+                except kazoo.client.NodeExistsError:
+                    _LOGGER.debug('Node exists: %s', path)
+                    conflicts.append((path, data))
+            elif op == 'set':
+                with_retry(put, zkclient, path, data, acl=realacl,
+                           default_acl=False, ephemeral=ephemeral)
+            else:
+                with_retry(ensure_deleted, zkclient, path, recursive=False)
+
+    return conflicts
+
+
 def put(zkclient, path, data=None, acl=None, sequence=False, default_acl=True,
         ephemeral=False, check_content=False):
     """Serialize data into Zk node, converting data to json.
@@ -460,9 +530,8 @@ def get(zkclient, path, watcher=None, strict=True):
     return data
 
 
-def get_with_metadata(zkclient, path, watcher=None, strict=True):
-    """Read content of Zookeeper node and return json parsed object."""
-
+def _deserialize(data, strict=True):
+    """Deserialize node content."""
     # Import yaml in the function scope, to stress that it should be decoed
     # once all legacy clients are upgraded.
     #
@@ -470,8 +539,6 @@ def get_with_metadata(zkclient, path, watcher=None, strict=True):
     # in YAML.
     from treadmill import yamlwrapper as yaml
 
-    data, metadata = zkclient.get(path, watch=watcher)
-
     result = None
     if data is not None:
         try:
@@ -484,7 +551,42 @@ def get_with_metadata(zkclient, path, watcher=None, strict=True):
                     raise
                 result = data
 
-    return result, metadata
+    return result
+
+
+def get_with_metadata(zkclient, path, watcher=None, strict=True):
+    """Read content of Zookeeper node and return json parsed object."""
+    data, metadata = zkclient.get(path, watch=watcher)
+    return _deserialize(data, strict=strict), metadata
+
+
+def get_many_with_metadata(zkclient, paths, strict=True,
+                           concurrency=DEFAULT_CONCURRENCY):
+    """Read content of multiple Zookeeper nodes, pipelining the requests.
+
+    At most `concurrency` requests are outstanding at any time.
+
+    :returns:
+        ``generator`` - (path, data, metadata) tuples in the order of paths,
+        data and metadata are None if the node does not exist.
+    """
+    pending = collections.deque()
+
+    def _result():
+        path, async_result = pending.popleft()
+        try:
+            data, metadata = async_result.get()
+        except kazoo.client.NoNodeError:
+            return path, None, None
+        return path, _deserialize(data, strict=strict), metadata
+
+    for path in paths:
+        pending.append((path, zkclient.get_async(path)))
+        if len(pending) >= concurrency:
+            yield _result()
+
+    while pending:
+        yield _result()
 
 
 def get_default(zkclient, path, watcher=None, strict=True, default=None):
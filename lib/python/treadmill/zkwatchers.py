@@ -40,15 +40,18 @@ class ExistingDataWatch:
     Supplied function will be passed three arguments: data, stat and event.
     For reconnection or the first call event will be None. If node does not
     exist or is deleted, data and stat will be None and watch will be stopped.
+
+    If version (mzxid) is given, the function is not called for the first
+    read unless the node version differs.
     """
-    def __init__(self, client, path, func=None):
+    def __init__(self, client, path, func=None, version=None):
         """Create a data watcher for an existing path"""
         self._client = client
         self._path = path
         self._func = func
         self._stopped = False
         self._run_lock = client.handler.lock_object()
-        self._version = None
+        self._version = version
         self._retry = kazoo.retry.KazooRetry(
             max_tries=None, sleep_func=client.handler.sleep_func
         )
@@ -75,6 +78,32 @@ class ExistingDataWatch:
         self._get_data()
         return func
 
+    @property
+    def watcher(self):
+        """Watcher to pass to the (pipelined) read starting the watch."""
+        return self._watcher
+
+    def start(self, func, result):
+        """Associate func with the watch, using the result of a pipelined
+        first read.
+
+        :param result:
+            Async result of ``get_async`` or ``exists_async`` issued with
+            ``watcher``. If the read failed, or data is needed but the result
+            is from ``exists_async``, the node is read (again) synchronously.
+        """
+        if self._used:
+            raise kazoo.exceptions.KazooException(
+                'A function has already been associated with this '
+                'ExistingDataWatch instance.')
+
+        self._func = func
+
+        self._used = True
+        self._client.add_listener(self._session_watcher)
+        self._get_data(result=result)
+        return func
+
     def _log_func_exception(self, data, stat, event=None):
         try:
             self._func(data, stat, event)
@@ -88,8 +117,30 @@ class ExistingDataWatch:
         _LOGGER.info('Stopping watch on %s: %s', self._path, reason)
         self._func = None
 
+    def _read(self, result):
+        """Read the node, from the result of a pipelined read if possible."""
+        if result is not None:
+            try:
+                res = result.get()
+            except kazoo.exceptions.NoNodeError:
+                raise
+            except kazoo.exceptions.KazooException as err:
+                _LOGGER.info('Pipelined read of %s failed: %r, retrying',
+                             self._path, err)
+            else:
+                if res is None:
+                    raise kazoo.exceptions.NoNodeError()
+                if not hasattr(res, 'mzxid'):
+                    # get_async (data, stat) result.
+                    return res
+                if res.mzxid == self._version:
+                    # Unchanged, no need for the data.
+                    return None, res
+
+        return self._retry(self._client.get, self._path, self._watcher)
+
     @_ignore_closed
-    def _get_data(self, event=None):
+    def _get_data(self, event=None, result=None):
         # Ensure this runs one at a time, possible because the session
         # watcher may trigger a run
         with self._run_lock:
@@ -102,8 +153,7 @@ class ExistingDataWatch:
                 return
 
             try:
-                data, stat = self._retry(self._client.get,
-                                         self._path, self._watcher)
+                data, stat = self._read(result)
             except kazoo.exceptions.NoNodeError:
                 self._log_func_exception(None, None, event)
                 self._stop('Node does not exist')